@@ -0,0 +1,470 @@
+"""
+Bulk import and export of triples, bypassing LLM extraction.
+
+Formats are chosen by file extension (optionally followed by .gz):
+
+    .nt, .nq         N-Triples; in N-Quads the graph term is the source
+    .csv             header row naming subject, relation (or predicate) and
+                     object columns, optionally sources and confidence
+    .jsonl, .ndjson  one {"subject", "relation", "object", "sources",
+                     "confidence"} object (or [s, r, o] array) per line
+
+Readers are fed raw blocks like the upload readers in api/readers.py, but
+return parsed rows instead of text chunks, so a file of any size streams
+through with bounded memory. BulkImporter collects rows into batches and
+commits each as one bulk_upsert operation (one WAL record and one
+version). That deduplicates node keys, edge keys and source links column
+by column with numpy, looks up every distinct label once and appends new
+nodes and edges to the engine in one step.
+
+Exports stream the same formats from a snapshot and never hold the graph
+lock. N-Triples has no room for sources or confidence; the CSV and JSONL
+exports keep both and import back into an identical graph.
+
+Usage, against the graph configured by GRAPH_DATA_DIR and GRAPH_BACKEND:
+
+    python -m api.bulk import kb.nt.gz --source kb
+    python -m api.bulk export --format jsonl -o graph.jsonl
+"""
+import argparse
+import asyncio
+import csv
+import gc
+import io
+import json
+import math
+import re
+import sys
+import time
+from contextlib import contextmanager
+from itertools import repeat
+from operator import itemgetter
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+from .readers import CsvReader, GzipReader, LineReader, UnsupportedFormatError, iter_file
+
+# (subject, relation, object, sources or None, confidence or None)
+Row = Tuple[str, str, str, Optional[List[str]], Optional[float]]
+
+# Rows per bulk_upsert operation
+BATCH_SIZE = 200_000
+# Imported triples are curated facts unless the file says otherwise
+DEFAULT_CONFIDENCE = 1.0
+# Joins several sources in one CSV cell
+SOURCE_SEPARATOR = "|"
+# Export rows per yielded block
+EXPORT_BATCH = 1000
+
+# IRIs used for labels and relations in N-Triples exports
+ENTITY_IRI = "urn:ukg:entity:"
+RELATION_IRI = "urn:ukg:relation:"
+
+CSV_COLUMNS = {
+    "subject": ("subject", "head", "s"),
+    "relation": ("relation", "predicate", "property", "p"),
+    "object": ("object", "tail", "o"),
+    "sources": ("sources", "source", "provenance"),
+    "confidence": ("confidence", "score"),
+}
+
+
+# One N-Triples term, capturing (IRI, blank node label, literal); literal tags and datatypes are dropped
+TERM = r'(?:<([^>]*)>|_:(\S+)|"((?:[^"\\]|\\.)*)"(?:@[A-Za-z0-9-]+|\^\^<[^>]*>)?)'
+# Subject, predicate, object and an optional graph term
+STATEMENT = re.compile(rf"\s*{TERM}\s*{TERM}\s*{TERM}(?:\s*{TERM})?\s*\.\s*(?:#.*)?$")
+ESCAPE = re.compile(r"\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))")
+ESCAPES = {"t": "\t", "b": "\b", "n": "\n", "r": "\r", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+
+
+def _unescape_match(m: "re.Match") -> str:
+    code = m.group(1) or m.group(2)
+    return chr(int(code, 16)) if code else ESCAPES.get(m.group(3), m.group(3))
+
+
+def unescape_literal(value: str) -> str:
+    return ESCAPE.sub(_unescape_match, value) if "\\" in value else value
+
+
+def iri_label(iri: str, entity: bool = True) -> str:
+    """
+    Label for an IRI: the original label for IRIs this module exported,
+    otherwise the local name after the last '#', '/' or ':' ("Neural_network"
+    becomes "Neural network" for entities).
+    """
+    if iri.startswith((ENTITY_IRI, RELATION_IRI)):
+        return unquote(iri[len(ENTITY_IRI if iri.startswith(ENTITY_IRI) else RELATION_IRI):])
+    stripped = iri.rstrip("/#")
+    local = stripped[max(stripped.rfind("#"), stripped.rfind("/"), stripped.rfind(":")) + 1:] or iri
+    local = unquote(local)
+    return local.replace("_", " ") if entity else local
+
+
+def iri_terms(line: str) -> Optional[List[str]]:
+    """
+    The IRIs of a statement made only of IRIs, each separated by one space
+    ("<s> <p> <o> ." or with a graph), or None for anything else, which is
+    left to STATEMENT. An IRI holds no spaces, brackets or quotes, so
+    splitting on "> <" is exact when the counts of those characters match.
+    """
+    line = line.strip()
+    if line[:1] != "<" or line[-3:] != "> .":
+        return None
+    body = line[1:-3]
+    terms = body.split("> <")
+    gaps = len(terms) - 1
+    if not 2 <= gaps <= 3 or not (body.count(" ") == body.count("<") == body.count(">") == gaps) or '"' in body:
+        return None
+    return terms
+
+
+def parse_confidence(value: Any) -> float:
+    """A confidence read from a file; ValueError for anything but a finite number ("nan", "inf")."""
+    confidence = float(value)
+    if not math.isfinite(confidence):
+        raise ValueError(f"confidence must be finite, not {value!r}")
+    return confidence
+
+
+class NTriplesReader(LineReader):
+    """N-Triples or N-Quads statements, one per line; comments and blank lines are skipped."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._relations: Dict[str, str] = {}  # predicate IRI -> relation; a file uses only a few
+
+    def feed_lines(self, lines: List[str]) -> List[Row]:
+        rows = []
+        relations = self._relations
+        for line in lines:
+            terms = iri_terms(line)
+            if terms is not None:
+                relation = relations.get(terms[1])
+                if relation is None:
+                    relation = relations[terms[1]] = iri_label(terms[1], entity=False)
+                self.records += 1
+                rows.append((iri_label(terms[0]), relation, iri_label(terms[2]), terms[3:] or None, None))
+                continue
+            m = STATEMENT.match(line)
+            if m is None:
+                if line.strip() and not line.lstrip().startswith("#"):
+                    self.bad_records += 1
+                continue
+            g = m.groups()
+            subject = iri_label(g[0]) if g[0] is not None else g[1] or unescape_literal(g[2])
+            relation = iri_label(g[3], entity=False) if g[3] is not None else g[4] or unescape_literal(g[5])
+            obj = iri_label(g[6]) if g[6] is not None else g[7] or unescape_literal(g[8])
+            graph = g[9] or g[10] or (unescape_literal(g[11]) if g[11] is not None else None)
+            self.records += 1
+            rows.append((subject, relation, obj, [graph] if graph else None, None))
+        return rows
+
+
+class CsvTripleReader(CsvReader):
+    """CSV rows with a header naming the triple's columns (see CSV_COLUMNS); without one, the first three columns."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._triple: Optional[Callable[[List[str]], Tuple[str, ...]]] = None
+        self._sources: Optional[int] = None
+        self._confidence: Optional[int] = None
+
+    def _read_header(self, row: List[str]):
+        self.header = [name.strip().lower() for name in row]
+        positions = {field: next((self.header.index(n) for n in names if n in self.header), None)
+                     for field, names in CSV_COLUMNS.items()}
+        self._triple = itemgetter(*(i if positions[field] is None else positions[field]
+                                    for i, field in enumerate(("subject", "relation", "object"))))
+        self._sources, self._confidence = positions["sources"], positions["confidence"]
+
+    def _feed_rows(self, rows: List[str]) -> List[Row]:
+        triples = []
+        sources: Optional[List[str]]
+        for row in csv.reader(rows):
+            if not row:
+                continue
+            if self.header is None:
+                self._read_header(row)
+                continue
+            try:
+                subject, relation, obj = self._triple(row)
+                sources = confidence = None
+                if self._sources is not None and self._sources < len(row):
+                    cell = row[self._sources].strip()
+                    if SOURCE_SEPARATOR not in cell:
+                        sources = [cell] if cell else None
+                    else:
+                        sources = [s for s in cell.split(SOURCE_SEPARATOR) if s] or None
+                if self._confidence is not None and self._confidence < len(row) and row[self._confidence].strip():
+                    confidence = parse_confidence(row[self._confidence])
+            except (IndexError, ValueError):
+                self.bad_records += 1
+                continue
+            triples.append((subject.strip(), relation.strip(), obj.strip(), sources, confidence))
+        self.records += len(triples)
+        return triples
+
+
+class JsonLinesTripleReader(LineReader):
+    """One triple per line, as an object or a [subject, relation, object, (source)] array."""
+
+    def feed_lines(self, lines: List[str]) -> List[Row]:
+        rows = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                rows.append(json_row(json.loads(line)))
+            except (ValueError, TypeError, KeyError, IndexError):
+                self.bad_records += 1
+                continue
+            self.records += 1
+        return rows
+
+
+def json_row(record: Any) -> Row:
+    if isinstance(record, list):
+        return (str(record[0]), str(record[1]), str(record[2]),
+                [str(record[3])] if len(record) > 3 and record[3] else None, None)
+    relation = record["relation"] if "relation" in record else record["predicate"]
+    sources = record.get("sources", record.get("source"))
+    if isinstance(sources, str):
+        sources = [sources]
+    sources = [str(s) for s in sources or () if s]
+    confidence = record.get("confidence")
+    return (str(record["subject"]), str(relation), str(record["object"]), sources or None,
+            parse_confidence(confidence) if confidence is not None else None)
+
+
+TRIPLE_READERS = {
+    ".nt": NTriplesReader,
+    ".nq": NTriplesReader,
+    ".csv": CsvTripleReader,
+    ".jsonl": JsonLinesTripleReader,
+    ".ndjson": JsonLinesTripleReader,
+}
+
+
+def triple_reader_for(filename: str):
+    """Triple reader for a file name's extension (optionally followed by .gz)."""
+    name = filename.lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    for extension, reader_class in TRIPLE_READERS.items():
+        if name.endswith(extension):
+            reader = reader_class()
+            return GzipReader(reader) if compressed else reader
+    supported = ", ".join(TRIPLE_READERS)
+    raise UnsupportedFormatError(f"Unsupported triple file type; supported: {supported} (optionally .gz)")
+
+
+@contextmanager
+def gc_paused():
+    """
+    Keep the cyclic garbage collector out of a block. Batches allocate
+    millions of tuples, dicts and lists that all survive, and every
+    generation-2 collection would rescan the whole graph built so far.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class BulkImporter:
+    """
+    Collects rows into batches and commits each with GraphStore.bulk_upsert,
+    which merges repeated triples: a triple's sources count every sighting
+    and its confidence is the maximum. Rows without sources are attributed
+    to `source`.
+    """
+
+    def __init__(self, store, source: str, batch_size: int = BATCH_SIZE):
+        self.store = store
+        self.source = source
+        self.batch_size = batch_size
+        self._rows: List[Row] = []
+        self.counts = {"rows": 0, "skipped_rows": 0, "batches": 0,
+                       "nodes_added": 0, "edges_added": 0, "edges_updated": 0}
+        self.started = time.perf_counter()
+
+    def feed(self, rows: Iterable[Row]):
+        """Add parsed rows, committing every time a batch fills up."""
+        self._rows.extend(rows)
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Commit the current batch, if any."""
+        rows, self._rows = self._rows, []
+        if not rows:
+            return
+        self.counts["rows"] += len(rows)
+        subjects, relations, objects, sources, confidences = map(list, zip(*rows))
+        if not (all(subjects) and all(relations) and all(objects)):
+            rows = [row for row in rows if row[0] and row[1] and row[2]]
+            self.counts["skipped_rows"] += len(subjects) - len(rows)
+            if not rows:
+                return
+            subjects, relations, objects, sources, confidences = map(list, zip(*rows))
+        confidences = [DEFAULT_CONFIDENCE if confidence is None else confidence for confidence in confidences]
+        if set(map(len, filter(None, sources))) <= {1}:
+            # At most one source per row, the common case
+            link_rows = list(range(len(rows)))
+            link_sources = [self.source if row_sources is None else row_sources[0] for row_sources in sources]
+        else:
+            link_rows, link_sources = [], []
+            for row, row_sources in enumerate(sources):
+                row_sources = row_sources or [self.source]
+                link_rows.extend(repeat(row, len(row_sources)))
+                link_sources.extend(row_sources)
+        counts = self.store.bulk_upsert(subjects, relations, objects, confidences,
+                                        link_rows, link_sources, [1] * len(link_rows))
+        self.counts["batches"] += 1
+        for name in ("nodes_added", "edges_added", "edges_updated"):
+            self.counts[name] += counts[name]
+
+    def report(self, reader=None) -> Dict[str, Any]:
+        report = dict(self.counts)
+        inner = getattr(reader, "inner", reader)
+        if inner is not None:
+            report["bad_rows"] = inner.bad_records
+        elapsed = time.perf_counter() - self.started
+        report["seconds"] = round(elapsed, 3)
+        report["rows_per_second"] = round(report["rows"] / elapsed) if elapsed else 0
+        report["version"] = self.store.version
+        return report
+
+
+def import_file(store, f, filename: str, source: Optional[str] = None, batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """Import a binary file object of triples; the format comes from filename."""
+    reader = triple_reader_for(filename)
+    importer = BulkImporter(store, source or filename, batch_size)
+    with gc_paused():
+        for block in iter_file(f):
+            importer.feed(reader.feed(block))
+        importer.feed(reader.finish())
+        importer.flush()
+    return importer.report(reader)
+
+
+async def aimport_blocks(store, blocks: AsyncIterable[bytes], reader, source: str,
+                         batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """Import an async byte stream (a request body); parsing and commits run off the event loop."""
+    loop = asyncio.get_running_loop()
+    importer = BulkImporter(store, source, batch_size)
+
+    def feed(block: bytes):
+        with gc_paused():
+            importer.feed(reader.feed(block))
+
+    async for block in blocks:
+        await loop.run_in_executor(None, feed, block)
+
+    def finish():
+        with gc_paused():
+            importer.feed(reader.finish())
+            importer.flush()
+
+    await loop.run_in_executor(None, finish)
+    return importer.report(reader)
+
+
+# Export
+
+def _entity_iri(label: str) -> str:
+    return f"<{ENTITY_IRI}{quote(label, safe='')}>"
+
+
+def _export_lines(snapshot, fmt: str) -> Iterator[str]:
+    labels = {dto["id"]: dto["label"] for dto in snapshot.nodes.values()}
+    if fmt == "nt":
+        iris = {node_id: _entity_iri(label) for node_id, label in labels.items()}
+        relations: Dict[str, str] = {}
+        for edge in snapshot.edges.values():
+            relation = relations.get(edge["relation"])
+            if relation is None:
+                relation = relations[edge["relation"]] = f"<{RELATION_IRI}{quote(edge['relation'], safe='')}>"
+            yield f"{iris[edge['source']]} {relation} {iris[edge['target']]} .\n"
+    elif fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(["subject", "relation", "object", "confidence", "sources"])
+        for edge in snapshot.edges.values():
+            writer.writerow([labels[edge["source"]], edge["relation"], labels[edge["target"]],
+                             edge["confidence"], SOURCE_SEPARATOR.join(edge["sources"])])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    elif fmt == "jsonl":
+        dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+        for edge in snapshot.edges.values():
+            yield dumps({"subject": labels[edge["source"]], "relation": edge["relation"],
+                         "object": labels[edge["target"]], "confidence": edge["confidence"],
+                         "sources": edge["sources"]}) + "\n"
+    else:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {sorted(EXPORT_FORMATS)}")
+
+
+# Format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "nt": ("application/n-triples", "nt"),
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+}
+
+
+def iter_export(store, fmt: str) -> Iterator[bytes]:
+    """Stream every edge of the latest snapshot as fmt, EXPORT_BATCH lines per block."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {sorted(EXPORT_FORMATS)}")
+    lines = []
+    for line in _export_lines(store.snapshot(), fmt):
+        lines.append(line)
+        if len(lines) >= EXPORT_BATCH:
+            yield "".join(lines).encode("utf-8")
+            lines = []
+    if lines:
+        yield "".join(lines).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    importing = commands.add_parser("import", help="import a triple file")
+    importing.add_argument("path")
+    importing.add_argument("--source", help="source id for rows without one (default: the file name)")
+    importing.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    exporting = commands.add_parser("export", help="export every edge")
+    exporting.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="jsonl")
+    exporting.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    from .graph_store import graph_store
+    if graph_store.persistence is None:
+        parser.error("set GRAPH_DATA_DIR to the graph's data directory")
+    try:
+        if args.command == "import":
+            with open(args.path, "rb") as f:
+                report = import_file(graph_store, f, args.path, args.source, args.batch_size)
+            # Snapshot now, so the next start does not replay the whole import from the WAL
+            graph_store.checkpoint(force=True)
+            print(json.dumps(report, indent=2))
+        else:
+            out = open(args.output, "wb") if args.output else sys.stdout.buffer
+            try:
+                for block in iter_export(graph_store, args.format):
+                    out.write(block)
+            finally:
+                if args.output:
+                    out.close()
+    finally:
+        graph_store.persistence.close()
+
+
+if __name__ == "__main__":
+    main()
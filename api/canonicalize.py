@@ -23,21 +23,25 @@ ALIASES: Dict[str, str] = {
     "robot": "robotics"
 }
 
+NON_WORD = re.compile(r'[^\w\s]')
+LEADING_ARTICLES = frozenset(('a', 'an', 'the'))
+
 def normalize_label(s: str) -> str:
     """Normalize a label for canonicalization."""
     if not s:
         return ""
     
-    # Convert to lowercase and strip punctuation
-    normalized = re.sub(r'[^\w\s]', ' ', s.lower())
-    
-    # Collapse multiple spaces
-    normalized = re.sub(r'\s+', ' ', normalized).strip()
+    # Convert to lowercase, strip punctuation and collapse whitespace
+    s = s.lower()
+    if not s.replace(' ', '').isalnum():  # isalnum() is exactly \w without '_'
+        s = NON_WORD.sub(' ', s)
+    words = s.split()
     
     # Remove leading articles
-    normalized = re.sub(r'^(a|an|the)\s+', '', normalized)
+    if len(words) > 1 and words[0] in LEADING_ARTICLES:
+        del words[0]
     
-    return normalized
+    return ' '.join(words)
 
 def canonical_form(s: str) -> str:
     """Get the canonical form of a label."""
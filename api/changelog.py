@@ -0,0 +1,71 @@
+from array import array
+from bisect import bisect_right
+from typing import Any, Iterable, List, Optional, Tuple
+
+NODE = 0
+EDGE = 1
+
+
+class ChangeLog:
+    """
+    Bounded log of (version, kind, handle) changes used to answer delta queries.
+
+    Versions are recorded in increasing order, so the entries after a given
+    version are found with a binary search. Once the log holds more than
+    twice `limit` entries the oldest half is dropped; `floor` is the oldest
+    version a delta can still be computed from.
+    """
+
+    def __init__(self, limit: int = 1_000_000):
+        self.limit = limit
+        self.floor = 0
+        self._versions = array("q")
+        self._kinds = bytearray()
+        self._handles: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+    def record(self, version: int, kind: int, handle: Any):
+        self._versions.append(version)
+        self._kinds.append(kind)
+        self._handles.append(handle)
+        if len(self._handles) > 2 * self.limit:
+            self._trim()
+
+    def record_many(self, version: int, kind: int, handles: Iterable[Any]):
+        handles = list(handles)
+        self._versions.extend(array("q", [version]) * len(handles))
+        self._kinds.extend(bytes([kind]) * len(handles))
+        self._handles.extend(handles)
+        if len(self._handles) > 2 * self.limit:
+            self._trim()
+
+    def _trim(self):
+        cut = len(self._handles) - self.limit
+        # Never split one version across the cut
+        cut = bisect_right(self._versions, self._versions[cut - 1])
+        self.floor = self._versions[cut - 1]
+        del self._versions[:cut]
+        del self._kinds[:cut]
+        del self._handles[:cut]
+
+    def reset(self, version: int):
+        """Forget all entries; deltas can only be computed from `version` onward."""
+        self.floor = version
+        self._versions = array("q")
+        self._kinds = bytearray()
+        self._handles = []
+
+    def since(self, version: int) -> Optional[Tuple[List[Any], List[Any]]]:
+        """
+        Node and edge handles changed after `version`, each listed once in
+        order of first change, or None if the log no longer reaches back that far.
+        """
+        if version < self.floor:
+            return None
+        start = bisect_right(self._versions, version)
+        nodes, edges = {}, {}
+        for kind, handle in zip(self._kinds[start:], self._handles[start:]):
+            (nodes if kind == NODE else edges)[handle] = None
+        return list(nodes), list(edges)
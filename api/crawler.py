@@ -0,0 +1,501 @@
+"""
+Site crawling on top of the ingest pipeline.
+
+A crawl starts from seed URLs, follows links up to max_depth and stops
+after max_pages pages. Every URL is normalized before it enters the
+frontier, so the same page reached through different spellings (case,
+default port, fragment, dot segments, tracking parameters, query order)
+is fetched once. Pages go through the pipeline's shared connection pool
+and per-host limit; robots.txt is fetched once per host and its
+Disallow rules and Crawl-delay are honoured, and the sitemaps it lists
+(or /sitemap.xml) add pages that no link reaches.
+
+Up to `concurrency` pages are fetched, parsed and submitted for extraction
+at once, but they are applied, and their links admitted to the frontier,
+in the order they were admitted, so the pages crawled and the resulting
+graph do not depend on timing.
+
+The ETag, Last-Modified and outgoing links of every page are kept in a
+CrawlState (SQLite, like the chunk index). A re-crawl sends conditional
+requests, and a page that answers 304 Not Modified is neither parsed nor
+extracted again; its stored links are followed instead.
+"""
+import asyncio
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, quote, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+from .html_extract import chunk_paragraphs, decode_html, paragraphs_of, parse_blocks
+from .metrics import in_context, stage, tracing
+from .pipeline import IngestPipeline, IngestReport, ProgressCallback
+
+logger = logging.getLogger(__name__)
+
+# Product token matched against robots.txt User-agent lines, and the header crawl requests send
+ROBOTS_AGENT = "universal-kg"
+CRAWLER_USER_AGENT = "universal-kg-crawler/1.0"
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PARAM = re.compile(r"^(?:utm_\w+|gclid|fbclid|msclkid|mc_cid|mc_eid)$", re.I)
+PERCENT_ESCAPE = re.compile(r"%([0-9a-fA-F]{2})")
+UNRESERVED = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+# Links to these are never pages
+BINARY_EXTENSION = re.compile(
+    r"\.(?:pdf|zip|gz|tgz|bz2|xz|7z|rar|tar|exe|dmg|msi|apk|iso|png|jpe?g|gif|webp|svg|ico|bmp|tiff?|"
+    r"mp3|mp4|m4a|wav|ogg|webm|mov|avi|css|js|mjs|json|woff2?|ttf|otf|eot|xml|rss|atom)$", re.I)
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+
+# robots.txt and sitemap limits
+MAX_ROBOTS_BYTES = 512 * 1024
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024
+MAX_SITEMAPS = 50  # sitemap files per host, counting sitemap index children
+
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """
+    Canonical form of an http(s) URL (resolved against base), or None if it
+    is not one. The scheme and host are lowercased, default ports, user
+    info and fragments dropped, dot segments removed, percent-escapes of
+    unreserved characters decoded and the rest uppercased, and the query
+    sorted without tracking parameters.
+    """
+    try:
+        parts = urlsplit(urljoin(base, url.strip()) if base else url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    host = parts.hostname
+    if scheme not in DEFAULT_PORTS or not host:
+        return None
+    if ":" in host:
+        host = f"[{host}]"
+    netloc = host if port is None or port == DEFAULT_PORTS[scheme] else f"{host}:{port}"
+    path = quote(PERCENT_ESCAPE.sub(_normalize_escape, remove_dot_segments(parts.path) or "/"),
+                 safe="/%:@!$&'()*+,;=~")
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if not TRACKING_PARAM.match(k)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def _normalize_escape(match: "re.Match") -> str:
+    char = chr(int(match.group(1), 16))
+    return char if char in UNRESERVED else "%" + match.group(1).upper()
+
+
+def remove_dot_segments(path: str) -> str:
+    """Resolve "." and ".." path segments (RFC 3986, section 5.2.4)."""
+    if "." not in path:
+        return path
+    segments = path.split("/")
+    out: List[str] = []
+    for segment in segments:
+        if segment == "..":
+            if len(out) > 1:
+                out.pop()
+        elif segment != ".":
+            out.append(segment)
+    if segments[-1] in (".", ".."):
+        out.append("")  # "/a/b/.." is the directory "/a/"
+    return "/".join(out)
+
+
+def origin_of(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class CrawlScope:
+    """
+    Which URLs a crawl may visit: those on the seeds' hosts that match an
+    include pattern (if any are given) and no exclude pattern. Patterns are
+    regular expressions searched in the normalized URL; invalid ones raise
+    re.error when the scope is built.
+    """
+
+    def __init__(self, seeds: Sequence[str], include: Sequence[str] = (), exclude: Sequence[str] = ()):
+        self.seeds = [url for url in (normalize_url(seed) for seed in seeds) if url is not None]
+        self.hosts = {urlsplit(url).netloc for url in self.seeds}
+        self.include = [re.compile(pattern) for pattern in include]
+        self.exclude = [re.compile(pattern) for pattern in exclude]
+
+    def __contains__(self, url: str) -> bool:
+        parts = urlsplit(url)
+        if parts.netloc not in self.hosts or BINARY_EXTENSION.search(parts.path):
+            return False
+        if self.include and not any(p.search(url) for p in self.include):
+            return False
+        return not any(p.search(url) for p in self.exclude)
+
+
+class CrawlState:
+    """
+    Validators and links of crawled pages, for conditional re-fetch.
+
+    With a path the state is kept in SQLite and survives restarts;
+    without one it lives in memory for the life of the process.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pages: Dict[str, Tuple[Optional[str], Optional[str], str]] = {}  # when there is no database
+        self._conn = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, links TEXT NOT NULL, fetched_at REAL NOT NULL)"
+            )
+
+    def get(self, url: str) -> Optional[Tuple[Optional[str], Optional[str], List[str]]]:
+        """(etag, last_modified, links) stored for url, or None."""
+        with self._lock:
+            if self._conn is None:
+                row = self._pages.get(url)
+            else:
+                row = self._conn.execute(
+                    "SELECT etag, last_modified, links FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, links = row
+        return etag, last_modified, json.loads(links)
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], links: Sequence[str]):
+        payload = json.dumps(list(links), separators=(",", ":"))
+        with self._lock:
+            if self._conn is None:
+                self._pages[url] = (etag, last_modified, payload)
+            else:
+                self._conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                                   (url, etag, last_modified, payload, time.time()))
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._conn is None:
+                return len(self._pages)
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": True, "pages": len(self), "persistent": self._conn is not None}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class CrawlReport(IngestReport):
+    """IngestReport with the crawl's page counters."""
+
+    def __init__(self):
+        super().__init__()
+        self.pages_fetched = 0
+        self.pages_unchanged = 0  # 304 Not Modified on re-crawl
+        self.pages_blocked = 0  # disallowed by robots.txt
+        self.pages_skipped = 0  # not HTML, or <meta name="robots" content="noindex">
+        self.pages_failed = 0
+        self.urls_discovered = 0  # distinct in-scope URLs seen, crawled or not
+        self.sitemap_urls = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **super().to_dict(),
+            "pages_fetched": self.pages_fetched,
+            "pages_unchanged": self.pages_unchanged,
+            "pages_blocked": self.pages_blocked,
+            "pages_skipped": self.pages_skipped,
+            "pages_failed": self.pages_failed,
+            "urls_discovered": self.urls_discovered,
+            "sitemap_urls": self.sitemap_urls,
+        }
+
+
+class Page:
+    """Outcome of fetching one frontier URL."""
+
+    __slots__ = ("url", "status", "jobs", "links", "etag", "last_modified")
+
+    def __init__(self, url: str, status: str, jobs: Sequence[Tuple[str, "asyncio.Future"]] = (),
+                 links: Sequence[str] = (), etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.url = url
+        self.status = status  # "fetched", "unchanged", "skipped" or "failed"
+        self.jobs = jobs
+        self.links = links
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+def parse_page(content: bytes, url: str) -> Tuple[List[str], List[str], bool]:
+    """(chunks, normalized links, indexable) of an HTML page; runs in an executor."""
+    with stage("parse"):
+        parser = parse_blocks(decode_html(content))
+    directives = {d.strip() for d in parser.robots.split(",")}
+    base = urljoin(url, parser.base_href) if parser.base_href else url
+    links: List[str] = []
+    if "nofollow" not in directives and "none" not in directives:
+        seen = set()
+        for href in parser.links:
+            link = normalize_url(href, base)
+            if link is not None and link not in seen:
+                seen.add(link)
+                links.append(link)
+    if "noindex" in directives or "none" in directives:
+        return [], links, False
+    with stage("chunk"):
+        return chunk_paragraphs(paragraphs_of(parser), target=1800, overlap=200), links, True
+
+
+def sitemap_locations(content: bytes) -> Tuple[List[str], List[str]]:
+    """(page URLs, child sitemap URLs) listed in a sitemap or sitemap index, gzipped or not."""
+    if content[:2] == b"\x1f\x8b":
+        with gzip.GzipFile(fileobj=io.BytesIO(content)) as f:
+            content = f.read(MAX_SITEMAP_BYTES + 1)
+        if len(content) > MAX_SITEMAP_BYTES:
+            raise ValueError("sitemap too large")
+    pages: List[str] = []
+    children: List[str] = []
+    for _, element in ET.iterparse(io.BytesIO(content), events=("end",)):
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag == "loc" and element.text:
+            pages.append(element.text.strip())
+        elif tag == "sitemap":
+            children += pages[-1:]
+            del pages[-1:]
+        element.clear()
+    return pages, children
+
+
+class RobotsRules:
+    """robots.txt of every host a crawl touches, fetched once per host."""
+
+    def __init__(self, fetch):
+        self._fetch = fetch
+        self._hosts: Dict[str, "asyncio.Future"] = {}
+
+    async def rules(self, url: str) -> RobotFileParser:
+        origin = origin_of(url)
+        if origin not in self._hosts:
+            self._hosts[origin] = asyncio.ensure_future(self._load(origin))
+        return await asyncio.shield(self._hosts[origin])
+
+    async def _load(self, origin: str) -> RobotFileParser:
+        parser = RobotFileParser(f"{origin}/robots.txt")
+        try:
+            r = await self._fetch(f"{origin}/robots.txt")
+        except Exception as e:
+            # Unreachable robots.txt: assume everything is disallowed (RFC 9309, section 2.3.1.4)
+            logger.warning(f"robots.txt for {origin} unreachable ({e}); skipping host")
+            parser.disallow_all = True
+            return parser
+        if r.status_code >= 500:
+            parser.disallow_all = True
+        elif r.status_code >= 400:
+            parser.allow_all = True  # no robots.txt
+        else:
+            parser.parse(r.content[:MAX_ROBOTS_BYTES].decode("utf-8", errors="replace").splitlines())
+            parser.modified()
+        return parser
+
+    async def allowed(self, url: str) -> bool:
+        return (await self.rules(url)).can_fetch(ROBOTS_AGENT, url)
+
+    async def delay(self, url: str) -> float:
+        """Seconds between requests to url's host that robots.txt asks for."""
+        parser = await self.rules(url)
+        delay = parser.crawl_delay(ROBOTS_AGENT)
+        rate = parser.request_rate(ROBOTS_AGENT)
+        if rate is not None and rate.requests:
+            delay = max(float(delay or 0), rate.seconds / rate.requests)
+        return float(delay or 0)
+
+    async def sitemaps(self, url: str) -> List[str]:
+        return list((await self.rules(url)).site_maps() or ())
+
+
+class Crawler:
+    """
+    Crawls sites into the graph through an IngestPipeline.
+
+    The pipeline's pool and per-host limit bound connections; `concurrency`
+    bounds pages in flight, and `delay` is the minimum spacing between
+    requests to one host (raised by a robots.txt Crawl-delay).
+    """
+
+    def __init__(self, pipeline: IngestPipeline, state: Optional[CrawlState] = None,
+                 concurrency: int = 16, delay: float = 0.0):
+        self.pipeline = pipeline
+        self.state = state if state is not None else CrawlState(None)
+        self.concurrency = concurrency
+        self.delay = delay
+        self._headers = {"User-Agent": CRAWLER_USER_AGENT}
+
+    async def crawl(self, scope: CrawlScope, max_depth: int = 2, max_pages: int = 100, sitemaps: bool = True,
+                    replace: bool = True, on_chunk: Optional[ProgressCallback] = None) -> CrawlReport:
+        """
+        Crawl from scope.seeds and upsert every page's triples, in admission order.
+        on_chunk(report, source_id) is called after each chunk, and with the page URL for pages without chunks.
+        """
+        report = CrawlReport()
+        started = time.perf_counter()
+        robots = RobotsRules(self._fetch)
+        next_slot: Dict[str, float] = {}  # host -> earliest start of its next request
+        seen = set()
+        frontier: Deque[Tuple[str, int]] = deque()
+
+        def discover(urls: Iterable[str], depth: int):
+            for url in urls:
+                if url not in seen and url in scope:
+                    seen.add(url)
+                    frontier.append((url, depth))
+            report.urls_discovered = len(seen)
+
+        async def polite_fetch(url: str, headers: Dict[str, str]):
+            host = urlsplit(url).netloc
+            delay = max(self.delay, await robots.delay(url))
+            if delay > 0:
+                # Reserve the host's next slot now, so concurrent pages queue up instead of bunching
+                loop = asyncio.get_running_loop()
+                now = loop.time()
+                slot = max(now, next_slot.get(host, now))
+                next_slot[host] = slot + delay
+                await asyncio.sleep(slot - now)
+            return await self._fetch(url, headers)
+
+        discover(scope.seeds, 0)
+        if sitemaps and max_depth > 0:
+            for origin in dict.fromkeys(origin_of(url) for url in scope.seeds):
+                urls = await self._sitemap_urls(origin, robots, polite_fetch)
+                report.sitemap_urls += len(urls)
+                discover(urls, 1)
+
+        window: Deque[Tuple[str, int, "asyncio.Future"]] = deque()
+        admitted = 0
+        try:
+            while frontier or window:
+                while frontier and len(window) < self.concurrency and admitted < max_pages:
+                    url, depth = frontier.popleft()
+                    if not await robots.allowed(url):
+                        report.pages_blocked += 1
+                        continue
+                    admitted += 1
+                    window.append((url, depth, asyncio.ensure_future(self._fetch_page(url, report, polite_fetch))))
+                if not window:
+                    break
+                url, depth, task = window.popleft()
+                page = await task
+                await self._apply(page, report, on_chunk, replace)
+                if depth < max_depth:
+                    discover(page.links, depth + 1)
+        finally:
+            for _, _, task in window:
+                task.cancel()
+        report.elapsed = time.perf_counter() - started
+        if tracing():
+            logger.info(f"TRACE crawl: {report.to_dict()}")
+        return report
+
+    async def _fetch(self, url: str, headers: Optional[Dict[str, str]] = None):
+        return await self.pipeline.get(url, {**self._headers, **(headers or {})})
+
+    async def _fetch_page(self, url: str, report: CrawlReport, fetch) -> Page:
+        """Fetch, parse and submit one page for extraction; never raises."""
+        loop = asyncio.get_running_loop()
+        headers = {}
+        known = self.state.get(url)
+        if known is not None and await loop.run_in_executor(None, self._has_sources, url):
+            etag, last_modified, _ = known
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        try:
+            r = await fetch(url, headers)
+            if r.status_code == 304 and known is not None:
+                return Page(url, "unchanged", links=known[2], etag=known[0], last_modified=known[1])
+            r.raise_for_status()
+            content_type = r.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+            if content_type and content_type not in HTML_TYPES:
+                return Page(url, "skipped")
+            chunks, links, indexable = await loop.run_in_executor(None, in_context(parse_page, r.content, str(r.url)))
+            if tracing():
+                logger.info(f"TRACE chunking: url={url} count={len(chunks)}")
+        except Exception as e:
+            logger.error(f"Error crawling URL {url}: {str(e)}")
+            return Page(url, "failed")
+        jobs = self.pipeline.submit_chunks(url, chunks, report)
+        return Page(url, "fetched" if indexable else "skipped", jobs, links,
+                    r.headers.get("etag"), r.headers.get("last-modified"))
+
+    def _has_sources(self, url: str) -> bool:
+        """Whether the graph still holds chunks of url; a 304 is only useful if it does."""
+        return bool(self.pipeline.store.sources(f"{url}#", 1))
+
+    async def _apply(self, page: Page, report: CrawlReport, on_chunk: Optional[ProgressCallback], replace: bool):
+        if page.status == "fetched":
+            report.pages_fetched += 1
+            report.documents += 1
+            if not page.jobs:
+                report.empty_documents.append(page.url)
+        else:
+            setattr(report, f"pages_{page.status}", getattr(report, f"pages_{page.status}") + 1)
+        if page.status in ("fetched", "skipped") and (page.jobs or replace):
+            # A page that is no longer indexable loses what it asserted before
+            await self.pipeline.apply_document(page.url, page.jobs, report, on_chunk, replace)
+        if page.status != "failed":
+            # Only after the page is in the graph, so an interrupted crawl fetches it again
+            self.state.put(page.url, page.etag, page.last_modified, page.links)
+        if not page.jobs and on_chunk is not None:
+            on_chunk(report, page.url)
+
+    async def _sitemap_urls(self, origin: str, robots: RobotsRules, fetch) -> List[str]:
+        """Page URLs from the host's sitemaps (robots.txt Sitemap lines, else /sitemap.xml)."""
+        queue = deque(await robots.sitemaps(origin) or [f"{origin}/sitemap.xml"])
+        fetched = set()
+        urls: List[str] = []
+        while queue and len(fetched) < MAX_SITEMAPS:
+            sitemap = queue.popleft()
+            if sitemap in fetched:
+                continue
+            fetched.add(sitemap)
+            if not await robots.allowed(sitemap):
+                continue
+            try:
+                r = await fetch(sitemap, {})
+                if r.status_code != 200 or len(r.content) > MAX_SITEMAP_BYTES:
+                    continue
+                pages, children = sitemap_locations(r.content)
+            except Exception as e:
+                logger.warning(f"Skipping sitemap {sitemap}: {e}")
+                continue
+            urls += [url for url in (normalize_url(page) for page in pages) if url is not None]
+            queue.extend(children)
+        return urls
+
+
+def create_crawl_state() -> CrawlState:
+    """CrawlState at CRAWL_STATE_PATH (empty keeps it in memory)."""
+    return CrawlState(os.getenv("CRAWL_STATE_PATH", ".cache/crawl_state.sqlite3") or None)
+
+
+def create_crawler(pipeline: IngestPipeline, state: Optional[CrawlState] = None) -> Crawler:
+    """Crawler configured from CRAWL_CONCURRENCY and CRAWL_DELAY (seconds between requests to a host)."""
+    return Crawler(pipeline, state if state is not None else create_crawl_state(),
+                   concurrency=int(os.getenv("CRAWL_CONCURRENCY", "16")),
+                   delay=float(os.getenv("CRAWL_DELAY", "0")))
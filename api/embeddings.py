@@ -0,0 +1,127 @@
+"""
+Text embeddings for semantic retrieval, computed locally.
+
+The default embedder needs no model and no network: each word (lowercased,
+plurals folded) is hashed into a fixed number of dimensions together with
+its character n-grams, fastText-style, and a text's vector is the sum over
+its words, normalized. Words that share a stem or most of their letters
+("robots" / "robotics", "learn" / "learning") get similar vectors, so a
+question matches labels that do not contain its exact words. Hashing is
+deterministic (CRC32), so vectors saved by one process are valid in the next.
+
+Setting EMBEDDING_MODEL to a sentence-transformers model name or local path
+uses that model instead, when the optional `sentence-transformers` package
+is installed. Either way `embed()` returns unit-length float32 rows.
+"""
+import math
+import os
+import re
+import threading
+import zlib
+from array import array
+from itertools import chain
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from .entity_resolution import stem
+from .retrieval import STOP_WORDS
+
+WORD = re.compile(r"[^\W_]+")
+
+# Character n-gram lengths hashed alongside each word
+MIN_GRAM = 3
+MAX_GRAM = 5
+# Weight of a whole word's own feature; its n-grams together weigh 1
+WORD_WEIGHT = 0.5
+
+
+class HashingEmbedder:
+    """
+    Signed feature hashing of words and their character n-grams.
+
+    Each distinct word's features are hashed once and kept in flat arrays
+    (a vocabulary of up to `vocabulary_size` words), so embedding a batch is
+    a dictionary lookup per word and a few vectorized numpy operations.
+    """
+
+    def __init__(self, dim: int = 256, vocabulary_size: int = 1 << 20):
+        self.dim = dim
+        self.name = f"hashing-{dim}-{MIN_GRAM}-{MAX_GRAM}"
+        self.vocabulary_size = vocabulary_size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._vocabulary: Dict[str, int] = {}  # word -> index into _start
+        self._start = array("q", [0])  # word -> first feature; word + 1 -> one past its last
+        self._columns = array("q")
+        self._weights = array("d")
+
+    def _add_word(self, word: str) -> int:
+        padded = f"<{word}>"
+        grams = [padded[i:i + n] for n in range(MIN_GRAM, MAX_GRAM + 1) for i in range(len(padded) - n + 1)]
+        gram_weight = 1.0 / math.sqrt(max(1, len(grams)))
+        for h, weight in chain([(zlib.crc32(f"w:{word}".encode()), WORD_WEIGHT)],
+                               ((zlib.crc32(gram.encode()), gram_weight) for gram in grams)):
+            self._columns.append(h % self.dim)
+            self._weights.append(-weight if h >> 31 else weight)
+        self._start.append(len(self._columns))
+        index = self._vocabulary[word] = len(self._vocabulary)
+        return index
+
+    def words(self, text: str) -> List[str]:
+        words = (stem(word) for word in WORD.findall(text.lower()))
+        return [word for word in words if word not in STOP_WORDS]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        counts = np.zeros(len(texts), dtype=np.int64)
+        with self._lock:
+            if len(self._vocabulary) > self.vocabulary_size:
+                self._reset()
+            vocabulary = self._vocabulary
+            ids = []
+            for i, text in enumerate(texts):
+                words = self.words(text)
+                ids += [vocabulary[word] if word in vocabulary else self._add_word(word) for word in words]
+                counts[i] = len(words)
+            if not ids:
+                return np.zeros((len(texts), self.dim), dtype=np.float32)
+            ids = np.array(ids, dtype=np.int64)
+            start = np.frombuffer(self._start, dtype=np.int64)
+            first, lengths = start[ids], start[ids + 1] - start[ids]
+            # Positions of every word's features, laid end to end
+            positions = np.repeat(first - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+            columns = np.frombuffer(self._columns, dtype=np.int64)[positions]
+            weights = np.frombuffer(self._weights, dtype=np.float64)[positions]
+        rows = np.repeat(np.repeat(np.arange(len(texts), dtype=np.int64), counts), lengths)
+        vectors = np.bincount(rows * self.dim + columns, weights=weights, minlength=len(texts) * self.dim)
+        vectors = vectors.reshape(len(texts), self.dim).astype(np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+
+class ModelEmbedder:
+    """A local sentence-transformers model, run on the CPU."""
+
+    def __init__(self, model: str, batch_size: int = 64):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:  # optional, and slow to import, so only loaded when asked for
+            raise RuntimeError(f"EMBEDDING_MODEL={model} needs the sentence-transformers package") from None
+        self.model = SentenceTransformer(model, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"model-{model}"
+        self.batch_size = batch_size
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self.model.encode(list(texts), batch_size=self.batch_size, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+
+
+def create_embedder():
+    """The embedder chosen by EMBEDDING_MODEL (default: hashed n-grams, EMBEDDING_DIM dimensions)."""
+    model = os.getenv("EMBEDDING_MODEL", "")
+    if model and model != "hashing":
+        return ModelEmbedder(model)
+    return HashingEmbedder(int(os.getenv("EMBEDDING_DIM", "256")))
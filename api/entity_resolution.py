@@ -0,0 +1,299 @@
+"""
+Incremental entity resolution for node labels.
+
+Each new label is reduced to its canonical form (see canonicalize.py) and
+matched in two steps, each a hash lookup rather than a
+scan over existing entities:
+
+    signature  same canonical form up to plurals, articles and spacing
+               ("Neural-Nets" / "neural net", "Tensor Flow" / "TensorFlow")
+    fuzzy      same tokens except one long token, which differs by a
+               single typo ("Convolutonal Network"): one inserted,
+               deleted or swapped character past the first. Candidates
+               are blocked on the other tokens plus the odd token's
+               2-character prefix or suffix, one of which such an edit
+               leaves intact
+
+Clusters are kept in a union-find structure; when a label bridges two
+existing entities they are merged and the caller rewires the dropped node.
+When a node is garbage-collected, remove() forgets its whole cluster.
+Everything is deterministic, so replaying the same upserts reproduces the
+same merges.
+"""
+from typing import Any, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+from .canonicalize import canonical_form
+
+ARTICLES = frozenset(("a", "an", "the"))
+# Tokens shorter than this, or containing digits, must match exactly ("GPT 3" != "GPT 4",
+# "Plant Earth" != "Planet Earth")
+FUZZY_MIN_TOKEN = 6
+
+
+def stem(token: str) -> str:
+    """Crude plural folding: 'networks' -> 'network', 'ontologies' -> 'ontology'."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def is_typo(a: str, b: str) -> bool:
+    """
+    True if a and b differ by one inserted, deleted or swapped (adjacent)
+    character, not touching the first one. Substitutions do not count:
+    they mostly turn one real word into another ("Sender" / "Render",
+    "Spark" / "Spare") rather than misspell it.
+    """
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if i == 0 or len(a) < FUZZY_MIN_TOKEN:
+        return False
+    if len(a) == len(b):
+        return i < len(a) - 1 and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+    return a[i:] == b[i + 1:]
+
+
+class UnionFind:
+    """Disjoint sets over hashable items; the oldest item of a set is its root."""
+
+    def __init__(self):
+        self.parent: Dict[Hashable, Hashable] = {}
+        self.order: Dict[Hashable, int] = {}
+        self._next = 0
+
+    def add(self, item: Hashable):
+        if item not in self.parent:
+            self.parent[item] = item
+            self.order[item] = self._next
+            self._next += 1
+
+    def discard(self, items: Iterable[Hashable]):
+        """Forget items; every member of a set must be discarded together."""
+        for item in items:
+            self.parent.pop(item, None)
+            self.order.pop(item, None)
+
+    def find(self, item: Hashable) -> Hashable:
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]  # path halving
+            item = parent[item]
+        return item
+
+    def union(self, a: Hashable, b: Hashable) -> Tuple[Hashable, Hashable]:
+        """Merge the sets of a and b; returns (kept root, absorbed root)."""
+        a, b = self.find(a), self.find(b)
+        if self.order[b] < self.order[a]:
+            a, b = b, a
+        self.parent[b] = a
+        return a, b
+
+
+class LabelKey(NamedTuple):
+    """A label reduced to the keys it is matched on."""
+    canonical: str
+    node_type: str
+    tokens: Tuple[str, ...]  # stemmed, without articles
+    signature: str
+    slot: str  # "type\x1fsignature", the key it is registered under
+
+
+new_tuple = tuple.__new__
+
+
+class EntityResolver:
+    """
+    Maps labels to entity handles, merging near-duplicates.
+
+    resolve() finds the entities a label matches (oldest first), add()
+    registers a label's keys for an entity, merge() records that one
+    entity was absorbed into another and remove() forgets an entity.
+
+    The tables only hold strings, ints and tuples of them. CPython stops
+    tracking such tuples (and never tracks such dicts) in the garbage
+    collector, so full collections do not have to walk millions of resolver
+    entries as the graph grows. Blocks are tuples rather than arrays for
+    that reason: arrays stay tracked.
+    """
+
+    def __init__(self, fuzzy_min_chars: int = 8, bucket_limit: int = 16):
+        self.fuzzy_min_chars = fuzzy_min_chars
+        self.bucket_limit = bucket_limit
+        self.clusters = UnionFind()
+        self._signatures: Dict[str, Any] = {}  # "type\x1fsignature" -> handle
+        self._canonical: Dict[str, str] = {}  # same keys -> canonical form that registered it
+        self._blocks: Dict[str, Tuple[int, ...]] = {}  # blocking key -> entry indexes
+        self._entry_tokens: List[Optional[Tuple[str, ...]]] = []  # entry -> tokens, None once removed
+        self._entry_handles: List[Any] = []  # entry -> handle
+        self._cluster_keys: Dict[Any, str] = {}  # cluster root -> its signatures, "\x1e"-joined
+        self._removed_entries = 0
+        self._pending: Tuple[Optional[LabelKey], Tuple[List[str], List[int]]] = (None, ([], []))
+        self.counts = {"signature": 0, "fuzzy": 0, "new": 0, "merges": 0}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def key(self, label: str, node_type: str) -> LabelKey:
+        return self.canonical_key(canonical_form(label) or label.lower(), node_type)
+
+    @staticmethod
+    def canonical_key(canonical: str, node_type: str) -> LabelKey:
+        words = canonical.split()
+        if canonical.endswith("s") or "s " in canonical or not ARTICLES.isdisjoint(words):
+            tokens = tuple([stem(word) if word[-1] == "s" else word for word in words if word not in ARTICLES])
+        else:
+            tokens = tuple(words)
+        signature = "".join(tokens) or canonical
+        # tuple.__new__ skips the Python-level LabelKey.__new__, which costs as much as the rest
+        return new_tuple(LabelKey, (canonical, node_type, tokens, signature, f"{node_type}\x1f{signature}"))
+
+    @staticmethod
+    def blocking_keys(key: LabelKey) -> Tuple[List[str], List[int]]:
+        """
+        Blocks shared by key and any label that differs from it in one long
+        token by a typo (see is_typo), and the positions of those tokens:
+        blocks 2n and 2n + 1 are for token positions[n]. A block is the type
+        and tokens with the odd token cut down to its first (or last) two
+        characters, one of which survives any single edit.
+        """
+        blocks, positions = [], []
+        joined = f"{key.node_type}\x1f{' '.join(key.tokens)}"
+        end = len(key.node_type)
+        for i, token in enumerate(key.tokens):
+            start, end = end + 1, end + 1 + len(token)
+            if end - start < FUZZY_MIN_TOKEN or not token.isalpha():
+                continue
+            head, tail = joined[:start], joined[end:]
+            # e.g. "entity\x1fconvolutional <ne" and "entity\x1fconvolutional >rk" for "network"
+            blocks += (f"{head}<{token[:2]}{tail}", f"{head}>{token[-2:]}{tail}")
+            positions.append(i)
+        return blocks, positions
+
+    def resolve(self, key: LabelKey) -> List[Any]:
+        """Current handles of the entities key matches, oldest first; empty if it is new."""
+        handle = self._signatures.get(key.slot)
+        if handle is not None:
+            self.counts["signature"] += 1
+            return [self.clusters.find(handle)]
+        if len(key.signature) < self.fuzzy_min_chars:
+            self.counts["new"] += 1
+            return []
+
+        blocks, positions = pending = self.blocking_keys(key)
+        self._pending = (key, pending)  # reused by add() for the same key
+        matches: Dict[Any, None] = {}
+        table, entry_tokens = self._blocks, self._entry_tokens
+        for n, block in enumerate(blocks):
+            bucket = table.get(block)
+            if bucket is None:
+                continue
+            i = positions[n >> 1]
+            token = key.tokens[i]
+            size = len(token)
+            for entry in bucket:
+                # Everything but token i is equal by construction of the block
+                other = entry_tokens[entry][i]
+                if -1 <= len(other) - size <= 1 and is_typo(token, other):
+                    matches[self.clusters.find(self._entry_handles[entry])] = None
+        if not matches:
+            self.counts["new"] += 1
+            return []
+        self.counts["fuzzy"] += 1
+        return sorted(matches, key=self.clusters.order.__getitem__)
+
+    def add(self, handle: Any, key: LabelKey):
+        """Register key as a name of the entity handle (creating the entity if needed)."""
+        signature = key.slot
+        if signature in self._signatures:
+            self.clusters.add(handle)
+            return
+        self._signatures[signature] = handle
+        self._canonical[signature] = key.canonical
+        if handle in self.clusters.parent:
+            root = self.clusters.find(handle)
+            keys = self._cluster_keys.get(root)
+            self._cluster_keys[root] = signature if keys is None else f"{keys}\x1e{signature}"
+        else:
+            self.clusters.add(handle)
+            self._cluster_keys[handle] = signature
+        if len(key.signature) < self.fuzzy_min_chars:
+            return
+        pending_key, (blocks, _) = self._pending
+        if pending_key is not key:
+            blocks, _ = self.blocking_keys(key)
+        if not blocks:
+            return
+        entry = len(self._entry_handles)
+        self._entry_tokens.append(key.tokens)
+        self._entry_handles.append(handle)
+        table, limit = self._blocks, self.bucket_limit
+        for block in blocks:
+            bucket = table.get(block)
+            if bucket is None:
+                table[block] = (entry,)
+            elif len(bucket) < limit:
+                table[block] = bucket + (entry,)
+
+    def merge(self, keep: Any, drop: Any):
+        """Record that entity drop was absorbed into keep."""
+        kept, absorbed = self.clusters.union(keep, drop)
+        dropped_keys = self._cluster_keys.pop(absorbed, None)
+        if dropped_keys is not None:
+            keys = self._cluster_keys.get(kept)
+            self._cluster_keys[kept] = dropped_keys if keys is None else f"{keys}\x1e{dropped_keys}"
+        self.counts["merges"] += 1
+
+    def remove(self, handle: Any):
+        """Forget the entity handle and every name registered for it, e.g. after its node was deleted."""
+        if handle not in self.clusters.parent:
+            return
+        root = self.clusters.find(handle)
+        signatures = self._cluster_keys.pop(root, "").split("\x1e")
+        members = {root}
+        for signature in signatures:
+            if signature:
+                members.add(self._signatures[signature])
+        removed = set()
+        for signature in filter(None, signatures):
+            del self._signatures[signature]
+            key = self.canonical_key(self._canonical.pop(signature), signature.split("\x1f", 1)[0])
+            if len(key.signature) < self.fuzzy_min_chars:
+                continue
+            # The entry was filed under the same blocks it was built from
+            for block in self.blocking_keys(key)[0]:
+                bucket = self._blocks.get(block)
+                if bucket is None:
+                    continue
+                kept = []
+                for entry in bucket:
+                    if self._entry_handles[entry] in members:
+                        removed.add(entry)
+                    else:
+                        kept.append(entry)
+                if not kept:
+                    del self._blocks[block]
+                elif len(kept) < len(bucket):
+                    self._blocks[block] = tuple(kept)
+        for entry in removed:
+            self._entry_tokens[entry] = self._entry_handles[entry] = None
+        self._removed_entries += len(removed)
+        self.clusters.discard(members)
+
+    def export_keys(self) -> List[Tuple[str, str, Any]]:
+        """
+        (canonical, type, current handle) for every registered signature, in
+        registration order; canonical_key(canonical, type) rebuilds each key.
+        """
+        find = self.clusters.find
+        return [(canonical, signature.split("\x1f", 1)[0], find(self._signatures[signature]))
+                for signature, canonical in self._canonical.items()]
+
+    def stats(self) -> Dict[str, int]:
+        return {"keys": len(self._signatures), "fuzzy_keys": len(self._entry_tokens) - self._removed_entries, **self.counts}
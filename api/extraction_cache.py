@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache:
+    """
+    Persistent, content-addressed cache of LLM extraction results.
+
+    Entries live in a SQLite file keyed by a hash of the chunk text, prompt
+    version, model and max_triples. The file is kept under max_bytes by
+    evicting least recently used entries, and concurrent lookups of a key
+    that is still being computed wait for the first caller instead of
+    issuing a second LLM call.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            "key TEXT PRIMARY KEY, triples TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS extractions_last_used ON extractions(last_used)")
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+
+    @staticmethod
+    def make_key(text: str, prompt_version: str, model: str, max_triples: int) -> str:
+        """Content address for one extraction request."""
+        h = hashlib.sha256()
+        for part in (prompt_version, model, str(max_triples), text):
+            h.update(part.encode("utf-8"))
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Return cached triples for key, or None, updating the LRU position."""
+        with self._lock:
+            row = self._conn.execute("SELECT triples FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE extractions SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, triples: List[Dict[str, Any]]):
+        """Store triples for key and evict old entries if the cache is over budget."""
+        payload = json.dumps(triples, separators=(",", ":"))
+        size = len(key) + len(payload)
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM extractions WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, triples, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, payload, size, time.time()),
+            )
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Evict down to 90% of the budget so eviction is amortized over many puts
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, size FROM extractions ORDER BY last_used").fetchall()
+        victims = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            victims.append((key,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM extractions WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def get_or_compute(self, key: str, compute: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Return the cached value for key, computing it at most once.
+
+        If another thread is already computing the same key, wait for its
+        result instead of calling compute again.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            # A previous leader may have stored the key between our lookup and now
+            value = self.get(key)
+            if value is None:
+                value = compute()
+                self.put(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM extractions")
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,134 +1,918 @@
-import networkx as nx
-import uuid
-from typing import Dict, List, Any, Set, Tuple
-import re
-from collections import defaultdict
+import math
+import os
+import threading
+from array import array
+from contextlib import contextmanager
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .changelog import EDGE, NODE, ChangeLog
+from .entity_resolution import EntityResolver
+from .label_index import LabelIndex
+from .persistence import GraphPersistence
+from .provenance import ProvenanceIndex
+from .rwlock import RWLock
+from .storage import NetworkXEngine, create_engine
+
+# Rebuild a snapshot from scratch rather than patching the previous one when
+# more than this share of the graph changed since it was taken
+SNAPSHOT_REBUILD_RATIO = 0.25
+
+
+class GraphSnapshot:
+    """
+    Immutable view of the graph at one committed version.
+
+    Holds the node and edge DTOs in graph order, so serving or streaming it
+    needs no lock and is unaffected by later writes. Consecutive snapshots
+    share the DTOs of everything that did not change in between.
+    """
+
+    __slots__ = ("version", "nodes", "edges", "_dto")
+
+    def __init__(self, version: int, nodes: Dict[Any, Dict[str, Any]], edges: Dict[Any, Dict[str, Any]]):
+        self.version = version
+        self.nodes = nodes  # handle -> node DTO
+        self.edges = edges  # handle -> edge DTO
+        self._dto: Optional[Dict[str, Any]] = None
+
+    def to_dto(self) -> Dict[str, Any]:
+        if self._dto is None:
+            self._dto = {"nodes": list(self.nodes.values()), "edges": list(self.edges.values()),
+                         "version": self.version}
+        return self._dto
+
+    def iter_dto_items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for dto in self.nodes.values():
+            yield "node", dto
+        for dto in self.edges.values():
+            yield "edge", dto
+
+
+def retract_op(source_id: str, prefix: bool = False, keep: Iterable[str] = ()) -> Tuple[Any, ...]:
+    return ("retract_prefix", source_id, sorted(keep)) if prefix else ("retract", [source_id])
+
+
+def _label(value: Any, field: str) -> str:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"{field} must be a non-empty string, not {value!r}")
+    return value
+
+
+def _source(value: Any) -> str:
+    if not isinstance(value, str):
+        raise ValueError(f"source id must be a string, not {value!r}")
+    return value
+
+
+def _confidence(value: Any) -> float:
+    """A confidence as a float clamped to [0, 1]; None counts as 0."""
+    if value is None:
+        return 0.0
+    if isinstance(value, bool):
+        raise ValueError(f"confidence must be a number, not {value!r}")
+    try:
+        confidence = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"confidence must be a number, not {value!r}") from None
+    if confidence != confidence:
+        raise ValueError("confidence must not be NaN")
+    return min(1.0, max(0.0, confidence))
+
+
+def normalize_op(op: Sequence[Any]) -> Tuple[Any, ...]:
+    """
+    A graph operation with its labels checked and its confidences coerced
+    to floats in [0, 1], ready to log and apply. Raises ValueError for an
+    operation that cannot be applied, before anything is written.
+    """
+    kind = op[0] if op else None
+    if kind == "upsert":
+        _, subject, relation, object_val, source_id, confidence = op
+        return (kind, _label(subject, "subject"), _label(relation, "relation"), _label(object_val, "object"),
+                _source(source_id), _confidence(confidence))
+    if kind == "bulk_upsert":
+        if len(op) == 7:
+            # Logged before provenance links were flat: a source list and a hit list per row
+            _, subjects, relations, objects, sources, hits, confidences = op
+            if len(sources) != len(subjects) or len(hits) != len(subjects):
+                raise ValueError("bulk_upsert columns must have the same length")
+            for row_sources, row_hits in zip(sources, hits):
+                if len(row_sources) != len(row_hits):
+                    raise ValueError("every bulk_upsert source needs a hit count")
+            link_rows = [row for row, row_sources in enumerate(sources) for _ in row_sources]
+            link_sources, link_hits = list(chain.from_iterable(sources)), list(chain.from_iterable(hits))
+        else:
+            _, subjects, relations, objects, confidences, link_rows, link_sources, link_hits = op
+        if not len(subjects) == len(relations) == len(objects) == len(confidences):
+            raise ValueError("bulk_upsert columns must have the same length")
+        if not len(link_rows) == len(link_sources) == len(link_hits):
+            raise ValueError("every bulk_upsert link needs a row, a source and a hit count")
+        columns = []
+        for column, field in ((subjects, "subject"), (relations, "relation"), (objects, "object")):
+            # Columns from the bulk readers are already clean; check them at C speed first
+            if set(map(type, column)) <= {str} and all(map(str.strip, column)):
+                columns.append(column)
+            else:
+                columns.append([_label(value, field) for value in column])
+        # NaN compares False either way, so min/max alone would let one through
+        if not (set(map(type, confidences)) <= {float} and all(map(math.isfinite, confidences)) and
+                (not confidences or 0.0 <= min(confidences) and max(confidences) <= 1.0)):
+            confidences = [_confidence(value) for value in confidences]
+        if not set(map(type, link_sources)) <= {str}:
+            link_sources = [_source(source_id) for source_id in link_sources]
+        if len(link_rows):
+            rows = np.asarray(link_rows)
+            hits = np.asarray(link_hits)
+            if (rows.dtype.kind not in "iu" or hits.dtype.kind not in "iu" or rows.min() < 0
+                    or rows.max() >= len(subjects) or hits.min() < 1):
+                raise ValueError("bulk_upsert links must name a row and a positive hit count")
+        return (kind, *columns, confidences, link_rows, link_sources, link_hits)
+    if kind == "batch":
+        return (kind, [normalize_op(inner) for inner in op[1]])
+    if kind == "retract":
+        return (kind, [_source(source_id) for source_id in op[1]])
+    if kind == "retract_prefix":
+        return (kind, _source(op[1]), [_source(source_id) for source_id in op[2]])
+    if kind == "replace":
+        return (kind, [_source(source_id) for source_id in op[1]], [normalize_op(inner) for inner in op[2]])
+    raise ValueError(f"Unknown graph operation {kind!r}")
+
+
+def factorize(values: Sequence[Any]) -> Tuple[List[Any], np.ndarray]:
+    """
+    (distinct values in order of first appearance, the code of each value)
+    for a column. A column that repeats itself (relations, sources) is coded
+    through a dict; a mostly distinct one (labels) is grouped by hash with
+    numpy, every value is compared with the first of its group, and a hash
+    collision falls back to the dict.
+    """
+    if len(set(islice(values, 1024))) * 2 > min(len(values), 1024):
+        column = as_objects(values)
+        hashes = np.fromiter(map(hash, column), dtype=np.int64, count=len(column))
+        _, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        if (column[first][inverse] == column).all():
+            order = np.argsort(first)
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            return column[first[order]].tolist(), rank[inverse]
+    distinct = list(dict.fromkeys(values))
+    codes = dict(zip(distinct, range(len(distinct))))
+    return distinct, np.fromiter(map(codes.__getitem__, values), dtype=np.int64, count=len(values))
+
+
+def as_objects(values: Sequence[Any]) -> np.ndarray:
+    """values as a numpy object array, so a column of codes can index it in one step."""
+    column = np.empty(len(values), dtype=object)
+    column[:] = list(values)
+    return column
+
+
+class Transaction:
+    """
+    Upserts and retractions buffered by `with store.transaction() as tx:`
+    and applied at the end of the block as one atomic write: readers see
+    all of them or none, and the write-ahead log gets them as a single
+    record. Each operation is checked as it is added (see normalize_op),
+    so a malformed one raises inside the block and nothing is applied.
+    """
+
+    def __init__(self, store: "GraphStore"):
+        self.store = store
+        self.ops: List[Tuple[Any, ...]] = []
+        self.replacing: List[str] = []
+
+    def upsert_triple(self, subject: str, relation: str, object_val: str, source_id: str, confidence: float = 0.0):
+        self.ops.append(normalize_op(("upsert", subject, relation, object_val, source_id, confidence)))
+
+    def retract_source(self, source_id: str, prefix: bool = False, keep: Iterable[str] = ()):
+        """See GraphStore.retract_source."""
+        self.ops.append(normalize_op(retract_op(source_id, prefix, keep)))
+
+    def replace_source(self, source_id: str):
+        """Retract whatever source_id asserted before, except what this transaction's upserts assert again."""
+        self.replacing.append(_source(source_id))
+
+    def __enter__(self) -> "Transaction":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and (self.ops or self.replacing):
+            self.store.commit([("replace", self.replacing, self.ops)] if self.replacing else self.ops)
+        self.ops = []
+        self.replacing = []
+
 
 class GraphStore:
-    def __init__(self):
-        self.graph = nx.MultiDiGraph()
-        self.node_id_map = {}  # (label, type) -> node_id
-        self.edge_id_map = {}  # (subject_id, object_id, relation) -> edge_id
+    def __init__(self, engine=None, indexed: bool = True, resolve_entities: bool = True):
+        # Storage engine holding nodes, edges and adjacency (see api/storage.py)
+        self.engine = engine if engine is not None else NetworkXEngine()
+        # Subgraph views are small and queried once, so they skip the indexes
+        self.indexed = indexed
+        self.label_index = LabelIndex()  # node handle -> label trigrams
+        self.relation_index = LabelIndex()  # relation -> relation trigrams
+        # Merges near-duplicate labels ("Neural Networks" / "the neural net") into one node
+        self.resolver = EntityResolver() if resolve_entities else None
+        # Source id -> edges it asserted, for retraction and re-ingestion
+        self.provenance = ProvenanceIndex()
+        # (source id, edge) pairs asserted while a "replace" operation is applied
+        self._touched: Optional[set] = None
+        # Write-ahead log and snapshots, attached by GraphPersistence.open()
+        self.persistence = None
+        # Monotonic graph version, bumped on every mutation, and the changes behind it
+        self.version = 0
+        self.changelog = ChangeLog()
+        # Writers hold the lock exclusively; readers share it (see read() and snapshot())
+        self._lock = RWLock()
+        self._snapshot: Optional[GraphSnapshot] = None
+        self._snapshot_lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+
+    def read(self):
+        """Context manager that keeps writers out while a reader walks the engine or indexes."""
+        return self._lock.read()
+
+    @contextmanager
+    def try_read(self, blocking: bool = False) -> Iterator[bool]:
+        """
+        Like read(), but yields whether the lock was taken: with blocking=False
+        it yields False at once while a writer holds the lock or is queued for it.
+        """
+        locked = self._lock.acquire_read(blocking)
+        try:
+            yield locked
+        finally:
+            if locked:
+                self._lock.release_read()
+
+    def transaction(self) -> Transaction:
+        """Batch several upserts into one atomic write (see Transaction)."""
+        return Transaction(self)
 
     def upsert_triple(self, subject: str, relation: str, object_val: str, source_id: str, confidence: float = 0.0):
         """
         Add or update a triple in the graph.
         Creates nodes for subject and object if they don't exist.
         """
+        self.commit([("upsert", subject, relation, object_val, source_id, confidence)])
 
-        
-        # Get or create node IDs
-        subject_id = self._get_or_create_node_id(subject, "entity")
-        object_id = self._get_or_create_node_id(object_val, "entity")
-        
-        # Create edge key for deduplication
-        edge_key = (subject_id, object_id, relation)
-        
-        # Check if edge already exists
-        if edge_key in self.edge_id_map:
-            # Update existing edge with additional source and keep max confidence
-            edge_id = self.edge_id_map[edge_key]
-            if "sources" not in self.graph.edges[subject_id, object_id, edge_id]:
-                self.graph.edges[subject_id, object_id, edge_id]["sources"] = []
-            self.graph.edges[subject_id, object_id, edge_id]["sources"].append(source_id)
-            
-            # Keep the maximum confidence
-            existing_confidence = self.graph.edges[subject_id, object_id, edge_id].get("confidence", 0.0)
-            self.graph.edges[subject_id, object_id, edge_id]["confidence"] = max(existing_confidence, confidence)
+    def retract_source(self, source_id: str, prefix: bool = False, keep: Iterable[str] = ()) -> Dict[str, int]:
+        """
+        Remove everything source_id asserted, or every source id starting
+        with source_id when prefix=True (except those in keep). Edges left
+        without sources are deleted, and so are nodes left without edges.
+        Costs time in proportion to the retracted sources' edges.
+        """
+        return self.commit([retract_op(source_id, prefix, keep)])[0]
 
+    def bulk_upsert(self, subjects: List[str], relations: List[str], objects: List[str], confidences: List[float],
+                    link_rows: List[int], link_sources: List[str], link_hits: List[int]) -> Dict[str, int]:
+        """
+        Upsert many triples as one write and one version. Row i asserts
+        (subjects[i], relations[i], objects[i]) with confidences[i]; its sources
+        are the links naming it: link j says that link_sources[j] asserted row
+        link_rows[j] link_hits[j] times. Repeated rows and links are merged.
+        Returns counts of rows, nodes and edges added and edges updated.
+        """
+        return self.commit([("bulk_upsert", subjects, relations, objects, confidences,
+                             link_rows, link_sources, link_hits)])[0]
+
+    def sources(self, prefix: str = "", limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """(source id, edges asserted) for source ids starting with prefix."""
+        with self._lock.read():
+            sources = self.provenance.sources_with_prefix(prefix)
+            return [(source_id, self.provenance.count(source_id)) for source_id in islice(sources, limit)]
+
+    def commit(self, ops: Sequence[Sequence[Any]]) -> List[Any]:
+        """
+        Log and apply operations as one write, returning apply_op's result for each.
+        A batch is one WAL record, so it replays whole or not at all. Every
+        operation is checked (see normalize_op) before any is logged or
+        applied, so a malformed one cannot reach the log.
+        """
+        ops = [normalize_op(op) for op in ops]
+        persistence = self.persistence
+        if persistence is None:
+            with self._lock.write():
+                return [self.apply_op(op) for op in ops]
+        # The shared lock is taken before the write lock so readers never wait on another process
+        with persistence.locked():
+            with self._lock.write():
+                # Other processes' writes go first, so every replica applies the log in the same order
+                persistence.catch_up(self)
+                persistence.log(ops if len(ops) == 1 else [("batch", list(ops))])
+                results = [self.apply_op(op) for op in ops]
+        if persistence.should_checkpoint():
+            self.checkpoint()
+        return results
+
+    def checkpoint(self, force: bool = False):
+        """Snapshot the store and truncate the WAL, if it is due (or always with force=True)."""
+        persistence = self.persistence
+        if persistence is None:
+            return
+        with self._checkpoint_lock, persistence.locked():
+            if persistence.has_updates():
+                with self._lock.write():
+                    persistence.catch_up(self)
+            # Writers stay out so the snapshot matches the WAL cut; readers are not excluded
+            with self._lock.read():
+                if force or persistence.should_checkpoint():
+                    persistence.checkpoint(self)
+
+    def sync(self) -> int:
+        """Apply writes other processes logged to a shared data directory; returns the operations applied."""
+        persistence = self.persistence
+        if persistence is None:
+            return 0
+        with persistence.locked():
+            with self._lock.write():
+                return persistence.catch_up(self)
+
+    def reset(self):
+        """Drop all contents, e.g. before reloading a snapshot another process wrote."""
+        self.engine = type(self.engine)()
+        self.label_index = LabelIndex()
+        self.relation_index = LabelIndex()
+        if self.resolver is not None:
+            self.resolver = EntityResolver()
+        self.provenance = ProvenanceIndex()
+        self.version = 0
+        self.changelog.reset(0)
+        self._snapshot = None
+
+    def replay_op(self, op):
+        """Check and apply an operation read back from the log; ValueError if it cannot be applied."""
+        return self.apply_op(normalize_op(op))
+
+    def apply_op(self, op):
+        """Apply one logged operation without logging it again; retractions return their counts."""
+        kind = op[0]
+        if kind == "upsert":
+            self._upsert(*op[1:])
+        elif kind == "bulk_upsert":
+            return self._bulk_upsert(*op[1:])
+        elif kind == "batch":
+            for inner in op[1]:
+                self.apply_op(inner)
+        elif kind == "retract":
+            return self._retract(op[1])
+        elif kind == "retract_prefix":
+            keep = set(op[2])
+            return self._retract([s for s in self.provenance.sources_with_prefix(op[1]) if s not in keep])
+        elif kind == "replace":
+            return self._replace(op[1], op[2])
+        else:
+            raise ValueError(f"Unknown graph operation {kind!r}")
+
+    def _upsert(self, subject: str, relation: str, object_val: str, source_id: str, confidence: float):
+        self.version += 1
+        source_id = self.provenance.intern(source_id)
+
+        # Get or create node handles
+        subject_h = self._get_or_create_node_id(subject, "entity")
+        object_h = self._get_or_create_node_id(object_val, "entity")
+        if self.resolver is not None:
+            # Resolving the object may have merged the subject's node into an older one
+            subject_h = self.resolver.clusters.find(subject_h)
+
+        # Check if edge already exists
+        edge_h = self.engine.find_edge(subject_h, object_h, relation)
+        if edge_h is not None:
+            # Count another sighting (a new source or a repeat) and keep max confidence
+            if self.engine.update_edge(edge_h, source_id, confidence):
+                self.provenance.add(source_id, edge_h)
+            self.changelog.record(self.version, EDGE, edge_h)
         else:
             # Create new edge
-            edge_id = str(uuid.uuid4())
-            self.edge_id_map[edge_key] = edge_id
-            self.graph.add_edge(
-                subject_id, 
-                object_id, 
-                key=edge_id,
-                relation=relation,
-                sources=[source_id],
-                confidence=confidence
+            edge_h = self._add_edge(subject_h, object_h, relation, [source_id], confidence)
+        if self._touched is not None:
+            self._touched.add((source_id, edge_h))
+
+    def _bulk_upsert(self, subjects: List[str], relations: List[str], objects: List[str], confidences: List[float],
+                     link_rows: List[int], link_sources: List[str], link_hits: List[int]) -> Dict[str, int]:
+        """
+        Apply a bulk_upsert batch column by column. Labels, relations and
+        sources are coded as dense integers once per batch, then repeated
+        triples and repeated (triple, source) links are merged by sorting
+        packed integer keys with numpy. Distinct labels are looked up in one
+        call and new ones created together in order of first appearance (as
+        row-by-row upserts would). Only triples whose endpoints both existed
+        before the batch are looked up in the engine; the rest are new and
+        go to the engine in one call.
+        """
+        self.version += 1
+        engine, provenance = self.engine, self.provenance
+        counts = {"rows": len(subjects), "nodes_added": 0, "edges_added": 0, "edges_updated": 0}
+        if not len(subjects):
+            return counts
+        nodes_before = engine.node_count()
+
+        # Subjects and objects interleaved, so labels are numbered in row order
+        labels, label_codes = factorize(list(chain.from_iterable(zip(subjects, objects))))
+        handles = engine.find_nodes(labels, "entity")
+        new_labels = [i for i, handle in enumerate(handles) if handle is None]
+        if self.resolver is None:
+            for i, handle in zip(new_labels, self._add_nodes([labels[i] for i in new_labels], "entity")):
+                handles[i] = handle
+            # One node per label
+            nodes, node_codes = handles, np.arange(len(handles))
+        else:
+            for i in new_labels:
+                handles[i] = self._get_or_create_node_id(labels[i], "entity")
+            # Resolving later labels may have merged nodes found earlier
+            nodes, node_codes = factorize(list(map(self.resolver.clusters.find, handles)))
+        # Net of nodes merged away by entity resolution
+        counts["nodes_added"] = engine.node_count() - nodes_before
+        subject_codes, object_codes = node_codes[label_codes[0::2]], node_codes[label_codes[1::2]]
+        relation_names, relation_codes = factorize(relations)
+
+        # Distinct triples, numbered in order of first appearance
+        _, pairs = np.unique(subject_codes * len(nodes) + object_codes, return_inverse=True)
+        keys = pairs.reshape(-1) * len(relation_names) + relation_codes
+        _, first_rows, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        order = np.argsort(first_rows, kind="stable")
+        triple_of_row = np.empty(len(order), dtype=np.int64)
+        triple_of_row[order] = np.arange(len(order))
+        triple_of_row = triple_of_row[inverse.reshape(-1)]
+        first_rows = first_rows[order]
+        triple_subjects, triple_objects = subject_codes[first_rows], object_codes[first_rows]
+        triple_relations = relation_codes[first_rows]
+        triple_confidences = np.zeros(len(first_rows))
+        np.maximum.at(triple_confidences, triple_of_row, np.asarray(confidences, dtype=np.float64))
+
+        # Distinct (triple, source) links, grouped by triple in order of first sighting
+        source_names, source_codes = factorize(link_sources)
+        source_names = list(map(provenance.intern, source_names))
+        width = max(len(source_names), 1)
+        link_keys, first_links, link_inverse = np.unique(
+            triple_of_row[np.asarray(link_rows, dtype=np.int64)] * width + source_codes,
+            return_index=True, return_inverse=True)
+        hits = np.zeros(len(link_keys), dtype=np.int64)
+        np.add.at(hits, link_inverse.reshape(-1), np.asarray(link_hits, dtype=np.int64))
+        link_order = np.lexsort((first_links, link_keys // width))
+        link_triples, link_sources_codes = (link_keys // width)[link_order], (link_keys % width)[link_order]
+        hits = hits[link_order]
+
+        node_column, relation_column, source_column = (as_objects(nodes), as_objects(relation_names),
+                                                       as_objects(source_names))
+        if self.resolver is None:
+            # A triple with an endpoint created by this batch cannot exist yet
+            known = np.ones(len(labels), dtype=bool)
+            known[new_labels] = False
+            known_nodes = np.zeros(len(nodes), dtype=bool)
+            known_nodes[node_codes[known]] = True
+            candidates = np.flatnonzero(known_nodes[triple_subjects] & known_nodes[triple_objects])
+        else:
+            candidates = np.arange(len(first_rows))
+        found = engine.find_edges(node_column[triple_subjects[candidates]].tolist(),
+                                  node_column[triple_objects[candidates]].tolist(),
+                                  relation_column[triple_relations[candidates]].tolist()) if len(candidates) else []
+
+        is_new = np.ones(len(first_rows), dtype=bool)
+        updated = []
+        if any(edge_h is not None for edge_h in found):
+            starts = np.searchsorted(link_triples, candidates, "left").tolist()
+            ends = np.searchsorted(link_triples, candidates, "right").tolist()
+            for triple, edge_h, start, end in zip(candidates.tolist(), found, starts, ends):
+                if edge_h is None:
+                    continue
+                is_new[triple] = False
+                updated.append(edge_h)
+                confidence = float(triple_confidences[triple])
+                for source_id, count in zip(source_column[link_sources_codes[start:end]].tolist(),
+                                            hits[start:end].tolist()):
+                    if engine.update_edge(edge_h, source_id, confidence, count):
+                        provenance.add(source_id, edge_h)
+
+        new_triples = np.flatnonzero(is_new)
+        position = np.full(len(first_rows), -1, dtype=np.int64)
+        position[new_triples] = np.arange(len(new_triples))
+        new_links = is_new[link_triples]
+        new_link_triples, new_link_sources = position[link_triples[new_links]], link_sources_codes[new_links]
+        added = engine.add_edges(
+            node_column[triple_subjects[new_triples]].tolist(), node_column[triple_objects[new_triples]].tolist(),
+            relation_column[triple_relations[new_triples]].tolist(), triple_confidences[new_triples].tolist(),
+            new_link_triples.tolist(), source_column[new_link_sources].tolist(), hits[new_links].tolist())
+        self.changelog.record_many(self.version, EDGE, added)
+        self.changelog.record_many(self.version, EDGE, updated)
+        # The provenance index gets each source's new edges in one call
+        added_column = as_objects(added)
+        by_source = np.argsort(new_link_sources, kind="stable")
+        grouped = new_link_sources[by_source]
+        bounds = (np.flatnonzero(np.diff(grouped)) + 1).tolist()
+        for start, end in zip([0, *bounds], [*bounds, len(grouped)]) if len(grouped) else ():
+            provenance.add_edges(source_names[grouped[start]],
+                                 added_column[new_link_triples[by_source[start:end]]].tolist())
+        if self.indexed:
+            for relation in relation_names:
+                if relation not in self.relation_index:
+                    self.relation_index.add(relation, relation)
+        counts["edges_added"] = len(added)
+        counts["edges_updated"] = len(set(updated))
+        return counts
+
+    def _retract(self, source_ids: Iterable[str]) -> Dict[str, int]:
+        """Drop every assertion of the given sources, collecting orphaned edges and nodes."""
+        counts = {"sources": 0, "assertions": 0, "edges_removed": 0, "nodes_removed": 0}
+        for source_id in source_ids:
+            edges = self.provenance.pop(source_id)
+            if not edges:
+                continue
+            if not counts["sources"]:
+                self.version += 1
+            counts["sources"] += 1
+            for edge_h in edges:
+                self._drop_source(edge_h, source_id, counts)
+        return counts
+
+    def _replace(self, source_ids: List[str], ops: Sequence[Sequence[Any]]) -> Dict[str, int]:
+        """Apply ops, then drop what source_ids asserted before that ops did not assert again."""
+        counts = {"sources": 0, "assertions": 0, "edges_removed": 0, "nodes_removed": 0}
+        touched = self._touched = set()
+        try:
+            for op in ops:
+                self.apply_op(op)
+        finally:
+            self._touched = None
+        for source_id in source_ids:
+            stale = [edge_h for edge_h in self.provenance.edges(source_id) if (source_id, edge_h) not in touched]
+            if not stale:
+                continue
+            if not counts["sources"]:
+                self.version += 1
+            counts["sources"] += 1
+            for edge_h in stale:
+                self.provenance.discard(source_id, edge_h)
+                self._drop_source(edge_h, source_id, counts)
+        return counts
+
+    def _drop_source(self, edge_h, source_id: str, counts: Dict[str, int]):
+        """Remove one source from an edge (already removed from the provenance index)."""
+        engine = self.engine
+        counts["assertions"] += 1
+        self.changelog.record(self.version, EDGE, edge_h)
+        if engine.remove_source(edge_h, source_id):
+            return
+        endpoints = engine.edge_endpoints(edge_h)
+        engine.remove_edge(edge_h)
+        counts["edges_removed"] += 1
+        for node_h in dict.fromkeys(endpoints):
+            if next(iter(engine.out_edges(node_h)), None) is None and next(iter(engine.in_edges(node_h)), None) is None:
+                self._remove_node(node_h)
+                counts["nodes_removed"] += 1
+
+    def _remove_node(self, handle):
+        """Delete a node that has no edges left, and forget its label."""
+        self.engine.remove_node(handle)
+        self.changelog.record(self.version, NODE, handle)
+        if self.indexed:
+            self.label_index.remove(handle)
+        if self.resolver is not None:
+            self.resolver.remove(handle)
+
+    def _get_or_create_node_id(self, label: str, node_type: str):
+        """Get existing node handle or create new node, resolving near-duplicate labels to one entity."""
+        handle = self.engine.find_node(label, node_type)
+        if handle is not None:
+            return handle
+        if self.resolver is None:
+            return self._add_node(label, node_type)
+
+        key = self.resolver.key(label, node_type)
+        matches = self.resolver.resolve(key)
+        if not matches:
+            handle = self._add_node(label, node_type)
+        else:
+            # The label may bridge several entities; fold them all into the oldest
+            handle = matches[0]
+            for other in matches[1:]:
+                self._merge_nodes(handle, other)
+        self.resolver.add(handle, key)
+        return handle
+
+    def _add_node(self, label: str, node_type: str, **engine_kwargs):
+        """Insert a node and index its label."""
+        handle = self.engine.add_node(label, node_type, **engine_kwargs)
+        self.changelog.record(self.version, NODE, handle)
+        if self.indexed:
+            self.label_index.add(handle, label)
+        return handle
+
+    def _add_nodes(self, labels: List[str], node_type: str) -> Sequence[Any]:
+        """Insert many new nodes and index their labels."""
+        handles = self.engine.add_nodes(labels, node_type)
+        self.changelog.record_many(self.version, NODE, handles)
+        if self.indexed:
+            self.label_index.add_many(handles, labels)
+        return handles
+
+    def _add_edge(self, subject_h, object_h, relation: str, sources: List[str], confidence: float, **engine_kwargs):
+        """Insert an edge and index its relation and sources."""
+        handle = self.engine.add_edge(subject_h, object_h, relation, sources, confidence, **engine_kwargs)
+        self.changelog.record(self.version, EDGE, handle)
+        self.provenance.add_all(sources, handle)
+        if self.indexed and relation not in self.relation_index:
+            self.relation_index.add(relation, relation)
+        return handle
+
+    def _merge_nodes(self, keep, drop):
+        """Fold node drop into keep: move its edges and their provenance onto keep, then delete it."""
+        engine = self.engine
+        for edge_h in list(dict.fromkeys([*engine.out_edges(drop), *engine.in_edges(drop)])):
+            source, target = engine.edge_endpoints(edge_h)
+            relation = engine.edge_relation(edge_h)
+            sources, hits = engine.edge_sources(edge_h), engine.edge_hits(edge_h)
+            confidence = engine.edge_confidence(edge_h)
+            engine.remove_edge(edge_h)
+            self.provenance.discard_all(sources, edge_h)
+            self.changelog.record(self.version, EDGE, edge_h)
+
+            source = keep if source == drop else source
+            target = keep if target == drop else target
+            existing = engine.find_edge(source, target, relation)
+            if existing is None:
+                existing = self._add_edge(source, target, relation, sources, confidence, hits=hits)
+            else:
+                for source_id, count in zip(sources, hits):
+                    if engine.update_edge(existing, source_id, confidence, count):
+                        self.provenance.add(source_id, existing)
+                self.changelog.record(self.version, EDGE, existing)
+            if self._touched is not None:
+                # Assertions made earlier in a replace move with the edge
+                self._touched.update((source_id, existing) for source_id in sources
+                                     if (source_id, edge_h) in self._touched)
+
+        engine.remove_node(drop)
+        self.changelog.record(self.version, NODE, drop)
+        if self.indexed:
+            self.label_index.remove(drop)
+        self.resolver.merge(keep, drop)
+
+    def export_columns(self):
+        """Engine columns plus the label index postings and resolver keys, for a snapshot."""
+        columns = self.engine.export_columns()
+        columns["version"] = array("q", [self.version])
+        engine_position = {h: i for i, h in enumerate(self.engine.iter_nodes())}
+        if self.resolver is not None:
+            keys = self.resolver.export_keys()
+            columns["resolve_keys"] = [f"{node_type}\x1f{canonical}" for canonical, node_type, _ in keys]
+            columns["resolve_nodes"] = array("i", (engine_position[h] for _, _, h in keys))
+        if self.indexed:
+            # Postings refer to nodes by rank; index_order maps rank -> snapshot node index
+            handles = self.label_index.ordered(engine_position)
+            columns["index_order"] = array("i", (engine_position[h] for h in handles))
+            columns["index_grams"], columns["index_offsets"], columns["index_items"] = \
+                self.label_index.export_postings(dict(zip(handles, range(len(handles)))))
+        return columns
+
+    def load_columns(self, columns):
+        """Replace an empty store's contents with snapshot columns and rebuild the indexes."""
+        self.engine.load_columns(columns)
+        if "version" in columns:
+            self.version = columns["version"][0]
+        self.changelog.reset(self.version)
+        for edge_h in self.engine.iter_edges():
+            self.provenance.add_all(self.engine.edge_sources(edge_h), edge_h)
+        nodes = list(self.engine.iter_nodes())
+        if self.resolver is not None:
+            self._load_resolver(columns, nodes)
+        if not self.indexed:
+            return
+        if "index_grams" in columns:
+            handles = [nodes[i] for i in columns["index_order"]]
+            self.label_index.load_postings(
+                handles, [self.engine.node_label(h) for h in handles],
+                columns["index_grams"], columns["index_offsets"], columns["index_items"]
             )
+        else:
+            for handle in nodes:
+                self.label_index.add(handle, self.engine.node_label(handle))
+        for relation in self.engine.relations():
+            self.relation_index.add(relation, relation)
+
+    def _load_resolver(self, columns, nodes):
+        """Re-register resolver keys in their original order so replayed upserts resolve identically."""
+        resolver = self.resolver
+        for handle in nodes:
+            resolver.clusters.add(handle)
+        if "resolve_keys" in columns:
+            for key, position in zip(columns["resolve_keys"], columns["resolve_nodes"]):
+                node_type, canonical = key.split("\x1f", 1)
+                resolver.add(nodes[position], resolver.canonical_key(canonical, node_type))
+        else:
+            for handle in nodes:
+                resolver.add(handle, resolver.key(self.engine.node_label(handle), self.engine.node_type(handle)))
+
+    def node_count(self) -> int:
+        return self.engine.node_count()
+
+    def edge_count(self) -> int:
+        return self.engine.edge_count()
+
+    def node_label(self, node_id: str) -> Optional[str]:
+        """Label of the node with this public id, or None if it does not exist."""
+        with self._lock.read():
+            handle = self.engine.node_handle(node_id)
+            return None if handle is None else self.engine.node_label(handle)
+
+    def find_nodes(self, keywords: Iterable[str]) -> List[str]:
+        """Node IDs whose label contains any keyword (case-insensitive), in insertion order."""
+        engine = self.engine
+        with self._lock.read():
+            if not self.indexed:
+                keywords = [k.lower() for k in keywords]
+                return [engine.node_id(h) for h in engine.iter_nodes()
+                        if any(k in engine.node_label(h).lower() for k in keywords)]
+            return [engine.node_id(h) for h in self.label_index.ordered(self.label_index.search_any(keywords))]
+
+    def find_edges_by_relation(self, keywords: Iterable[str]) -> List[str]:
+        """Edge IDs whose relation contains any keyword (case-insensitive)."""
+        engine = self.engine
+        keywords = [k.lower() for k in keywords]
+        with self._lock.read():
+            if self.indexed:
+                relations = self.relation_index.ordered(self.relation_index.search_any(keywords))
+            else:
+                relations = [r for r in engine.relations() if any(k in r.lower() for k in keywords)]
+            return [engine.edge_id(h) for relation in relations for h in engine.edges_with_relation(relation)]
+
+    def node_dto(self, handle) -> Dict[str, Any]:
+        engine = self.engine
+        return {
+            "id": engine.node_id(handle),
+            "label": engine.node_label(handle),
+            "type": engine.node_type(handle)
+        }
+
+    def edge_dto(self, handle) -> Dict[str, Any]:
+        engine = self.engine
+        source, target = engine.edge_endpoints(handle)
+        return {
+            "id": engine.edge_id(handle),
+            "source": engine.node_id(source),
+            "target": engine.node_id(target),
+            "relation": engine.edge_relation(handle),
+            "confidence": round(engine.edge_confidence(handle), 6),
+            # Copied, so DTOs held by snapshots never see later sightings
+            "sources": list(engine.edge_sources(handle))
+        }
+
+    def snapshot(self) -> GraphSnapshot:
+        """
+        Immutable view of the latest committed version. It is built once per
+        version and shared by every reader; a new one patches the previous
+        snapshot with the change log instead of converting the whole graph.
+
+        Only the first snapshot waits for writers. Later, while a writer
+        holds or is queued for the lock, or another reader is already
+        building the next snapshot, the previous one is returned at once.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self.version:
+            return snapshot
+        wait = snapshot is None
+        if not self._snapshot_lock.acquire(blocking=wait):
+            return snapshot
+        try:
+            if not self._lock.acquire_read(blocking=wait):
+                return snapshot
+            try:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.version != self.version:
+                    snapshot = self._build_snapshot(snapshot)
+                    self._snapshot = snapshot
+            finally:
+                self._lock.release_read()
+        finally:
+            self._snapshot_lock.release()
+        return snapshot
 
-        
-
-    
-    def _get_or_create_node_id(self, label: str, node_type: str) -> str:
-        """Get existing node ID or create new node."""
-        node_key = (label, node_type)
-        
-        if node_key in self.node_id_map:
-            return self.node_id_map[node_key]
-        
-        # Create new node
-        node_id = str(uuid.uuid4())
-        self.node_id_map[node_key] = node_id
-        self.graph.add_node(node_id, label=label, type=node_type)
-        return node_id
-    
-    def to_dto(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Convert graph to DTO format for JSON serialization."""
-        nodes = []
-        edges = []
-        
-
-        
-        # Convert nodes
-        for node_id, attrs in self.graph.nodes(data=True):
-            nodes.append({
-                "id": node_id,
-                "label": attrs.get("label", ""),
-                "type": attrs.get("type", "entity")
-            })
-        
-        # Convert edges
-        for source, target, edge_id, attrs in self.graph.edges(data=True, keys=True):
-            edges.append({
-                "id": edge_id,
-                "source": source,
-                "target": target,
-                "relation": attrs.get("relation", ""),
-                "sources": attrs.get("sources", [])
-            })
-        
-        result = {"nodes": nodes, "edges": edges}
-
-        return result
+    def _build_snapshot(self, previous: Optional[GraphSnapshot]) -> GraphSnapshot:
+        engine = self.engine
+        changes = self.changelog.since(previous.version) if previous is not None else None
+        if changes is None or len(changes[0]) + len(changes[1]) > \
+                SNAPSHOT_REBUILD_RATIO * (len(previous.nodes) + len(previous.edges)):
+            return GraphSnapshot(self.version, {h: self.node_dto(h) for h in engine.iter_nodes()},
+                                 {h: self.edge_dto(h) for h in engine.iter_edges()})
+        nodes, edges = dict(previous.nodes), dict(previous.edges)
+        node_handles, edge_handles = changes
+        for h in node_handles:
+            if engine.has_node(h):
+                nodes[h] = self.node_dto(h)
+            else:
+                nodes.pop(h, None)
+        for h in edge_handles:
+            if engine.has_edge(h):
+                edges[h] = self.edge_dto(h)
+            else:
+                edges.pop(h, None)
+        return GraphSnapshot(self.version, nodes, edges)
+
+    def to_dto(self) -> Dict[str, Any]:
+        """Convert graph to DTO format for JSON serialization (shared by readers; do not modify)."""
+        return self.snapshot().to_dto()
+
+    def to_dto_since(self, since: Optional[int]) -> Dict[str, Any]:
+        """
+        Nodes and edges added, changed or removed after version `since`.
+        Falls back to the full graph (full=True) when since is None or older
+        than the change log reaches.
+        """
+        with self._lock.read():
+            changes = None
+            if since is not None and since <= self.version:
+                changes = self.changelog.since(since)
+            if changes is not None:
+                return self._delta_dto(since, *changes)
+        return {**self.to_dto(), "removed_nodes": [], "removed_edges": [], "since": since, "full": True}
+
+    def _delta_dto(self, since: int, node_handles: List[Any], edge_handles: List[Any]) -> Dict[str, Any]:
+        engine = self.engine
+        return {
+            "nodes": [self.node_dto(h) for h in node_handles if engine.has_node(h)],
+            "edges": [self.edge_dto(h) for h in edge_handles if engine.has_edge(h)],
+            # Nodes merged into another entity, and the edges rewired with them
+            "removed_nodes": [engine.node_id(h) for h in node_handles if not engine.has_node(h)],
+            "removed_edges": [engine.edge_id(h) for h in edge_handles if not engine.has_edge(h)],
+            "version": self.version,
+            "since": since,
+            "full": False
+        }
+
+    def iter_dto_items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield ("node", dto) then ("edge", dto) pairs for the whole graph, one at a time."""
+        # A snapshot, so upserts during a slow stream neither break nor leak into it
+        return self.snapshot().iter_dto_items()
 
     def get_subgraph_by_keywords(self, keywords: List[str]) -> 'GraphStore':
         """Get subgraph containing nodes and edges related to keywords."""
-        if not self.graph.nodes():
-            return GraphStore()  # Return empty graph if no nodes exist
-        
+        with self._lock.read():
+            return self._subgraph_by_keywords(keywords)
+
+    def _subgraph_by_keywords(self, keywords: List[str]) -> 'GraphStore':
+        engine = self.engine
+        # Subgraphs keep the parent's public ids, so they always use the NetworkX engine
+        subgraph_store = GraphStore(NetworkXEngine(), indexed=False, resolve_entities=False)
+        if not engine.node_count():
+            return subgraph_store  # Return empty graph if no nodes exist
+
         # Find nodes that contain any of the keywords
-        relevant_nodes = set()
-        for node_id, attrs in self.graph.nodes(data=True):
-            label = attrs.get("label", "").lower()
-            for keyword in keywords:
-                if keyword.lower() in label:
-                    relevant_nodes.add(node_id)
-                    break
-        
+        if self.indexed:
+            relevant_nodes = self.label_index.ordered(self.label_index.search_any(keywords))
+        else:
+            relevant_nodes = [engine.node_handle(node_id) for node_id in self.find_nodes(keywords)]
+
         # If no relevant nodes found, return a small sample of the graph
         if not relevant_nodes:
-            all_nodes = list(self.graph.nodes())
-            relevant_nodes = set(all_nodes[:10])  # Take first 10 nodes
-        
-        # Get edges between relevant nodes
-        relevant_edges = set()
-        for source, target, edge_id in self.graph.edges(keys=True):
-            if source in relevant_nodes and target in relevant_nodes:
-                relevant_edges.add((source, target, edge_id))
-        
-        # Create subgraph
-        subgraph_store = GraphStore()
-        subgraph_store.graph = self.graph.subgraph(relevant_nodes).copy()
-        
-        # Add the relevant edges
-        for source, target, edge_id in relevant_edges:
-            edge_data = self.graph.edges[source, target, edge_id].copy()
-            subgraph_store.graph.add_edge(source, target, key=edge_id, **edge_data)
-        
+            relevant_nodes = list(islice(engine.iter_nodes(), 10))  # Take first 10 nodes
+        relevant = set(relevant_nodes)
+
+        for handle in relevant_nodes:
+            subgraph_store._add_node(engine.node_label(handle), engine.node_type(handle), node_id=engine.node_id(handle))
+
+        # Add edges between relevant nodes, found through adjacency
+        for source in relevant_nodes:
+            for edge_h in engine.out_edges(source):
+                _, target = engine.edge_endpoints(edge_h)
+                if target not in relevant:
+                    continue
+                subgraph_store._add_edge(
+                    engine.node_id(source), engine.node_id(target), engine.edge_relation(edge_h),
+                    engine.edge_sources(edge_h), engine.edge_confidence(edge_h),
+                    hits=engine.edge_hits(edge_h), edge_id=engine.edge_id(edge_h)
+                )
+
         return subgraph_store
 
+def create_graph_store(backend: Optional[str] = None, data_dir: Optional[str] = None) -> GraphStore:
+    """
+    Create a GraphStore on the backend named by GRAPH_BACKEND (default: networkx).
+    If GRAPH_DATA_DIR is set, the store is restored from and logged to that directory;
+    GRAPH_SHARED=1 lets several worker processes serve and write the same directory.
+    ENTITY_RESOLUTION=0 keeps every distinct label as its own node.
+    """
+    store = GraphStore(
+        create_engine(backend or os.getenv("GRAPH_BACKEND", "networkx")),
+        resolve_entities=os.getenv("ENTITY_RESOLUTION", "1") != "0",
+    )
+    data_dir = data_dir or os.getenv("GRAPH_DATA_DIR")
+    if data_dir:
+        persistence = GraphPersistence(
+            data_dir,
+            fsync=os.getenv("GRAPH_WAL_FSYNC", "interval"),
+            fsync_interval=float(os.getenv("GRAPH_WAL_FSYNC_INTERVAL", "1.0")),
+            snapshot_every=int(os.getenv("GRAPH_SNAPSHOT_EVERY", "1000000")),
+            shared=os.getenv("GRAPH_SHARED", "0") == "1",
+        )
+        persistence.open(store)
+        persistence.start_follower(store, float(os.getenv("GRAPH_SYNC_INTERVAL", "0.05")))
+    return store
+
 # Global graph store instance
-graph_store = GraphStore()
+graph_store = create_graph_store()
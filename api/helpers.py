@@ -1,11 +1,20 @@
-from typing import List, Dict, Any, Tuple
-import re
+from typing import List, Dict, Any, Optional, Tuple
 import json
+import logging
 import os
+import threading
 from dotenv import load_dotenv
 from openai import OpenAI
 import networkx as nx
 
+from .extraction_cache import ExtractionCache
+from .llm_scheduler import ExtractionScheduler, Triples, Usage
+from .metrics import tracing
+from .retrieval import Retriever
+from .rules import default_engine as rule_engine
+
+logger = logging.getLogger(__name__)
+
 # Load environment variables
 load_dotenv()
 
@@ -13,183 +22,138 @@ load_dotenv()
 openai_client = None
 try:
     if os.getenv("OPENAI_API_KEY"):
-        openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        print("INFO OpenAI client: enabled")
+        # Retries are done by the extraction scheduler, which also backs off on rate limits
+        openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        logger.info("OpenAI client: enabled")
     else:
-        print("INFO OpenAI client: missing, fallback")
+        logger.info("OpenAI client: missing, fallback")
 except Exception as e:
-    print(f"Warning: Could not initialize OpenAI client: {e}")
+    logger.warning(f"Could not initialize OpenAI client: {e}")
     openai_client = None
 
+EXTRACTION_MODEL = "gpt-3.5-turbo"
+# Bump whenever the extraction prompt changes so cached results are not reused
+PROMPT_VERSION = "3"
+
+# Content-addressed cache of LLM extractions; set EXTRACTION_CACHE_PATH="" to disable
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", ".cache/extractions.sqlite3")
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+extraction_cache: Optional[ExtractionCache] = None
+_extraction_cache_lock = threading.Lock()
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Return the shared extraction cache, opening it on first use (None if disabled)."""
+    global extraction_cache
+    if extraction_cache is None and EXTRACTION_CACHE_PATH:
+        with _extraction_cache_lock:
+            if extraction_cache is None:
+                extraction_cache = ExtractionCache(EXTRACTION_CACHE_PATH, max_bytes=EXTRACTION_CACHE_MAX_BYTES)
+    return extraction_cache
+
+# Batching and rate limits for extraction requests
+LLM_BATCH_TOKENS = int(os.getenv("LLM_BATCH_TOKENS", "6000"))
+LLM_BATCH_MAX_CHUNKS = int(os.getenv("LLM_BATCH_MAX_CHUNKS", "8"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+extraction_scheduler: Optional[ExtractionScheduler] = None
+_extraction_scheduler_lock = threading.Lock()
+
+def get_extraction_scheduler() -> Optional[ExtractionScheduler]:
+    """Return the scheduler for the current OpenAI client, starting it on first use (None without a client)."""
+    global extraction_scheduler
+    if openai_client is None:
+        return None
+    if extraction_scheduler is None or extraction_scheduler.client is not openai_client:
+        with _extraction_scheduler_lock:
+            if extraction_scheduler is None or extraction_scheduler.client is not openai_client:
+                if extraction_scheduler is not None:
+                    extraction_scheduler.close()
+                extraction_scheduler = ExtractionScheduler(
+                    openai_client,
+                    EXTRACTION_MODEL,
+                    max_batch_tokens=LLM_BATCH_TOKENS,
+                    max_batch_chunks=LLM_BATCH_MAX_CHUNKS,
+                    concurrency=LLM_CONCURRENCY,
+                    requests_per_minute=LLM_REQUESTS_PER_MINUTE or None,
+                    tokens_per_minute=LLM_TOKENS_PER_MINUTE or None,
+                    max_retries=LLM_MAX_RETRIES,
+                )
+    return extraction_scheduler
+
 def extract_triples(text: str, source_id: str, max_triples: int = 8) -> List[Dict[str, Any]]:
     """
     Extract subject-relation-object triples from text using OpenAI.
-    Falls back to stub implementation if no API key or parsing fails.
-    Returns List[Dict] with keys: subject, relation, object, confidence, source
+    Chunks are batched into shared, rate-limited requests by the extraction
+    scheduler, and results are cached by chunk content, so repeated chunks
+    skip the LLM call. Falls back to stub implementation if no API key, the
+    response cannot be parsed or the request keeps failing after retries.
+    Returns List[Dict] with keys: subject, relation, object, confidence, source;
+    the list's usage attribute holds the LLM calls and tokens spent on it.
     """
-    print(f"TRACE extract_triples: source={source_id} len={len(text)}")
+    if tracing():
+        logger.info(f"TRACE extract_triples: source={source_id} len={len(text)}")
     
     # If no OpenAI API key, fall back to stub implementation
-    if not openai_client:
-        print("DEBUG: No OpenAI client, using stub")
+    scheduler = get_extraction_scheduler()
+    if scheduler is None:
+        if tracing():
+            logger.info("TRACE extract_triples: no OpenAI client, using stub")
         return _extract_triples_stub(text, source_id)
     
-    # Truncate text if too large for the model
-    if len(text) > 3500:
-        text = text[:3500]
-        print("DEBUG: Text truncated to 3500 chars for model")
+    # Only the caller that actually hits the LLM is charged for it
+    usage = Usage()
+    
+    def compute() -> List[Dict[str, Any]]:
+        triples, spent = scheduler.extract(text, max_triples)
+        usage.add(spent)
+        return triples
     
     try:
-        # Create the prompt for OpenAI
-        prompt = f"""Extract factual triples from this text. Return ONLY valid JSON with this exact schema:
-
-{{
-  "triples": [
-    {{"subject":"<Concept>","relation":"<Relation>","object":"<Concept>","confidence":0.0,"source":"{source_id}"}}
-  ]
-}}
-
-Rules:
-- Subjects and objects should be specific concepts, entities, or technologies
-- Relations should be meaningful relationships like "is_a", "uses", "depends_on", "enables", etc.
-- Avoid generic relations like "is", "has", "contains"
-- Cap to {max_triples} triples maximum
-- Confidence should be between 0.0 and 1.0
-
-Text: {text}"""
-
-        print("DEBUG: Calling OpenAI API...")
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-            max_tokens=1000
-        )
-        
-        content = response.choices[0].message.content.strip()
-        print(f"DEBUG: OpenAI response: {content}")
-        
-        # Try to parse JSON response
-        try:
-            data = json.loads(content)
-            triples = []
-            
-            if "triples" in data:
-                for triple in data["triples"]:
-                    if all(key in triple for key in ["subject", "relation", "object"]):
-                        triples.append({
-                            "subject": triple["subject"].strip(),
-                            "relation": triple["relation"].strip(),
-                            "object": triple["object"].strip(),
-                            "confidence": triple.get("confidence", 0.5),
-                            "source": source_id
-                        })
-            
-            print(f"DEBUG: extract_triples returning {len(triples)} triples")
-            return triples[:max_triples]
-            
-        except json.JSONDecodeError:
-            print(f"WARN: Failed to parse JSON from OpenAI response: {content[:80]}")
-            return _extract_triples_stub(text, source_id)
-            
+        cache = get_extraction_cache()
+        if cache is not None:
+            key = ExtractionCache.make_key(text, PROMPT_VERSION, EXTRACTION_MODEL, max_triples)
+            triples = cache.get_or_compute(key, compute)
+        else:
+            triples = compute()
+    except json.JSONDecodeError:
+        logger.warning("Failed to parse JSON from OpenAI response")
+        return _extract_triples_stub(text, source_id)
     except Exception as e:
-        print(f"Error calling OpenAI API: {e}")
+        logger.error(f"Error calling OpenAI API: {e}")
         return _extract_triples_stub(text, source_id)
+    
+    return Triples((dict(triple, source=source_id) for triple in triples), usage)
 
 def _extract_triples_stub(text: str, source_id: str) -> List[Dict[str, Any]]:
     """Stub implementation for triple extraction when OpenAI is not available."""
-    print("DEBUG: _extract_triples_stub called")
-    # Simple rule-based extraction
-    triples = []
-    
-    # Look for common patterns
-    sentences = re.split(r'[.!?]+', text)
-    
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence or len(sentence) < 10:
-            continue
-            
-        # Pattern: "X is a Y"
-        match = re.search(r'(\w+(?:\s+\w+)*)\s+is\s+a\s+(\w+(?:\s+\w+)*)', sentence, re.IGNORECASE)
-        if match:
-            subject = match.group(1).strip()
-            obj = match.group(2).strip()
-            if len(subject) > 2 and len(obj) > 2:
-                triples.append({
-                    "subject": subject,
-                    "relation": "is_a",
-                    "object": obj,
-                    "confidence": 0.7,
-                    "source": source_id
-                })
-        
-        # Pattern: "X uses Y"
-        match = re.search(r'(\w+(?:\s+\w+)*)\s+uses\s+(\w+(?:\s+\w+)*)', sentence, re.IGNORECASE)
-        if match:
-            subject = match.group(1).strip()
-            obj = match.group(2).strip()
-            if len(subject) > 2 and len(obj) > 2:
-                triples.append({
-                    "subject": subject,
-                    "relation": "uses",
-                    "object": obj,
-                    "confidence": 0.7,
-                    "source": source_id
-                })
-        
-        # Pattern: "X depends on Y"
-        match = re.search(r'(\w+(?:\s+\w+)*)\s+depends\s+on\s+(\w+(?:\s+\w+)*)', sentence, re.IGNORECASE)
-        if match:
-            subject = match.group(1).strip()
-            obj = match.group(2).strip()
-            if len(subject) > 2 and len(obj) > 2:
-                triples.append({
-                    "subject": subject,
-                    "relation": "depends_on",
-                    "object": obj,
-                    "confidence": 0.7,
-                    "source": source_id
-                })
-    
-    print(f"DEBUG: _extract_triples_stub returning {len(triples)} triples")
-    return triples[:8]  # Cap to 8 triples
+    # Rule-based extraction in a single linear pass per sentence (see api/rules.py)
+    triples = rule_engine.extract(text, source_id, max_triples=8)
+    if tracing():
+        logger.info(f"TRACE extract_triples_stub: source={source_id} triples={len(triples)}")
+    return triples
 
-def answer_question(question: str, graph_store) -> Dict[str, Any]:
-    """Answer a question using the knowledge graph."""
-    if not graph_store.graph.nodes():
+def answer_question(question: str, graph_store, retriever: Optional[Retriever] = None) -> Dict[str, Any]:
+    """Answer a question from the ranked evidence around the question's keywords."""
+    if not graph_store.node_count():
         return {
             "answer": "I don't have enough information to answer this question.",
             "cited_nodes": [],
             "cited_edges": []
         }
     
-    # Simple keyword-based answer generation
-    question_lower = question.lower()
-    
-    # Find relevant nodes
-    relevant_nodes = []
-    for node_id, attrs in graph_store.graph.nodes(data=True):
-        label = attrs.get("label", "").lower()
-        if any(word in label for word in question_lower.split()):
-            relevant_nodes.append(node_id)
-    
-    # Find relevant edges
-    relevant_edges = []
-    for source, target, edge_id, attrs in graph_store.graph.edges(data=True, keys=True):
-        relation = attrs.get("relation", "").lower()
-        if any(word in relation for word in question_lower.split()):
-            relevant_edges.append(edge_id)
+    # Bounded k-hop retrieval; repeated questions are served from its cache
+    evidence = (retriever or Retriever(graph_store)).retrieve(question)
     
     # Generate a simple answer
-    if relevant_nodes:
-        node_labels = [graph_store.graph.nodes[node_id]["label"] for node_id in relevant_nodes[:3]]
-        answer = f"Based on the knowledge graph, I found information about: {', '.join(node_labels)}"
+    if evidence["nodes"]:
+        answer = f"Based on the knowledge graph, I found information about: {', '.join(evidence['labels'][:3])}"
     else:
         answer = "I couldn't find specific information to answer your question."
     
     return {
         "answer": answer,
-        "cited_nodes": relevant_nodes,
-        "cited_edges": relevant_edges
+        "cited_nodes": evidence["nodes"],
+        "cited_edges": evidence["edges"]
     }
@@ -0,0 +1,300 @@
+"""
+Main-content extraction from HTML without building a DOM.
+
+The page goes through html.parser's event-driven tokenizer once. Text is
+collected into blocks at block-level tags (paragraphs, headings, list
+items, table cells...), and each block remembers how much of its text sat
+inside links and whether it came from navigation-like markup (<nav>,
+<footer>, <aside>, or class/id names such as "cookie" or "sidebar").
+Blocks are then classified with shallow text features, in the spirit of
+Boilerpipe:
+
+    link density   menus, breadcrumbs and "related" lists are mostly links
+    text length    content paragraphs are long, chrome is short
+    context        shorter text next to content is content, and a
+                   heading is kept when the block after it is
+
+The kept blocks come back as paragraphs, so chunking can split between
+them instead of mid-sentence. The same pass collects the page's links, its
+<base href> and its robots <meta> for the crawler (see api/crawler.py).
+"""
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+from .readers import TextChunker
+
+# Content inside these is never text
+SKIP_TAGS = frozenset(("script", "style", "noscript", "template", "svg", "math", "iframe", "object",
+                       "canvas", "select", "button", "textarea"))
+# Elements that end the current text block
+BLOCK_TAGS = frozenset((
+    "address", "article", "aside", "blockquote", "body", "br", "caption", "dd", "details", "dialog", "div",
+    "dl", "dt", "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6",
+    "header", "hr", "li", "main", "nav", "ol", "p", "pre", "section", "summary", "table", "td", "th", "tr", "ul",
+))
+HEADING_TAGS = frozenset(("h1", "h2", "h3", "h4", "h5", "h6"))
+# Elements whose text is page chrome, wherever they appear
+BOILERPLATE_TAGS = frozenset(("nav", "footer", "aside", "form", "dialog"))
+# Elements that mark the main content when a page has them
+CONTENT_TAGS = frozenset(("article", "main"))
+# class/id fragments of navigation, banners and widgets
+BOILERPLATE_HINT = re.compile(
+    r"(?:^|[\s_-])(?:nav|navbar|menu|footer|masthead|sidebar|side-bar|breadcrumbs?|cookies?|consent|gdpr|banner|"
+    r"popup|modal|newsletter|subscribe|share|sharing|social|related|recommended|promo|advert|ads?|sponsor|"
+    r"comments?|pagination|pager|toolbar|skip)(?:$|[\s_-])", re.I)
+# Tags the link collector looks at
+LINK_TAGS = frozenset(("a", "area", "base", "meta"))
+VOID_TAGS = frozenset(("area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param",
+                       "source", "track", "wbr"))
+CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", re.I)
+
+# Classification thresholds
+MAX_LINK_DENSITY = 0.33
+MIN_CONTENT_WORDS = 10  # a block this long is content on its own
+MIN_CONTEXT_WORDS = 3  # shorter blocks are only kept between two content blocks
+
+
+class Block:
+    __slots__ = ("text", "words", "link_chars", "heading", "boilerplate", "in_content")
+
+    def __init__(self, text: str, link_chars: int, heading: bool, boilerplate: bool, in_content: bool):
+        self.text = text
+        self.words = text.count(" ") + 1
+        self.link_chars = link_chars
+        self.heading = heading
+        self.boilerplate = boilerplate
+        self.in_content = in_content
+
+    @property
+    def link_density(self) -> float:
+        return self.link_chars / len(self.text)
+
+
+# Flags of open elements
+LINK, HEADING, CONTENT, BOILERPLATE = 1, 2, 4, 8
+
+
+class BlockParser(HTMLParser):
+    """Tokenizer callbacks that turn a page into a flat list of text Blocks."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[Block] = []
+        self.title = ""
+        self.links: List[str] = []  # <a href> values, except rel="nofollow"
+        self.base_href: Optional[str] = None
+        self.robots = ""  # content of <meta name="robots">, lowercased
+        self._parts: List[str] = []
+        self._link_chars = 0
+        self._skip = 0  # depth inside SKIP_TAGS
+        self._in_title = False
+        # Open elements and their flags; an end tag closes everything opened after
+        # its element, so unclosed <li>/<p> tags cannot leak flags to the rest of the page
+        self._stack: List[Tuple[str, int]] = []
+        self._counts = {LINK: 0, HEADING: 0, CONTENT: 0, BOILERPLATE: 0}
+
+    def _flush(self):
+        if not self._parts:
+            return
+        text = " ".join("".join(self._parts).split())
+        if text:
+            counts = self._counts
+            self.blocks.append(Block(text, min(self._link_chars, len(text)), counts[HEADING] > 0,
+                                     counts[BOILERPLATE] > 0, counts[CONTENT] > 0))
+        self._parts = []
+        self._link_chars = 0
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        if tag in SKIP_TAGS:
+            if tag not in VOID_TAGS:
+                self._skip += 1
+            return
+        if tag == "title":
+            self._in_title = True
+            return
+        if self._skip:
+            return
+        if tag in LINK_TAGS:
+            self._collect_link(tag, dict(attrs))
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in VOID_TAGS:
+            return
+        flags = 0
+        if tag == "a":
+            flags |= LINK
+        elif tag in HEADING_TAGS:
+            flags |= HEADING
+        elif tag in CONTENT_TAGS:
+            flags |= CONTENT
+        if tag in BOILERPLATE_TAGS or (attrs and self._has_hint(attrs)):
+            flags |= BOILERPLATE
+        if flags & BOILERPLATE and tag not in BLOCK_TAGS:
+            self._flush()
+        for flag in (LINK, HEADING, CONTENT, BOILERPLATE):
+            if flags & flag:
+                self._counts[flag] += 1
+        self._stack.append((tag, flags))
+
+    def _collect_link(self, tag: str, attrs: Dict[str, Optional[str]]):
+        if tag == "meta":
+            if (attrs.get("name") or "").lower() == "robots":
+                self.robots = (attrs.get("content") or "").lower()
+        elif tag == "base":
+            if self.base_href is None and attrs.get("href"):
+                self.base_href = attrs["href"]
+        elif attrs.get("href") and "nofollow" not in (attrs.get("rel") or "").lower():
+            self.links.append(attrs["href"])
+
+    @staticmethod
+    def _has_hint(attrs: List[Tuple[str, Optional[str]]]) -> bool:
+        for name, value in attrs:
+            if name == "role" and value in ("navigation", "banner", "contentinfo", "complementary", "dialog"):
+                return True
+            if value and name in ("class", "id") and BOILERPLATE_HINT.search(value):
+                return True
+            if (name == "hidden" or name == "aria-hidden") and value != "false":
+                return True
+        return False
+
+    def handle_endtag(self, tag: str):
+        if tag in SKIP_TAGS:
+            if self._skip:
+                self._skip -= 1
+            return
+        if tag == "title":
+            self._in_title = False
+            return
+        if self._skip:
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        stack = self._stack
+        for depth in range(len(stack) - 1, -1, -1):
+            if stack[depth][0] == tag:
+                break
+        else:
+            return  # stray end tag
+        if any(flags & BOILERPLATE for _, flags in stack[depth:]) and tag not in BLOCK_TAGS:
+            self._flush()
+        for _, flags in stack[depth:]:
+            for flag in (LINK, HEADING, CONTENT, BOILERPLATE):
+                if flags & flag:
+                    self._counts[flag] -= 1
+        del stack[depth:]
+
+    def handle_data(self, data: str):
+        if self._in_title:
+            self.title += data
+            return
+        if self._skip:
+            return
+        self._parts.append(data)
+        if self._counts[LINK]:
+            self._link_chars += len(data.strip())
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def classify(blocks: List[Block]) -> List[bool]:
+    """Which blocks are main content."""
+    has_content_tag = any(b.in_content for b in blocks)
+
+    def candidate(b: Block) -> bool:
+        if b.boilerplate or b.link_density > MAX_LINK_DENSITY:
+            return False
+        return not has_content_tag or b.in_content
+
+    keep = [candidate(b) and b.words >= MIN_CONTENT_WORDS for b in blocks]
+    context = [candidate(b) and not b.heading for b in blocks]
+    # Runs of shorter text attached to content, and anything in <article>/<main>
+    for i, b in enumerate(blocks):
+        if not keep[i] and context[i] and b.words >= MIN_CONTEXT_WORDS and (b.in_content or (i and keep[i - 1])):
+            keep[i] = True
+    for i in range(len(blocks) - 2, -1, -1):
+        if not keep[i] and context[i] and blocks[i].words >= MIN_CONTEXT_WORDS and keep[i + 1]:
+            keep[i] = True
+    # Any block between two content blocks
+    for i in range(1, len(blocks) - 1):
+        if not keep[i] and context[i] and keep[i - 1] and keep[i + 1]:
+            keep[i] = True
+    # Headings that introduce content
+    for i in range(len(blocks) - 2, -1, -1):
+        if blocks[i].heading and not keep[i] and keep[i + 1] and candidate(blocks[i]):
+            keep[i] = True
+    return keep
+
+
+def decode_html(content: bytes) -> str:
+    """Decode a page: UTF-8, else the charset its <meta> declares, else Windows-1252."""
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+    match = CHARSET.search(content[:4096])
+    if match:
+        try:
+            return content.decode(codecs.lookup(match.group(1).decode("ascii")).name, errors="replace")
+        except LookupError:
+            pass
+    return content.decode("cp1252", errors="replace")
+
+
+def extract_paragraphs(html: str) -> List[str]:
+    """Main-content paragraphs of a page, in document order."""
+    return paragraphs_of(parse_blocks(html))
+
+
+def parse_blocks(html: str) -> BlockParser:
+    """Tokenize a page once; the parser holds its blocks, links and robots directives."""
+    parser = BlockParser()
+    parser.feed(html)
+    parser.close()
+    return parser
+
+
+def paragraphs_of(parser: BlockParser) -> List[str]:
+    """Main-content paragraphs of a parsed page, in document order."""
+    blocks = parser.blocks
+    keep = classify(blocks)
+    paragraphs = [b.text for b, k in zip(blocks, keep) if k]
+    if not paragraphs:
+        # Nothing looks like an article (e.g. a page of short lines): keep all non-chrome text
+        paragraphs = [b.text for b in blocks if not b.boilerplate and b.link_density <= MAX_LINK_DENSITY]
+    return paragraphs
+
+
+def chunk_paragraphs(paragraphs: List[str], target: int = 1800, overlap: int = 200) -> List[str]:
+    """
+    Pack paragraphs into chunks of at most target characters, joined by
+    blank lines. A chunk repeats the last paragraph of the previous one
+    when it fits in overlap characters. Paragraphs longer than target are
+    split like chunk_text.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for paragraph in paragraphs:
+        if len(paragraph) > target:
+            if current:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            chunker = TextChunker(target, overlap)
+            chunks += chunker.feed(paragraph) + chunker.finish()
+            continue
+        if current and size + 2 + len(paragraph) > target:
+            chunks.append("\n\n".join(current))
+            tail = current[-1]
+            if len(tail) <= overlap and len(tail) + 2 + len(paragraph) <= target:
+                current, size = [tail], len(tail)
+            else:
+                current, size = [], 0
+        size += len(paragraph) + (2 if current else 0)
+        current.append(paragraph)
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
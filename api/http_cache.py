@@ -0,0 +1,198 @@
+"""
+Conditional, compressed responses for graph reads.
+
+A graph response is a function of the graph version, so its ETag is
+derived from the version (and the request variant and content coding)
+instead of hashing the body. A poll with a matching If-None-Match gets
+304 Not Modified without touching the graph. Otherwise the body is
+serialized once per version and kept, together with its gzip (and, with
+the optional `brotli` package, br) encodings, so clients polling the same
+version share one serialization and one compression.
+
+ETags also carry an epoch: the identity of the data directory for a
+persistent graph, whose versions every worker process shares, or a
+random token for an in-memory one, whose versions restart at 0.
+"""
+import gzip
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.responses import Response
+
+from .metrics import stage
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def graph_epoch(store) -> str:
+    """Token that changes whenever the same version number could mean a different graph."""
+    persistence = getattr(store, "persistence", None)
+    if persistence is not None:
+        st = os.stat(persistence.data_dir)
+        return blake2b(f"{st.st_dev}:{st.st_ino}".encode("ascii"), digest_size=6).hexdigest()
+    return uuid.uuid4().hex[:12]
+
+
+def accepted_encodings(header: Optional[str]) -> Dict[str, float]:
+    """Content codings of an Accept-Encoding header and their q-values."""
+    encodings: Dict[str, float] = {}
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        encodings[name.strip().lower()] = q
+    return encodings
+
+
+def choose_encoding(header: Optional[str]) -> str:
+    """Best coding this server offers for an Accept-Encoding header: br, gzip or identity."""
+    accepted = accepted_encodings(header)
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = "identity", 0.0
+    for encoding in offered:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for it)."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+class CachedBody:
+    """One serialized response and the encodings produced for it so far."""
+
+    __slots__ = ("version", "bodies")
+
+    def __init__(self, version: int, body: bytes):
+        self.version = version
+        self.bodies = {"identity": body}
+
+    def encoded(self, encoding: str) -> bytes:
+        body = self.bodies.get(encoding)
+        if body is None:
+            identity = self.bodies["identity"]
+            if encoding == "br":
+                body = brotli.compress(identity, quality=BROTLI_QUALITY)
+            else:
+                body = gzip.compress(identity, compresslevel=GZIP_LEVEL, mtime=0)
+            self.bodies[encoding] = body
+        return body
+
+    @property
+    def size(self) -> int:
+        return sum(len(body) for body in self.bodies.values())
+
+
+class GraphResponseCache:
+    """
+    Version-keyed cache of serialized graph responses.
+
+    respond(key, build, ...) serves the response named key (e.g. "graph" or
+    "since:42"): 304 if the client's ETag is current, else the cached body
+    for the current version, else build()'s DTO serialized and cached. The
+    DTO must carry the "version" it was built at. At most max_entries
+    responses are kept, least recently used first out.
+    """
+
+    def __init__(self, store, max_entries: int = 16):
+        self.store = store
+        self.max_entries = max_entries
+        self.epoch = graph_epoch(store)
+        self._entries: "OrderedDict[str, CachedBody]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def etag(self, key: str, version: int, encoding: str) -> str:
+        return f'"{self.epoch}-{version}-{key}-{encoding}"'
+
+    def respond(self, key: str, build: Callable[[], Dict[str, Any]], if_none_match: Optional[str] = None,
+                accept_encoding: Optional[str] = None) -> Response:
+        encoding = choose_encoding(accept_encoding)
+        version = self.store.version
+        if etag_matches(if_none_match, self.etag(key, version, encoding)):
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=self._headers(key, version, encoding))
+
+        entry = self._get(key, version)
+        if entry is None:
+            with self._build_lock:
+                # Another request may have built it while this one waited
+                entry = self._get(key, self.store.version)
+                if entry is None:
+                    with stage("serialize"):
+                        dto = build()
+                        entry = CachedBody(dto["version"], json.dumps(
+                            dto, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8"))
+                    self._put(key, entry)
+                    with self._lock:
+                        self.misses += 1
+        if len(entry.bodies["identity"]) < MIN_COMPRESS_BYTES:
+            encoding = "identity"
+        if encoding not in entry.bodies:
+            with self._build_lock, stage("compress"):
+                body = entry.encoded(encoding)
+        else:
+            body = entry.bodies[encoding]
+        headers = self._headers(key, entry.version, encoding)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type="application/json", headers=headers)
+
+    def _headers(self, key: str, version: int, encoding: str) -> Dict[str, str]:
+        # no-cache: clients and proxies may store the body but must revalidate it on every poll
+        return {"ETag": self.etag(key, version, encoding), "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    def _get(self, key: str, version: int) -> Optional[CachedBody]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _put(self, key: str, entry: CachedBody):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries: List[Tuple[str, CachedBody]] = list(self._entries.items())
+            return {"entries": len(entries), "bytes": sum(entry.size for _, entry in entries),
+                    "hits": self.hits, "misses": self.misses, "not_modified": self.not_modified,
+                    "brotli": brotli is not None}
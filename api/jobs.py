@@ -0,0 +1,342 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Union
+
+from .crawler import Crawler, CrawlScope
+from .metrics import JOBS, start_trace
+from .pipeline import IngestPipeline, IngestReport
+from .readers import aiter_chunks, aiter_file
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity; callers should retry later."""
+
+
+class Job:
+    """One queued ingestion request and its live progress."""
+
+    def __init__(self, kind: str, name: str, payload: Any, version: int, replace: bool = False):
+        self.id = uuid.uuid4().hex
+        self.kind = kind  # "urls", "chunks", "file" or "crawl"
+        self.name = name
+        self.payload = payload
+        self.replace = replace  # re-ingest: retract what the documents asserted before and no longer do
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.start_version = version
+        self.report = IngestReport()
+        self.error: Optional[str] = None
+        self.board: Optional["JobBoard"] = None  # set when other worker processes follow this job
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def notify(self):
+        """Wake every subscriber; each one reads the current state when it runs."""
+        if self.board is not None:
+            self.board.put(self.to_dict())
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_changed(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.kind == "urls":
+            total = len(self.payload)
+        elif self.kind == "crawl":
+            total = self.payload["max_pages"]  # an upper bound; the frontier is not known in advance
+        else:
+            total = 1
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "name": self.name,
+            "replace": self.replace,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "documents_total": total,
+            "start_version": self.start_version,
+            "error": self.error,
+            **self.report.to_dict(),
+        }
+
+
+class JobBoard:
+    """
+    Job states shared by the worker processes of one deployment, in SQLite.
+
+    The worker that accepted a job publishes its state on every change, so
+    status and event requests for it can be answered by any worker. Rows
+    of finished jobs beyond `max_finished` are pruned by their owners.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, state TEXT NOT NULL, finished INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def put(self, state: Dict[str, Any]):
+        payload = json.dumps(state, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?)",
+                               (state["id"], payload, int(state["status"] in ("done", "failed")), time.time()))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def prune(self, max_finished: int):
+        """Forget all but the `max_finished` most recently finished jobs."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE finished = 1 AND id NOT IN "
+                "(SELECT id FROM jobs WHERE finished = 1 ORDER BY updated_at DESC LIMIT ?)", (max_finished,))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class RemoteJob:
+    """
+    A job accepted by another worker process, followed through the JobBoard.
+    It offers what status and event requests read from a Job; changes are
+    picked up by polling the board every `poll` seconds.
+    """
+
+    def __init__(self, board: JobBoard, state: Dict[str, Any], poll: float = 0.25):
+        self.board = board
+        self.state = state
+        self.poll = poll
+        self.id = state["id"]
+        self.start_version = state["start_version"]
+
+    @property
+    def finished(self) -> bool:
+        return self.state["status"] in ("done", "failed")
+
+    async def wait_changed(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            await asyncio.sleep(max(0.0, min(self.poll, deadline - time.monotonic())))
+            state = self.board.get(self.id)
+            if state is not None and state != self.state:
+                self.state = state
+                return True
+            if time.monotonic() >= deadline:
+                return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.state
+
+
+class JobManager:
+    """
+    Runs ingestion jobs on a fixed number of background workers.
+
+    Jobs wait in a bounded queue; submit() raises QueueFullError instead of
+    growing it, so clients see backpressure as a retryable error. Progress is
+    published per chunk through Job.notify(), and events() turns it into a
+    Server-Sent Events stream of progress and graph deltas.
+
+    With a JobBoard, jobs are also published there, and get() finds the jobs
+    of every worker process sharing the board, so requests about a job need
+    not reach the process running it.
+    """
+
+    def __init__(self, pipeline: IngestPipeline, store, workers: int = 2, max_queue: int = 100,
+                 max_finished: int = 1000, crawler: Optional[Crawler] = None, board: Optional[JobBoard] = None):
+        self.pipeline = pipeline
+        self.store = store
+        self.crawler = crawler
+        self.workers = workers
+        self.max_finished = max_finished
+        self.board = board
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=max_queue)
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        for i in range(self.workers):
+            self._tasks.append(asyncio.ensure_future(self._worker(i)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.board is not None:
+            # Other workers would otherwise report these as queued or running forever
+            for job in self.jobs.values():
+                if not job.finished:
+                    job.status, job.error, job.finished_at = "failed", "worker stopped", time.time()
+                    job.notify()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit_urls(self, urls: Sequence[str], replace: bool = False) -> Job:
+        return self._submit(Job("urls", f"{len(urls)} urls", list(urls), self.store.version, replace))
+
+    def submit_chunks(self, name: str, chunks: Sequence[str], replace: bool = False) -> Job:
+        return self._submit(Job("chunks", name, list(chunks), self.store.version, replace))
+
+    def submit_file(self, name: str, f, reader, replace: bool = False) -> Job:
+        """Queue a file streamed through reader (see readers.py); the job closes f when done."""
+        return self._submit(Job("file", name, (f, reader), self.store.version, replace))
+
+    def submit_crawl(self, scope: CrawlScope, max_depth: int = 2, max_pages: int = 100, sitemaps: bool = True,
+                     replace: bool = True) -> Job:
+        """Queue a site crawl (see crawler.Crawler.crawl)."""
+        if self.crawler is None:
+            raise RuntimeError("JobManager has no crawler")
+        payload = {"scope": scope, "max_depth": max_depth, "max_pages": max_pages, "sitemaps": sitemaps}
+        return self._submit(Job("crawl", f"crawl of {len(scope.seeds)} seeds", payload, self.store.version, replace))
+
+    def check_capacity(self):
+        """Raise QueueFullError now rather than after the caller has prepared a large job."""
+        if self._queue.full():
+            raise QueueFullError(f"Ingestion queue is full ({self._queue.maxsize} jobs)")
+
+    def _submit(self, job: Job) -> Job:
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Ingestion queue is full ({self._queue.maxsize} jobs)")
+        self.jobs[job.id] = job
+        if self.board is not None:
+            job.board = self.board
+            self.board.put(job.to_dict())
+        self._evict_finished()
+        return job
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+        if self.board is not None:
+            self.board.prune(self.max_finished)
+
+    def get(self, job_id: str) -> Optional[Union[Job, RemoteJob]]:
+        """A job of this process, or with a board one published by another process."""
+        job = self.jobs.get(job_id)
+        if job is not None or self.board is None:
+            return job
+        state = self.board.get(job_id)
+        return None if state is None else RemoteJob(self.board, state)
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        traced = start_trace()
+        job.status = "running"
+        job.started_at = time.time()
+        job.notify()
+
+        def on_chunk(report: IngestReport, source_id: str):
+            job.report = report
+            job.notify()
+
+        try:
+            if job.kind == "urls":
+                job.report = await self.pipeline.ingest_urls(job.payload, on_chunk=on_chunk, replace=job.replace)
+            elif job.kind == "crawl":
+                job.report = await self.crawler.crawl(**job.payload, replace=job.replace, on_chunk=on_chunk)
+            elif job.kind == "file":
+                f, reader = job.payload
+                chunks = aiter_chunks(aiter_file(f), reader)
+                job.report = await self.pipeline.ingest_stream(job.name, chunks, on_chunk=on_chunk, replace=job.replace)
+            else:
+                job.report = await self.pipeline.ingest_chunks(job.name, job.payload, on_chunk=on_chunk,
+                                                               replace=job.replace)
+            job.status = "done"
+        except Exception as e:
+            logger.exception(f"ERROR ingestion job {job.id}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            if job.kind == "chunks":
+                job.payload = []  # release the chunk text
+            elif job.kind == "file":
+                job.payload[0].close()
+            job.finished_at = time.time()
+            JOBS.inc(1, job.kind, job.status)
+            if traced:
+                logger.info(f"TRACE job {job.id}: {job.to_dict()}")
+            job.notify()
+
+    async def events(self, job: Union[Job, RemoteJob], since: Optional[int] = None, keepalive: float = 15.0) -> AsyncIterator[str]:
+        """
+        Yield SSE messages for a job until it finishes.
+
+        Each wake-up sends a "progress" event with the job state and, if the
+        graph moved, a "delta" event with the nodes and edges changed since
+        the last one this subscriber saw. Updates that arrive while the
+        client is slow are coalesced into the next delta.
+        """
+        version = job.start_version if since is None else since
+        while True:
+            finished = job.finished
+            yield sse("progress", job.to_dict())
+            if self.store.version != version:
+                delta = self.store.to_dto_since(version)
+                version = delta["version"]
+                yield sse("delta", delta)
+            if finished:
+                yield sse("done", job.to_dict())
+                return
+            while not await job.wait_changed(keepalive):
+                yield ": keepalive\n\n"
+
+
+def sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def create_job_board() -> Optional[JobBoard]:
+    """
+    The JobBoard at JOB_BOARD_PATH, by default jobs.sqlite3 in GRAPH_DATA_DIR
+    when several workers share the graph (GRAPH_SHARED=1); None otherwise.
+    """
+    data_dir = os.getenv("GRAPH_DATA_DIR", "")
+    shared = data_dir and os.getenv("GRAPH_SHARED", "0") == "1"
+    path = os.getenv("JOB_BOARD_PATH", os.path.join(data_dir, "jobs.sqlite3") if shared else "")
+    return JobBoard(path) if path else None
@@ -0,0 +1,232 @@
+import heapq
+import threading
+from array import array
+from itertools import islice
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+
+def trigrams(s: str) -> Set[str]:
+    """All distinct 3-character substrings of s."""
+    return {s[i:i+3] for i in range(len(s) - 2)}
+
+
+class LabelIndex:
+    """
+    Incremental trigram index answering case-insensitive substring queries.
+
+    A keyword of three or more characters can only occur in a label that
+    contains all of its trigrams, so candidates come from intersecting the
+    smallest posting sets and are then verified with a plain substring test.
+    Shorter keywords are resolved against the trigram vocabulary, which is
+    bounded by the alphabet rather than by the number of labels.
+
+    Labels added with add_many are searchable by rank and label at once, but
+    their trigrams are only posted when a query (or a removal) first needs
+    them, so a bulk import does not pay for search structures batch by batch.
+    """
+
+    def __init__(self):
+        self._labels: Dict[Hashable, str] = {}  # item -> lowercased label
+        self._rank: Dict[Hashable, int] = {}  # item -> insertion order
+        self._postings: Dict[str, Set[Hashable]] = {}  # trigram -> items
+        self._short: Dict[str, Set[Hashable]] = {}  # labels under 3 chars -> items
+        self._next_rank = 0
+        self._pending: List[Tuple[Sequence[Hashable], List[str]]] = []  # add_many batches not posted yet
+        # Readers may post pending batches concurrently under the store's read lock
+        self._pending_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._labels
+
+    def add(self, item: Hashable, label: str):
+        """Index item under label, replacing any label it had before."""
+        if item in self._labels:
+            self.remove(item)
+        label = label.lower()
+        self._labels[item] = label
+        self._rank[item] = self._next_rank
+        self._next_rank += 1
+        if len(label) < 3:
+            self._short.setdefault(label, set()).add(item)
+            return
+        for gram in trigrams(label):
+            self._postings.setdefault(gram, set()).add(item)
+
+    def add_many(self, items: Sequence[Hashable], labels: Sequence[str]):
+        """add for many items that are not indexed yet; their trigrams are posted on first use."""
+        lowered = list(map(str.lower, labels))
+        self._labels.update(zip(items, lowered))
+        self._rank.update(zip(items, range(self._next_rank, self._next_rank + len(lowered))))
+        self._next_rank += len(lowered)
+        self._pending.append((items, lowered))
+
+    def _post_pending(self):
+        if not self._pending:
+            return
+        with self._pending_lock:
+            if not self._pending:
+                return
+            # Cleared only once posted, so a concurrent reader never searches a partial index
+            self._post([item for items, _ in self._pending for item in items],
+                       [label for _, labels in self._pending for label in labels])
+            self._pending = []
+
+    def _post(self, items: Sequence[Hashable], lowered: List[str]):
+        """
+        Post the trigrams of many new labels. They are packed into integers
+        (three 21-bit code points) and sorted together with numpy, so each
+        distinct trigram updates its posting set once instead of once per label.
+        """
+        lengths = np.fromiter(map(len, lowered), dtype=np.int64, count=len(lowered))
+        for i in np.flatnonzero(lengths < 3).tolist():
+            self._short.setdefault(lowered[i], set()).add(items[i])
+        try:
+            text = "\x00".join(lowered).encode("utf-32-le")
+        except UnicodeEncodeError:
+            # Lone surrogates cannot be packed; index these labels one by one
+            for item, label in zip(items, lowered):
+                if len(label) >= 3:
+                    for gram in trigrams(label):
+                        self._postings.setdefault(gram, set()).add(item)
+            return
+        codes = np.frombuffer(text, dtype=np.uint32).astype(np.int64)
+        if len(codes) < 3:
+            return
+        # Label i occupies [starts[i], starts[i] + lengths[i]), followed by one separator
+        starts = np.cumsum(lengths + 1) - lengths - 1
+        owner = np.repeat(np.arange(len(lowered)), lengths + 1)[:len(codes) - 2]
+        windows = np.arange(len(codes) - 2)
+        inside = windows + 3 <= starts[owner] + lengths[owner]
+        owner, windows = owner[inside], windows[inside]
+        grams = (codes[windows] << 42) | (codes[windows + 1] << 21) | codes[windows + 2]
+        order = np.lexsort((owner, grams))
+        grams, owner = grams[order], owner[order]
+        distinct = np.ones(len(grams), dtype=bool)
+        distinct[1:] = (grams[1:] != grams[:-1]) | (owner[1:] != owner[:-1])
+        grams, owner = grams[distinct], owner[distinct]
+        items_column = np.empty(len(lowered), dtype=object)
+        items_column[:] = list(items)
+        bounds = (np.flatnonzero(np.diff(grams)) + 1).tolist()
+        postings = self._postings
+        for start, end in zip([0, *bounds], [*bounds, len(grams)]) if len(grams) else ():
+            code = int(grams[start])
+            gram = chr(code >> 42) + chr((code >> 21) & 0x1FFFFF) + chr(code & 0x1FFFFF)
+            members = items_column[owner[start:end]].tolist()
+            bucket = postings.get(gram)
+            if bucket is None:
+                postings[gram] = set(members)
+            else:
+                bucket.update(members)
+
+    def remove(self, item: Hashable):
+        if item not in self._labels:
+            return
+        self._post_pending()
+        label = self._labels.pop(item)
+        del self._rank[item]
+        if len(label) < 3:
+            bucket = self._short[label]
+            bucket.discard(item)
+            if not bucket:
+                del self._short[label]
+            return
+        for gram in trigrams(label):
+            bucket = self._postings[gram]
+            bucket.discard(item)
+            if not bucket:
+                del self._postings[gram]
+
+    def label(self, item: Hashable) -> str:
+        return self._labels[item]
+
+    def search(self, keyword: str, limit: Optional[int] = None) -> Set[Hashable]:
+        """
+        Items whose label contains keyword (case-insensitive). With a limit,
+        stops after that many matches, which are then an arbitrary subset.
+        """
+        keyword = keyword.lower()
+        if not keyword:
+            return set(islice(self._labels, limit))
+        self._post_pending()
+
+        if len(keyword) < 3:
+            matches: Set[Hashable] = set()
+            for gram, items in self._postings.items():
+                if keyword in gram:
+                    matches |= items
+                    if limit is not None and len(matches) >= limit:
+                        return set(islice(matches, limit))
+            for label, items in self._short.items():
+                if keyword in label:
+                    matches |= items
+            return matches if limit is None else set(islice(matches, limit))
+
+        buckets = []
+        for gram in trigrams(keyword):
+            bucket = self._postings.get(gram)
+            if not bucket:
+                return set()
+            buckets.append(bucket)
+        buckets.sort(key=len)
+        candidates = buckets[0]
+        labels = self._labels
+        if limit is not None:
+            # Verify lazily instead of intersecting sets that may be far larger than limit
+            return set(islice((item for item in candidates if keyword in labels[item]), limit))
+        for bucket in buckets[1:]:
+            if len(candidates) <= 64:
+                break
+            candidates = candidates & bucket
+        return {item for item in candidates if keyword in labels[item]}
+
+    def search_any(self, keywords: Iterable[str]) -> Set[Hashable]:
+        """Items whose label contains at least one of the keywords."""
+        matches: Set[Hashable] = set()
+        for keyword in keywords:
+            matches |= self.search(keyword)
+        return matches
+
+    def ordered(self, items: Iterable[Hashable]) -> List[Hashable]:
+        """Sort items by the order they were first indexed."""
+        return sorted(items, key=self._rank.__getitem__)
+
+    def ordered_after(self, items: Iterable[Hashable], after: int, limit: int) -> List[Tuple[int, Hashable]]:
+        """(rank, item) of the first `limit` items indexed after rank `after`, without sorting them all."""
+        rank = self._rank
+        return heapq.nsmallest(limit, ((rank[item], item) for item in items if rank[item] > after))
+
+    def export_postings(self, position: Dict[Hashable, int]) -> Tuple[List[str], array, array]:
+        """
+        Flatten the postings for a snapshot as (grams, offsets, positions).
+
+        Items are written as their position in the caller's item order; labels
+        shorter than three characters are stored as grams prefixed with NUL.
+        """
+        self._post_pending()
+        grams: List[str] = []
+        offsets = array("q", [0])
+        positions = array("i")
+        for prefix, table in (("", self._postings), ("\0", self._short)):
+            for gram, items in table.items():
+                grams.append(prefix + gram)
+                positions.extend(position[item] for item in items)
+                offsets.append(len(positions))
+        return grams, offsets, positions
+
+    def load_postings(self, items: Sequence[Hashable], labels: Sequence[str],
+                      grams: List[str], offsets: array, positions: array):
+        """Rebuild an empty index from export_postings output; items/labels are in rank order."""
+        self._labels = {item: label.lower() for item, label in zip(items, labels)}
+        self._rank = dict(zip(items, range(len(items))))
+        self._next_rank = len(items)
+        for i, gram in enumerate(grams):
+            bucket = {items[p] for p in positions[offsets[i]:offsets[i + 1]]}
+            if gram.startswith("\0"):
+                self._short[gram[1:]] = bucket
+            else:
+                self._postings[gram] = bucket
@@ -0,0 +1,535 @@
+"""
+Server-side graph layout with level-of-detail clustering.
+
+Positions come from a force-directed (Fruchterman-Reingold) layout
+vectorized with NumPy. Repulsion between all pairs of nodes is
+approximated the way particle-mesh simulations do it instead of with a
+Barnes-Hut tree: node counts are binned onto a grid and convolved with
+the 1/r force kernel by FFT, and nodes close to each other along a
+Z-order curve repel each other exactly, in blocks. One iteration costs
+O(N + E + G² log G).
+
+Layouts are computed once per graph version and updated incrementally:
+nodes seen before keep their positions and only drift, and new nodes
+start next to their placed neighbours. Community labels are warm-started
+the same way, so clusters stay put while triples arrive. A graph that is
+mostly new is laid out from scratch, multilevel: the graph of its
+communities first, then the nodes starting from their community's place.
+
+On top of the nodes sit coarser levels of clusters: communities found by
+label propagation, then communities of communities, with clusters merged
+spatially where the graph has no more structure to follow (e.g. many
+small components). A view of a viewport at a zoom level returns only the
+nodes or clusters inside it and the edges between them, so a client
+never holds the whole graph.
+"""
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .metrics import stage
+
+# Ideal edge length, in layout units (pixels at zoom 1)
+EDGE_LENGTH = 80.0
+FULL_ITERATIONS = 150
+INCREMENTAL_ITERATIONS = 20
+# Larger graphs start from a layout of their communities, refined in this many iterations
+MULTILEVEL_NODES = 1000
+REFINE_ITERATIONS = 30
+# How far nodes placed by an earlier version move compared to new ones
+SETTLED_MOBILITY = 0.2
+# Pull towards the centre that keeps disconnected components together
+GRAVITY = 1.0
+# Grid cells per side for the far-field repulsion (power of two)
+MAX_GRID = 256
+# Nodes per block for the exact repulsion within grid cells
+BLOCK = 32
+
+# Coarsening stops at this many clusters, or after MAX_LEVELS levels
+TOP_CLUSTERS = 32
+MAX_LEVELS = 8
+# A level must have at most this share of the clusters of the one below it
+COARSENING = 0.75
+LABEL_PROPAGATION_ROUNDS = 12
+# Zoom at and above which single nodes are shown; each halving shows one level coarser
+DETAIL_ZOOM = 0.5
+
+_kernels: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _kernel(g: int) -> Tuple[np.ndarray, np.ndarray]:
+    """FFTs of the unit repulsion kernel o/|o|² over cell offsets o, laid out for a linear 2g x 2g convolution."""
+    kernel = _kernels.get(g)
+    if kernel is None:
+        offsets = np.fft.fftfreq(2 * g, 1.0 / (2 * g))  # 0, 1, .., g-1, -g, .., -1
+        ox, oy = np.meshgrid(offsets, offsets, indexing="ij")
+        r2 = ox * ox + oy * oy
+        r2[0, 0] = 1.0
+        kx, ky = ox / r2, oy / r2
+        kx[0, 0] = ky[0, 0] = 0.0
+        kernel = _kernels[g] = (np.fft.rfft2(kx), np.fft.rfft2(ky))
+    return kernel
+
+
+def repulsion(pos: np.ndarray, k: float) -> np.ndarray:
+    """Approximate Fruchterman-Reingold repulsion k²/d on every node from every other."""
+    n = len(pos)
+    force = np.zeros_like(pos)
+    if n < 2:
+        return force
+    lo = pos.min(axis=0)
+    span = float((pos.max(axis=0) - lo).max()) or k
+    g = int(min(MAX_GRID, max(8, 2 ** math.ceil(math.log2(math.sqrt(n))))))
+    h = span / g * (1 + 1e-9)
+    cells = np.minimum(((pos - lo) / h).astype(np.int64), g - 1)
+    flat = cells[:, 0] * g + cells[:, 1]
+
+    # Far field: every pair of cells, as if each cell's nodes sat together
+    density = np.bincount(flat, minlength=g * g).reshape(g, g).astype(np.float64)
+    spectrum = np.fft.rfft2(density, s=(2 * g, 2 * g))
+    kx, ky = _kernel(g)
+    scale = k * k / h
+    fx = np.fft.irfft2(spectrum * kx, s=(2 * g, 2 * g))[:g, :g]
+    fy = np.fft.irfft2(spectrum * ky, s=(2 * g, 2 * g))[:g, :g]
+    force[:, 0] = fx[cells[:, 0], cells[:, 1]] * scale
+    force[:, 1] = fy[cells[:, 0], cells[:, 1]] * scale
+
+    # Near field: in blocks of nodes sorted along a Z-order curve (so each block is a
+    # compact patch), replace the grid's approximation with the exact force for every pair
+    order = np.lexsort((flat, _morton(cells)))
+    padded = -(-n // BLOCK) * BLOCK
+    index = np.full(padded, -1, dtype=np.int64)
+    index[:n] = order
+    blocks = index.reshape(-1, BLOCK)
+    floor = 1e-4 * k * k
+    x, y = pos[:, 0], pos[:, 1]
+    cx, cy = cells[:, 0].astype(np.float64), cells[:, 1].astype(np.float64)
+    others = ~np.eye(BLOCK, dtype=bool)
+    for start in range(0, len(blocks), 4096):
+        batch = blocks[start:start + 4096]
+        valid = batch >= 0
+        safe = np.where(valid, batch, 0)
+        pair = valid[:, :, None] & valid[:, None, :] & others
+        dx = x[safe][:, :, None] - x[safe][:, None, :]
+        dy = y[safe][:, :, None] - y[safe][:, None, :]
+        ox = cx[safe][:, :, None] - cx[safe][:, None, :]
+        oy = cy[safe][:, :, None] - cy[safe][:, None, :]
+        exact = np.where(pair, k * k / np.maximum(dx * dx + dy * dy, floor), 0.0)
+        grid = np.where(pair, scale / np.maximum(ox * ox + oy * oy, 1.0), 0.0)
+        force[batch[valid], 0] += (dx * exact - ox * grid).sum(axis=2)[valid]
+        force[batch[valid], 1] += (dy * exact - oy * grid).sum(axis=2)[valid]
+    return force
+
+
+def _morton(cells: np.ndarray) -> np.ndarray:
+    """Z-order curve index of grid cells (up to 2^16 per side)."""
+    code = np.zeros(len(cells), dtype=np.int64)
+    for bit in range(16):
+        code |= ((cells[:, 0] >> bit) & 1) << (2 * bit + 1)
+        code |= ((cells[:, 1] >> bit) & 1) << (2 * bit)
+    return code
+
+
+def force_layout(pos: np.ndarray, src: np.ndarray, dst: np.ndarray, iterations: int, start: float, end: float,
+                 mobility: Optional[np.ndarray] = None, k: float = EDGE_LENGTH) -> np.ndarray:
+    """
+    Run `iterations` Fruchterman-Reingold steps on pos in place, cooling the
+    largest step from `start` to `end`. Edges are (src[i], dst[i]) index pairs;
+    mobility scales each node's step (0 pins it).
+    """
+    n = len(pos)
+    if n == 0 or iterations <= 0:
+        return pos
+    cooling = (end / start) ** (1.0 / max(1, iterations - 1))
+    temperature = start
+    for _ in range(iterations):
+        disp = repulsion(pos, k)
+        if len(src):
+            delta = pos[src] - pos[dst]
+            dist = np.sqrt((delta * delta).sum(axis=1))
+            pull = delta * (dist / k)[:, None]
+            for axis in (0, 1):
+                disp[:, axis] -= np.bincount(src, pull[:, axis], minlength=n)
+                disp[:, axis] += np.bincount(dst, pull[:, axis], minlength=n)
+        disp -= GRAVITY * (pos - pos.mean(axis=0)) * (math.sqrt(n) * k / max(1.0, _radius(pos)))
+        length = np.sqrt((disp * disp).sum(axis=1))
+        step = np.minimum(length, temperature) / np.maximum(length, 1e-9)
+        if mobility is not None:
+            step *= mobility
+        pos += disp * step[:, None]
+        temperature *= cooling
+    return pos
+
+
+def _radius(pos: np.ndarray) -> float:
+    centred = pos - pos.mean(axis=0)
+    return float(np.sqrt((centred * centred).sum(axis=1).mean()))
+
+
+def propagate_labels(n: int, src: np.ndarray, dst: np.ndarray, weight: np.ndarray, labels: np.ndarray,
+                     rng: np.random.Generator, degree: Optional[np.ndarray] = None,
+                     rounds: int = LABEL_PROPAGATION_ROUNDS) -> np.ndarray:
+    """
+    Community labels by modularity-constrained label propagation (LPAm),
+    starting from `labels` (one per node, < n). A node adopts the label
+    whose neighbours' weight, minus the label's expected share of that
+    weight (its degree times the label's volume over 2m), is largest, so
+    hubs do not pull the whole graph into one community. `degree` is each
+    node's total weight, internal edges included (default: from the edges).
+    Each round a random half of the nodes is updated, so labels settle
+    instead of oscillating.
+    """
+    labels = labels.copy()
+    if degree is None:
+        degree = np.bincount(src, weight, minlength=n) + np.bincount(dst, weight, minlength=n)
+    total = float(degree.sum())
+    if not total:
+        return labels
+    nodes = np.arange(n)
+    a = np.concatenate([src, dst, nodes])
+    b = np.concatenate([dst, src, nodes])
+    w = np.concatenate([weight, weight, np.zeros(n)])  # a node may always keep its label
+    for _ in range(rounds):
+        key = a * n + labels[b]
+        votes, inverse = np.unique(key, return_inverse=True)
+        node, label = votes // n, votes % n
+        # Volume of each candidate label, not counting the node itself
+        volume = np.bincount(labels, degree, minlength=n)[label] - np.where(label == labels[node], degree[node], 0)
+        score = np.bincount(inverse, w) - degree[node] * volume / total + rng.random(len(votes)) * 1e-9
+        best = np.lexsort((score, node))
+        last = np.r_[node[best][1:] != node[best][:-1], True]
+        winners = np.empty(n, dtype=np.int64)
+        winners[node[best][last]] = label[best][last]
+        changed = (rng.random(n) < 0.5) & (winners != labels)
+        if not changed.any():
+            break
+        labels[changed] = winners[changed]
+    return labels
+
+
+def multilevel_layout(n: int, src: np.ndarray, dst: np.ndarray, rng: np.random.Generator,
+                      labels: Optional[np.ndarray] = None, degree: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Positions for a graph laid out from scratch. Past MULTILEVEL_NODES nodes
+    the graph of its communities (`labels`, found if not given) is laid out
+    first, recursively, and each node starts at its community's place.
+    """
+    if n > MULTILEVEL_NODES:
+        if degree is None:
+            degree = np.bincount(src, minlength=n) + np.bincount(dst, minlength=n)
+        if labels is None:
+            labels = propagate_labels(n, src, dst, np.ones(len(src)), np.arange(n), rng, degree.astype(np.float64))
+        of_node, count = compact(labels)
+        if count <= COARSENING * n:
+            coarse_src, coarse_dst, _ = cluster_edges(of_node, count, src, dst)
+            coarse = multilevel_layout(count, coarse_src, coarse_dst, rng,
+                                       degree=np.bincount(of_node, degree, minlength=count))
+            size = np.bincount(of_node, minlength=count)
+            pos = coarse[of_node] * math.sqrt(n / count)
+            pos += rng.normal(0.0, EDGE_LENGTH / 2, (n, 2)) * np.sqrt(size[of_node])[:, None]
+            return force_layout(pos, src, dst, REFINE_ITERATIONS, EDGE_LENGTH * 2, EDGE_LENGTH / 20)
+    side = EDGE_LENGTH * math.sqrt(max(n, 1))
+    pos = rng.uniform(-side / 2, side / 2, (n, 2))
+    return force_layout(pos, src, dst, FULL_ITERATIONS, side / 8 + EDGE_LENGTH, EDGE_LENGTH / 20)
+
+
+def compact(labels: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Renumber labels to 0..count-1."""
+    unique, inverse = np.unique(labels, return_inverse=True)
+    return inverse.astype(np.int64), len(unique)
+
+
+def merge_spatially(pos: np.ndarray, target: int) -> np.ndarray:
+    """Group points by grid cell, with the finest grid that has at most `target` occupied cells; returns cell labels."""
+    lo = pos.min(axis=0)
+    span = float((pos.max(axis=0) - lo).max()) or 1.0
+    side = 2 ** math.ceil(math.log2(max(2.0, math.sqrt(len(pos))))) * 2
+    while True:
+        cells = np.minimum(((pos - lo) / (span / side * (1 + 1e-9))).astype(np.int64), side - 1)
+        labels = cells[:, 0] * side + cells[:, 1]
+        if side == 1 or len(np.unique(labels)) <= max(target, 1):
+            return labels
+        side //= 2
+
+
+class Level:
+    """The clusters of one level of detail, for leaf nodes mapped to them by `of_node`."""
+
+    __slots__ = ("of_node", "ids", "labels", "size", "pos", "radius", "src", "dst", "weight")
+
+    def __init__(self, of_node: np.ndarray, count: int, node_pos: np.ndarray, node_ids: List[str],
+                 node_labels: List[str], degree: np.ndarray, level: int, edges: Tuple[np.ndarray, np.ndarray]):
+        self.of_node = of_node
+        self.size = np.bincount(of_node, minlength=count)
+        weights = np.maximum(self.size, 1)[:, None]
+        self.pos = np.stack([np.bincount(of_node, node_pos[:, axis], minlength=count) for axis in (0, 1)], 1) / weights
+        offset = node_pos - self.pos[of_node]
+        radius = np.zeros(count)
+        np.maximum.at(radius, of_node, np.sqrt((offset * offset).sum(axis=1)))
+        self.radius = radius + EDGE_LENGTH / 4
+        # Named after the best-connected member, which also makes the id stable across versions
+        order = np.lexsort((degree, of_node))
+        last = np.r_[of_node[order][1:] != of_node[order][:-1], True]
+        representative = np.empty(count, dtype=np.int64)
+        representative[of_node[order][last]] = order[last]
+        self.ids = [f"cluster:{level}:{node_ids[i]}" for i in representative]
+        self.labels = [node_labels[i] for i in representative]
+        self.src, self.dst, self.weight = cluster_edges(of_node, count, *edges)
+
+
+def cluster_edges(of_node: np.ndarray, count: int, src: np.ndarray, dst: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Edges between clusters (either direction) and how many node-to-node edges each stands for."""
+    a, b = of_node[src], of_node[dst]
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+    between = lo != hi
+    pairs, weight = np.unique(lo[between] * count + hi[between], return_counts=True)
+    return pairs // count, pairs % count, weight.astype(np.float64)
+
+
+class GraphLayout:
+    """
+    Node positions and cluster levels for one graph version (immutable).
+    Level 0 is the nodes themselves; levels[i] are ever coarser clusters.
+    """
+
+    def __init__(self, version: int, nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]],
+                 pos: np.ndarray, scale: float, src: np.ndarray, dst: np.ndarray, communities: np.ndarray,
+                 levels: List[Level], elapsed: float, iterations: int):
+        self.version = version
+        self.nodes = nodes  # node DTOs, shared with the graph snapshot
+        self.edges = edges  # edge DTOs whose endpoints are src[i], dst[i]
+        self.index = {node["id"]: i for i, node in enumerate(nodes)}
+        self.pos = pos
+        self.scale = scale  # pos is the force layout's positions times scale
+        self.src = src
+        self.dst = dst
+        self.communities = communities  # first-level labels, to warm-start the next version
+        self.levels = levels
+        self.elapsed = elapsed
+        self.iterations = iterations
+
+    def bounds(self) -> Dict[str, float]:
+        if not len(self.pos):
+            return {"x0": 0.0, "y0": 0.0, "x1": 0.0, "y1": 0.0}
+        (x0, y0), (x1, y1) = np.floor(self.pos.min(axis=0) * 10) / 10, np.ceil(self.pos.max(axis=0) * 10) / 10
+        return {"x0": float(x0), "y0": float(y0), "x1": float(x1), "y1": float(y1)}
+
+    def level_for_zoom(self, zoom: float) -> int:
+        if zoom >= DETAIL_ZOOM or zoom <= 0:
+            return 0 if zoom > 0 else len(self.levels)
+        return min(len(self.levels), math.ceil(math.log2(DETAIL_ZOOM / zoom)))
+
+    def view(self, x0: float, y0: float, x1: float, y1: float, zoom: float = 1.0, limit: int = 2000,
+             level: Optional[int] = None) -> Dict[str, Any]:
+        """
+        What to draw in the viewport [x0, x1] x [y0, y1]: the nodes (level 0)
+        or clusters of the level the zoom calls for, coarser still if more than
+        `limit` of them are visible, and the edges among them. Edges leaving
+        the viewport come with their far endpoint, so they can be drawn.
+        """
+        top = len(self.levels)
+        level = self.level_for_zoom(zoom) if level is None else max(0, min(level, top))
+        while True:
+            pos, radius = self._points(level)
+            visible = np.flatnonzero((pos[:, 0] + radius >= x0) & (pos[:, 0] - radius <= x1) &
+                                     (pos[:, 1] + radius >= y0) & (pos[:, 1] - radius <= y1))
+            if len(visible) <= limit or level >= top:
+                break
+            level += 1
+        truncated = len(visible) > limit
+        if truncated:
+            size = self.levels[level - 1].size if level else np.ones(len(pos))
+            visible = visible[np.argsort(-size[visible], kind="stable")[:limit]]
+
+        shown = np.zeros(len(pos), dtype=bool)
+        shown[visible] = True
+        src, dst = (self.src, self.dst) if level == 0 else (self.levels[level - 1].src, self.levels[level - 1].dst)
+        inside = np.flatnonzero(shown[src] & shown[dst])[:limit]
+        crossing = np.flatnonzero(shown[src] ^ shown[dst])[:limit - len(inside)]
+        picked = np.concatenate([inside, crossing])
+        outside = np.setdiff1d(np.concatenate([src[picked], dst[picked]]), visible)
+
+        result = {"version": self.version, "level": level, "levels": top + 1, "bounds": self.bounds(),
+                  "truncated": truncated}
+        if level == 0:
+            result["nodes"] = [self._node(i) for i in visible] + [self._node(i, outside=True) for i in outside]
+            result["edges"] = [self.edges[i] for i in picked]
+        else:
+            clusters = self.levels[level - 1]
+            result["nodes"] = ([self._cluster(clusters, i) for i in visible] +
+                               [self._cluster(clusters, i, outside=True) for i in outside])
+            result["edges"] = [{"id": f"{clusters.ids[a]}->{clusters.ids[b]}", "source": clusters.ids[a],
+                                "target": clusters.ids[b], "weight": int(clusters.weight[i])}
+                               for i, a, b in zip(picked, clusters.src[picked], clusters.dst[picked])]
+        return result
+
+    def _points(self, level: int) -> Tuple[np.ndarray, np.ndarray]:
+        if level == 0:
+            return self.pos, np.zeros(len(self.pos))
+        clusters = self.levels[level - 1]
+        return clusters.pos, clusters.radius
+
+    def _node(self, i: int, outside: bool = False) -> Dict[str, Any]:
+        x, y = self.pos[i]
+        node = {**self.nodes[i], "x": round(float(x), 1), "y": round(float(y), 1)}
+        if outside:
+            node["outside"] = True
+        return node
+
+    @staticmethod
+    def _cluster(clusters: Level, i: int, outside: bool = False) -> Dict[str, Any]:
+        x, y = clusters.pos[i]
+        cluster = {"id": clusters.ids[i], "label": clusters.labels[i], "type": "cluster",
+                   "size": int(clusters.size[i]), "x": round(float(x), 1), "y": round(float(y), 1),
+                   "radius": round(float(clusters.radius[i]), 1)}
+        if outside:
+            cluster["outside"] = True
+        return cluster
+
+
+class LayoutService:
+    """
+    Layout of the store's graph, computed once per version and warm-started
+    from the previous one. While a new version is being laid out, other
+    callers get the previous layout rather than waiting (see layout()).
+    """
+
+    def __init__(self, store, seed: int = 7):
+        self.store = store
+        self.seed = seed
+        self._current: Optional[GraphLayout] = None
+        self._lock = threading.Lock()
+        self.computed = 0
+        self.stale_served = 0
+
+    def layout(self, wait: bool = False) -> GraphLayout:
+        """Layout of the current version, or the previous one if it is being computed and wait is False."""
+        current = self._current
+        if current is not None and current.version == self.store.version:
+            return current
+        if not self._lock.acquire(blocking=wait or current is None):
+            self.stale_served += 1
+            return current
+        try:
+            snapshot = self.store.snapshot()
+            current = self._current
+            if current is None or current.version != snapshot.version:
+                with stage("layout"):
+                    current = self._compute(snapshot, current)
+                self._current = current
+                self.computed += 1
+            return current
+        finally:
+            self._lock.release()
+
+    def _compute(self, snapshot, previous: Optional[GraphLayout]) -> GraphLayout:
+        started = time.perf_counter()
+        rng = np.random.default_rng(self.seed + snapshot.version)
+        nodes = list(snapshot.nodes.values())
+        index = {node["id"]: i for i, node in enumerate(nodes)}
+        edges = [edge for edge in snapshot.edges.values() if edge["source"] in index and edge["target"] in index]
+        n = len(nodes)
+        src = np.fromiter((index[edge["source"]] for edge in edges), dtype=np.int64, count=len(edges))
+        dst = np.fromiter((index[edge["target"]] for edge in edges), dtype=np.int64, count=len(edges))
+
+        # Forces and communities act once per connected pair, whatever the relations between them
+        lo, hi = np.minimum(src, dst), np.maximum(src, dst)
+        pairs = np.unique(lo[lo != hi] * max(n, 1) + hi[lo != hi])
+        pair_src, pair_dst = pairs // max(n, 1), pairs % max(n, 1)
+
+        old = np.array([previous.index.get(node["id"], -1) for node in nodes] if previous else [-1] * n,
+                       dtype=np.int64)
+        placed = old >= 0
+        labels = np.arange(n, dtype=np.int64)
+        if placed.any():
+            # Keep last version's communities (renumbered onto member indices) for nodes seen before
+            previous_labels = previous.communities[old[placed]].tolist()
+            first_member: Dict[int, int] = {}
+            for i, label in zip(np.flatnonzero(placed).tolist(), previous_labels):
+                first_member.setdefault(label, i)
+            labels[placed] = [first_member[label] for label in previous_labels]
+        communities = propagate_labels(n, pair_src, pair_dst, np.ones(len(pair_src)), labels, rng) if n else labels
+
+        if placed.any() and placed.sum() >= n / 2:
+            # Mostly known: new nodes join their neighbours, and known ones drift a little
+            scale = previous.scale
+            pos = np.zeros((n, 2))
+            pos[placed] = previous.pos[old[placed]] / scale
+            self._place_new(pos, placed, pair_src, pair_dst, rng)
+            iterations = INCREMENTAL_ITERATIONS
+            force_layout(pos, pair_src, pair_dst, iterations, EDGE_LENGTH * 2, EDGE_LENGTH / 20,
+                         np.where(placed, SETTLED_MOBILITY, 1.0))
+        else:
+            iterations = FULL_ITERATIONS
+            pos = multilevel_layout(n, pair_src, pair_dst, rng, communities)
+            # Densely connected graphs pull together; spread them to about EDGE_LENGTH² per node
+            scale = max(1.0, EDGE_LENGTH * math.sqrt(n / (2 * math.pi)) / max(_radius(pos), 1e-9)) if n else 1.0
+        pos *= scale
+        levels = self._levels(communities, pos, nodes, (pair_src, pair_dst), rng)
+        return GraphLayout(snapshot.version, nodes, edges, pos, scale, src, dst, communities, levels,
+                           time.perf_counter() - started, iterations)
+
+    @staticmethod
+    def _place_new(pos: np.ndarray, placed: np.ndarray, src: np.ndarray, dst: np.ndarray, rng: np.random.Generator):
+        """Start new nodes at the mean of their placed neighbours, or at random in the layout's area."""
+        n = len(pos)
+        placed = placed.copy()
+        for _ in range(3):
+            new = ~placed
+            if not new.any():
+                return
+            a = np.concatenate([src, dst])
+            b = np.concatenate([dst, src])
+            known = new[a] & placed[b]
+            count = np.bincount(a[known], minlength=n)
+            reached = count > 0
+            if not reached.any():
+                break
+            for axis in (0, 1):
+                pos[reached, axis] = np.bincount(a[known], pos[b[known], axis], minlength=n)[reached] / count[reached]
+            pos[reached] += rng.normal(0.0, EDGE_LENGTH / 2, (int(reached.sum()), 2))
+            placed |= reached
+        new = ~placed
+        if new.any():
+            centre = pos[placed].mean(axis=0) if placed.any() else np.zeros(2)
+            side = EDGE_LENGTH * math.sqrt(n) * 2
+            pos[new] = centre + rng.uniform(-side / 2, side / 2, (int(new.sum()), 2))
+
+    @staticmethod
+    def _levels(communities: np.ndarray, pos: np.ndarray, nodes: List[Dict[str, Any]],
+                edges: Tuple[np.ndarray, np.ndarray], rng: np.random.Generator) -> List[Level]:
+        n = len(nodes)
+        degree = np.bincount(edges[0], minlength=n) + np.bincount(edges[1], minlength=n)
+        if n <= TOP_CLUSTERS:
+            return []
+        ids = [node["id"] for node in nodes]
+        labels = [node["label"] for node in nodes]
+        of_node, count = compact(communities)
+        if count > COARSENING * n:
+            of_node, count = compact(merge_spatially(pos, max(TOP_CLUSTERS, n // 4)))
+        levels: List[Level] = []
+        while True:
+            levels.append(Level(of_node, count, pos, ids, labels, degree, len(levels) + 1, edges))
+            if count <= TOP_CLUSTERS or len(levels) == MAX_LEVELS:
+                return levels
+            clusters = levels[-1]
+            volume = np.bincount(of_node, degree, minlength=count).astype(np.float64)
+            merged = propagate_labels(count, clusters.src, clusters.dst, clusters.weight, np.arange(count), rng,
+                                      volume)
+            cluster_of, next_count = compact(merged)
+            if next_count > COARSENING * count:
+                # Communities found nothing more to merge (e.g. many small components): merge neighbours
+                cluster_of, next_count = compact(merge_spatially(clusters.pos, max(TOP_CLUSTERS, count // 4)))
+            of_node, count = cluster_of[of_node], next_count
+
+    def stats(self) -> Dict[str, Any]:
+        current = self._current
+        if current is None:
+            return {"version": None, "computed": self.computed, "stale_served": self.stale_served}
+        return {"version": current.version, "nodes": len(current.nodes), "edges": len(current.edges),
+                "levels": [len(current.nodes)] + [len(level.size) for level in current.levels],
+                "iterations": current.iterations, "elapsed": round(current.elapsed, 4),
+                "computed": self.computed, "stale_served": self.stale_served}
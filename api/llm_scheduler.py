@@ -0,0 +1,463 @@
+"""
+Batching, rate-limited scheduling of LLM extraction requests.
+
+Extraction workers hand chunks to an ExtractionScheduler and block until
+their triples are back. A dispatcher thread packs the waiting chunks into
+one chat completion request, up to a token budget, and the response's
+triples are split back out by chunk id. Requests are paced by two token
+buckets (requests per minute and tokens per minute), and 429s, 5xx
+responses and connection errors are retried with jittered exponential
+backoff. A 429 also pauses every sender until its Retry-After has passed.
+
+Batches grow with load: while all request slots are busy, chunks keep
+queueing, and the next free slot takes as many as fit the budget.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+# Rough token count for English text; good enough for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+# Completion tokens reserved per requested triple, plus per-chunk JSON overhead
+TOKENS_PER_TRIPLE = 40
+TOKENS_PER_CHUNK = 20
+PROMPT_OVERHEAD_TOKENS = 200
+MAX_COMPLETION_TOKENS = 4096
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class Usage:
+    """LLM calls and tokens spent on one or more chunks."""
+
+    __slots__ = ("calls", "retries", "prompt_tokens", "completion_tokens")
+
+    def __init__(self, calls: int = 0, retries: int = 0, prompt_tokens: int = 0, completion_tokens: int = 0):
+        self.calls = calls
+        self.retries = retries
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    def add(self, other: "Usage"):
+        self.calls += other.calls
+        self.retries += other.retries
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+
+    def to_dict(self) -> Dict[str, int]:
+        return {"calls": self.calls, "retries": self.retries,
+                "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens}
+
+
+class Triples(list):
+    """A list of extracted triples that also carries the Usage spent on them."""
+
+    def __init__(self, triples=(), usage: Optional[Usage] = None):
+        super().__init__(triples)
+        self.usage = usage or Usage()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at rate_per_minute.
+
+    acquire(n) blocks until n tokens are available. A request larger than
+    the capacity is let through once the bucket is full, leaving it in
+    debt, so oversized requests are slowed down rather than stuck.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be positive")
+        self.rate = rate_per_minute / 60.0
+        # Ten seconds of budget by default: enough for bursts, small enough to stay under per-minute limits
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_minute / 6.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, n: float = 1.0) -> float:
+        """Take n tokens, sleeping as needed; returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                needed = min(n, self.capacity)
+                if self._tokens >= needed:
+                    self._tokens -= n
+                    self.waited += waited
+                    return waited
+                delay = (needed - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def refund(self, n: float):
+        """Give back tokens that were reserved but not used."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + n)
+
+
+class _Item:
+    __slots__ = ("text", "max_triples", "tokens", "future")
+
+    def __init__(self, text: str, max_triples: int, tokens: int):
+        self.text = text
+        self.max_triples = max_triples
+        self.tokens = tokens
+        self.future: Future = Future()
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked to wait before retrying, if it said so."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """429s, server errors, timeouts and dropped connections are worth retrying."""
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status == 429 or (isinstance(status, int) and status >= 500)
+
+
+def batch_prompt(texts: Sequence[str], max_triples: int) -> str:
+    sections = "\n\n".join(f'<chunk id="c{i}">\n{text}\n</chunk>' for i, text in enumerate(texts))
+    return f"""Extract factual triples from each chunk below, separately. Return ONLY valid JSON with this exact schema:
+
+{{
+  "chunks": [
+    {{"id":"c0","triples":[{{"subject":"<Concept>","relation":"<Relation>","object":"<Concept>","confidence":0.0}}]}}
+  ]
+}}
+
+Rules:
+- Return one entry per chunk id, even if its triples list is empty
+- Only use facts stated in that chunk for its triples
+- Subjects and objects should be specific concepts, entities, or technologies
+- Relations should be meaningful relationships like "is_a", "uses", "depends_on", "enables", etc.
+- Avoid generic relations like "is", "has", "contains"
+- Cap to {max_triples} triples maximum per chunk
+- Confidence should be between 0.0 and 1.0
+
+{sections}"""
+
+
+def coerce_confidence(value: Any, default: float = 0.5) -> float:
+    """A model-reported confidence as a float clamped to [0, 1], or default if it is not a number."""
+    if isinstance(value, bool):
+        return default
+    try:
+        confidence = float(value)
+    except (TypeError, ValueError):
+        return default
+    if confidence != confidence:
+        return default
+    return min(1.0, max(0.0, confidence))
+
+
+def clean_triples(raw: Any, max_triples: int) -> List[Dict[str, Any]]:
+    triples = []
+    for triple in raw if isinstance(raw, list) else []:
+        if not isinstance(triple, dict):
+            continue
+        fields = [triple.get(key) for key in ("subject", "relation", "object")]
+        if not all(isinstance(field, str) and field.strip() for field in fields):
+            continue
+        triples.append({
+            "subject": fields[0].strip(),
+            "relation": fields[1].strip(),
+            "object": fields[2].strip(),
+            "confidence": coerce_confidence(triple.get("confidence", 0.5)),
+        })
+    return triples[:max_triples]
+
+
+def split_response(content: str, count: int, max_triples: int) -> List[Optional[List[Dict[str, Any]]]]:
+    """
+    Triples per chunk from a batch response, in chunk order; None for a
+    chunk the response has no entry for. Raises json.JSONDecodeError if
+    the response is not valid JSON.
+    """
+    data = json.loads(content)
+    results: List[Optional[List[Dict[str, Any]]]] = [None] * count
+    if not isinstance(data, dict):
+        return results
+    if count == 1 and "triples" in data:
+        results[0] = clean_triples(data["triples"], max_triples)
+        return results
+    for entry in data.get("chunks") or []:
+        if not isinstance(entry, dict):
+            continue
+        chunk_id = str(entry.get("id", ""))
+        if chunk_id[:1] == "c" and chunk_id[1:].isdigit() and int(chunk_id[1:]) < count:
+            results[int(chunk_id[1:])] = clean_triples(entry.get("triples"), max_triples)
+    return results
+
+
+class ExtractionScheduler:
+    """
+    Packs concurrent extraction requests into batched, rate-limited LLM calls.
+
+    extract() is called from worker threads and returns (triples, usage) for
+    one chunk. Batches hold chunks with the same max_triples, at most
+    max_batch_chunks of them and max_batch_tokens of prompt. A chunk the
+    batch response left out is retried on its own.
+    """
+
+    def __init__(
+        self,
+        client,
+        model: str,
+        max_batch_tokens: int = 6000,
+        max_batch_chunks: int = 8,
+        batch_wait: float = 0.02,
+        concurrency: int = 8,
+        requests_per_minute: Optional[float] = 500,
+        tokens_per_minute: Optional[float] = 200000,
+        max_retries: int = 6,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        temperature: float = 0.1,
+    ):
+        self.client = client
+        self.model = model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_chunks = max_batch_chunks
+        self.batch_wait = batch_wait
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.temperature = temperature
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+        self._queue: Deque[_Item] = deque()
+        self._cond = threading.Condition()
+        self._slots = threading.Semaphore(concurrency)
+        self._paused_until = 0.0
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batched_chunks = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.failed_chunks = 0
+        self.usage = Usage()
+        self._dispatcher = threading.Thread(target=self._dispatch, name="llm-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    def extract(self, text: str, max_triples: int = 8) -> Tuple[List[Dict[str, Any]], Usage]:
+        """Triples for one chunk and the usage charged to it; raises if every attempt failed."""
+        budget = self.max_batch_tokens - PROMPT_OVERHEAD_TOKENS
+        if estimate_tokens(text) > budget:
+            logger.warning(f"Chunk of {len(text)} chars exceeds the batch budget; truncating")
+            text = text[:budget * CHARS_PER_TOKEN]
+        item = _Item(text, max_triples, estimate_tokens(text))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("scheduler is closed")
+            self._queue.append(item)
+            self._cond.notify()
+        return item.future.result()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _dispatch(self):
+        while True:
+            self._slots.acquire()
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    self._slots.release()
+                    return
+                # Give concurrent callers a moment to join a small batch
+                deadline = time.monotonic() + self.batch_wait
+                while len(self._queue) < self.max_batch_chunks and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+            threading.Thread(target=self._run, args=(batch,), name="llm-request", daemon=True).start()
+
+    def _take_batch(self) -> List[_Item]:
+        first = self._queue.popleft()
+        batch = [first]
+        tokens = first.tokens
+        budget = self.max_batch_tokens - PROMPT_OVERHEAD_TOKENS
+        skipped: List[_Item] = []
+        while self._queue and len(batch) < self.max_batch_chunks:
+            item = self._queue[0]
+            if tokens + item.tokens + TOKENS_PER_CHUNK > budget:
+                break
+            self._queue.popleft()
+            if item.max_triples != first.max_triples:
+                skipped.append(item)
+                continue
+            batch.append(item)
+            tokens += item.tokens + TOKENS_PER_CHUNK
+        self._queue.extendleft(reversed(skipped))
+        return batch
+
+    def _run(self, batch: List[_Item]):
+        try:
+            self._send(batch)
+        except BaseException as e:
+            failed = [item for item in batch if not item.future.done()]
+            with self._stats_lock:
+                self.failed_chunks += len(failed)
+            for item in failed:
+                item.future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def _send(self, batch: List[_Item]):
+        max_triples = batch[0].max_triples
+        completion_budget = min(MAX_COMPLETION_TOKENS, len(batch) * (max_triples * TOKENS_PER_TRIPLE + TOKENS_PER_CHUNK))
+        prompt = batch_prompt([item.text for item in batch], max_triples)
+        estimate = estimate_tokens(prompt) + completion_budget
+        retries = 0
+        while True:
+            self._wait_for_limits(estimate)
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=self.temperature,
+                    max_tokens=completion_budget,
+                )
+                break
+            except Exception as e:
+                if not is_retryable(e) or retries >= self.max_retries:
+                    with self._stats_lock:
+                        self.failures += 1
+                    raise
+                retries += 1
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retries))
+                hinted = retry_after(e)
+                if getattr(e, "status_code", None) == 429:
+                    with self._stats_lock:
+                        self.rate_limited += 1
+                    # Everyone backs off, not just this request
+                    pause = hinted if hinted is not None else delay
+                    with self._cond:
+                        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+                with self._stats_lock:
+                    self.retries += 1
+                logger.warning(f"LLM request failed ({e.__class__.__name__}), retry {retries} in {delay:.2f}s")
+                time.sleep(max(delay, hinted or 0.0))
+
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or estimate_tokens(prompt)
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        if self.token_bucket is not None:
+            self.token_bucket.refund(max(0, estimate - prompt_tokens - completion_tokens))
+        with self._stats_lock:
+            self.requests += 1
+            self.batched_chunks += len(batch)
+            self.usage.add(Usage(1, retries, prompt_tokens, completion_tokens))
+
+        try:
+            results = split_response(response.choices[0].message.content.strip(), len(batch), max_triples)
+        except json.JSONDecodeError:
+            if len(batch) == 1:
+                batch[0].future.set_exception(json.JSONDecodeError("invalid JSON in LLM response", "", 0))
+                return
+            results = [None] * len(batch)
+
+        # Charge the call to the first chunk and split tokens by prompt size
+        total = sum(item.tokens for item in batch)
+        left_prompt, left_completion = prompt_tokens, completion_tokens
+        for i, (item, triples) in enumerate(zip(batch, results)):
+            if i == len(batch) - 1:
+                share = Usage(1 if i == 0 else 0, retries if i == 0 else 0, left_prompt, left_completion)
+            else:
+                p = prompt_tokens * item.tokens // total
+                c = completion_tokens * item.tokens // total
+                left_prompt -= p
+                left_completion -= c
+                share = Usage(1 if i == 0 else 0, retries if i == 0 else 0, p, c)
+            if triples is not None:
+                item.future.set_result((triples, share))
+            elif len(batch) == 1:
+                item.future.set_result(([], share))
+            else:
+                # Left out of the batch answer: ask again for this chunk alone
+                threading.Thread(target=self._resend, args=(item, share), daemon=True).start()
+
+    def _resend(self, item: _Item, spent: Usage):
+        single = _Item(item.text, item.max_triples, item.tokens)
+        self._slots.acquire()
+        self._run([single])
+        try:
+            triples, usage = single.future.result()
+        except BaseException as e:
+            item.future.set_exception(e)
+            return
+        usage.add(spent)
+        item.future.set_result((triples, usage))
+
+    def _wait_for_limits(self, tokens: int):
+        while True:
+            with self._cond:
+                pause = self._paused_until - time.monotonic()
+            if pause <= 0:
+                break
+            time.sleep(pause)
+        if self.request_bucket is not None:
+            self.request_bucket.acquire(1)
+        if self.token_bucket is not None:
+            self.token_bucket.acquire(tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "requests": self.requests,
+                "chunks": self.batched_chunks,
+                "chunks_per_request": round(self.batched_chunks / self.requests, 2) if self.requests else 0.0,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "failures": self.failures,
+                "failed_chunks": self.failed_chunks,
+                "prompt_tokens": self.usage.prompt_tokens,
+                "completion_tokens": self.usage.completion_tokens,
+                "throttled_seconds": round(sum(b.waited for b in (self.request_bucket, self.token_bucket) if b), 2),
+                "queued": len(self._queue),
+            }
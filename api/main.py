@@ -1,28 +1,118 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
-import requests
-from bs4 import BeautifulSoup
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional
+import json
+import os
 import re
-import uuid
+import tempfile
 import logging
 
+from .bulk import EXPORT_FORMATS, aimport_blocks, iter_export, triple_reader_for
+from .crawler import CrawlScope, create_crawl_state, create_crawler
 from .graph_store import graph_store
-from .helpers import extract_triples, answer_question
+from .helpers import answer_question, get_extraction_cache, get_extraction_scheduler
+from .http_cache import GraphResponseCache
+from .jobs import JobManager, QueueFullError, create_job_board
+from .layout import LayoutService
+from .metrics import REGISTRY, TimingMiddleware, stage, tracing
+from .near_duplicates import create_chunk_index
+from .pipeline import IngestPipeline
+from .query import GraphQuery, NodeNotFoundError
+from .readers import UnsupportedFormatError, aiter_chunks, aiter_file, reader_for
+from .retrieval import Retriever
+from .semantic import create_semantic_index
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging; per-request TRACE lines are sampled separately (TRACE_SAMPLE_RATE, see metrics.py)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Universal Knowledge Graph API", version="1.0.0")
+chunk_index = create_chunk_index()
+pipeline = IngestPipeline(graph_store, chunk_index=chunk_index)
+crawl_state = create_crawl_state()
+crawler = create_crawler(pipeline, crawl_state)
+job_board = create_job_board()
+jobs = JobManager(pipeline, graph_store, crawler=crawler, board=job_board)
+semantic_index = create_semantic_index(graph_store)
+retriever = Retriever(graph_store, semantic=semantic_index)
+graph_cache = GraphResponseCache(graph_store)
+layouts = LayoutService(graph_store)
+graph_query = GraphQuery(graph_store)
+
+def cache_counters(field: str) -> Dict[tuple, int]:
+    """Hit or miss counter of every enabled cache, by cache name (read when /metrics is scraped)."""
+    caches = {"qa": retriever.stats(), "graph_response": graph_cache.stats()}
+    extraction_cache = get_extraction_cache()
+    if extraction_cache is not None:
+        caches["extraction"] = extraction_cache.stats()
+    if chunk_index is not None:
+        caches["near_duplicate"] = chunk_index.stats()
+    return {(name,): stats[field] for name, stats in caches.items()}
+
+REGISTRY.callback("ukg_graph_nodes", "gauge", "Nodes in the knowledge graph.", graph_store.node_count)
+REGISTRY.callback("ukg_graph_edges", "gauge", "Edges in the knowledge graph.", graph_store.edge_count)
+REGISTRY.callback("ukg_graph_version", "gauge", "Current graph version.", lambda: graph_store.version)
+REGISTRY.callback("ukg_job_queue_depth", "gauge", "Ingestion jobs waiting for a worker.", jobs.queue_depth)
+REGISTRY.callback("ukg_cache_hits_total", "counter", "Cache hits by cache.", lambda: cache_counters("hits"), ["cache"])
+REGISTRY.callback("ukg_cache_misses_total", "counter", "Cache misses by cache.", lambda: cache_counters("misses"),
+                  ["cache"])
+if semantic_index is not None:
+    REGISTRY.callback("ukg_semantic_index_lag", "gauge", "Graph versions not yet in the semantic index.",
+                      lambda: graph_store.version - max(semantic_index.version, 0))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    jobs.start()
+    if semantic_index is not None:
+        semantic_index.start()
+    yield
+    await jobs.stop()
+    if job_board is not None:
+        job_board.close()
+    await pipeline.aclose()
+    if semantic_index is not None:
+        semantic_index.close()
+    if chunk_index is not None:
+        chunk_index.close()
+    crawl_state.close()
+    if graph_store.persistence is not None:
+        graph_store.persistence.close()
+
+app = FastAPI(title="Universal Knowledge Graph API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(TimingMiddleware)
 
 # Pydantic models for request/response
 class IngestRequest(BaseModel):
     urls: List[str]
+    # Re-ingest: retract what these URLs asserted before and no longer do
+    replace: bool = False
+
+class CrawlRequest(BaseModel):
+    seeds: List[str]
+    max_depth: int = 2
+    max_pages: int = 100
+    # Regular expressions searched in each URL; the seeds' hosts are always the outer bound
+    include: List[str] = []
+    exclude: List[str] = []
+    sitemaps: bool = True
+    # Changed pages replace what they asserted on the previous crawl
+    replace: bool = True
 
 class IngestResponse(BaseModel):
     nodes: List[Dict[str, Any]]
     edges: List[Dict[str, Any]]
+    version: int = 0
+    since: Optional[int] = None
+    full: bool = True
+    removed_nodes: List[str] = []
+    removed_edges: List[str] = []
+
+class JobResponse(BaseModel):
+    id: str
+    status: str
+    status_url: str
+    events_url: str
 
 class QARequest(BaseModel):
     question: str
@@ -32,167 +122,163 @@ class QAResponse(BaseModel):
     cited_nodes: List[str]
     cited_edges: List[str]
 
-def chunk_text(text, target=1800, overlap=200):
-    """Robust text chunking with overlap."""
-    if not text: 
-        return []
-    chunks = []
-    i = 0
-    while i < len(text):
-        j = min(i+target, len(text))
-        chunks.append(text[i:j])
-        if j == len(text): 
-            break
-        i = j - overlap
-        if i < 0: 
-            i = 0
-    return chunks
-
-def fetch_and_process_url(url: str) -> List[str]:
-    """Fetch HTML from URL, strip tags, and split into chunks."""
+# Largest accepted upload, counted in bytes as sent (compressed for .gz files)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+
+# Most pages one crawl request may fetch
+MAX_CRAWL_PAGES = int(os.getenv("MAX_CRAWL_PAGES", "10000"))
+
+# Lines per chunk in NDJSON graph dumps
+NDJSON_BATCH = 1000
+
+# Most nodes or clusters one layout view may return
+MAX_LAYOUT_ITEMS = int(os.getenv("MAX_LAYOUT_ITEMS", "10000"))
+
+# Largest page a graph query may ask for
+MAX_QUERY_LIMIT = int(os.getenv("MAX_QUERY_LIMIT", "1000"))
+
+def graph_response(since: Optional[int] = None) -> JSONResponse:
+    """The graph, or its changes after `since`, serialized directly without per-item model validation."""
+    with stage("serialize"):
+        return JSONResponse(graph_store.to_dto_since(since))
+
+def job_response(job) -> JSONResponse:
+    """202 Accepted pointing at the job's status and event stream."""
+    status_url = f"/api/jobs/{job.id}"
+    body = {"id": job.id, "status": job.status, "status_url": status_url, "events_url": f"{status_url}/events"}
+    return JSONResponse(body, status_code=202, headers={"Location": status_url})
+
+def queue_full(e: QueueFullError) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+
+def run_query(method, *args, limit: Optional[int] = None, **kwargs) -> Dict[str, Any]:
+    """Run a GraphQuery method, mapping unknown nodes to 404 and bad parameters to 400."""
+    if limit is not None:
+        if not 0 < limit <= MAX_QUERY_LIMIT:
+            raise HTTPException(status_code=400, detail=f"limit must be in 1..{MAX_QUERY_LIMIT}")
+        kwargs["limit"] = limit
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
-        }
-        r = requests.get(url, headers=headers, timeout=15)
-        r.raise_for_status()
-        
-        # Parse HTML and extract text
-        soup = BeautifulSoup(r.content, "html.parser")
-        
-        # Remove script, style, and noscript elements
-        for element in soup(["script", "style", "noscript"]):
-            element.decompose()
-        
-        # Get text content and clean up whitespace
-        text = " ".join(soup.get_text(" ").split())
-        
-        logger.info(f"TRACE fetch: url={url} status={r.status_code} text_len={len(text)} preview={text[:120]!r}")
-        
-        # Chunk the text
-        chunks = chunk_text(text, target=1800, overlap=200)
-        logger.info(f"TRACE chunking: url={url} count={len(chunks)} first_len={(len(chunks[0]) if chunks else 0)}")
-        
-        return chunks
-        
-    except Exception as e:
-        logger.error(f"Error processing URL {url}: {str(e)}")
-        return []
+        return method(*args, **kwargs)
+    except NodeNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"Node not found: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def crawl_scope(request: CrawlRequest) -> CrawlScope:
+    """Validate a crawl request; raises HTTPException on bad seeds, limits or patterns."""
+    if request.max_depth < 0 or not 0 < request.max_pages <= MAX_CRAWL_PAGES:
+        raise HTTPException(status_code=400, detail=f"max_depth must be >= 0 and max_pages in 1..{MAX_CRAWL_PAGES}")
+    try:
+        scope = CrawlScope(request.seeds, request.include, request.exclude)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid pattern: {e}")
+    if not scope.seeds:
+        raise HTTPException(status_code=400, detail="No valid http(s) seed URLs")
+    return scope
+
+def upload_reader(filename: Optional[str]):
+    """Streaming reader for an upload's file type; raises HTTPException on unsupported types."""
+    try:
+        return reader_for(filename or "")
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def limit_size(blocks: AsyncIterator[bytes], filename: str) -> AsyncIterator[bytes]:
+    """Pass blocks through, failing with 413 once more than MAX_UPLOAD_BYTES have been read."""
+    size = 0
+    async for block in blocks:
+        size += len(block)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_UPLOAD_BYTES} bytes")
+        yield block
+    if tracing():
+        logger.info(f"TRACE ingest-file: filename={filename} size={size}")
+
+def check_readable(report, filename: str):
+    if report.chunks == 0:
+        logger.warning(f"No content extracted from {filename}")
+        raise HTTPException(status_code=400, detail="No readable content found in file")
+
+def iter_graph_ndjson() -> Iterator[bytes]:
+    """Stream the graph as NDJSON: a meta line, then one line per node and edge."""
+    snapshot = graph_store.snapshot()
+    yield (json.dumps({"kind": "meta", "version": snapshot.version,
+                       "nodes": len(snapshot.nodes), "edges": len(snapshot.edges)}) + "\n").encode("utf-8")
+    lines = []
+    for kind, item in snapshot.iter_dto_items():
+        lines.append(json.dumps({"kind": kind, **item}, separators=(",", ":")))
+        if len(lines) >= NDJSON_BATCH:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
 
 @app.get("/")
 def read_root():
     return {"message": "Universal Knowledge Graph API", "version": "1.0.0"}
 
 @app.post("/api/ingest", response_model=IngestResponse)
-async def ingest_urls(request: IngestRequest):
-    """Ingest URLs and extract knowledge triples."""
-    empty_urls_flag = False
-    
-    for url in request.urls:
-        try:
-            logger.info(f"TRACE ingest: url={url}")
-            
-            # Fetch and process the URL
-            chunks = fetch_and_process_url(url)
-            logger.info(f"TRACE chunks: url={url} count={len(chunks)}")
-            
-            if len(chunks) == 0:
-                logger.warning(f"No content extracted from {url}")
-                empty_urls_flag = True
-                continue
-            
-            # Process each chunk
-            for i, chunk in enumerate(chunks):
-                # Skip chunks larger than ~4000 chars to control token costs
-                if len(chunk) > 4000:
-                    logger.info(f"Skipping chunk {i} from {url} - too large ({len(chunk)} chars)")
-                    continue
-                    
-                source_id = f"{url}#chunk_{i}"
-                logger.info(f"TRACE extract: source_id={source_id} len={len(chunk)}")
-                
-                # Extract triples from the chunk
-                triples = extract_triples(chunk, source_id)
-                logger.info(f"TRACE triples: count={len(triples)} first={(triples[0] if triples else 'NONE')}")
-                
-                # Store triples in the graph
-                for tr in triples:
-                    subj = tr.get("subject") or tr[0] if isinstance(tr, (list, tuple)) else tr.get("subject")
-                    rel = tr.get("relation") or tr[1] if isinstance(tr, (list, tuple)) else tr.get("relation")
-                    obj = tr.get("object") or tr[2] if isinstance(tr, (list, tuple)) else tr.get("object")
-                    if not subj or not rel or not obj: 
-                        continue
-                    graph_store.upsert_triple(subj, rel, obj, source_id, confidence=tr.get("confidence", 0.5))
-            
-            logger.info(f"TRACE graph-size: nodes={len(graph_store.graph.nodes())} edges={len(graph_store.graph.edges())}")
-            
-        except Exception as e:
-            logger.exception(f"ERROR ingest for url={url}")
-            continue
+async def ingest_urls(request: IngestRequest, delta: bool = False):
+    """Ingest URLs and extract knowledge triples. With ?delta=true only the changes are returned."""
+    since = graph_store.version
+    report = await pipeline.ingest_urls(request.urls, replace=request.replace)
+    if tracing():
+        logger.info(f"TRACE ingest: {report.to_dict()}")
+        logger.info(f"TRACE graph-size: nodes={graph_store.node_count()} edges={graph_store.edge_count()}")
     
     # Add seed fallback if graph is empty
-    if len(graph_store.graph.nodes()) == 0:
+    if graph_store.node_count() == 0:
         logger.warning("WARN: graph empty after ingest; seeded sample triples.")
         graph_store.upsert_triple("Artificial Intelligence", "defined_as", "Field of Computer Science", "seed", confidence=1.0)
         graph_store.upsert_triple("Artificial Intelligence", "related_to", "Machine Learning", "seed", confidence=0.9)
         graph_store.upsert_triple("Machine Learning", "subset_of", "Artificial Intelligence", "seed", confidence=0.9)
     
-    # Return the current graph
-    result = graph_store.to_dto()
-    return result
+    # Return the changes or the current graph
+    if delta:
+        return graph_response(since)
+    return graph_response()
+
+@app.post("/api/crawl", response_model=IngestResponse)
+async def crawl(request: CrawlRequest, delta: bool = False):
+    """
+    Crawl from seed URLs (same hosts, robots.txt and sitemaps honoured) and extract knowledge triples.
+    Pages unchanged since the last crawl are not fetched again. With ?delta=true only the changes are returned.
+    """
+    scope = crawl_scope(request)
+    since = graph_store.version
+    report = await crawler.crawl(scope, max_depth=request.max_depth, max_pages=request.max_pages,
+                                 sitemaps=request.sitemaps, replace=request.replace)
+    if tracing():
+        logger.info(f"TRACE crawl: {report.to_dict()}")
+        logger.info(f"TRACE graph-size: nodes={graph_store.node_count()} edges={graph_store.edge_count()}")
+    if delta:
+        return graph_response(since)
+    return graph_response()
 
 @app.post("/api/ingest-file", response_model=IngestResponse)
-async def ingest_file(file: UploadFile = File(...)):
-    """Ingest TXT file and extract knowledge triples."""
+async def ingest_file(file: UploadFile = File(...), delta: bool = False, replace: bool = False):
+    """
+    Ingest a TXT/LOG, JSONL or CSV file (optionally gzipped) and extract knowledge triples.
+    The file is read, decoded and chunked as a stream. With ?delta=true only the changes are returned;
+    with ?replace=true a file ingested before under the same name is replaced.
+    """
+    since = graph_store.version
+    reader = upload_reader(file.filename)
     try:
-        # Validate file type
-        if not file.filename.endswith(".txt"):
-            raise HTTPException(status_code=400, detail="Only TXT files supported for now")
-        
-        # Check file size (5MB limit)
-        content = await file.read()
-        if len(content) > 5 * 1024 * 1024:  # 5MB
-            raise HTTPException(status_code=400, detail="File too large. Maximum size is 5MB")
-        
-        # Decode content
-        try:
-            text = content.decode("utf-8", errors="ignore")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Failed to decode file: {str(e)}")
-        
-        logger.info(f"TRACE ingest-file: filename={file.filename} size={len(content)} text_len={len(text)}")
-        
-        # Chunk the text
-        chunks = chunk_text(text, target=1800, overlap=200)
-        logger.info(f"TRACE file-chunking: filename={file.filename} count={len(chunks)}")
+        # Extract and store triples from every chunk as it is read
+        chunks = aiter_chunks(limit_size(aiter_file(file.file), file.filename), reader)
+        report = await pipeline.ingest_stream(file.filename, chunks, replace=replace)
+        if tracing():
+            logger.info(f"TRACE ingest-file: {report.to_dict()}")
+        check_readable(report, file.filename)
         
-        if len(chunks) == 0:
-            logger.warning(f"No content extracted from {file.filename}")
-            raise HTTPException(status_code=400, detail="No readable content found in file")
+        if tracing():
+            logger.info(f"TRACE graph-size: nodes={graph_store.node_count()} edges={graph_store.edge_count()}")
         
-        # Process each chunk
-        for i, chunk in enumerate(chunks):
-            source_id = f"{file.filename}#chunk_{i}"
-            logger.info(f"TRACE extract: source_id={source_id} len={len(chunk)}")
-            
-            # Extract triples from the chunk
-            triples = extract_triples(chunk, source_id)
-            logger.info(f"TRACE triples: count={len(triples)} first={(triples[0] if triples else 'NONE')}")
-            
-            # Store triples in the graph
-            for tr in triples:
-                subj = tr.get("subject") or tr[0] if isinstance(tr, (list, tuple)) else tr.get("subject")
-                rel = tr.get("relation") or tr[1] if isinstance(tr, (list, tuple)) else tr.get("relation")
-                obj = tr.get("object") or tr[2] if isinstance(tr, (list, tuple)) else tr.get("object")
-                if not subj or not rel or not obj: 
-                    continue
-                graph_store.upsert_triple(subj, rel, obj, source_id, confidence=tr.get("confidence", 0.5))
-        
-        logger.info(f"TRACE graph-size: nodes={len(graph_store.graph.nodes())} edges={len(graph_store.graph.edges())}")
-        
-        # Return the current graph
-        result = graph_store.to_dto()
-        return result
+        # Return the changes or the current graph
+        if delta:
+            return graph_response(since)
+        return graph_response()
         
     except HTTPException:
         raise
@@ -200,31 +286,275 @@ async def ingest_file(file: UploadFile = File(...)):
         logger.exception(f"ERROR ingest-file for filename={file.filename}")
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
+@app.post("/api/ingest-stream", response_model=IngestResponse)
+async def ingest_stream(request: Request, filename: str, delta: bool = False, replace: bool = False):
+    """
+    Ingest a raw request body (no multipart) as the file `filename`. Extraction
+    starts while the body is still arriving. With ?delta=true only the changes are returned;
+    with ?replace=true a file ingested before under the same name is replaced.
+    """
+    since = graph_store.version
+    reader = upload_reader(filename)
+    try:
+        chunks = aiter_chunks(limit_size(request.stream(), filename), reader)
+        report = await pipeline.ingest_stream(filename, chunks, replace=replace)
+        if tracing():
+            logger.info(f"TRACE ingest-stream: {report.to_dict()}")
+        check_readable(report, filename)
+        if delta:
+            return graph_response(since)
+        return graph_response()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"ERROR ingest-stream for filename={filename}")
+        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+
+@app.post("/api/import")
+async def import_triples(request: Request, filename: str, source: Optional[str] = None):
+    """
+    Import triples from a raw N-Triples/N-Quads, CSV or JSONL body (optionally gzipped),
+    bypassing extraction. `filename` picks the format; rows without sources are attributed
+    to `source` (default: the file name). Returns import counters, not the graph.
+    """
+    try:
+        reader = triple_reader_for(filename)
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    report = await aimport_blocks(graph_store, limit_size(request.stream(), filename), reader, source or filename)
+    if tracing():
+        logger.info(f"TRACE import: {report}")
+    return report
+
+@app.get("/api/export")
+def export_triples(format: str = "jsonl"):
+    """Stream every edge as N-Triples (nt), CSV or JSONL."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format; expected one of {', '.join(EXPORT_FORMATS)}")
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(iter_export(graph_store, format), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="graph.{extension}"'})
+
+@app.post("/api/jobs/ingest", status_code=202, response_model=JobResponse)
+async def submit_ingest_job(request: IngestRequest):
+    """Queue a URL ingest in the background; 429 if the queue is full."""
+    try:
+        job = jobs.submit_urls(request.urls, replace=request.replace)
+    except QueueFullError as e:
+        raise queue_full(e)
+    return job_response(job)
+
+@app.post("/api/jobs/crawl", status_code=202, response_model=JobResponse)
+async def submit_crawl_job(request: CrawlRequest):
+    """Queue a crawl in the background; 429 if the queue is full."""
+    scope = crawl_scope(request)
+    try:
+        job = jobs.submit_crawl(scope, max_depth=request.max_depth, max_pages=request.max_pages,
+                                sitemaps=request.sitemaps, replace=request.replace)
+    except QueueFullError as e:
+        raise queue_full(e)
+    return job_response(job)
+
+@app.post("/api/jobs/ingest-file", status_code=202, response_model=JobResponse)
+async def submit_ingest_file_job(file: UploadFile = File(...), replace: bool = False):
+    """Queue a file ingest in the background; 429 if the queue is full."""
+    upload_reader(file.filename)  # reject unsupported types before spooling
+    try:
+        jobs.check_capacity()
+    except QueueFullError as e:
+        raise queue_full(e)
+    # The upload is closed when this request ends, so the job reads its own copy
+    spooled = tempfile.TemporaryFile()
+    try:
+        async for block in limit_size(aiter_file(file.file), file.filename):
+            spooled.write(block)
+        spooled.seek(0)
+        job = jobs.submit_file(file.filename, spooled, upload_reader(file.filename), replace=replace)
+    except QueueFullError as e:
+        spooled.close()
+        raise queue_full(e)
+    except BaseException:
+        spooled.close()
+        raise
+    return job_response(job)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the status and progress counters of an ingestion job."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, since: Optional[int] = None):
+    """
+    Stream job progress as Server-Sent Events: "progress" after every chunk,
+    "delta" with the graph changes since the last event (or since ?since=),
+    and a final "done".
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        jobs.events(job, since), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Graph reads are plain functions, so they run on the threadpool and serialize
+# snapshots there instead of holding up the event loop that applies ingests
 @app.get("/api/graph", response_model=IngestResponse)
-async def get_graph():
-    """Get the current knowledge graph."""
+def get_graph(request: Request, since: Optional[int] = None):
+    """
+    Get the current knowledge graph, or with ?since=<version> only what changed after that version.
+    Responses carry an ETag; polls with a current If-None-Match get 304 Not Modified.
+    """
     try:
-        return graph_store.to_dto()
+        if since is not None:
+            key, build = f"since:{since}", lambda: graph_store.to_dto_since(since)
+        else:
+            key, build = "graph", graph_store.to_dto
+        return graph_cache.respond(key, build, request.headers.get("if-none-match"),
+                                   request.headers.get("accept-encoding"))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving graph: {str(e)}")
 
+@app.get("/api/graph/layout")
+def graph_layout(x0: Optional[float] = None, y0: Optional[float] = None, x1: Optional[float] = None,
+                 y1: Optional[float] = None, zoom: float = 1.0, level: Optional[int] = None, limit: int = 2000):
+    """
+    Get positioned nodes, or at coarser zoom levels clusters, inside the viewport [x0, x1] x [y0, y1]
+    (default: the whole layout) and the edges among them. The layout is computed on the server,
+    once per graph version; while a new version is laid out, the previous layout is served.
+    """
+    if zoom <= 0 or not 0 < limit <= MAX_LAYOUT_ITEMS:
+        raise HTTPException(status_code=400, detail=f"zoom must be > 0 and limit in 1..{MAX_LAYOUT_ITEMS}")
+    layout = layouts.layout()
+    bounds = layout.bounds()
+    x0, y0 = bounds["x0"] if x0 is None else x0, bounds["y0"] if y0 is None else y0
+    x1, y1 = bounds["x1"] if x1 is None else x1, bounds["y1"] if y1 is None else y1
+    if x0 > x1 or y0 > y1:
+        raise HTTPException(status_code=400, detail="Empty viewport: x0 > x1 or y0 > y1")
+    view = layout.view(x0, y0, x1, y1, zoom=zoom, limit=limit, level=level)
+    with stage("serialize"):
+        return JSONResponse(view)
+
+@app.get("/api/graph/layout/stats")
+def graph_layout_stats():
+    """Get the version, size, cluster levels and compute time of the current graph layout."""
+    return layouts.stats()
+
+@app.get("/api/query/nodes")
+def query_nodes(label: str, match: str = "exact", cursor: Optional[str] = None, limit: int = 50):
+    """Find nodes whose label equals (ignoring case) or, with match=contains, contains `label`."""
+    return run_query(graph_query.nodes, label, match=match, cursor=cursor, limit=limit)
+
+@app.get("/api/query/nodes/{node_id}")
+def query_node(node_id: str):
+    """Get one node and its in- and out-degree."""
+    return run_query(graph_query.node, node_id)
+
+@app.get("/api/query/nodes/{node_id}/neighbors")
+def query_neighbors(node_id: str, direction: str = "both", relation: Optional[str] = None,
+                    min_confidence: float = 0.0, cursor: Optional[str] = None, limit: int = 50):
+    """Get a page of a node's edges (out, in or both), each with the node at its other end."""
+    return run_query(graph_query.neighbors, node_id, direction=direction, relation=relation,
+                     min_confidence=min_confidence, cursor=cursor, limit=limit)
+
+@app.get("/api/query/edges")
+def query_edges(relation: str, min_confidence: float = 0.0, cursor: Optional[str] = None, limit: int = 100):
+    """Get a page of the edges with one relation and the nodes at their ends."""
+    return run_query(graph_query.edges, relation, min_confidence=min_confidence, cursor=cursor, limit=limit)
+
+@app.get("/api/query/paths")
+def query_paths(source: str, target: str, max_hops: int = 3, directed: bool = False, relation: Optional[str] = None,
+                min_confidence: float = 0.0, limit: int = 10):
+    """Get up to `limit` shortest paths of at most max_hops edges between two node ids."""
+    return run_query(graph_query.paths, source, target, max_hops=max_hops, directed=directed, relation=relation,
+                     min_confidence=min_confidence, limit=limit)
+
+@app.get("/api/graph/stream")
+async def stream_graph():
+    """Stream the full graph as NDJSON."""
+    return StreamingResponse(iter_graph_ndjson(), media_type="application/x-ndjson")
+
+@app.get("/api/sources")
+def list_sources(prefix: str = "", limit: int = 100):
+    """List source ids starting with prefix (e.g. a site or page URL) and how many edges each asserts."""
+    return {"sources": [{"source": source_id, "edges": edges}
+                        for source_id, edges in graph_store.sources(prefix, max(0, limit))]}
+
+@app.delete("/api/sources")
+def retract_source(source: str, prefix: bool = False):
+    """
+    Retract a source id, or with ?prefix=true every source id starting with it
+    (e.g. "https://example.com/page#" for one page). Edges left without
+    sources and nodes left without edges are removed.
+    """
+    counts = graph_store.retract_source(source, prefix=prefix)
+    return {"version": graph_store.version, **counts}
+
+@app.get("/api/provenance/stats")
+def provenance_stats():
+    """Get the number of sources, documents and source-edge assertions in the provenance index."""
+    with graph_store.read():
+        return graph_store.provenance.stats()
+
+@app.get("/api/cache/stats")
+async def extraction_cache_stats():
+    """Get hit/miss counters for the extraction cache."""
+    cache = get_extraction_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@app.get("/api/llm/stats")
+async def llm_scheduler_stats():
+    """Get request, batching, retry and token counters for LLM extraction."""
+    scheduler = get_extraction_scheduler()
+    if scheduler is None:
+        return {"enabled": False}
+    return {"enabled": True, **scheduler.stats()}
+
+@app.get("/api/near-duplicates/stats")
+async def near_duplicate_stats():
+    """Get counters for the near-duplicate chunk index."""
+    if chunk_index is None:
+        return {"enabled": False}
+    return chunk_index.stats()
+
+@app.get("/api/crawl/stats")
+def crawl_stats():
+    """Get the number of pages whose validators and links are kept for conditional re-crawls."""
+    return crawl_state.stats()
+
+@app.get("/api/graph/cache/stats")
+def graph_cache_stats():
+    """Get hit/miss/304 counters and the size of the cached graph responses."""
+    return graph_cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics: stage and request latency histograms, LLM token and call counters, graph and cache gauges."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/qa/stats")
+async def qa_cache_stats():
+    """Get hit/miss counters for the QA retrieval cache."""
+    return retriever.stats()
+
+@app.get("/api/semantic/stats")
+def semantic_index_stats():
+    """Get the size of the semantic index and the graph version it reflects."""
+    if semantic_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **semantic_index.stats()}
+
 @app.post("/api/qa", response_model=QAResponse)
-async def answer_question_endpoint(request: QARequest):
+def answer_question_endpoint(request: QARequest):
     """Answer questions using the knowledge graph."""
     try:
-        # Extract keywords from the question
-        question_clean = re.sub(r'[^\w\s]', ' ', request.question.lower())
-        question_words = re.findall(r'\b\w+\b', question_clean)
-        
-        # Remove common stop words
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'can', 'what', 'when', 'where', 'who', 'why', 'how'}
-        keywords = [word for word in question_words if word not in stop_words and len(word) > 1]
-        
-        # Get relevant subgraph
-        subgraph = graph_store.get_subgraph_by_keywords(keywords)
-        
-        # Answer the question
-        result = answer_question(request.question, subgraph)
+        result = answer_question(request.question, graph_store, retriever)
         
         return QAResponse(
             answer=result["answer"],
@@ -0,0 +1,248 @@
+"""
+Process metrics in the Prometheus text format, and sampled tracing.
+
+Counters and histograms are plain Python objects updated under one lock
+each, so instrumenting a hot path costs a dict lookup and a bisect.
+Values owned by other components (graph size, cache counters) are read
+through callbacks when /metrics is scraped instead of being mirrored.
+
+`stage(name)` times one pipeline stage (fetch, parse, chunk, extract,
+upsert, serialize, layout, embed) into ukg_stage_duration_seconds and,
+inside an HTTP request, into that request's Server-Timing header (see
+TimingMiddleware). Work moved to a thread keeps the request's timings
+only when it runs in a copy of the request's context (see `in_context`).
+
+Verbose TRACE logging is for a sample of requests and jobs:
+TRACE_SAMPLE_RATE is the fraction traced (default 0), and `tracing()`
+tells call sites whether to format their log line at all.
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+
+# Stage timings of the current request ({stage: seconds}), or None outside requests
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("timings", default=None)
+_traced: contextvars.ContextVar[Optional[bool]] = contextvars.ContextVar("traced", default=None)
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic count per label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # labels -> [count per bucket..., +Inf, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        names = self.labelnames + ("le",)
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(names, labels + (_number(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Callback:
+    """A gauge or counter read from fn() at scrape time: a number, or {label values: number}."""
+
+    def __init__(self, name: str, kind: str, help: str, fn: Callable[[], Any], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterator[str]:
+        value = self.fn()
+        if value is None:
+            return
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, v in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(v)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric  # re-registering a name replaces it, e.g. on reload
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, kind: str, help: str, fn: Callable[[], Any], labelnames: Sequence[str] = ()):
+        return self.register(Callback(name, kind, help, fn, labelnames))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = list(metric.samples())
+            except Exception as e:  # a broken callback must not take the others down
+                lines.append(f"# {metric.name} unavailable: {e.__class__.__name__}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines += samples
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("ukg_stage_duration_seconds", "Time spent in each ingest/serve stage.", ["stage"])
+HTTP_SECONDS = REGISTRY.histogram("ukg_http_request_duration_seconds", "HTTP request latency by route.",
+                                  ["method", "route", "status"])
+LLM_CALLS = REGISTRY.counter("ukg_llm_calls_total", "LLM extraction requests sent.")
+LLM_RETRIES = REGISTRY.counter("ukg_llm_retries_total", "LLM extraction requests retried.")
+LLM_TOKENS = REGISTRY.counter("ukg_llm_tokens_total", "Tokens spent on LLM extraction.", ["type"])
+CHUNKS = REGISTRY.counter("ukg_chunks_total", "Chunks by outcome.", ["outcome"])
+TRIPLES = REGISTRY.counter("ukg_triples_upserted_total", "Extracted triples upserted into the graph.")
+JOBS = REGISTRY.counter("ukg_jobs_total", "Background ingestion jobs finished, by kind and status.", ["kind", "status"])
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as pipeline stage `name`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, name)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def in_context(fn: Callable, *args) -> Callable[[], Any]:
+    """fn(*args) bound to a copy of the current context, for run_in_executor (which does not copy it)."""
+    ctx = contextvars.copy_context()
+    return lambda: ctx.run(fn, *args)
+
+
+def start_trace() -> bool:
+    """Decide whether the current request or job is traced; returns the decision."""
+    traced = TRACE_SAMPLE_RATE > 0 and (TRACE_SAMPLE_RATE >= 1 or random.random() < TRACE_SAMPLE_RATE)
+    _traced.set(traced)
+    return traced
+
+
+def tracing() -> bool:
+    """Whether verbose TRACE logging is on for the current request or job."""
+    traced = _traced.get()
+    return TRACE_SAMPLE_RATE >= 1 if traced is None else traced
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    return ", ".join([f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+                     + [f"total;dur={total * 1000:.1f}"])
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware recording each request's latency by route template, and
+    adding a Server-Timing header with the stages timed while it was handled.
+    Streaming responses send their headers first, so later stages are only
+    in the histograms.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        start_trace()
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                header = server_timing(timings, time.perf_counter() - started).encode("latin-1")
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_SECONDS.observe(time.perf_counter() - started, scope["method"], route, str(status[0]))
@@ -0,0 +1,218 @@
+"""
+Near-duplicate chunk detection across ingests.
+
+Every chunk sent for extraction gets a 64-bit SimHash over its word
+3-shingles. Chunks whose fingerprints differ in at most `max_distance`
+bits share most of their shingles. Sites repeat headers, sidebars and
+footers on every page, and mirrors repeat whole articles, so such a chunk
+does not need another LLM call: the triples extracted from the first copy
+are attached to it instead, or it is skipped entirely.
+
+Lookups use the pigeonhole trick: the fingerprint is cut into
+max_distance + 1 bands, and two fingerprints within max_distance bits
+agree exactly on at least one band. Each band is a hash table, so a
+lookup costs a few dict probes however many chunks are indexed.
+Fingerprints and the triples of the first copy are kept in SQLite, so the
+index survives restarts.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from hashlib import blake2b
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+WORD = re.compile(r"\w+")
+SHINGLE = 3
+LANE = 20  # bits per counter in the packed SimHash accumulator
+LANE_MASK = (1 << LANE) - 1
+# SPREAD[k][b]: byte value b of hash byte k with each bit moved to its own counter lane
+SPREAD = [[sum(1 << (LANE * (8 * k + j)) for j in range(8) if b >> j & 1) for b in range(256)] for k in range(8)]
+MODES = ("attach", "skip")
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the word 3-shingles of text (0 for text without words)."""
+    words = WORD.findall(text.lower())
+    if len(words) >= SHINGLE:
+        shingles = {" ".join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+    else:
+        shingles = {" ".join(words)} if words else set()
+    if not shingles:
+        return 0
+    # All 64 bit counters are summed at once as LANE-bit lanes of one integer
+    total = 0
+    s0, s1, s2, s3, s4, s5, s6, s7 = SPREAD
+    for shingle in shingles:
+        h = blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+        total += (s0[h[0]] + s1[h[1]] + s2[h[2]] + s3[h[3]]
+                  + s4[h[4]] + s5[h[5]] + s6[h[6]] + s7[h[7]])
+    half = len(shingles) / 2
+    fingerprint = 0
+    for bit in range(64):
+        if (total >> (LANE * bit)) & LANE_MASK > half:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def max_distance_for(threshold: float) -> int:
+    """Hamming distance (of 64 bits) allowed for a similarity threshold in (0, 1]."""
+    if not 0 < threshold <= 1:
+        raise ValueError("threshold must be in (0, 1]")
+    return int((1 - threshold) * 64 + 1e-9)
+
+
+class ChunkIndex:
+    """
+    Persistent SimHash index of extracted chunks.
+
+    reserve() registers a chunk before its extraction finishes, so copies
+    submitted concurrently also find it; resolve() stores the triples once
+    they are known, and discard() forgets a chunk whose extraction failed.
+    """
+
+    def __init__(self, path: Optional[str], threshold: float = 0.95, mode: str = "attach"):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        self.path = path
+        self.threshold = threshold
+        self.mode = mode
+        self.max_distance = max_distance_for(threshold)
+        bands = self.max_distance + 1
+        self._band_bits = [64 * i // bands for i in range(bands + 1)]
+        self._bands: List[Dict[int, array]] = [{} for _ in range(bands)]
+        self._fingerprints = array("Q")  # entry -> fingerprint
+        self._rows = array("q")  # entry -> SQLite rowid
+        self._pending: Dict[int, Any] = {}  # entry -> extraction still running
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "id INTEGER PRIMARY KEY, fingerprint INTEGER NOT NULL, source TEXT NOT NULL, triples TEXT)"
+            )
+            # Reservations left by a crash never got their triples
+            self._conn.execute("DELETE FROM chunks WHERE triples IS NULL")
+            for row, fingerprint in self._conn.execute("SELECT id, fingerprint FROM chunks ORDER BY id"):
+                self._insert(fingerprint & 0xFFFFFFFFFFFFFFFF, row)
+        self._triples: Dict[int, str] = {}  # entry -> triples JSON, when there is no database
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def _band_keys(self, fingerprint: int) -> List[int]:
+        bits = self._band_bits
+        return [(fingerprint >> bits[i]) & ((1 << (bits[i + 1] - bits[i])) - 1) for i in range(len(bits) - 1)]
+
+    def _insert(self, fingerprint: int, row: int) -> int:
+        entry = len(self._fingerprints)
+        self._fingerprints.append(fingerprint)
+        self._rows.append(row)
+        for band, key in zip(self._bands, self._band_keys(fingerprint)):
+            bucket = band.get(key)
+            if bucket is None:
+                band[key] = array("q", (entry,))
+            else:
+                bucket.append(entry)
+        return entry
+
+    def find(self, fingerprint: int) -> Optional[int]:
+        """Oldest indexed entry within max_distance bits of fingerprint, or None."""
+        best = None
+        with self._lock:
+            for band, key in zip(self._bands, self._band_keys(fingerprint)):
+                for entry in band.get(key, ()):
+                    if (best is None or entry < best) and \
+                            bin(self._fingerprints[entry] ^ fingerprint).count("1") <= self.max_distance:
+                        best = entry
+                        break  # buckets are in entry order
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return best
+
+    def reserve(self, fingerprint: int, source_id: str, pending: Any = None) -> int:
+        """Index a chunk whose extraction has started; pending is whatever callers should wait on."""
+        with self._lock:
+            row = -1
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "INSERT INTO chunks (fingerprint, source) VALUES (?, ?)",
+                    (fingerprint - (1 << 64) if fingerprint >> 63 else fingerprint, source_id),
+                ).lastrowid
+            entry = self._insert(fingerprint, row)
+            if pending is not None:
+                self._pending[entry] = pending
+        return entry
+
+    def pending(self, entry: int) -> Any:
+        """What reserve() was given for entry, while its extraction is still running."""
+        return self._pending.get(entry)
+
+    def resolve(self, entry: int, triples: Sequence[Tuple[str, str, str, float]]):
+        """Store the (subject, relation, object, confidence) triples extracted from entry's chunk."""
+        payload = json.dumps([list(t) for t in triples], separators=(",", ":"))
+        with self._lock:
+            self._pending.pop(entry, None)
+            if self._conn is not None:
+                self._conn.execute("UPDATE chunks SET triples = ? WHERE id = ?", (payload, self._rows[entry]))
+            else:
+                self._triples[entry] = payload
+
+    def discard(self, entry: int):
+        """Forget a reserved chunk whose extraction failed; lookups stop matching it."""
+        with self._lock:
+            self._pending.pop(entry, None)
+            fingerprint = self._fingerprints[entry]
+            for band, key in zip(self._bands, self._band_keys(fingerprint)):
+                bucket = band.get(key)
+                if bucket is not None and entry in bucket:
+                    bucket.remove(entry)
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM chunks WHERE id = ?", (self._rows[entry],))
+
+    def triples(self, entry: int, source_id: str) -> List[Dict[str, Any]]:
+        """The triples of entry's chunk, attributed to source_id."""
+        with self._lock:
+            if self._conn is not None:
+                row = self._conn.execute("SELECT triples FROM chunks WHERE id = ?", (self._rows[entry],)).fetchone()
+                payload = row[0] if row else None
+            else:
+                payload = self._triples.get(entry)
+        if not payload:
+            return []
+        return [{"subject": s, "relation": r, "object": o, "confidence": c, "source": source_id}
+                for s, r, o, c in json.loads(payload)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": True, "entries": len(self), "hits": self.hits, "misses": self.misses,
+                "threshold": self.threshold, "max_distance": self.max_distance, "mode": self.mode}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def create_chunk_index() -> Optional[ChunkIndex]:
+    """
+    ChunkIndex configured from NEAR_DUPLICATE_MODE (attach, skip or off),
+    NEAR_DUPLICATE_THRESHOLD and NEAR_DUPLICATE_PATH (empty keeps it in memory).
+    """
+    mode = os.getenv("NEAR_DUPLICATE_MODE", "attach")
+    if mode == "off":
+        return None
+    path = os.getenv("NEAR_DUPLICATE_PATH", ".cache/chunk_fingerprints.sqlite3")
+    return ChunkIndex(path or None, threshold=float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.95")), mode=mode)
@@ -0,0 +1,472 @@
+"""
+Durable graph persistence: an append-only write-ahead log plus compacted
+binary snapshots.
+
+Layout of a data directory:
+
+    snapshot.bin       latest snapshot (replaced atomically)
+    wal.<gen>.log      log of operations applied after snapshot generation <gen>
+
+Every mutation is appended to the current WAL before it is applied. A
+checkpoint opens WAL generation g+1, writes a snapshot stamped g+1 and then
+deletes older logs, so a crash at any point leaves a snapshot plus every
+log needed to reach the latest state. Startup memory-maps the snapshot,
+loads its columns and replays only the WAL tail. Operations are checked
+before they are logged; a record that still cannot be applied on replay
+is skipped with a warning instead of keeping the graph from loading.
+
+In shared mode several processes (e.g. uvicorn workers) keep replicas of
+one graph in the same directory. Appends and checkpoints happen under an
+exclusive flock on the `lock` file, after the writer has applied whatever
+other processes appended; in between, each process tails the WAL to pick
+up their writes. Every replica applies the same operations in the same
+order, so versions and ids agree across processes.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from contextlib import nullcontext
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no shared mode
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"UKGSNAP1"
+SNAPSHOT_NAME = "snapshot.bin"
+LOCK_NAME = "lock"
+RECORD_HEADER = struct.Struct("<II")  # payload length, crc32
+FSYNC_POLICIES = ("always", "interval", "never")
+
+# Column names that hold string tables rather than typed arrays
+STRING_COLUMNS = ("labels", "types", "relations", "sources", "node_ids", "edge_ids", "index_grams", "resolve_keys")
+
+
+def encode_record(op: Sequence[Any]) -> bytes:
+    payload = json.dumps(op, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(path: str, offset: int = 0) -> Iterator[Tuple[List[Any], int]]:
+    """
+    Yield (operation, end_offset) for each intact record from offset onward.
+
+    Stops at the first short or corrupt record, which is where a crash
+    interrupted the last append.
+    """
+    with open(path, "rb") as f:
+        yield from iter_records(f, offset)
+
+
+def iter_records(f: BinaryIO, offset: int = 0) -> Iterator[Tuple[List[Any], int]]:
+    """read_records over an open file, which stays readable after a checkpoint deletes it."""
+    f.seek(offset)
+    while True:
+        header = f.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return
+        length, crc = RECORD_HEADER.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        offset += RECORD_HEADER.size + length
+        yield json.loads(payload), offset
+
+
+class WriteAheadLog:
+    """
+    Append-only operation log for one generation.
+
+    fsync policy:
+      always    fsync after every append (no acknowledged write is ever lost)
+      interval  fsync at most every `fsync_interval` seconds and on close
+      never     leave flushing to the OS (survives process crashes, not power loss)
+    """
+
+    def __init__(self, path: str, fsync: str = "interval", fsync_interval: float = 1.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}; expected one of {FSYNC_POLICIES}")
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.records = 0
+        self._lock = threading.Lock()
+        self._last_sync = time.monotonic()
+        self._file = open(path, "ab", buffering=0)
+
+    def append(self, op: Sequence[Any]):
+        self.append_many([op])
+
+    def append_many(self, ops: Sequence[Sequence[Any]]) -> int:
+        """Append several operations with a single write (and at most one fsync); returns the bytes written."""
+        data = b"".join(encode_record(op) for op in ops)
+        with self._lock:
+            self._file.write(data)
+            self.records += len(ops)
+            if self.fsync == "always":
+                os.fsync(self._file.fileno())
+            elif self.fsync == "interval":
+                now = time.monotonic()
+                if now - self._last_sync >= self.fsync_interval:
+                    os.fsync(self._file.fileno())
+                    self._last_sync = now
+        return len(data)
+
+    def sync(self):
+        with self._lock:
+            if not self._file.closed:
+                os.fsync(self._file.fileno())
+                self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                if self.fsync != "never":
+                    os.fsync(self._file.fileno())
+                self._file.close()
+
+
+def _fsync_dir(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_snapshot(path: str, columns: Dict[str, Any], generation: int):
+    """
+    Write engine columns to path atomically.
+
+    Sections are written back to back, 8-byte aligned, followed by a JSON
+    footer describing them and the footer offset. String tables are stored
+    as one UTF-8 blob plus an int64 array of character offsets.
+    """
+    tmp = path + ".tmp"
+    sections: Dict[str, Dict[str, Any]] = {}
+    with open(tmp, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+
+        def write_section(name: str, data: bytes, typecode: str):
+            pad = -f.tell() % 8
+            f.write(b"\0" * pad)
+            sections[name] = {"offset": f.tell(), "length": len(data), "typecode": typecode}
+            f.write(data)
+
+        for name, value in columns.items():
+            if name == "engine" or value is None:
+                continue
+            if name in STRING_COLUMNS:
+                offsets = array("q", [0])
+                total = 0
+                for s in value:
+                    total += len(s)
+                    offsets.append(total)
+                write_section(name, "".join(value).encode("utf-8"), "str")
+                write_section(name + ".offsets", offsets.tobytes(), "q")
+            else:
+                write_section(name, value.tobytes(), value.typecode)
+
+        footer = json.dumps({"engine": columns["engine"], "generation": generation, "sections": sections}).encode("utf-8")
+        footer_offset = f.tell()
+        f.write(footer)
+        f.write(struct.pack("<Q", footer_offset))
+        f.write(SNAPSHOT_MAGIC)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(os.path.dirname(path) or ".")
+
+
+def load_snapshot(path: str) -> Tuple[Dict[str, Any], int]:
+    """Memory-map a snapshot and return (columns, generation)."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[:8] != SNAPSHOT_MAGIC or mm[-8:] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a complete graph snapshot")
+        footer_offset = struct.unpack("<Q", mm[-16:-8])[0]
+        footer = json.loads(mm[footer_offset:-16])
+        sections = footer["sections"]
+
+        def section(name: str):
+            meta = sections[name]
+            return mm[meta["offset"]:meta["offset"] + meta["length"]], meta["typecode"]
+
+        columns: Dict[str, Any] = {"engine": footer["engine"], "node_ids": None, "edge_ids": None}
+        for name, meta in sections.items():
+            if name.endswith(".offsets"):
+                continue
+            data, typecode = section(name)
+            if typecode == "str":
+                text = data.decode("utf-8")
+                offsets = array("q")
+                offsets.frombytes(section(name + ".offsets")[0])
+                columns[name] = [text[a:b] for a, b in zip(offsets, offsets[1:])]
+            else:
+                values = array(typecode)
+                values.frombytes(data)
+                columns[name] = values
+    return columns, footer["generation"]
+
+
+class SharedLock:
+    """Exclusive lock across threads and processes: an RLock plus an flock on a lock file."""
+
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise RuntimeError("Shared graph storage needs fcntl.flock, which this platform lacks")
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock = threading.RLock()
+        self._depth = 0
+
+    def acquire(self):
+        self._lock.acquire()
+        if not self._depth:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if not self._depth:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def close(self):
+        os.close(self._fd)
+
+
+class GraphPersistence:
+    """
+    Owns a data directory and keeps a GraphStore durable.
+
+    open() restores the store from disk and starts logging; the store calls
+    log() before each mutation and checkpoint() when log_records exceeds
+    snapshot_every.
+
+    With shared=True the store also calls catch_up() under locked() before
+    logging, and a follower thread (start_follower) applies other
+    processes' writes between its own.
+    """
+
+    def __init__(self, data_dir: str, fsync: str = "interval", fsync_interval: float = 1.0,
+                 snapshot_every: int = 1_000_000, shared: bool = False):
+        self.data_dir = data_dir
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        self.shared = shared
+        self.generation = 0
+        self.wal: Optional[WriteAheadLog] = None
+        self._replaying = False
+        os.makedirs(data_dir, exist_ok=True)
+        self._shared_lock = SharedLock(os.path.join(data_dir, LOCK_NAME)) if shared else None
+        # Read side of the current WAL and how far this process has applied it
+        self._tail: Optional[BinaryIO] = None
+        self._offset = 0
+        self._follower: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.data_dir, SNAPSHOT_NAME)
+
+    def wal_path(self, generation: int) -> str:
+        return os.path.join(self.data_dir, f"wal.{generation}.log")
+
+    def wal_generations(self) -> List[int]:
+        generations = []
+        for name in os.listdir(self.data_dir):
+            if name.startswith("wal.") and name.endswith(".log"):
+                try:
+                    generations.append(int(name[4:-4]))
+                except ValueError:
+                    continue
+        return sorted(generations)
+
+    def locked(self):
+        """Context manager excluding other processes' appends and checkpoints (a no-op unless shared)."""
+        return self._shared_lock if self._shared_lock is not None else nullcontext()
+
+    def open(self, store) -> Dict[str, Any]:
+        """Load the snapshot and WAL tail into store, then start logging its mutations."""
+        with self.locked():
+            return self._open(store)
+
+    def _open(self, store) -> Dict[str, Any]:
+        started = time.perf_counter()
+        stats = {"snapshot_nodes": 0, "snapshot_edges": 0, "replayed": 0, "skipped": 0}
+        if os.path.exists(self.snapshot_path):
+            columns, self.generation = load_snapshot(self.snapshot_path)
+            store.load_columns(columns)
+            stats["snapshot_nodes"], stats["snapshot_edges"] = store.node_count(), store.edge_count()
+
+        self._replaying = True
+        try:
+            for generation in self.wal_generations():
+                if generation < self.generation:
+                    continue
+                path = self.wal_path(generation)
+                end = 0
+                for op, end in read_records(path):
+                    if self._replay(store, op, path):
+                        stats["replayed"] += 1
+                    else:
+                        stats["skipped"] += 1
+                # Drop a torn record left by a crash so new appends start on a boundary
+                if end < os.path.getsize(path):
+                    logger.warning(f"Truncating torn WAL tail in {path} at offset {end}")
+                    with open(path, "r+b") as f:
+                        f.truncate(end)
+                self.generation = max(self.generation, generation)
+        finally:
+            self._replaying = False
+
+        self.wal = WriteAheadLog(self.wal_path(self.generation), self.fsync, self.fsync_interval)
+        self.wal.records = stats["replayed"] + stats["skipped"]
+        if self.shared:
+            self._tail = open(self.wal.path, "rb")
+            self._offset = os.fstat(self._tail.fileno()).st_size
+        store.persistence = self
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(f"Graph restored from {self.data_dir}: {stats}")
+        return stats
+
+    @staticmethod
+    def _replay(store, op: Sequence[Any], path: str) -> bool:
+        """
+        Apply a logged operation. One that cannot be applied (e.g. written
+        before operations were checked) is skipped with a warning rather
+        than keeping the graph from loading.
+        """
+        try:
+            store.replay_op(op)
+            return True
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Skipping a WAL record in {path} that cannot be applied: {e}: {str(op)[:200]}")
+            return False
+
+    def log(self, ops: Sequence[Sequence[Any]]):
+        if self.wal is not None and not self._replaying:
+            written = self.wal.append_many(ops)
+            if self._tail is not None:
+                self._offset += written
+
+    def has_updates(self) -> bool:
+        """Whether another process appended or checkpointed since this one last caught up."""
+        if self._tail is None:
+            return False
+        if os.fstat(self._tail.fileno()).st_size > self._offset:
+            return True
+        generations = self.wal_generations()
+        return bool(generations) and generations[-1] > self.generation
+
+    def catch_up(self, store) -> int:
+        """
+        Apply operations other processes logged since this one last caught up.
+
+        Must run under locked() with the store's write lock held. Follows
+        checkpoints into newer WAL generations (the old log stays readable
+        through the open file after it is deleted); a process that slept
+        through two checkpoints reloads the snapshot instead.
+        """
+        if self._tail is None:
+            return 0
+        applied = 0
+        while True:
+            for op, self._offset in iter_records(self._tail, self._offset):
+                self._replay(store, op, self.wal.path)
+                self.wal.records += 1
+                applied += 1
+            newer = [g for g in self.wal_generations() if g > self.generation]
+            if not newer:
+                break
+            if newer[0] == self.generation + 1:
+                self._switch(self.generation + 1)
+            else:
+                columns, generation = load_snapshot(self.snapshot_path)
+                store.reset()
+                store.load_columns(columns)
+                self._switch(generation)
+        # Anything past the last intact record is a write torn by a crashed process
+        if os.fstat(self._tail.fileno()).st_size > self._offset:
+            logger.warning(f"Truncating torn WAL tail in {self.wal.path} at offset {self._offset}")
+            os.truncate(self.wal.path, self._offset)
+        return applied
+
+    def _switch(self, generation: int):
+        """Move the append handle and the tail to another process's newer WAL generation."""
+        self.wal.close()
+        self.generation = generation
+        self.wal = WriteAheadLog(self.wal_path(generation), self.fsync, self.fsync_interval)
+        self._tail.close()
+        self._tail = open(self.wal.path, "rb")
+        self._offset = 0
+
+    def start_follower(self, store, interval: float = 0.05):
+        """Poll the shared WAL and apply other processes' writes to store in the background."""
+        if not self.shared or self._follower is not None:
+            return
+
+        def follow():
+            while not self._stop.wait(interval):
+                try:
+                    if self.has_updates():
+                        store.sync()
+                except Exception:
+                    logger.exception("Failed to apply writes from the shared graph WAL")
+
+        self._follower = threading.Thread(target=follow, name="graph-wal-follower", daemon=True)
+        self._follower.start()
+
+    def should_checkpoint(self) -> bool:
+        return self.wal is not None and self.wal.records >= self.snapshot_every
+
+    def checkpoint(self, store):
+        """Write a compacted snapshot of store and discard the logs it covers."""
+        started = time.perf_counter()
+        old_wal = self.wal
+        self.generation += 1
+        self.wal = WriteAheadLog(self.wal_path(self.generation), self.fsync, self.fsync_interval)
+        if old_wal is not None:
+            old_wal.close()
+        if self._tail is not None:
+            self._tail.close()
+            self._tail = open(self.wal.path, "rb")
+            self._offset = 0
+        write_snapshot(self.snapshot_path, store.export_columns(), self.generation)
+        for generation in self.wal_generations():
+            if generation < self.generation:
+                os.remove(self.wal_path(generation))
+        logger.info(f"Graph checkpoint generation={self.generation} took {time.perf_counter() - started:.2f}s")
+
+    def close(self):
+        self._stop.set()
+        if self._follower is not None:
+            self._follower.join()
+            self._follower = None
+        if self.wal is not None:
+            self.wal.close()
+            self.wal = None
+        if self._tail is not None:
+            self._tail.close()
+            self._tail = None
+        if self._shared_lock is not None:
+            self._shared_lock.close()
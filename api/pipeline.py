@@ -0,0 +1,409 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterable, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from .helpers import extract_triples
+from .html_extract import chunk_paragraphs, decode_html, extract_paragraphs
+from .llm_scheduler import coerce_confidence
+from .metrics import CHUNKS, LLM_CALLS, LLM_RETRIES, LLM_TOKENS, TRIPLES, in_context, stage, tracing
+from .near_duplicates import ChunkIndex, simhash
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+
+# Chunks larger than this are skipped to control token costs
+MAX_CHUNK_CHARS = 4000
+
+
+def chunk_text(text, target=1800, overlap=200):
+    """Robust text chunking with overlap."""
+    if not text:
+        return []
+    chunks = []
+    i = 0
+    while i < len(text):
+        j = min(i+target, len(text))
+        chunks.append(text[i:j])
+        if j == len(text):
+            break
+        i = j - overlap
+        if i < 0:
+            i = 0
+    return chunks
+
+
+def html_to_chunks(content: bytes) -> List[str]:
+    """Extract the main content of an HTML document and chunk it on paragraph boundaries."""
+    with stage("parse"):
+        paragraphs = extract_paragraphs(decode_html(content))
+    with stage("chunk"):
+        return chunk_paragraphs(paragraphs, target=1800, overlap=200)
+
+
+def triple_fields(tr: Any) -> Optional[Tuple[str, str, str, float]]:
+    """
+    Return (subject, relation, object, confidence) from a dict or tuple triple,
+    with the confidence clamped to [0, 1] (0.5 if it is not a number); None if
+    the subject, relation or object is empty or not a string.
+    """
+    if isinstance(tr, (list, tuple)):
+        fields = tr[:3] if len(tr) >= 3 else ()
+        confidence = tr[3] if len(tr) > 3 else 0.5
+    elif isinstance(tr, dict):
+        fields = (tr.get("subject"), tr.get("relation"), tr.get("object"))
+        confidence = tr.get("confidence", 0.5)
+    else:
+        return None
+    if len(fields) < 3 or not all(isinstance(field, str) and field.strip() for field in fields):
+        return None
+    return fields[0], fields[1], fields[2], coerce_confidence(confidence)
+
+
+def apply_triples(store, triples: List[Any], source_id: str, replace: bool = False) -> int:
+    """
+    Upsert extracted triples into the store in one transaction, returning how many were applied.
+    With replace=True whatever source_id asserted before and no longer does is retracted in the same transaction.
+    """
+    applied = 0
+    with stage("upsert"), store.transaction() as tx:
+        if replace:
+            tx.replace_source(source_id)
+        for tr in triples:
+            fields = triple_fields(tr)
+            if fields is None:
+                continue
+            subj, rel, obj, confidence = fields
+            tx.upsert_triple(subj, rel, obj, source_id, confidence=confidence)
+            applied += 1
+    TRIPLES.inc(applied)
+    return applied
+
+
+class IngestReport:
+    """Counters collected while running one ingest through the pipeline."""
+
+    def __init__(self):
+        self.documents = 0
+        self.empty_documents: List[str] = []
+        self.chunks = 0
+        self.chunks_done = 0
+        self.skipped_chunks = 0
+        self.llm_calls_saved = 0  # near-duplicate chunks served from the chunk index
+        self.llm_calls = 0
+        self.llm_retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.triples = 0
+        self.elapsed = 0.0
+
+    def add_usage(self, usage):
+        """Count the LLM calls and tokens an extraction reported (see llm_scheduler.Usage)."""
+        self.llm_calls += usage.calls
+        self.llm_retries += usage.retries
+        self.prompt_tokens += usage.prompt_tokens
+        self.completion_tokens += usage.completion_tokens
+        LLM_CALLS.inc(usage.calls)
+        LLM_RETRIES.inc(usage.retries)
+        LLM_TOKENS.inc(usage.prompt_tokens, "prompt")
+        LLM_TOKENS.inc(usage.completion_tokens, "completion")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "documents": self.documents,
+            "empty_documents": list(self.empty_documents),
+            "chunks": self.chunks,
+            "chunks_done": self.chunks_done,
+            "skipped_chunks": self.skipped_chunks,
+            "llm_calls_saved": self.llm_calls_saved,
+            "llm_calls": self.llm_calls,
+            "llm_retries": self.llm_retries,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "triples": self.triples,
+            "elapsed": round(self.elapsed, 4),
+        }
+
+
+ProgressCallback = Callable[[IngestReport, str], None]
+
+
+class IngestPipeline:
+    """
+    Concurrent fetch -> parse/chunk -> extract -> upsert pipeline.
+
+    URLs are fetched over a shared connection pool with a per-host concurrency
+    limit, HTML parsing and chunking run in the default executor, and chunk
+    extraction is fanned out over a bounded thread pool so the event loop never
+    blocks on the network or the LLM. Upserts are applied chunk by chunk in
+    request order as soon as each chunk's predecessors are done, so the
+    resulting graph does not depend on timing.
+
+    With replace=True a document is re-ingested: each chunk's transaction
+    also retracts what that chunk asserted last time and no longer does,
+    and chunks the document no longer has are retracted at the end. The
+    graph never lacks the unchanged part of the page, and the work is
+    proportional to the page rather than to the graph.
+    """
+
+    def __init__(
+        self,
+        store,
+        extract_fn: Callable[[str, str], List[Any]] = extract_triples,
+        max_connections: int = 32,
+        per_host_limit: int = 4,
+        extract_workers: int = 32,
+        timeout: float = 15.0,
+        max_chunk_chars: int = MAX_CHUNK_CHARS,
+        chunk_index: Optional[ChunkIndex] = None,
+    ):
+        self.store = store
+        self.extract_fn = extract_fn
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.max_chunk_chars = max_chunk_chars
+        # Near-duplicate chunks reuse the first copy's triples instead of being extracted again
+        self.chunk_index = chunk_index
+        # Workers mostly wait for the extraction scheduler, which batches whatever is in flight
+        self._executor = ThreadPoolExecutor(max_workers=extract_workers, thread_name_prefix="extract")
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={"User-Agent": USER_AGENT},
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+
+    async def aclose(self):
+        """Close the HTTP connection pool and the extraction workers."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._executor.shutdown(wait=False)
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """GET one URL through the shared pool, respecting the per-host limit; the status is not checked."""
+        async with self._host_limit(url):
+            with stage("fetch"):
+                r = await self._get_client().get(url, headers=headers)
+            if tracing():
+                logger.info(f"TRACE fetch: url={url} status={r.status_code} bytes={len(r.content)}")
+            return r
+
+    async def fetch(self, url: str) -> bytes:
+        """Fetch one URL through the shared pool, respecting the per-host limit."""
+        r = await self.get(url)
+        r.raise_for_status()
+        return r.content
+
+    async def fetch_chunks(self, url: str) -> List[str]:
+        """Fetch a URL and chunk its text off the event loop; returns [] on failure."""
+        try:
+            content = await self.fetch(url)
+            loop = asyncio.get_running_loop()
+            chunks = await loop.run_in_executor(None, in_context(html_to_chunks, content))
+            if tracing():
+                logger.info(f"TRACE chunking: url={url} count={len(chunks)}")
+            return chunks
+        except Exception as e:
+            logger.error(f"Error processing URL {url}: {str(e)}")
+            return []
+
+    def submit_chunks(self, name: str, chunks: Sequence[str], report: IngestReport) -> List[Tuple[str, "asyncio.Future"]]:
+        """Queue extraction of every chunk of one document on the worker pool, in chunk order."""
+        jobs = []
+        for i, chunk in enumerate(chunks):
+            job = self.submit_chunk(name, i, chunk, report)
+            if job is not None:
+                jobs.append(job)
+        return jobs
+
+    def submit_chunk(self, name: str, i: int, chunk: str, report: IngestReport) -> Optional[Tuple[str, "asyncio.Future"]]:
+        """Queue extraction of chunk i of a document; None if the chunk is skipped."""
+        report.chunks += 1
+        if len(chunk) > self.max_chunk_chars:
+            logger.info(f"Skipping chunk {i} from {name} - too large ({len(chunk)} chars)")
+            report.skipped_chunks += 1
+            CHUNKS.inc(1, "skipped")
+            return None
+        source_id = f"{name}#chunk_{i}"
+        index = self.chunk_index
+        if index is None:
+            return source_id, self._extract(chunk, source_id)
+
+        fingerprint = simhash(chunk)
+        entry = index.find(fingerprint)
+        if entry is not None:
+            report.llm_calls_saved += 1
+            CHUNKS.inc(1, "reused")
+            return source_id, asyncio.ensure_future(self._reuse(index, entry, chunk, source_id))
+        job = self._extract(chunk, source_id)
+        entry = index.reserve(fingerprint, source_id, pending=job)
+        job.add_done_callback(lambda job: self._remember(index, entry, job))
+        return source_id, job
+
+    def _extract(self, chunk: str, source_id: str) -> "asyncio.Future":
+        """Run extract_fn on the worker pool, timed as the extract stage of the calling request."""
+        CHUNKS.inc(1, "extracted")
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, in_context(self._timed_extract, chunk, source_id))
+
+    def _timed_extract(self, chunk: str, source_id: str) -> List[Any]:
+        with stage("extract"):
+            return self.extract_fn(chunk, source_id)
+
+    @staticmethod
+    def _remember(index: ChunkIndex, entry: int, job: "asyncio.Future"):
+        """Store a finished extraction in the chunk index (once), or forget the chunk if it failed."""
+        if index.pending(entry) is not job:
+            return
+        if job.cancelled() or job.exception() is not None:
+            index.discard(entry)
+            return
+        rows = [triple_fields(tr) for tr in job.result()]
+        index.resolve(entry, [row for row in rows if row is not None])
+
+    async def _reuse(self, index: ChunkIndex, entry: int, chunk: str, source_id: str) -> List[Any]:
+        """Triples for a near-duplicate chunk: the first copy's, re-attributed to source_id."""
+        pending = index.pending(entry)
+        if pending is not None:
+            try:
+                await asyncio.shield(pending)
+            except Exception:
+                # The first copy failed, so this one is extracted after all
+                return await self._extract(chunk, source_id)
+            # Awaiting a finished future does not yield, so the done callback may not have run yet
+            self._remember(index, entry, pending)
+        if index.mode == "skip":
+            return None  # nothing to add, and nothing this source asserted before is stale
+        return index.triples(entry, source_id)
+
+    async def _apply_in_order(self, jobs: Iterable[Tuple[str, "asyncio.Future"]], report: IngestReport,
+                              on_chunk: Optional[ProgressCallback], replace: bool = False):
+        """Upsert each chunk's triples as soon as it and every chunk before it are extracted."""
+        loop = asyncio.get_running_loop()
+        for source_id, job in jobs:
+            try:
+                triples = await job
+            except Exception:
+                logger.exception(f"ERROR extract for source_id={source_id}")
+                CHUNKS.inc(1, "failed")
+                triples = None  # a failed chunk keeps what it asserted before
+            usage = getattr(triples, "usage", None)
+            if usage is not None:
+                report.add_usage(usage)
+            if triples is not None:
+                # Upserts run in a worker thread, so waiting for graph readers never blocks the event loop
+                report.triples += await loop.run_in_executor(
+                    None, in_context(apply_triples, self.store, triples, source_id, replace))
+            report.chunks_done += 1
+            if on_chunk is not None:
+                on_chunk(report, source_id)
+
+    async def _retract_stale_chunks(self, name: str, source_ids: Iterable[str]):
+        """After re-ingesting document name, retract its chunks that were not part of this ingest."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, lambda: self.store.retract_source(f"{name}#", prefix=True, keep=source_ids))
+
+    async def apply_document(self, name: str, jobs: Sequence[Tuple[str, "asyncio.Future"]], report: IngestReport,
+                             on_chunk: Optional[ProgressCallback] = None, replace: bool = False):
+        """Upsert the chunks of one document submitted with submit_chunks, retracting chunks it no longer has."""
+        await self._apply_in_order(jobs, report, on_chunk, replace)
+        if replace:
+            await self._retract_stale_chunks(name, [source_id for source_id, _ in jobs])
+
+    async def _process_url(self, url: str, report: IngestReport) -> Optional[List[Tuple[str, "asyncio.Future"]]]:
+        chunks = await self.fetch_chunks(url)
+        if not chunks:
+            return None
+        return self.submit_chunks(url, chunks, report)
+
+    async def ingest_urls(self, urls: Sequence[str], on_chunk: Optional[ProgressCallback] = None,
+                          replace: bool = False) -> IngestReport:
+        """
+        Ingest every URL concurrently and upsert the triples in URL order.
+        on_chunk(report, source_id) is called after each chunk's triples are upserted.
+        """
+        report = IngestReport()
+        started = time.perf_counter()
+        tasks = [asyncio.ensure_future(self._process_url(url, report)) for url in urls]
+        try:
+            for url, task in zip(urls, tasks):
+                jobs = await task
+                report.documents += 1
+                if jobs is None:
+                    logger.warning(f"No content extracted from {url}")
+                    report.empty_documents.append(url)
+                    if on_chunk is not None:
+                        on_chunk(report, url)
+                    continue
+                await self.apply_document(url, jobs, report, on_chunk, replace)
+        finally:
+            for task in tasks:
+                task.cancel()
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    async def ingest_chunks(self, name: str, chunks: Sequence[str],
+                            on_chunk: Optional[ProgressCallback] = None, replace: bool = False) -> IngestReport:
+        """Extract and upsert already-chunked text, e.g. an uploaded file."""
+        report = IngestReport()
+        started = time.perf_counter()
+        jobs = self.submit_chunks(name, chunks, report)
+        await self.apply_document(name, jobs, report, on_chunk, replace)
+        report.documents = 1
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    async def ingest_stream(self, name: str, chunks: AsyncIterable[str],
+                            on_chunk: Optional[ProgressCallback] = None, max_pending: int = 32,
+                            replace: bool = False) -> IngestReport:
+        """
+        Extract and upsert chunks as a reader produces them, e.g. from an
+        upload still in flight. At most max_pending chunks wait for extraction,
+        so memory does not grow with the size of the document.
+        """
+        report = IngestReport()
+        started = time.perf_counter()
+        pending: Deque[Tuple[str, "asyncio.Future"]] = deque()
+        source_ids = []
+        try:
+            i = 0
+            async for chunk in chunks:
+                job = self.submit_chunk(name, i, chunk, report)
+                i += 1
+                if job is not None:
+                    pending.append(job)
+                    source_ids.append(job[0])
+                if len(pending) >= max_pending:
+                    await self._apply_in_order([pending.popleft()], report, on_chunk, replace)
+            await self._apply_in_order(pending, report, on_chunk, replace)
+            if replace:
+                await self._retract_stale_chunks(name, source_ids)
+        finally:
+            for _, job in pending:
+                job.cancel()
+        report.documents = 1
+        report.elapsed = time.perf_counter() - started
+        return report
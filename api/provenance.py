@@ -0,0 +1,124 @@
+"""
+Reverse index from source ids to the edges they asserted.
+
+Source ids look like "<document>#chunk_<i>" (a URL or file name plus the
+chunk), so the index also groups them by document. Looking up everything
+one page asserted, or every page under a URL prefix, then costs time in
+proportion to what it returns rather than to the size of the graph.
+"""
+import sys
+from bisect import bisect_left
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+
+def document_of(source_id: str) -> str:
+    """The document part of a source id: everything before the first '#'."""
+    return source_id.split("#", 1)[0]
+
+
+class ProvenanceIndex:
+    """Source id -> edges it asserted, plus document -> source ids for prefix lookups."""
+
+    def __init__(self):
+        self._edges: Dict[str, Dict[Hashable, None]] = {}  # source id -> edges, in order of first sighting
+        self._documents: Dict[str, Dict[str, None]] = {}  # document -> its source ids
+        self._sorted: Optional[List[str]] = None  # documents in sorted order, rebuilt on the next prefix query
+        self._assertions = 0  # (source, edge) pairs
+
+    def __len__(self) -> int:
+        return len(self._edges)
+
+    def __contains__(self, source_id: str) -> bool:
+        return source_id in self._edges
+
+    @staticmethod
+    def intern(source_id: str) -> str:
+        """Share one string object per source id between the index and the engine."""
+        return sys.intern(source_id)
+
+    def _new_source(self, source_id: str) -> Dict[Hashable, None]:
+        edges = self._edges[source_id] = {}
+        document = document_of(source_id)
+        sources = self._documents.get(document)
+        if sources is None:
+            sources = self._documents[document] = {}
+            self._sorted = None
+        sources[source_id] = None
+        return edges
+
+    def add(self, source_id: str, edge: Hashable):
+        edges = self._edges.get(source_id)
+        if edges is None:
+            edges = self._new_source(source_id)
+        if edge not in edges:
+            edges[edge] = None
+            self._assertions += 1
+
+    def add_edges(self, source_id: str, new_edges: Iterable[Hashable]):
+        """add for many edges of one source."""
+        edges = self._edges.get(source_id)
+        if edges is None:
+            edges = self._new_source(source_id)
+        before = len(edges)
+        edges.update(dict.fromkeys(new_edges))
+        self._assertions += len(edges) - before
+
+    def add_all(self, sources: Iterable[str], edge: Hashable):
+        for source_id in sources:
+            self.add(source_id, edge)
+
+    def discard(self, source_id: str, edge: Hashable):
+        edges = self._edges.get(source_id)
+        if edges is None:
+            return
+        if edges.pop(edge, 0) is None:
+            self._assertions -= 1
+        if not edges:
+            self._forget(source_id)
+
+    def discard_all(self, sources: Iterable[str], edge: Hashable):
+        for source_id in sources:
+            self.discard(source_id, edge)
+
+    def pop(self, source_id: str) -> List[Any]:
+        """Remove a source and return the edges it asserted."""
+        edges = self._edges.get(source_id)
+        if edges is None:
+            return []
+        self._forget(source_id)
+        self._assertions -= len(edges)
+        return list(edges)
+
+    def _forget(self, source_id: str):
+        del self._edges[source_id]
+        document = document_of(source_id)
+        sources = self._documents[document]
+        del sources[source_id]
+        if not sources:
+            del self._documents[document]
+            self._sorted = None
+
+    def edges(self, source_id: str) -> List[Any]:
+        return list(self._edges.get(source_id, ()))
+
+    def count(self, source_id: str) -> int:
+        return len(self._edges.get(source_id, ()))
+
+    def sources_with_prefix(self, prefix: str) -> List[str]:
+        """Source ids starting with prefix, grouped by document in sorted document order."""
+        if "#" in prefix:
+            # A prefix inside one document, e.g. "https://example.com/page#"
+            return [s for s in self._documents.get(document_of(prefix), ()) if s.startswith(prefix)]
+        if self._sorted is None:
+            self._sorted = sorted(self._documents)
+        documents = self._sorted
+        sources = []
+        for i in range(bisect_left(documents, prefix), len(documents)):
+            if not documents[i].startswith(prefix):
+                break
+            sources.extend(self._documents[documents[i]])
+        return sources
+
+    def stats(self) -> Dict[str, int]:
+        return {"sources": len(self._edges), "documents": len(self._documents),
+                "assertions": self._assertions}
@@ -0,0 +1,272 @@
+"""
+Targeted graph queries with cursor pagination.
+
+Each query walks only the part of the graph it returns, through the
+storage engine's adjacency and relation lists, so its cost follows the
+size of the answer rather than the size of the graph:
+
+    node       one node by id, with its in- and out-degree
+    nodes      nodes whose label is (case-insensitive) or contains a string
+    neighbors  a node's out- and/or in-edges with the node at the other end
+    edges      the edges with one relation, with their endpoints
+    paths      shortest paths between two nodes, up to a number of hops
+
+Neighbors, edges and paths can be filtered by relation and minimum
+confidence. Listings return at most `limit` items and a `next` cursor,
+None on the last page. A cursor holds the position the scan stopped at,
+so the next page resumes there instead of skipping what was already
+returned. A filtered scan looks at no more than `max_scan` edges per
+page; the page may then come back short, even empty, with a cursor to go
+on from. Pages read at different graph versions (see `version`) may
+repeat or miss edges changed in between.
+
+Path search is breadth-first from both ends, growing the smaller side
+one hop at a time. It expands at most `max_branch` edges of any node
+and reaches at most `max_visited` nodes, so hubs cannot blow it up. When
+a cap cuts the search short the result says `"truncated": true`, and a
+longer path, or none, may be returned where a shorter one exists.
+"""
+import base64
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+DIRECTIONS = ("out", "in", "both")
+
+# Most hops a path query may ask for
+MAX_PATH_HOPS = 6
+
+
+class NodeNotFoundError(LookupError):
+    pass
+
+
+def encode_cursor(kind: str, position: int) -> str:
+    return base64.urlsafe_b64encode(f"{kind}:{position}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kinds: Tuple[str, ...]) -> Tuple[str, int]:
+    """(kind, position) of a cursor returned by a query over `kinds`; ValueError if it is not one."""
+    try:
+        kind, position = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        position = int(position)
+    except ValueError:
+        raise ValueError("Invalid cursor") from None
+    if kind not in kinds or position < 0:
+        raise ValueError("Invalid cursor")
+    return kind, position
+
+
+class GraphQuery:
+    """Paginated node, neighbor, edge and path queries on one GraphStore."""
+
+    def __init__(self, store, max_scan: int = 10000, max_branch: int = 1000, max_visited: int = 20000):
+        self.store = store
+        self.max_scan = max_scan
+        self.max_branch = max_branch
+        self.max_visited = max_visited
+
+    def _handle(self, node_id: str) -> Hashable:
+        handle = self.store.engine.node_handle(node_id)
+        if handle is None:
+            raise NodeNotFoundError(node_id)
+        return handle
+
+    def _accept(self, relation: Optional[str], min_confidence: float) -> Optional[Callable[[Hashable], bool]]:
+        """Edge filter for the query's relation and confidence, or None to take every edge."""
+        engine = self.store.engine
+        if relation is None and min_confidence <= 0:
+            return None
+        if relation is None:
+            return lambda edge: engine.edge_confidence(edge) >= min_confidence
+        return lambda edge: engine.edge_relation(edge) == relation and engine.edge_confidence(edge) >= min_confidence
+
+    def node(self, node_id: str) -> Dict[str, Any]:
+        store = self.store
+        with store.read():
+            handle = self._handle(node_id)
+            return {**store.node_dto(handle), "out_degree": store.engine.out_degree(handle),
+                    "in_degree": store.engine.in_degree(handle), "version": store.version}
+
+    def nodes(self, label: str, match: str = "exact", cursor: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+        """
+        Nodes whose label equals `label` ignoring case (match="exact"), or
+        contains it (match="contains"), in the order they were created.
+        """
+        if match not in ("exact", "contains"):
+            raise ValueError("match must be 'exact' or 'contains'")
+        if not label:
+            raise ValueError("label must not be empty")
+        _, after = decode_cursor(cursor, ("label",)) if cursor else ("label", -1)
+        store = self.store
+        engine = store.engine
+        with store.read():
+            if store.indexed:
+                index = store.label_index
+                matches = index.search(label)
+                if match == "exact":
+                    matches = [h for h in matches if index.label(h) == label.lower()]
+                page = index.ordered_after(matches, after, limit + 1)
+            else:
+                wanted = label.lower()
+                matches = (h for h in engine.iter_nodes()
+                           if (engine.node_label(h).lower() == wanted if match == "exact"
+                               else wanted in engine.node_label(h).lower()))
+                page = list(islice(((rank, h) for rank, h in enumerate(matches) if rank > after), limit + 1))
+            return {"version": store.version, "nodes": [store.node_dto(h) for _, h in page[:limit]],
+                    "next": encode_cursor("label", page[limit - 1][0]) if len(page) > limit else None}
+
+    def neighbors(self, node_id: str, direction: str = "both", relation: Optional[str] = None,
+                  min_confidence: float = 0.0, cursor: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+        """A node's edges, outgoing first, each with the node at its other end."""
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {', '.join(DIRECTIONS)}")
+        phases = ("out", "in") if direction == "both" else (direction,)
+        phase, position = decode_cursor(cursor, phases) if cursor else (phases[0], 0)
+        accept = self._accept(relation, min_confidence)
+        store = self.store
+        engine = store.engine
+        with store.read():
+            handle = self._handle(node_id)
+            neighbors: List[Dict[str, Any]] = []
+            next_cursor = None
+            scanned = 0
+            for phase in phases[phases.index(phase):]:
+                scan = engine.out_edges_from(handle, position) if phase == "out" else \
+                    engine.in_edges_from(handle, position)
+                for position, edge in scan:
+                    if len(neighbors) == limit or scanned == self.max_scan:
+                        next_cursor = encode_cursor(phase, position)
+                        break
+                    scanned += 1
+                    if accept is None or accept(edge):
+                        source, target = engine.edge_endpoints(edge)
+                        other = target if phase == "out" else source
+                        neighbors.append({"direction": phase, "edge": store.edge_dto(edge),
+                                          "node": store.node_dto(other)})
+                else:
+                    position = 0
+                    continue
+                break
+            return {"version": store.version, "node": store.node_dto(handle), "neighbors": neighbors,
+                    "next": next_cursor}
+
+    def edges(self, relation: str, min_confidence: float = 0.0, cursor: Optional[str] = None,
+              limit: int = 100) -> Dict[str, Any]:
+        """Edges with this exact relation, oldest first, and the nodes at their ends."""
+        _, position = decode_cursor(cursor, ("edges",)) if cursor else ("edges", 0)
+        store = self.store
+        engine = store.engine
+        with store.read():
+            edges = []
+            nodes: Dict[Hashable, None] = {}
+            next_cursor = None
+            for scanned, (position, edge) in enumerate(engine.relation_edges_from(relation, position)):
+                if len(edges) == limit or scanned == self.max_scan:
+                    next_cursor = encode_cursor("edges", position)
+                    break
+                if engine.edge_confidence(edge) >= min_confidence:
+                    edges.append(edge)
+                    nodes.update(dict.fromkeys(engine.edge_endpoints(edge)))
+            return {"version": store.version, "relation": relation, "nodes": [store.node_dto(h) for h in nodes],
+                    "edges": [store.edge_dto(h) for h in edges], "next": next_cursor}
+
+    def paths(self, source_id: str, target_id: str, max_hops: int = 3, directed: bool = False,
+              relation: Optional[str] = None, min_confidence: float = 0.0, limit: int = 10) -> Dict[str, Any]:
+        """
+        Up to `limit` shortest paths from source to target of at most
+        max_hops edges. Undirected by default: edges may be followed
+        against their direction.
+        """
+        if not 0 < max_hops <= MAX_PATH_HOPS:
+            raise ValueError(f"max_hops must be in 1..{MAX_PATH_HOPS}")
+        accept = self._accept(relation, min_confidence)
+        store = self.store
+        with store.read():
+            source, target = self._handle(source_id), self._handle(target_id)
+            routes, truncated = self._shortest_routes(source, target, max_hops, directed, accept, limit)
+            nodes = dict.fromkeys(chain.from_iterable(nodes for nodes, _ in routes))
+            edges = dict.fromkeys(chain.from_iterable(edges for _, edges in routes))
+            return {
+                "version": store.version,
+                "length": len(routes[0][1]) if routes else None,
+                "paths": [{"nodes": [store.engine.node_id(h) for h in nodes],
+                           "edges": [store.engine.edge_id(h) for h in edges]} for nodes, edges in routes],
+                "nodes": [store.node_dto(h) for h in nodes],
+                "edges": [store.edge_dto(h) for h in edges],
+                "truncated": truncated,
+            }
+
+    def _steps(self, node: Hashable, outgoing: bool, incoming: bool,
+               accept: Optional[Callable[[Hashable], bool]]) -> Tuple[List[Tuple[Hashable, Hashable]], bool]:
+        """(edge, neighbor) pairs one hop from node, and whether max_branch cut them short."""
+        engine = self.store.engine
+        edges = chain(engine.out_edges(node) if outgoing else (), engine.in_edges(node) if incoming else ())
+        steps = []
+        for count, edge in enumerate(edges):
+            if count == self.max_branch:
+                return steps, True
+            if accept is None or accept(edge):
+                source, target = engine.edge_endpoints(edge)
+                neighbor = target if source == node else source
+                if neighbor != node:
+                    steps.append((edge, neighbor))
+        return steps, False
+
+    def _shortest_routes(self, source: Hashable, target: Hashable, max_hops: int, directed: bool,
+                         accept: Optional[Callable[[Hashable], bool]],
+                         limit: int) -> Tuple[List[Tuple[List[Hashable], List[Hashable]]], bool]:
+        if source == target:
+            return [([source], [])], False
+        # node -> (hops from this side's end, [(previous node, edge)] on shortest routes to it)
+        sides = ({source: (0, [])}, {target: (0, [])})
+        frontiers = ([source], [target])
+        hops = [0, 0]
+        truncated = False
+        while frontiers[0] and frontiers[1] and hops[0] + hops[1] < max_hops:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            reached, other = sides[side], sides[1 - side]
+            # Forward follows out-edges, backward in-edges; undirected both
+            outgoing, incoming = (side == 0 or not directed), (side == 1 or not directed)
+            depth = hops[side] + 1
+            new: Dict[Hashable, None] = {}
+            for node in frontiers[side]:
+                steps, cut = self._steps(node, outgoing, incoming, accept)
+                truncated |= cut
+                for edge, neighbor in steps:
+                    known = reached.get(neighbor)
+                    if known is None:
+                        if len(sides[0]) + len(sides[1]) >= self.max_visited:
+                            truncated = True
+                            continue
+                        reached[neighbor] = (depth, [(node, edge)])
+                        new[neighbor] = None
+                    elif known[0] == depth and len(known[1]) < limit:
+                        known[1].append((node, edge))
+            hops[side] = depth
+            frontiers = (list(new), frontiers[1]) if side == 0 else (frontiers[0], list(new))
+            meetings = [node for node in new if node in other]
+            if meetings:
+                length = min(depth + other[node][0] for node in meetings)
+                meetings = [node for node in meetings if depth + other[node][0] == length]
+                return list(islice(self._join(sides, meetings), limit)), truncated
+        return [], truncated
+
+    @classmethod
+    def _join(cls, sides, meetings: List[Hashable]) -> Iterator[Tuple[List[Hashable], List[Hashable]]]:
+        """Source-to-target routes through each meeting node."""
+        forward, backward = sides
+        for meeting in meetings:
+            for head_nodes, head_edges in cls._routes(forward, meeting):
+                for tail_nodes, tail_edges in cls._routes(backward, meeting):
+                    yield head_nodes + tail_nodes[-2::-1], head_edges + tail_edges[::-1]
+
+    @classmethod
+    def _routes(cls, reached, node: Hashable) -> Iterator[Tuple[List[Hashable], List[Hashable]]]:
+        """Routes from a side's end to node, following the recorded parents."""
+        parents = reached[node][1]
+        if not parents:
+            yield [node], []
+            return
+        for previous, edge in parents:
+            for nodes, edges in cls._routes(reached, previous):
+                yield nodes + [node], edges + [edge]
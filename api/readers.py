@@ -0,0 +1,281 @@
+"""
+Streaming readers that turn uploaded bytes into text chunks.
+
+A reader is fed raw blocks as they arrive and returns the chunks completed
+so far, so a file of any size is ingested with memory bounded by the block
+size and the chunk size:
+
+    TextReader       plain text (.txt, .log), decoded incrementally
+    JsonLinesReader  one JSON record per line (.jsonl, .ndjson)
+    CsvReader        one row per record (.csv), quoted newlines allowed
+    GzipReader       wraps any of the above for .gz files
+
+Decoding is incremental, so a multi-byte character split across two
+blocks is decoded whole. Chunking keeps the semantics of
+pipeline.chunk_text: the chunks are identical to chunking the whole text
+at once.
+"""
+import asyncio
+import codecs
+import csv
+import json
+import zlib
+from itertools import repeat
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Iterator, List, Optional
+
+DEFAULT_CHUNK_TARGET = 1800
+DEFAULT_CHUNK_OVERLAP = 200
+# Block size used when reading from files
+READ_BLOCK = 1 << 16
+# JSON fields taken as a record's text, in order of preference
+TEXT_FIELDS = ("text", "content", "body", "message")
+
+
+class UnsupportedFormatError(ValueError):
+    """Raised for a file name no reader handles."""
+
+
+class TextChunker:
+    """
+    Incremental version of chunk_text: push text with feed(), collect chunks.
+
+    A chunk is emitted once text beyond it has arrived (it cannot be the
+    last one), and the next chunk starts `overlap` characters before its end.
+    Only the unfinished tail is buffered.
+    """
+
+    def __init__(self, target: int = DEFAULT_CHUNK_TARGET, overlap: int = DEFAULT_CHUNK_OVERLAP):
+        if not 0 <= overlap < target:
+            raise ValueError("overlap must be smaller than target")
+        self.target = target
+        self.overlap = overlap
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        if not text:
+            return []
+        buffer = self._buffer + text
+        chunks = []
+        start = 0
+        step = self.target - self.overlap
+        while len(buffer) - start > self.target:
+            chunks.append(buffer[start:start + self.target])
+            start += step
+        self._buffer = buffer[start:]
+        return chunks
+
+    def finish(self) -> List[str]:
+        tail, self._buffer = self._buffer, ""
+        return [tail] if tail else []
+
+
+class TextReader:
+    """Plain text: decode incrementally and chunk."""
+
+    def __init__(self, encoding: str = "utf-8", target: int = DEFAULT_CHUNK_TARGET,
+                 overlap: int = DEFAULT_CHUNK_OVERLAP):
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="ignore")
+        self.chunker = TextChunker(target, overlap)
+        self.bytes_read = 0
+
+    def feed(self, data: bytes) -> List[str]:
+        self.bytes_read += len(data)
+        return self.feed_text(self._decoder.decode(data))
+
+    def feed_text(self, text: str) -> List[str]:
+        return self.chunker.feed(text)
+
+    def finish(self) -> List[str]:
+        return self.feed_text(self._decoder.decode(b"", final=True)) + self.chunker.finish()
+
+
+class LineReader(TextReader):
+    """Base for line-oriented formats: feed_lines() gets every complete line."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._partial = ""
+        self.records = 0
+        self.bad_records = 0
+
+    def feed_text(self, text: str) -> List[str]:
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        return self.feed_lines(lines) if lines else []
+
+    def finish(self) -> List[str]:
+        chunks = self.feed_text(self._decoder.decode(b"", final=True))
+        partial, self._partial = self._partial, ""
+        if partial:
+            chunks += self.feed_lines([partial])
+        return chunks + self.end_lines() + self.chunker.finish()
+
+    def feed_lines(self, lines: List[str]) -> List[str]:
+        raise NotImplementedError
+
+    def end_lines(self) -> List[str]:
+        """Called after the last line; returns chunks for anything still held back."""
+        return []
+
+
+def record_text(record: Any) -> str:
+    """Text of one structured record: a known text field, else its string values."""
+    if isinstance(record, str):
+        return record
+    if isinstance(record, dict):
+        for field in TEXT_FIELDS:
+            if isinstance(record.get(field), str):
+                return record[field]
+        return " ".join(str(v) for v in record.values() if isinstance(v, (str, int, float)))
+    if isinstance(record, list):
+        return " ".join(record_text(v) for v in record)
+    return ""
+
+
+class JsonLinesReader(LineReader):
+    """One JSON value per line; each record's text becomes one line of the chunked text."""
+
+    def feed_lines(self, lines: List[str]) -> List[str]:
+        texts = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                text = record_text(json.loads(line))
+            except ValueError:
+                self.bad_records += 1
+                continue
+            self.records += 1
+            if text:
+                texts.append(text)
+        return self.chunker.feed("".join(t + "\n" for t in texts))
+
+
+class CsvReader(LineReader):
+    """
+    CSV with a header row; each row becomes "column: value; ..." text.
+    A row ends at a newline outside double quotes, so quoted fields may
+    span lines.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.header: Optional[List[str]] = None
+        self._row: List[str] = []  # physical lines of an unfinished row
+        self._quotes = 0
+
+    def feed_lines(self, lines: List[str]) -> List[str]:
+        quotes = list(map(str.count, lines, repeat('"')))
+        if not self._row and not any(quotes):
+            # No quoted fields: every line is a row
+            return self._feed_rows(lines)
+        rows = []
+        for line, count in zip(lines, quotes):
+            self._row.append(line)
+            self._quotes += count
+            if self._quotes % 2:
+                continue  # inside a quoted field
+            rows.append("\n".join(self._row))
+            self._row, self._quotes = [], 0
+        return self._feed_rows(rows)
+
+    def end_lines(self) -> List[str]:
+        # Unterminated quote at the end of the file: parse what is there
+        rows, self._row, self._quotes = ["\n".join(self._row)] if self._row else [], [], 0
+        return self._feed_rows(rows)
+
+    def _feed_rows(self, rows: List[str]) -> List[str]:
+        texts = []
+        for row in csv.reader(rows):
+            if not row:
+                continue
+            if self.header is None:
+                self.header = [name.strip() for name in row]
+                continue
+            self.records += 1
+            text = "; ".join(f"{name}: {value}" if name else value
+                             for name, value in zip(self.header, row) if value)
+            if text:
+                texts.append(text)
+        return self.chunker.feed("".join(t + "\n" for t in texts))
+
+
+class GzipReader:
+    """Decompresses (possibly multi-member) gzip data into another reader."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self._inflate = zlib.decompressobj(wbits=31)
+        self.bytes_read = 0
+
+    def feed(self, data: bytes) -> List[str]:
+        self.bytes_read += len(data)
+        chunks = []
+        while data:
+            chunks += self.inner.feed(self._inflate.decompress(data))
+            if not self._inflate.eof:
+                break
+            data = self._inflate.unused_data
+            self._inflate = zlib.decompressobj(wbits=31)
+        return chunks
+
+    def finish(self) -> List[str]:
+        return self.inner.feed(self._inflate.flush()) + self.inner.finish()
+
+
+READERS = {
+    ".txt": TextReader,
+    ".log": TextReader,
+    ".jsonl": JsonLinesReader,
+    ".ndjson": JsonLinesReader,
+    ".csv": CsvReader,
+}
+
+
+def reader_for(filename: str, target: int = DEFAULT_CHUNK_TARGET, overlap: int = DEFAULT_CHUNK_OVERLAP):
+    """Reader for a file name's extension (optionally followed by .gz)."""
+    name = filename.lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    for extension, reader_class in READERS.items():
+        if name.endswith(extension):
+            reader = reader_class(target=target, overlap=overlap)
+            return GzipReader(reader) if compressed else reader
+    supported = ", ".join(READERS)
+    raise UnsupportedFormatError(f"Unsupported file type; supported: {supported} (optionally .gz)")
+
+
+def iter_chunks(blocks: Iterable[bytes], reader) -> Iterator[str]:
+    """Chunks of a byte stream, produced as the blocks are read."""
+    for block in blocks:
+        yield from reader.feed(block)
+    yield from reader.finish()
+
+
+async def aiter_chunks(blocks: AsyncIterable[bytes], reader) -> AsyncIterator[str]:
+    """Chunks of an async byte stream (an upload or a request body) as it arrives."""
+    async for block in blocks:
+        for chunk in reader.feed(block):
+            yield chunk
+    for chunk in reader.finish():
+        yield chunk
+
+
+def iter_file(f, block_size: int = READ_BLOCK) -> Iterator[bytes]:
+    """Blocks of a binary file object."""
+    while True:
+        block = f.read(block_size)
+        if not block:
+            return
+        yield block
+
+
+async def aiter_file(f, block_size: int = READ_BLOCK) -> AsyncIterator[bytes]:
+    """Blocks of a binary file object, each read off the event loop."""
+    loop = asyncio.get_running_loop()
+    while True:
+        block = await loop.run_in_executor(None, f.read, block_size)
+        if not block:
+            return
+        yield block
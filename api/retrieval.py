@@ -0,0 +1,376 @@
+"""
+Question-driven evidence retrieval over the graph.
+
+A question is reduced to keywords. The nodes whose labels contain them
+are the seeds, and the graph is explored breadth-first from those seeds
+for a few hops through the storage engine's adjacency. Nothing is copied.
+The walk stops at a node and edge budget, so the cost of a question is
+bounded however large the graph or the match set is. The nodes and edges
+that were reached are ranked as evidence:
+
+    keyword overlap   share of the keywords found in a label or relation
+    confidence        the edge's extraction confidence
+    provenance        how many source chunks assert the edge (log-scaled)
+    similarity        cosine similarity of the question to a label or
+                      verbalized triple, from the semantic index, as a
+                      share of the best match's
+
+With a SemanticIndex (see semantic.py), the nodes and edges most similar
+to the question are seeds too, so "Which grippers were trained by
+demonstrations?" reaches "Gripping Systems learn from Demonstrated
+Motions" though no label contains "gripper" or "demonstration". Scores
+are discounted by hop distance. Results are memoized in an LRU keyed by the normalized question
+and the graph version; while the semantic index is behind the graph,
+results are not cached.
+
+A question never waits for ingestion: while a writer holds the store's
+lock, it is answered from the store's last snapshot (see SnapshotGraph),
+which may miss the writes since.
+"""
+import heapq
+import math
+import re
+import threading
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+from .entity_resolution import stem
+
+STOP_WORDS = frozenset((
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are',
+    'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+    'should', 'may', 'might', 'can', 'what', 'when', 'where', 'who', 'why', 'how'
+))
+WORD = re.compile(r"\w+")
+
+# Evidence score weights
+OVERLAP_WEIGHT = 1.0
+CONFIDENCE_WEIGHT = 0.5
+PROVENANCE_WEIGHT = 0.25
+SEMANTIC_WEIGHT = 1.0
+
+# Semantic matches less similar than this are ignored
+MIN_SIMILARITY = 0.25
+
+
+def question_keywords(question: str) -> List[str]:
+    """Distinct stemmed content words of a question, in order of appearance."""
+    words = (stem(word) for word in WORD.findall(question.lower()))
+    return list(dict.fromkeys(word for word in words if word not in STOP_WORDS and len(word) > 1))
+
+
+def overlap(text: str, keywords: List[str]) -> float:
+    """Share of keywords contained in text (already lowercased)."""
+    return sum(1 for keyword in keywords if keyword in text) / len(keywords) if keywords else 0.0
+
+
+def appended(mapping: Dict[Hashable, Any], handles: Set[Hashable]) -> List[Hashable]:
+    """handles, all keys of mapping, in mapping order; new keys come last, so only the tail is scanned."""
+    found = []
+    if handles:
+        for h in reversed(mapping):
+            if h in handles:
+                found.append(h)
+                if len(found) == len(handles):
+                    break
+    found.reverse()
+    return found
+
+
+class SnapshotGraph:
+    """
+    Read-only graph over a GraphSnapshot with the engine methods retrieval
+    uses, so a question can be answered without the store's lock.
+
+    Adjacency and a word -> nodes index over the labels are built for the
+    first snapshot. For a later one, the previous SnapshotGraph's tables are
+    copied and patched with the nodes and edges added or removed in between:
+    labels and endpoints never change, and confidences and sources are read
+    from the snapshot's DTOs. A keyword is a run of word characters, so it
+    occurs in a label exactly when it occurs in one of the label's words,
+    and search() only scans the vocabulary rather than every label.
+    """
+
+    def __init__(self, snapshot, previous: Optional["SnapshotGraph"] = None):
+        self.version = snapshot.version
+        self.nodes, self.edges = snapshot.nodes, snapshot.edges
+        if previous is None:
+            self._handle_of: Dict[str, Hashable] = {}  # node id -> handle
+            self._rank: Dict[Hashable, int] = {}  # node -> insertion order
+            self._endpoints: Dict[Hashable, Tuple[Hashable, Hashable]] = {}
+            self._out: Dict[Hashable, Tuple[Hashable, ...]] = {}
+            self._in: Dict[Hashable, Tuple[Hashable, ...]] = {}
+            self._words: Dict[str, Tuple[Hashable, ...]] = {}  # word -> nodes, oldest first
+            self._next_rank = 0
+            self._add(list(self.nodes), list(self.edges))
+            return
+        self._handle_of, self._rank = dict(previous._handle_of), dict(previous._rank)
+        self._endpoints, self._out, self._in = dict(previous._endpoints), dict(previous._out), dict(previous._in)
+        self._words = dict(previous._words)
+        self._next_rank = previous._next_rank
+        self._remove(previous, previous.nodes.keys() - self.nodes.keys(), previous.edges.keys() - self.edges.keys())
+        self._add(appended(self.nodes, self.nodes.keys() - previous.nodes.keys()),
+                  appended(self.edges, self.edges.keys() - previous.edges.keys()))
+
+    def _add(self, nodes: List[Hashable], edges: List[Hashable]):
+        out: Dict[Hashable, List[Hashable]] = {}
+        into: Dict[Hashable, List[Hashable]] = {}
+        words: Dict[str, List[Hashable]] = {}
+        for h in nodes:
+            dto = self.nodes[h]
+            self._handle_of[dto["id"]] = h
+            self._rank[h] = self._next_rank
+            self._next_rank += 1
+            for word in set(WORD.findall(dto["label"].lower())):
+                words.setdefault(word, []).append(h)
+        for h in edges:
+            dto = self.edges[h]
+            source, target = self._endpoints[h] = self._handle_of[dto["source"]], self._handle_of[dto["target"]]
+            out.setdefault(source, []).append(h)
+            into.setdefault(target, []).append(h)
+        # Tuples, so the copies made for later snapshots can share them
+        for table, added in ((self._out, out), (self._in, into), (self._words, words)):
+            for key, handles in added.items():
+                table[key] = table.get(key, ()) + tuple(handles)
+
+    def _remove(self, previous: "SnapshotGraph", nodes: Set[Hashable], edges: Set[Hashable]):
+        out: Dict[Hashable, Set[Hashable]] = {}
+        into: Dict[Hashable, Set[Hashable]] = {}
+        words: Dict[str, Set[Hashable]] = {}
+        for h in edges:
+            source, target = self._endpoints.pop(h)
+            out.setdefault(source, set()).add(h)
+            into.setdefault(target, set()).add(h)
+        for h in nodes:
+            dto = previous.nodes[h]
+            del self._handle_of[dto["id"]]
+            del self._rank[h]
+            for word in set(WORD.findall(dto["label"].lower())):
+                words.setdefault(word, set()).add(h)
+        for table, removed in ((self._out, out), (self._in, into), (self._words, words)):
+            for key, handles in removed.items():
+                kept = tuple(h for h in table[key] if h not in handles)
+                if kept:
+                    table[key] = kept
+                else:
+                    del table[key]
+
+    def search(self, keyword: str, limit: int) -> List[Hashable]:
+        """Up to limit oldest nodes whose label contains keyword."""
+        found = set()
+        for word, handles in self._words.items():
+            if keyword in word:
+                found.update(handles)
+        return heapq.nsmallest(limit, found, key=self._rank.__getitem__)
+
+    def ordered(self, handles) -> List[Hashable]:
+        return sorted(handles, key=self._rank.__getitem__)
+
+    def node_count(self) -> int:
+        return len(self.nodes)
+
+    def has_node(self, h) -> bool:
+        return h in self.nodes
+
+    def has_edge(self, h) -> bool:
+        return h in self.edges
+
+    def node_id(self, h) -> str:
+        return self.nodes[h]["id"]
+
+    def node_label(self, h) -> str:
+        return self.nodes[h]["label"]
+
+    def edge_id(self, h) -> str:
+        return self.edges[h]["id"]
+
+    def edge_relation(self, h) -> str:
+        return self.edges[h]["relation"]
+
+    def edge_confidence(self, h) -> float:
+        return self.edges[h]["confidence"]
+
+    def edge_sources(self, h) -> List[str]:
+        return self.edges[h]["sources"]
+
+    def edge_endpoints(self, h) -> Tuple[Hashable, Hashable]:
+        return self._endpoints[h]
+
+    def out_edges(self, h) -> Tuple[Hashable, ...]:
+        return self._out.get(h, ())
+
+    def in_edges(self, h) -> Tuple[Hashable, ...]:
+        return self._in.get(h, ())
+
+
+class Retriever:
+    """
+    Bounded k-hop retrieval with ranked, cached results for one GraphStore.
+
+    retrieve() returns a dict with the question's keywords, the top_k node
+    and edge ids (best first) and the labels of the top nodes. Questions
+    with the same keywords in any order ("What uses TensorFlow?" and
+    "tensorflow uses") share a cache entry. Any upsert bumps the graph
+    version and so invalidates the whole cache.
+    """
+
+    def __init__(self, store, hops: int = 2, max_seeds: int = 32, max_nodes: int = 256,
+                 max_edges: int = 1024, top_k: int = 10, cache_size: int = 1024, semantic=None):
+        self.store = store
+        self.semantic = semantic
+        self.hops = hops
+        self.max_seeds = max_seeds
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        self.top_k = top_k
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, int], Dict[str, Any]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._snapshot_graph: Optional[SnapshotGraph] = None
+        self._snapshot_graph_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache),
+                "max_entries": self.cache_size}
+
+    def retrieve(self, question: str) -> Dict[str, Any]:
+        keywords = question_keywords(question)
+        cache_key = (" ".join(sorted(keywords)), self.store.version)
+        with self._cache_lock:
+            result = self._cache.get(cache_key)
+            if result is not None:
+                self.hits += 1
+                self._cache.move_to_end(cache_key)
+                return result
+            self.misses += 1
+        similar = self._similar(question, keywords)
+        with self.store.try_read() as locked:
+            if locked:
+                # Walk one consistent version; writes wait until the walk is done
+                cache_key = (cache_key[0], self.store.version)
+                result = self._retrieve(self.store.engine, keywords, *similar)
+        if not locked:
+            # A writer holds the lock: walk the last snapshot rather than wait for it
+            graph = self._graph_of(self.store.snapshot())
+            cache_key = (cache_key[0], graph.version)
+            result = self._retrieve(graph, keywords, *similar)
+        if self.semantic is not None and self.semantic.version != cache_key[1]:
+            return result  # a later call may find more once the index has caught up
+        with self._cache_lock:
+            if self._cache and next(iter(self._cache))[1] < cache_key[1]:
+                self._cache.clear()  # every entry is for an older graph version
+            self._cache[cache_key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _graph_of(self, snapshot) -> SnapshotGraph:
+        """The SnapshotGraph of snapshot, built by the first question that needs it."""
+        with self._snapshot_graph_lock:
+            graph = self._snapshot_graph
+            if graph is None or graph.version != snapshot.version:
+                graph = self._snapshot_graph = SnapshotGraph(snapshot, graph)
+            return graph
+
+    def _similar(self, question: str, keywords: List[str]) -> Tuple[Dict[Hashable, float], Dict[Hashable, float]]:
+        """Nodes and edges similar enough to the question, handle -> similarity relative to the best match."""
+        if self.semantic is None or not keywords:
+            return {}, {}
+        if self.semantic.version >= 0:  # the first, full pass is left to the background sync
+            self.semantic.sync(wait=False)  # index the latest writes, unless the background sync already is
+        hits = self.semantic.search(question, self.top_k)
+        best = max((score for h, score in chain(hits["nodes"], hits["edges"])), default=0.0)
+        if best < MIN_SIMILARITY:
+            return {}, {}
+        # Relative, like keyword overlap: cosine similarities of a good match vary with the embedder
+        return ({h: score / best for h, score in hits["nodes"] if score >= MIN_SIMILARITY},
+                {h: score / best for h, score in hits["edges"] if score >= MIN_SIMILARITY})
+
+    def _seeds(self, engine, keywords: List[str]) -> List[Hashable]:
+        """
+        Best-matching nodes for the keywords: most keywords matched first,
+        then oldest. At most a few times max_seeds candidates are looked at
+        per keyword.
+        """
+        store = self.store
+        limit = 4 * self.max_seeds
+        if isinstance(engine, SnapshotGraph):
+            candidates = engine.ordered(set().union(*(engine.search(keyword, limit) for keyword in keywords)))
+        elif store.indexed:
+            index = store.label_index
+            candidates = set()
+            for keyword in keywords:
+                candidates |= index.search(keyword, limit=limit)
+            candidates = index.ordered(candidates)
+        else:
+            candidates = [engine.node_handle(node_id) for node_id in store.find_nodes(keywords)]
+        scored = [(overlap(engine.node_label(h).lower(), keywords), h) for h in candidates]
+        # nlargest is stable, so ties keep insertion order
+        return [h for _, h in heapq.nlargest(self.max_seeds, scored, key=lambda item: item[0])]
+
+    def _expand(self, engine, seeds: List[Hashable]) -> Tuple[Dict[Hashable, int], Dict[Hashable, None]]:
+        """Breadth-first walk from the seeds: node -> hop distance, and the edges crossed."""
+        distance = {h: 0 for h in seeds}
+        edges: Dict[Hashable, None] = {}
+        frontier = list(seeds)
+        for hop in range(1, self.hops + 1):
+            next_frontier = []
+            for node in frontier:
+                for edge in chain(engine.out_edges(node), engine.in_edges(node)):
+                    if edge in edges:
+                        continue
+                    if len(edges) >= self.max_edges:
+                        return distance, edges
+                    source, target = engine.edge_endpoints(edge)
+                    other = target if source == node else source
+                    if other not in distance:
+                        if len(distance) >= self.max_nodes:
+                            continue
+                        distance[other] = hop
+                        next_frontier.append(other)
+                    edges[edge] = None
+            frontier = next_frontier
+        return distance, edges
+
+    def _retrieve(self, engine, keywords: List[str], similar_nodes: Dict[Hashable, float],
+                  similar_edges: Dict[Hashable, float]) -> Dict[str, Any]:
+        """Ranked evidence from engine: the store's engine under its read lock, or a SnapshotGraph."""
+        result = {"keywords": keywords, "nodes": [], "edges": [], "labels": []}
+        if not keywords or not engine.node_count():
+            return result
+        # The semantic index may lag behind removals
+        similar_nodes = {h: score for h, score in similar_nodes.items() if engine.has_node(h)}
+        similar_edges = {h: score for h, score in similar_edges.items() if engine.has_edge(h)}
+        seeds = list(dict.fromkeys(chain(self._seeds(engine, keywords), similar_nodes,
+                                         chain.from_iterable(map(engine.edge_endpoints, similar_edges)))))
+        if not seeds:
+            return result
+
+        distance, edges = self._expand(engine, seeds)
+        edges.update(dict.fromkeys(similar_edges))
+        node_scores = {h: (OVERLAP_WEIGHT * overlap(engine.node_label(h).lower(), keywords)
+                           + SEMANTIC_WEIGHT * similar_nodes.get(h, 0.0)) / (1 + d)
+                       for h, d in distance.items()}
+        edge_scores = {}
+        for edge in edges:
+            source, target = engine.edge_endpoints(edge)
+            score = (OVERLAP_WEIGHT * max(node_scores[source], node_scores[target],
+                                          overlap(engine.edge_relation(edge).lower(), keywords))
+                     + CONFIDENCE_WEIGHT * engine.edge_confidence(edge)
+                     + PROVENANCE_WEIGHT * math.log1p(len(engine.edge_sources(edge)))
+                     + SEMANTIC_WEIGHT * similar_edges.get(edge, 0.0))
+            edge_scores[edge] = score / (1 + min(distance[source], distance[target]))
+        # A node is also as good as the best evidence it takes part in
+        for edge, score in edge_scores.items():
+            for node in engine.edge_endpoints(edge):
+                node_scores[node] = max(node_scores[node], score / 2)
+
+        top_nodes = heapq.nlargest(self.top_k, node_scores, key=node_scores.__getitem__)
+        top_edges = heapq.nlargest(self.top_k, edge_scores, key=edge_scores.__getitem__)
+        result["nodes"] = [engine.node_id(h) for h in top_nodes]
+        result["edges"] = [engine.edge_id(h) for h in top_edges]
+        result["labels"] = [engine.node_label(h) for h in top_nodes]
+        return result
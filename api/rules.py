@@ -0,0 +1,161 @@
+"""
+Rule-based triple extraction used when no LLM is available.
+
+A rule maps a keyword phrase such as "depends on" to a relation: in a run
+of words the text before the phrase is the subject and the text after it
+is the object. All phrases are compiled into one word trie, so every
+sentence is tokenized once and scanned once, in time linear in its length
+no matter how many rules there are or how the text is shaped.
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+SENTENCE_SPLIT = re.compile(r"[.!?]+")
+WORD = re.compile(r"\w+")
+# Words separated only by whitespace; punctuation ends a run
+WORD_RUN = re.compile(r"\w+(?:\s+\w+)*")
+
+
+class Rule(NamedTuple):
+    """
+    A declarative extraction rule.
+
+    pattern holds one or more keyword phrases separated by "|", matched
+    case-insensitively on whole words, e.g. "depends on|relies on".
+    """
+    relation: str
+    pattern: str
+    confidence: float = 0.7
+
+
+DEFAULT_RULES = (
+    Rule("is_a", "is a"),
+    Rule("uses", "uses"),
+    Rule("depends_on", "depends on"),
+)
+
+
+class RuleEngine:
+    """
+    Extract triples from sentences with a compiled set of rules.
+
+    Within a sentence, each rule fires at most once. It uses the first run
+    of words (text not broken by punctuation) that contains its phrase with
+    words on both sides, splitting at the last such occurrence in that run.
+    Subject and object must be longer than two characters.
+    """
+
+    def __init__(self, rules: Sequence[Rule] = DEFAULT_RULES, min_sentence_chars: int = 10):
+        self.rules = tuple(rules)
+        self.min_sentence_chars = min_sentence_chars
+        # Word trie: each node is (children, rule indices ending here)
+        self._trie: Tuple[Dict[str, Any], List[int]] = ({}, [])
+        self._max_phrase = 0
+        phrases = []
+        for index, rule in enumerate(self.rules):
+            for phrase in rule.pattern.split("|"):
+                words = phrase.lower().split()
+                if not words:
+                    raise ValueError(f"Rule {rule.relation!r} has an empty phrase")
+                node = self._trie
+                for word in words:
+                    node = node[0].setdefault(word, ({}, []))
+                node[1].append(index)
+                self._max_phrase = max(self._max_phrase, len(words))
+                phrases.append(r"\s+".join(re.escape(word) for word in words))
+        # Matches any phrase as whole words; used only to skip runs cheaply
+        self._trigger = re.compile(r"(?<!\w)(?:" + "|".join(phrases) + r")(?!\w)")
+
+    def _matches(self, words: List[str], start: int):
+        """Yield (rule index, phrase length) for every phrase starting at words[start]."""
+        node = self._trie
+        for offset in range(min(self._max_phrase, len(words) - start)):
+            node = node[0].get(words[start + offset])
+            if node is None:
+                return
+            for index in node[1]:
+                yield index, offset + 1
+
+    def extract_sentence(self, sentence: str) -> List[Tuple[Rule, str, str]]:
+        """(rule, subject, object) for each rule that fires on one sentence, in rule order."""
+        found: List[Optional[Tuple[str, str]]] = [None] * len(self.rules)
+        remaining = len(self.rules)
+        for run in WORD_RUN.finditer(sentence):
+            # Most runs contain no keyword at all; reject those without a Python-level scan
+            if not self._trigger.search(run.group().lower()):
+                continue
+            spans = [m.span() for m in WORD.finditer(sentence, run.start(), run.end())]
+            words = [sentence[a:b].lower() for a, b in spans]
+            # Last occurrence of each phrase in this run with words on both sides
+            best: Dict[int, Tuple[int, int]] = {}
+            for start in range(1, len(words) - 1):
+                for index, length in self._matches(words, start):
+                    if found[index] is None and start + length < len(words):
+                        best[index] = (start, length)
+            for index, (start, length) in best.items():
+                found[index] = (sentence[spans[0][0]:spans[start - 1][1]],
+                                sentence[spans[start + length][0]:spans[-1][1]])
+                remaining -= 1
+            if not remaining:
+                break
+        return [(rule, *match) for rule, match in zip(self.rules, found) if match is not None]
+
+    def extract(self, text: str, source_id: str, max_triples: Optional[int] = 8) -> List[Dict[str, Any]]:
+        """Triples from every sentence of text, in order, capped at max_triples (None for no cap)."""
+        triples = []
+        for sentence in SENTENCE_SPLIT.split(text):
+            sentence = sentence.strip()
+            if len(sentence) < self.min_sentence_chars:
+                continue
+            for rule, subject, obj in self.extract_sentence(sentence):
+                if len(subject) > 2 and len(obj) > 2:
+                    triples.append({
+                        "subject": subject,
+                        "relation": rule.relation,
+                        "object": obj,
+                        "confidence": rule.confidence,
+                        "source": source_id
+                    })
+            if max_triples is not None and len(triples) >= max_triples:
+                return triples[:max_triples]
+        return triples
+
+    def extract_parallel(self, text: str, source_id: str, processes: Optional[int] = None,
+                         segment_chars: int = 1 << 20) -> List[Dict[str, Any]]:
+        """
+        Extract every triple of a large document on a process pool.
+
+        The text is cut into segments of about segment_chars at sentence
+        boundaries, so the result is the same as extract(text, source_id, None).
+        """
+        segments = split_segments(text, segment_chars)
+        if len(segments) < 2 or processes == 1:
+            return self.extract(text, source_id, max_triples=None)
+        processes = min(processes or os.cpu_count() or 1, len(segments))
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            parts = pool.map(_extract_segment, [(self, segment, source_id) for segment in segments])
+            return [triple for part in parts for triple in part]
+
+
+def _extract_segment(args) -> List[Dict[str, Any]]:
+    engine, segment, source_id = args
+    return engine.extract(segment, source_id, max_triples=None)
+
+
+def split_segments(text: str, segment_chars: int) -> List[str]:
+    """Cut text into pieces of about segment_chars, each ending at a sentence boundary."""
+    segments = []
+    start = 0
+    while len(text) - start > segment_chars:
+        boundary = SENTENCE_SPLIT.search(text, start + segment_chars)
+        if boundary is None:
+            break
+        segments.append(text[start:boundary.end()])
+        start = boundary.end()
+    segments.append(text[start:])
+    return segments
+
+
+default_engine = RuleEngine()
@@ -0,0 +1,126 @@
+"""
+Reader/writer lock used by GraphStore.
+
+Any number of threads may read at once; a writer waits for the readers in
+flight and has the store to itself. Waiting writers block new readers, so
+a steady stream of reads cannot starve ingestion, and when a writer
+finishes, the readers already waiting go before the next writer, so a
+steady stream of writes cannot starve reads either. Both sides are
+reentrant per thread, and a thread holding the write lock may also read.
+A reader that has something else to fall back on (an older snapshot)
+can use acquire_read(blocking=False) rather than queue behind a writer.
+"""
+import threading
+from typing import Dict
+
+
+class RWLock:
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers: Dict[int, int] = {}  # thread id -> read depth
+        self._writer = 0  # thread id of the writer, 0 when none
+        self._write_depth = 0
+        self._writers_waiting = 0
+        self._readers_waiting = 0
+        self._readers_turn = False  # set when a writer leaves with readers waiting
+        self._read = _ReadGuard(self)
+        self._write = _WriteGuard(self)
+
+    @property
+    def writing(self) -> bool:
+        return self._writer != 0
+
+    def acquire_read(self, blocking: bool = True) -> bool:
+        """
+        Take the lock for reading. With blocking=False, return False instead
+        of waiting when a writer holds the lock or is queued for it.
+        """
+        me = threading.get_ident()
+        with self._cond:
+            depth = self._readers.get(me)
+            if depth is not None:
+                self._readers[me] = depth + 1
+                return True
+            if self._writer != me:
+                if not blocking and (self._writer or (self._writers_waiting and not self._readers_turn)):
+                    return False
+                self._readers_waiting += 1
+                try:
+                    while self._writer or (self._writers_waiting and not self._readers_turn):
+                        self._cond.wait()
+                finally:
+                    self._readers_waiting -= 1
+                    if not self._readers_waiting:
+                        self._readers_turn = False
+            self._readers[me] = 1
+            return True
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            depth = self._readers[me] - 1
+            if depth:
+                self._readers[me] = depth
+                return
+            del self._readers[me]
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError("cannot upgrade a read lock to a write lock")
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers or self._readers_turn:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+            self._write_depth = 1
+
+    def release_write(self):
+        with self._cond:
+            self._write_depth -= 1
+            if not self._write_depth:
+                self._writer = 0
+                self._readers_turn = self._readers_waiting > 0
+                self._cond.notify_all()
+
+    def read(self) -> "_ReadGuard":
+        """Context manager holding the lock for reading."""
+        return self._read
+
+    def write(self) -> "_WriteGuard":
+        """Context manager holding the lock for writing."""
+        return self._write
+
+
+class _ReadGuard:
+    __slots__ = ("lock",)
+
+    def __init__(self, lock: RWLock):
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire_read()
+
+    def __exit__(self, *exc):
+        self.lock.release_read()
+
+
+class _WriteGuard:
+    __slots__ = ("lock",)
+
+    def __init__(self, lock: RWLock):
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire_write()
+
+    def __exit__(self, *exc):
+        self.lock.release_write()
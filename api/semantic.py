@@ -0,0 +1,181 @@
+"""
+Semantic index of the graph for QA retrieval: embeddings of node labels
+and of verbalized triples ("Robotics uses Reinforcement Learning").
+
+The index follows the graph through its change log. sync() embeds, in
+batches, the nodes and edges added since the graph version it last saw
+and drops the removed ones. When the log no longer reaches back that far
+(e.g. after a restart) it compares the whole graph with the index
+instead. Labels are read under the graph's read lock; embedding happens
+outside it, so writers are not held up. A background thread (start())
+makes the first pass right away and then syncs every `interval` seconds
+while the graph changes; a question syncs the last few writes itself
+unless a sync is already running or a writer holds the graph.
+
+With a path, the node and edge indexes are saved there on close and
+after every `save_every` new vectors, and loaded again on startup.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from .embeddings import create_embedder
+from .metrics import stage
+from .vector_index import VectorIndex, read_meta
+
+logger = logging.getLogger(__name__)
+
+
+def verbalize(subject: str, relation: str, obj: str) -> str:
+    return f"{subject} {relation.replace('_', ' ')} {obj}"
+
+
+class SemanticIndex:
+    def __init__(self, store, embedder=None, path: Optional[str] = None, batch_size: int = 4096,
+                 save_every: int = 100000):
+        self.store = store
+        self.embedder = embedder or create_embedder()
+        self.nodes = VectorIndex(self.embedder.dim)
+        self.edges = VectorIndex(self.embedder.dim)
+        self.path = path
+        self.batch_size = batch_size
+        self.save_every = save_every
+        self.version = -1  # graph version the vectors reflect; -1 compares the whole graph on the next sync
+        self.embedded = 0
+        self.unsaved = 0
+        self.syncs = 0
+        self.elapsed = 0.0  # seconds the last sync took
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if path:
+            self._load()
+
+    def _load(self):
+        meta = read_meta(os.path.join(self.path, "nodes"))
+        if meta is None or meta.get("embedder") != self.embedder.name:
+            return  # nothing saved, or vectors of another embedder
+        engine = self.store.engine
+        with self.store.read():
+            self.nodes.load(os.path.join(self.path, "nodes"), engine.node_handle)
+            self.edges.load(os.path.join(self.path, "edges"), engine.edge_handle)
+        logger.info(f"Loaded {len(self.nodes)} node and {len(self.edges)} edge vectors from {self.path}")
+
+    def sync(self, wait: bool = True) -> bool:
+        """
+        Catch up with the graph; returns False without waiting if wait is
+        False and a sync is running or a writer holds the store.
+        """
+        if not self._sync_lock.acquire(blocking=wait):
+            return False
+        try:
+            return self.store.version == self.version or self._sync(wait)
+        finally:
+            self._sync_lock.release()
+
+    def _sync(self, wait: bool) -> bool:
+        store = self.store
+        engine = store.engine
+        started = time.perf_counter()
+        with store.try_read(blocking=wait) as locked:
+            if not locked:
+                return False
+            version = store.version
+            changes = store.changelog.since(self.version) if self.version >= 0 else None
+            if changes is None:
+                node_handles, edge_handles = engine.iter_nodes(), engine.iter_edges()
+                stale_nodes = [h for h in self.nodes.rows if not engine.has_node(h)]
+                stale_edges = [h for h in self.edges.rows if not engine.has_edge(h)]
+            else:
+                node_handles, edge_handles = changes
+                stale_nodes = [h for h in node_handles if not engine.has_node(h)]
+                stale_edges = [h for h in edge_handles if not engine.has_edge(h)]
+            # Labels and relations never change, so known handles need no new vector
+            new_nodes = [(h, engine.node_label(h)) for h in node_handles
+                         if h not in self.nodes and engine.has_node(h)]
+            new_edges = []
+            for h in edge_handles:
+                if h not in self.edges and engine.has_edge(h):
+                    source, target = engine.edge_endpoints(h)
+                    new_edges.append((h, verbalize(engine.node_label(source), engine.edge_relation(h),
+                                                   engine.node_label(target))))
+        self.nodes.remove(stale_nodes)
+        self.edges.remove(stale_edges)
+        for index, items in ((self.nodes, new_nodes), (self.edges, new_edges)):
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                with stage("embed"):
+                    vectors = self.embedder.embed([text for _, text in batch])
+                index.add([h for h, _ in batch], vectors)
+        added = len(new_nodes) + len(new_edges)
+        self.embedded += added
+        self.unsaved += added + len(stale_nodes) + len(stale_edges)
+        self.version = version
+        self.syncs += 1
+        self.elapsed = time.perf_counter() - started
+        return True
+
+    def search(self, text: str, k: int) -> Dict[str, List[Tuple[Hashable, float]]]:
+        """The k nodes and k edges most similar to text, best first, as (handle, cosine similarity)."""
+        with stage("embed"):
+            vector = self.embedder.embed([text])[0]
+        if not vector.any():
+            return {"nodes": [], "edges": []}
+        return {"nodes": self.nodes.search(vector, k), "edges": self.edges.search(vector, k)}
+
+    def save(self):
+        with self._sync_lock:
+            engine = self.store.engine
+            meta = {"embedder": self.embedder.name, "version": self.version}
+            self.nodes.save(os.path.join(self.path, "nodes"), engine.node_id, meta)
+            self.edges.save(os.path.join(self.path, "edges"), engine.edge_id, meta)
+            self.unsaved = 0
+
+    def start(self, interval: float = 1.0):
+        """Sync in the background every `interval` seconds while the graph changes."""
+        if self._thread is not None:
+            return
+
+        def follow():
+            while True:
+                try:
+                    if self.store.version != self.version:
+                        self.sync()
+                    if self.path and self.unsaved >= self.save_every:
+                        self.save()
+                except Exception:
+                    logger.exception("Failed to update the semantic index")
+                if self._stop.wait(interval):
+                    return
+
+        self._thread = threading.Thread(target=follow, name="semantic-index", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.path and self.unsaved:
+            self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"embedder": self.embedder.name, "dim": self.embedder.dim, "version": self.version,
+                "graph_version": self.store.version, "nodes": self.nodes.stats(), "edges": self.edges.stats(),
+                "embedded": self.embedded, "syncs": self.syncs, "last_sync_seconds": round(self.elapsed, 4)}
+
+
+def create_semantic_index(store) -> Optional[SemanticIndex]:
+    """
+    The semantic index for store, or None with SEMANTIC_INDEX=0. It is kept
+    in SEMANTIC_INDEX_PATH, by default next to a persistent graph's data.
+    """
+    if os.getenv("SEMANTIC_INDEX", "1") == "0":
+        return None
+    data_dir = os.getenv("GRAPH_DATA_DIR", "")
+    path = os.getenv("SEMANTIC_INDEX_PATH", os.path.join(data_dir, "vectors") if data_dir else "")
+    if store.persistence is not None and store.persistence.shared:
+        path = ""  # every worker process keeps its own index; they would overwrite each other's files
+    return SemanticIndex(store, path=path or None)
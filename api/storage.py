@@ -0,0 +1,913 @@
+"""
+Storage engines behind GraphStore.
+
+An engine owns the nodes, edges and adjacency of one graph. GraphStore talks
+to it through small integer-or-string handles and only converts them to the
+public string ids when building responses:
+
+    find_node / find_nodes / add_node / add_nodes / remove_node / has_node / node_label / node_type / iter_nodes
+    find_edge / find_edges / add_edge / add_edges / update_edge / remove_edge / has_edge / edge_endpoints
+    edge_relation / edge_sources / edge_hits / remove_source / edge_confidence
+    iter_edges / out_edges / in_edges / relations / edges_with_relation
+    out_degree / in_degree / out_edges_from / in_edges_from / relation_edges_from
+    node_id / edge_id / node_handle / edge_handle
+
+The *_from scans yield (position, edge) pairs from a position on, so a
+paginated reader can resume where its previous page stopped without
+walking the edges before it again.
+
+An edge's sources are a set: each distinct source id is stored once, in
+order of first sighting, with a count of how many times it asserted the
+edge. add_edges takes them as flat provenance links rather than a dict per
+edge: link i says that link_sources[i] asserted the new edge at position
+link_edges[i] link_hits[i] times, with links grouped by edge in ascending
+order and each (edge, source) pair at most once.
+
+Engines also convert themselves to and from a dict of flat columns
+(export_columns / load_columns), which is what snapshots persist.
+"""
+import uuid
+from array import array
+from itertools import islice, repeat
+from operator import lshift, or_
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import networkx as nx
+import numpy as np
+
+
+# Namespace for deterministic node/edge UUIDs, so replaying the same operations
+# (e.g. from the write-ahead log) reproduces the same ids
+ID_NAMESPACE = uuid.UUID("6c1f0d2e-8a55-4e0b-9a43-2f5d3b7e9c11")
+
+
+def new_columns() -> Dict:
+    """Empty engine-neutral column set (see export_columns)."""
+    return {
+        "engine": None,
+        "labels": [], "types": [], "relations": [], "sources": [],
+        "node_ids": None, "edge_ids": None,
+        "node_label": array("i"), "node_type": array("i"),
+        "edge_src": array("i"), "edge_dst": array("i"), "edge_rel": array("i"), "edge_conf": array("f"),
+        "prov_head": array("i"), "prov_tail": array("i"), "prov_source": array("i"), "prov_next": array("i"),
+        "prov_hits": array("i"),
+    }
+
+
+def column_sources(columns: Dict, edge: int) -> Tuple[List[str], List[int]]:
+    """Walk one edge's provenance chain in a column set; returns (sources, hits)."""
+    sources, hits, strings = [], [], columns["sources"]
+    # Snapshots written before hit counts existed count each entry once
+    hit_column = columns.get("prov_hits")
+    entry = columns["prov_head"][edge]
+    while entry != -1:
+        sources.append(strings[columns["prov_source"][entry]])
+        hits.append(hit_column[entry] if hit_column is not None else 1)
+        entry = columns["prov_next"][entry]
+    return sources, hits
+
+
+def merge_sources(sources: Iterable[str], hits: Optional[Iterable[int]] = None) -> Dict[str, int]:
+    """Collapse a source list (which may repeat ids) into {source: hits} in order of first sighting."""
+    merged: Dict[str, int] = {}
+    for source_id, count in zip(sources, hits if hits is not None else repeat(1)):
+        merged[source_id] = merged.get(source_id, 0) + count
+    return merged
+
+
+def sources_per_edge(count: int, link_edges: Iterable[int], link_sources: Iterable[str],
+                     link_hits: Iterable[int]) -> List[Dict[str, int]]:
+    """{source: hits} for each of count new edges, from add_edges' provenance links."""
+    per_edge: List[Dict[str, int]] = [{} for _ in range(count)]
+    for edge, source_id, hits in zip(link_edges, link_sources, link_hits):
+        per_edge[edge][source_id] = hits
+    return per_edge
+
+
+def int32_array(values: np.ndarray) -> array:
+    """A numpy column as an array("i"), copied in one step."""
+    column = array("i")
+    column.frombytes(np.ascontiguousarray(values, dtype=np.int32).tobytes())
+    return column
+
+
+class NetworkXEngine:
+    """Engine backed by an nx.MultiDiGraph keyed by UUID strings; handles are the ids."""
+
+    name = "networkx"
+
+    def __init__(self):
+        self.graph = nx.MultiDiGraph()
+        self.node_id_map = {}  # (label, type) -> node_id
+        self.edge_id_map = {}  # (subject_id, object_id, relation) -> edge_id
+        self.edge_endpoints_map = {}  # edge_id -> (subject_id, object_id)
+        self.relation_edges = {}  # relation -> {edge_id: None}, in insertion order
+
+    # Handles and public ids are the same strings
+    def node_id(self, handle: str) -> str:
+        return handle
+
+    def edge_id(self, handle: str) -> str:
+        return handle
+
+    def node_handle(self, node_id: str) -> Optional[str]:
+        return node_id if node_id in self.graph else None
+
+    def edge_handle(self, edge_id: str) -> Optional[str]:
+        return edge_id if edge_id in self.edge_endpoints_map else None
+
+    def node_count(self) -> int:
+        return self.graph.number_of_nodes()
+
+    def edge_count(self) -> int:
+        return self.graph.number_of_edges()
+
+    def find_node(self, label: str, node_type: str) -> Optional[str]:
+        return self.node_id_map.get((label, node_type))
+
+    def find_nodes(self, labels: Sequence[str], node_type: str) -> List[Optional[str]]:
+        """find_node for many labels of one type."""
+        return list(map(self.node_id_map.get, zip(labels, repeat(node_type))))
+
+    def add_node(self, label: str, node_type: str, node_id: Optional[str] = None) -> str:
+        node_id = node_id or str(uuid.uuid5(ID_NAMESPACE, f"{node_type}\x1f{label}"))
+        self.node_id_map[(label, node_type)] = node_id
+        self.graph.add_node(node_id, label=label, type=node_type)
+        return node_id
+
+    def add_nodes(self, labels: List[str], node_type: str) -> List[str]:
+        """add_node for many new labels of one type."""
+        return [self.add_node(label, node_type) for label in labels]
+
+    def remove_node(self, handle: str):
+        """Delete a node; its edges must have been removed first."""
+        attrs = self.graph.nodes[handle]
+        key = (attrs.get("label", ""), attrs.get("type", "entity"))
+        if self.node_id_map.get(key) == handle:
+            del self.node_id_map[key]
+        self.graph.remove_node(handle)
+
+    def has_node(self, handle: str) -> bool:
+        return handle in self.graph
+
+    def node_label(self, handle: str) -> str:
+        return self.graph.nodes[handle].get("label", "")
+
+    def node_type(self, handle: str) -> str:
+        return self.graph.nodes[handle].get("type", "entity")
+
+    def iter_nodes(self) -> Iterator[str]:
+        return iter(self.graph.nodes())
+
+    def find_edge(self, subject: str, obj: str, relation: str) -> Optional[str]:
+        return self.edge_id_map.get((subject, obj, relation))
+
+    def find_edges(self, subjects: List[str], objects: List[str], relations: List[str]) -> List[Optional[str]]:
+        """find_edge for many keys."""
+        return list(map(self.edge_id_map.get, zip(subjects, objects, relations)))
+
+    def add_edge(self, subject: str, obj: str, relation: str, sources: List[str], confidence: float,
+                 hits: Optional[List[int]] = None, edge_id: Optional[str] = None) -> str:
+        edge_id = edge_id or str(uuid.uuid5(ID_NAMESPACE, f"{subject}\x1f{obj}\x1f{relation}"))
+        self.edge_id_map[(subject, obj, relation)] = edge_id
+        self.edge_endpoints_map[edge_id] = (subject, obj)
+        self.relation_edges.setdefault(relation, {})[edge_id] = None
+        self.graph.add_edge(subject, obj, key=edge_id, relation=relation, sources=merge_sources(sources, hits),
+                            confidence=confidence)
+        return edge_id
+
+    def add_edges(self, subjects: List[str], objects: List[str], relations: List[str], confidences: List[float],
+                  link_edges: List[int], link_sources: List[str], link_hits: List[int]) -> List[str]:
+        """add_edge for many new edges, with their sources as provenance links (see the module docstring)."""
+        sources = sources_per_edge(len(subjects), link_edges, link_sources, link_hits)
+        return [self.add_edge(subject, obj, relation, list(edge_sources), confidence, hits=list(edge_sources.values()))
+                for subject, obj, relation, edge_sources, confidence
+                in zip(subjects, objects, relations, sources, confidences)]
+
+    def _edge_attrs(self, handle: str) -> Dict:
+        subject, obj = self.edge_endpoints_map[handle]
+        return self.graph.edges[subject, obj, handle]
+
+    def update_edge(self, handle: str, source_id: str, confidence: float, hits: int = 1) -> bool:
+        """Record another sighting of an edge, keeping the maximum confidence; True if source_id is new to it."""
+        attrs = self._edge_attrs(handle)
+        sources = attrs["sources"]
+        previous = sources.get(source_id, 0)
+        sources[source_id] = previous + hits
+        attrs["confidence"] = max(attrs.get("confidence", 0.0), confidence)
+        return not previous
+
+    def remove_source(self, handle: str, source_id: str) -> int:
+        """Drop source_id from an edge; returns how many sources the edge has left."""
+        sources = self._edge_attrs(handle)["sources"]
+        sources.pop(source_id, None)
+        return len(sources)
+
+    def remove_edge(self, handle: str):
+        subject, obj = self.edge_endpoints_map.pop(handle)
+        relation = self.graph.edges[subject, obj, handle].get("relation", "")
+        self.graph.remove_edge(subject, obj, key=handle)
+        del self.edge_id_map[(subject, obj, relation)]
+        edges = self.relation_edges[relation]
+        del edges[handle]
+        if not edges:
+            del self.relation_edges[relation]
+
+    def has_edge(self, handle: str) -> bool:
+        return handle in self.edge_endpoints_map
+
+    def edge_endpoints(self, handle: str) -> Tuple[str, str]:
+        return self.edge_endpoints_map[handle]
+
+    def edge_relation(self, handle: str) -> str:
+        return self._edge_attrs(handle).get("relation", "")
+
+    def edge_sources(self, handle: str) -> List[str]:
+        return list(self._edge_attrs(handle)["sources"])
+
+    def edge_hits(self, handle: str) -> List[int]:
+        """Sighting counts aligned with edge_sources()."""
+        return list(self._edge_attrs(handle)["sources"].values())
+
+    def edge_confidence(self, handle: str) -> float:
+        return self._edge_attrs(handle).get("confidence", 0.0)
+
+    def iter_edges(self) -> Iterator[str]:
+        return iter(self.edge_endpoints_map)
+
+    def out_edges(self, handle: str) -> Iterator[str]:
+        for keyed_edges in self.graph.succ[handle].values():
+            yield from keyed_edges
+
+    def in_edges(self, handle: str) -> Iterator[str]:
+        for keyed_edges in self.graph.pred[handle].values():
+            yield from keyed_edges
+
+    def out_degree(self, handle: str) -> int:
+        return self.graph.out_degree(handle)
+
+    def in_degree(self, handle: str) -> int:
+        return self.graph.in_degree(handle)
+
+    # Dicts cannot be entered in the middle, so these skip to `start`;
+    # positions shift when an edge before them is removed
+    def out_edges_from(self, handle: str, start: int = 0) -> Iterator[Tuple[int, str]]:
+        return islice(enumerate(self.out_edges(handle)), start, None)
+
+    def in_edges_from(self, handle: str, start: int = 0) -> Iterator[Tuple[int, str]]:
+        return islice(enumerate(self.in_edges(handle)), start, None)
+
+    def relation_edges_from(self, relation: str, start: int = 0) -> Iterator[Tuple[int, str]]:
+        return islice(enumerate(self.relation_edges.get(relation, {})), start, None)
+
+    def relations(self) -> Iterator[str]:
+        return iter(self.relation_edges)
+
+    def edges_with_relation(self, relation: str) -> Iterable[str]:
+        return self.relation_edges.get(relation, {})
+
+    def export_columns(self) -> Dict:
+        columns = new_columns()
+        columns["engine"] = self.name
+        interners = {name: StringInterner() for name in ("labels", "types", "relations", "sources")}
+        node_index = {}
+        columns["node_ids"] = []
+        for node_id, attrs in self.graph.nodes(data=True):
+            node_index[node_id] = len(columns["node_ids"])
+            columns["node_ids"].append(node_id)
+            columns["node_label"].append(interners["labels"].intern(attrs.get("label", "")))
+            columns["node_type"].append(interners["types"].intern(attrs.get("type", "entity")))
+        columns["edge_ids"] = []
+        for edge_id, (subject, obj) in self.edge_endpoints_map.items():
+            attrs = self.graph.edges[subject, obj, edge_id]
+            columns["edge_ids"].append(edge_id)
+            columns["edge_src"].append(node_index[subject])
+            columns["edge_dst"].append(node_index[obj])
+            columns["edge_rel"].append(interners["relations"].intern(attrs.get("relation", "")))
+            columns["edge_conf"].append(attrs.get("confidence", 0.0))
+            sources = attrs["sources"]
+            source_ids = [interners["sources"].intern(source) for source in sources]
+            first = len(columns["prov_source"])
+            columns["prov_head"].append(first if source_ids else -1)
+            columns["prov_tail"].append(first + len(source_ids) - 1 if source_ids else -1)
+            columns["prov_source"].extend(source_ids)
+            columns["prov_hits"].extend(sources.values())
+            columns["prov_next"].extend(range(first + 1, first + len(source_ids)))
+            if source_ids:
+                columns["prov_next"].append(-1)
+        for name, interner in interners.items():
+            columns[name] = interner.strings
+        return columns
+
+    def load_columns(self, columns: Dict):
+        """Populate an empty engine from a column set."""
+        labels, types, relations = columns["labels"], columns["types"], columns["relations"]
+        node_ids = columns["node_ids"] or [f"n{i}" for i in range(len(columns["node_label"]))]
+        edge_ids = columns["edge_ids"] or [f"e{i}" for i in range(len(columns["edge_src"]))]
+        # Rows of nodes and edges deleted by merges (compact engine only)
+        dead_nodes, dead_edges = set(columns.get("dead_nodes", ())), set(columns.get("dead_edges", ()))
+        for i, node_id in enumerate(node_ids):
+            if i in dead_nodes:
+                continue
+            self.add_node(labels[columns["node_label"][i]], types[columns["node_type"][i]], node_id=node_id)
+        for e, edge_id in enumerate(edge_ids):
+            if e in dead_edges:
+                continue
+            sources, hits = column_sources(columns, e)
+            self.add_edge(
+                node_ids[columns["edge_src"][e]], node_ids[columns["edge_dst"][e]], relations[columns["edge_rel"][e]],
+                sources, columns["edge_conf"][e], hits=hits, edge_id=edge_id
+            )
+
+
+class StringInterner:
+    """Maps strings to dense integer ids and back."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def intern(self, s: str) -> int:
+        i = self.ids.get(s)
+        if i is None:
+            i = len(self.strings)
+            self.ids[s] = i
+            self.strings.append(s)
+        return i
+
+    def get(self, s: str) -> Optional[int]:
+        return self.ids.get(s)
+
+    def intern_many(self, strings: Sequence[str]) -> List[int]:
+        """intern for many strings; each distinct new one gets the next id in order of first appearance."""
+        ids = self.ids
+        new = [s for s in dict.fromkeys(strings) if s not in ids]
+        ids.update(zip(new, range(len(self.strings), len(self.strings) + len(new))))
+        self.strings.extend(new)
+        return list(map(ids.__getitem__, strings))
+
+
+class Adjacency:
+    """
+    One direction of adjacency: a CSR base plus a linked-list delta buffer.
+
+    Edges below `compacted` live in the CSR arrays (offsets/targets); newer
+    edges are chained per node through `delta_head`/`delta_next` until the
+    buffer is large enough to fold into a rebuilt CSR.
+    """
+
+    def __init__(self):
+        self.offsets = array("q", [0])  # node -> start in targets, length nodes + 1
+        self.targets = array("i")  # edge indexes grouped by node
+        self.compacted = 0  # edges [0, compacted) are in the CSR
+        self.delta_head = array("i")  # node -> newest delta edge or -1
+        self.delta_next = array("i")  # delta edge - compacted -> previous delta edge or -1
+
+    def add_node(self):
+        self.offsets.append(self.offsets[-1])
+        self.delta_head.append(-1)
+
+    def add_nodes(self, count: int):
+        self.offsets.extend(array("q", [self.offsets[-1]]) * count)
+        self.delta_head.extend(array("i", [-1]) * count)
+
+    def add_edge(self, node: int, edge: int):
+        self.delta_next.append(self.delta_head[node])
+        self.delta_head[node] = edge
+
+    def add_edges(self, nodes: Sequence[int], first_edge: int):
+        """
+        add_edge for consecutive edges first_edge, first_edge + 1, ... from the
+        given nodes. Edges are grouped by node with a stable sort, so each one
+        links to the previous edge of its node in the batch (the first to the
+        node's old head) and each node's head moves to its last edge.
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        if not len(nodes):
+            return
+        order = np.argsort(nodes, kind="stable")
+        grouped = nodes[order]
+        first = np.ones(len(nodes), dtype=bool)
+        first[1:] = grouped[1:] != grouped[:-1]
+        last = np.ones(len(nodes), dtype=bool)
+        last[:-1] = first[1:]
+        head = np.frombuffer(self.delta_head, dtype=np.int32)
+        previous = np.empty(len(nodes), dtype=np.int64)
+        previous[1:] = order[:-1] + first_edge
+        previous[first] = head[grouped[first]]
+        head[grouped[last]] = order[last] + first_edge
+        del head  # release the buffer so delta_head can grow again
+        linked = np.empty(len(nodes), dtype=np.int64)
+        linked[order] = previous
+        self.delta_next.extend(int32_array(linked))
+
+    def edges(self, node: int) -> Iterator[int]:
+        yield from self.targets[self.offsets[node]:self.offsets[node + 1]]
+        delta = []
+        edge = self.delta_head[node]
+        while edge != -1:
+            delta.append(edge)
+            edge = self.delta_next[edge - self.compacted]
+        yield from reversed(delta)
+
+    def edges_from(self, node: int, start: int) -> Iterator[int]:
+        """edges(node) from position start on; the CSR part is sliced, not walked."""
+        begin, end = self.offsets[node], self.offsets[node + 1]
+        yield from self.targets[begin + start:end]
+        delta = []
+        edge = self.delta_head[node]
+        while edge != -1:
+            delta.append(edge)
+            edge = self.delta_next[edge - self.compacted]
+        yield from reversed(delta[:max(0, len(delta) - (start - (end - begin)))])
+
+    def degree(self, node: int) -> int:
+        count = self.offsets[node + 1] - self.offsets[node]
+        edge = self.delta_head[node]
+        while edge != -1:
+            count += 1
+            edge = self.delta_next[edge - self.compacted]
+        return count
+
+    def compact(self, endpoint: array, node_count: int, edge_count: int):
+        """Rebuild the CSR from the per-edge endpoint column with a stable sort of edges by endpoint."""
+        ends = np.frombuffer(endpoint, dtype=np.int32, count=edge_count)
+        offsets = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ends, minlength=node_count), out=offsets[1:])
+        self.offsets = array("q")
+        self.offsets.frombytes(offsets.tobytes())
+        self.targets = int32_array(np.argsort(ends, kind="stable"))
+        self.compacted = edge_count
+        self.delta_head = array("i", [-1]) * node_count
+        self.delta_next = array("i")
+
+
+class CompactEngine:
+    """
+    Engine that interns labels, relations and sources to integers and keeps
+    the graph in typed array columns.
+
+    Node and edge handles are array indexes; public ids are "n<index>" and
+    "e<index>". Sources for each edge are a linked list through the
+    provenance columns so repeat sightings never allocate a per-edge list;
+    a repeat sighting by a known source walks its edge's list and bumps
+    the entry's hit count. Entries unlinked by remove_source are not reused.
+    Removed nodes and edges keep their rows as tombstones, so ids never shift.
+    """
+
+    name = "compact"
+
+    # Fold the adjacency delta into the CSR once it reaches this fraction of the base
+    COMPACT_RATIO = 0.25
+    COMPACT_MIN = 1 << 16
+
+    def __init__(self):
+        self.labels = StringInterner()
+        self.types = StringInterner()
+        self.relation_names = StringInterner()
+        self.sources = StringInterner()
+
+        self.node_label_col = array("i")
+        self.node_type_col = array("i")
+        self.node_keys: Dict[int, int] = {}  # packed (label, type) -> node
+
+        self.edge_src = array("i")
+        self.edge_dst = array("i")
+        self.edge_rel = array("i")
+        self.edge_conf = array("f")
+        self.edge_keys: Dict[int, int] = {}  # packed (src, dst, rel) -> edge
+        self.relation_edges: List[array] = []  # relation -> edge indexes
+
+        # Provenance: per-edge linked list of source ids
+        self.prov_head = array("i")  # edge -> first entry
+        self.prov_tail = array("i")  # edge -> last entry
+        self.prov_source = array("i")  # entry -> source
+        self.prov_next = array("i")  # entry -> next entry or -1
+        self.prov_hits = array("i")  # entry -> sightings
+
+        self.out_adj = Adjacency()
+        self.in_adj = Adjacency()
+
+        # Tombstoned rows; adjacency and relation lists still hold dead edges and skip them on read
+        self.dead_nodes: Set[int] = set()
+        self.dead_edges: Set[int] = set()
+
+    def node_id(self, handle: int) -> str:
+        return f"n{handle}"
+
+    def edge_id(self, handle: int) -> str:
+        return f"e{handle}"
+
+    def node_handle(self, node_id: str) -> Optional[int]:
+        handle = self._parse_id(node_id, "n", len(self.node_label_col))
+        return None if handle in self.dead_nodes else handle
+
+    def edge_handle(self, edge_id: str) -> Optional[int]:
+        handle = self._parse_id(edge_id, "e", len(self.edge_src))
+        return None if handle in self.dead_edges else handle
+
+    @staticmethod
+    def _parse_id(public_id: str, prefix: str, limit: int) -> Optional[int]:
+        if not public_id.startswith(prefix) or not public_id[1:].isdigit():
+            return None
+        handle = int(public_id[1:])
+        return handle if handle < limit else None
+
+    def node_count(self) -> int:
+        return len(self.node_label_col) - len(self.dead_nodes)
+
+    def edge_count(self) -> int:
+        return len(self.edge_src) - len(self.dead_edges)
+
+    def _node_key(self, label: str, node_type: str, create: bool) -> Optional[int]:
+        if create:
+            return (self.labels.intern(label) << 16) | self.types.intern(node_type)
+        label_id = self.labels.get(label)
+        type_id = self.types.get(node_type)
+        if label_id is None or type_id is None:
+            return None
+        return (label_id << 16) | type_id
+
+    def find_node(self, label: str, node_type: str) -> Optional[int]:
+        key = self._node_key(label, node_type, create=False)
+        return None if key is None else self.node_keys.get(key)
+
+    def find_nodes(self, labels: Sequence[str], node_type: str) -> List[Optional[int]]:
+        """find_node for many labels of one type."""
+        type_id = self.types.get(node_type)
+        if type_id is None:
+            return [None] * len(labels)
+        # An unknown label gets id -1, whose key is negative and matches no node
+        label_ids = map(self.labels.ids.get, labels, repeat(-1))
+        return list(map(self.node_keys.get, map(or_, map(lshift, label_ids, repeat(16)), repeat(type_id))))
+
+    def add_node(self, label: str, node_type: str) -> int:
+        key = self._node_key(label, node_type, create=True)
+        handle = len(self.node_label_col)
+        self.node_keys[key] = handle
+        self.node_label_col.append(key >> 16)
+        self.node_type_col.append(key & 0xFFFF)
+        self.out_adj.add_node()
+        self.in_adj.add_node()
+        return handle
+
+    def add_nodes(self, labels: List[str], node_type: str) -> range:
+        """add_node for many new labels of one type, extending the columns in one step."""
+        type_id = self.types.intern(node_type)
+        label_ids = self.labels.intern_many(labels)
+        first = len(self.node_label_col)
+        handles = range(first, first + len(label_ids))
+        self.node_keys.update(zip([(label_id << 16) | type_id for label_id in label_ids], handles))
+        self.node_label_col.extend(label_ids)
+        self.node_type_col.extend(repeat(type_id, len(label_ids)))
+        self.out_adj.add_nodes(len(label_ids))
+        self.in_adj.add_nodes(len(label_ids))
+        return handles
+
+    def remove_node(self, handle: int):
+        """Tombstone a node; its edges must have been removed first."""
+        key = (self.node_label_col[handle] << 16) | self.node_type_col[handle]
+        if self.node_keys.get(key) == handle:
+            del self.node_keys[key]
+        self.dead_nodes.add(handle)
+
+    def has_node(self, handle: int) -> bool:
+        return 0 <= handle < len(self.node_label_col) and handle not in self.dead_nodes
+
+    def node_label(self, handle: int) -> str:
+        return self.labels.strings[self.node_label_col[handle]]
+
+    def node_type(self, handle: int) -> str:
+        return self.types.strings[self.node_type_col[handle]]
+
+    def iter_nodes(self) -> Iterator[int]:
+        if not self.dead_nodes:
+            return iter(range(len(self.node_label_col)))
+        return (h for h in range(len(self.node_label_col)) if h not in self.dead_nodes)
+
+    @staticmethod
+    def _edge_key(subject: int, obj: int, relation: int) -> int:
+        return (subject << 64) | (obj << 32) | relation
+
+    def find_edge(self, subject: int, obj: int, relation: str) -> Optional[int]:
+        relation_id = self.relation_names.get(relation)
+        if relation_id is None:
+            return None
+        return self.edge_keys.get(self._edge_key(subject, obj, relation_id))
+
+    def find_edges(self, subjects: List[int], objects: List[int], relations: List[str]) -> List[Optional[int]]:
+        """find_edge for many keys; each distinct relation is looked up once."""
+        get = self.relation_names.ids.get
+        relation_ids = list(map({relation: get(relation, -1) for relation in dict.fromkeys(relations)}.__getitem__,
+                                relations))
+        # A relation never seen has id -1, which turns the whole key into -1 and matches no edge
+        return list(map(self.edge_keys.get, map(or_, map(lshift, subjects, repeat(64)),
+                                                map(or_, map(lshift, objects, repeat(32)), relation_ids))))
+
+    def add_edge(self, subject: int, obj: int, relation: str, sources: List[str], confidence: float,
+                 hits: Optional[List[int]] = None) -> int:
+        relation_id = self.relation_names.intern(relation)
+        if relation_id == len(self.relation_edges):
+            self.relation_edges.append(array("i"))
+        handle = len(self.edge_src)
+        self.edge_keys[self._edge_key(subject, obj, relation_id)] = handle
+        self.edge_src.append(subject)
+        self.edge_dst.append(obj)
+        self.edge_rel.append(relation_id)
+        self.edge_conf.append(confidence)
+        self.relation_edges[relation_id].append(handle)
+        self.prov_head.append(-1)
+        self.prov_tail.append(-1)
+        for source_id, count in merge_sources(sources, hits).items():
+            self._add_source(handle, source_id, count)
+        self.out_adj.add_edge(subject, handle)
+        self.in_adj.add_edge(obj, handle)
+        self._maybe_compact()
+        return handle
+
+    def add_edges(self, subjects: List[int], objects: List[int], relations: List[str], confidences: List[float],
+                  link_edges: List[int], link_sources: List[str], link_hits: List[int]) -> range:
+        """
+        add_edge for many new edges, with their sources as provenance links
+        (see the module docstring). Columns are extended in one step, each
+        edge's provenance entries are laid out consecutively and the
+        relation lists are extended once per relation.
+        """
+        relation_ids = self.relation_names.intern_many(relations)
+        while len(self.relation_edges) < len(self.relation_names):
+            self.relation_edges.append(array("i"))
+        first = len(self.edge_src)
+        handles = range(first, first + len(relation_ids))
+        # (s << 64) | (o << 32) | r, as _edge_key, without a Python call per edge
+        self.edge_keys.update(zip(map(or_, map(lshift, subjects, repeat(64)),
+                                      map(or_, map(lshift, objects, repeat(32)), relation_ids)), handles))
+        self.edge_src.extend(subjects)
+        self.edge_dst.extend(objects)
+        self.edge_rel.extend(relation_ids)
+        self.edge_conf.extend(confidences)
+        relations_column = np.array(relation_ids, dtype=np.int64)
+        order = np.argsort(relations_column, kind="stable")
+        grouped = relations_column[order]
+        bounds = (np.flatnonzero(np.diff(grouped)) + 1).tolist()
+        for start, end in zip([0, *bounds], [*bounds, len(order)]) if len(order) else ():
+            self.relation_edges[int(grouped[start])].extend(int32_array(order[start:end] + first))
+
+        entry = len(self.prov_source)
+        links = np.array(link_edges, dtype=np.int64)
+        self.prov_source.extend(self.sources.intern_many(link_sources))
+        self.prov_hits.extend(link_hits)
+        positions = np.arange(len(relation_ids))
+        starts = np.searchsorted(links, positions, "left")
+        ends = np.searchsorted(links, positions, "right")
+        linked = ends > starts
+        self.prov_head.extend(int32_array(np.where(linked, entry + starts, -1)))
+        self.prov_tail.extend(int32_array(np.where(linked, entry + ends - 1, -1)))
+        following = np.arange(entry + 1, entry + len(links) + 1)
+        following[ends[linked] - 1] = -1  # each edge's last entry ends its list
+        self.prov_next.extend(int32_array(following))
+
+        if self._compaction_due():
+            # Folding the batch straight into the CSR beats chaining it into the delta buffer first
+            self.compact()
+        else:
+            self.out_adj.add_edges(subjects, first)
+            self.in_adj.add_edges(objects, first)
+        return handles
+
+    def _add_source(self, handle: int, source_id: str, hits: int = 1):
+        entry = len(self.prov_source)
+        self.prov_source.append(self.sources.intern(source_id))
+        self.prov_next.append(-1)
+        self.prov_hits.append(hits)
+        tail = self.prov_tail[handle]
+        if tail == -1:
+            self.prov_head[handle] = entry
+        else:
+            self.prov_next[tail] = entry
+        self.prov_tail[handle] = entry
+
+    def _compaction_due(self) -> bool:
+        delta = len(self.edge_src) - self.out_adj.compacted
+        return delta >= max(self.COMPACT_MIN, int(self.out_adj.compacted * self.COMPACT_RATIO))
+
+    def _maybe_compact(self):
+        if self._compaction_due():
+            self.compact()
+
+    def compact(self):
+        """Fold all buffered edges into the CSR adjacency."""
+        nodes, edges = len(self.node_label_col), len(self.edge_src)
+        self.out_adj.compact(self.edge_src, nodes, edges)
+        self.in_adj.compact(self.edge_dst, nodes, edges)
+
+    def _find_entry(self, handle: int, source: int) -> Tuple[int, int]:
+        """(entry, previous entry) of source in an edge's provenance list; entry is -1 if absent."""
+        previous, entry = -1, self.prov_head[handle]
+        while entry != -1 and self.prov_source[entry] != source:
+            previous, entry = entry, self.prov_next[entry]
+        return entry, previous
+
+    def update_edge(self, handle: int, source_id: str, confidence: float, hits: int = 1) -> bool:
+        """Record another sighting of an edge, keeping the maximum confidence; True if source_id is new to it."""
+        if confidence > self.edge_conf[handle]:
+            self.edge_conf[handle] = confidence
+        source = self.sources.get(source_id)
+        entry = -1 if source is None else self._find_entry(handle, source)[0]
+        if entry == -1:
+            self._add_source(handle, source_id, hits)
+            return True
+        self.prov_hits[entry] += hits
+        return False
+
+    def remove_source(self, handle: int, source_id: str) -> int:
+        """Unlink source_id from an edge's provenance list; returns how many sources the edge has left."""
+        source = self.sources.get(source_id)
+        if source is not None:
+            entry, previous = self._find_entry(handle, source)
+            if entry != -1:
+                following = self.prov_next[entry]
+                if previous == -1:
+                    self.prov_head[handle] = following
+                else:
+                    self.prov_next[previous] = following
+                if following == -1:
+                    self.prov_tail[handle] = previous
+        remaining, entry = 0, self.prov_head[handle]
+        while entry != -1:
+            remaining += 1
+            entry = self.prov_next[entry]
+        return remaining
+
+    def remove_edge(self, handle: int):
+        key = self._edge_key(self.edge_src[handle], self.edge_dst[handle], self.edge_rel[handle])
+        if self.edge_keys.get(key) == handle:
+            del self.edge_keys[key]
+        self.dead_edges.add(handle)
+
+    def has_edge(self, handle: int) -> bool:
+        return 0 <= handle < len(self.edge_src) and handle not in self.dead_edges
+
+    def edge_endpoints(self, handle: int) -> Tuple[int, int]:
+        return self.edge_src[handle], self.edge_dst[handle]
+
+    def edge_relation(self, handle: int) -> str:
+        return self.relation_names.strings[self.edge_rel[handle]]
+
+    def edge_sources(self, handle: int) -> List[str]:
+        sources = []
+        entry = self.prov_head[handle]
+        while entry != -1:
+            sources.append(self.sources.strings[self.prov_source[entry]])
+            entry = self.prov_next[entry]
+        return sources
+
+    def edge_hits(self, handle: int) -> List[int]:
+        """Sighting counts aligned with edge_sources()."""
+        hits = []
+        entry = self.prov_head[handle]
+        while entry != -1:
+            hits.append(self.prov_hits[entry])
+            entry = self.prov_next[entry]
+        return hits
+
+    def edge_confidence(self, handle: int) -> float:
+        return self.edge_conf[handle]
+
+    def _live(self, edges: Iterable[int]) -> Iterable[int]:
+        if not self.dead_edges:
+            return edges
+        return (e for e in edges if e not in self.dead_edges)
+
+    def iter_edges(self) -> Iterator[int]:
+        return iter(self._live(range(len(self.edge_src))))
+
+    def out_edges(self, handle: int) -> Iterator[int]:
+        return iter(self._live(self.out_adj.edges(handle)))
+
+    def in_edges(self, handle: int) -> Iterator[int]:
+        return iter(self._live(self.in_adj.edges(handle)))
+
+    def out_degree(self, handle: int) -> int:
+        if self.dead_edges:
+            return sum(1 for _ in self.out_edges(handle))
+        return self.out_adj.degree(handle)
+
+    def in_degree(self, handle: int) -> int:
+        if self.dead_edges:
+            return sum(1 for _ in self.in_edges(handle))
+        return self.in_adj.degree(handle)
+
+    # Positions count tombstoned edges too, and edges are only ever appended,
+    # so a position keeps pointing at the same edge across writes
+    def _live_from(self, edges: Iterable[int], start: int) -> Iterator[Tuple[int, int]]:
+        dead = self.dead_edges
+        return ((position, e) for position, e in enumerate(edges, start) if e not in dead)
+
+    def out_edges_from(self, handle: int, start: int = 0) -> Iterator[Tuple[int, int]]:
+        return self._live_from(self.out_adj.edges_from(handle, start), start)
+
+    def in_edges_from(self, handle: int, start: int = 0) -> Iterator[Tuple[int, int]]:
+        return self._live_from(self.in_adj.edges_from(handle, start), start)
+
+    def relation_edges_from(self, relation: str, start: int = 0) -> Iterator[Tuple[int, int]]:
+        relation_id = self.relation_names.get(relation)
+        if relation_id is None:
+            return iter(())
+        return self._live_from(self.relation_edges[relation_id][start:], start)
+
+    def relations(self) -> Iterator[str]:
+        return iter(self.relation_names.strings)
+
+    def edges_with_relation(self, relation: str) -> Iterable[int]:
+        relation_id = self.relation_names.get(relation)
+        if relation_id is None:
+            return array("i")
+        edges = self.relation_edges[relation_id]
+        return edges if not self.dead_edges else array("i", self._live(edges))
+
+    def export_columns(self) -> Dict:
+        """Column set sharing this engine's arrays; the CSR is compacted first so no delta remains."""
+        self.compact()
+        return {
+            "engine": self.name,
+            "labels": self.labels.strings, "types": self.types.strings,
+            "relations": self.relation_names.strings, "sources": self.sources.strings,
+            "node_ids": None, "edge_ids": None,
+            "node_label": self.node_label_col, "node_type": self.node_type_col,
+            "edge_src": self.edge_src, "edge_dst": self.edge_dst, "edge_rel": self.edge_rel, "edge_conf": self.edge_conf,
+            "prov_head": self.prov_head, "prov_tail": self.prov_tail,
+            "prov_source": self.prov_source, "prov_next": self.prov_next, "prov_hits": self.prov_hits,
+            "out_offsets": self.out_adj.offsets, "out_targets": self.out_adj.targets,
+            "in_offsets": self.in_adj.offsets, "in_targets": self.in_adj.targets,
+            "dead_nodes": array("i", sorted(self.dead_nodes)), "dead_edges": array("i", sorted(self.dead_edges)),
+        }
+
+    def load_columns(self, columns: Dict):
+        """Adopt a column set as this engine's storage, rebuilding the key maps."""
+        if columns.get("engine") != self.name:
+            raise ValueError(f"Cannot load {columns.get('engine')} columns into the {self.name} engine; ids would change")
+        for interner, name in ((self.labels, "labels"), (self.types, "types"),
+                               (self.relation_names, "relations"), (self.sources, "sources")):
+            interner.strings = list(columns[name])
+            interner.ids = dict(zip(interner.strings, range(len(interner.strings))))
+
+        self.node_label_col, self.node_type_col = columns["node_label"], columns["node_type"]
+        self.edge_src, self.edge_dst = columns["edge_src"], columns["edge_dst"]
+        self.edge_rel, self.edge_conf = columns["edge_rel"], columns["edge_conf"]
+        self.prov_head, self.prov_tail = columns["prov_head"], columns["prov_tail"]
+        self.prov_source, self.prov_next = columns["prov_source"], columns["prov_next"]
+        nodes, edges = len(self.node_label_col), len(self.edge_src)
+        if "prov_hits" in columns:
+            self.prov_hits = columns["prov_hits"]
+        else:
+            # Older snapshots list a source once per sighting; fold repeats into hit counts
+            chains = [merge_sources(*column_sources(columns, e)) for e in range(edges)]
+            self.prov_head, self.prov_tail = array("i", [-1]) * edges, array("i", [-1]) * edges
+            self.prov_source, self.prov_next, self.prov_hits = array("i"), array("i"), array("i")
+            for e, links in enumerate(chains):
+                for source_id, count in links.items():
+                    self._add_source(e, source_id, count)
+        self.dead_nodes, self.dead_edges = set(columns.get("dead_nodes", ())), set(columns.get("dead_edges", ()))
+        self.node_keys = dict(zip(
+            ((label << 16) | node_type for label, node_type in zip(self.node_label_col, self.node_type_col)),
+            range(nodes)
+        ))
+        self.edge_keys = dict(zip(map(self._edge_key, self.edge_src, self.edge_dst, self.edge_rel), range(edges)))
+        # Keys of tombstoned rows were deleted when they were removed
+        for handle in self.dead_nodes:
+            key = (self.node_label_col[handle] << 16) | self.node_type_col[handle]
+            if self.node_keys.get(key) == handle:
+                del self.node_keys[key]
+        for handle in self.dead_edges:
+            key = self._edge_key(self.edge_src[handle], self.edge_dst[handle], self.edge_rel[handle])
+            if self.edge_keys.get(key) == handle:
+                del self.edge_keys[key]
+        self.relation_edges = [array("i") for _ in self.relation_names.strings]
+        for handle, relation_id in enumerate(self.edge_rel):
+            self.relation_edges[relation_id].append(handle)
+
+        for adjacency, prefix, endpoint in ((self.out_adj, "out", self.edge_src), (self.in_adj, "in", self.edge_dst)):
+            if f"{prefix}_offsets" in columns:
+                adjacency.offsets, adjacency.targets = columns[f"{prefix}_offsets"], columns[f"{prefix}_targets"]
+                adjacency.compacted = edges
+                adjacency.delta_head = array("i", [-1]) * nodes
+                adjacency.delta_next = array("i")
+            else:
+                adjacency.compact(endpoint, nodes, edges)
+
+
+ENGINES = {
+    NetworkXEngine.name: NetworkXEngine,
+    CompactEngine.name: CompactEngine,
+}
+
+
+def create_engine(name: str):
+    """Instantiate a storage engine by name ("networkx" or "compact")."""
+    try:
+        return ENGINES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown graph backend {name!r}; expected one of {sorted(ENGINES)}")
@@ -0,0 +1,252 @@
+"""
+Approximate nearest-neighbour search over unit vectors, by inner product.
+
+VectorIndex is an inverted file (IVF): vectors are grouped into lists
+around centroids, and a query scans only the `nprobe` lists whose
+centroids are closest to it. Lists are not trained up front. The index
+starts as a single list, and a list that grows past `max_list` vectors
+is split in two by a few rounds of 2-means over its own members. Adding
+a batch therefore costs one matrix product against the centroids plus
+the occasional local split, and the number of lists grows with the data.
+
+Vectors are stored as int8 codes with a per-vector scale (a quarter of
+float32's memory); a query scores the codes of the probed lists and
+scales the results. Removing a key marks its row dead; dead rows are skipped by
+queries, dropped when their list is split and left out by save().
+
+save() writes the codes and list assignments as .npy files next to a
+meta.json naming them; load() memory-maps the codes, so a large index
+is paged in as queries touch it rather than read up front. Vectors added
+after a load are kept in memory until the next save.
+"""
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Rounds of 2-means when a list is split
+SPLIT_ITERATIONS = 6
+
+
+def _grown(array: np.ndarray, size: int) -> np.ndarray:
+    """array, or a copy with room for at least `size` rows (capacity doubles)."""
+    if len(array) >= size:
+        return array
+    grown = np.empty((max(size, 2 * len(array), 1024),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class VectorIndex:
+    def __init__(self, dim: int, max_list: int = 1024, nprobe: int = 8, seed: int = 7):
+        self.dim = dim
+        self.max_list = max_list
+        self.nprobe = nprobe
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self.keys: List[Hashable] = []  # row -> key
+        self.rows: Dict[Hashable, int] = {}  # live key -> row
+        self.count = 0  # rows, dead ones included
+        self._base = np.empty((0, dim), dtype=np.int8)  # codes of rows [0, len(_base)), memory-mapped after load()
+        self._codes = np.empty((0, dim), dtype=np.int8)  # codes of the rows after those
+        self._scales = np.empty(0, dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+        self._list_of = np.empty(0, dtype=np.int32)
+        self._centroids = np.zeros((1, dim), dtype=np.float32)
+        self._lists: List[np.ndarray] = [np.empty(0, dtype=np.int32)]  # list -> rows, with spare capacity
+        self._sizes: List[int] = [0]
+        self._limits: List[int] = [max_list]  # lists whose members cannot be told apart are allowed to grow
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.rows
+
+    def stats(self) -> Dict[str, Any]:
+        return {"vectors": len(self.rows), "dead": self.count - len(self.rows), "lists": len(self._lists),
+                "largest_list": max(self._sizes), "bytes": int(self.count * (self.dim + 9))}
+
+    def _codes_of(self, rows: np.ndarray) -> np.ndarray:
+        based = len(self._base)
+        if not based:
+            return self._codes[rows]
+        codes = np.empty((len(rows), self.dim), dtype=np.int8)
+        old = rows < based
+        codes[old] = self._base[rows[old]]
+        codes[~old] = self._codes[rows[~old] - based]
+        return codes
+
+    def _gather(self, rows: np.ndarray) -> np.ndarray:
+        """Dequantized vectors of rows."""
+        return self._codes_of(rows).astype(np.float32) * self._scales[rows, None]
+
+    def add(self, keys: Sequence[Hashable], vectors: np.ndarray):
+        """Insert or replace the vectors of distinct keys."""
+        if not len(keys):
+            return
+        with self._lock:
+            self._remove([key for key in keys if key in self.rows])
+            n, first = len(keys), self.count
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            based = len(self._base)
+            self._codes = _grown(self._codes, first + n - based)
+            self._codes[first - based:first + n - based] = np.rint(vectors / scales[:, None])
+            self._scales = _grown(self._scales, first + n)
+            self._scales[first:first + n] = scales
+            self._alive = _grown(self._alive, first + n)
+            self._alive[first:first + n] = True
+            assignment = np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+            self._list_of = _grown(self._list_of, first + n)
+            self._list_of[first:first + n] = assignment
+            self.keys.extend(keys)
+            self.rows.update(zip(keys, range(first, first + n)))
+            self.count = first + n
+            order = np.argsort(assignment, kind="stable")
+            lists, starts = np.unique(assignment[order], return_index=True)
+            for i, lst in enumerate(lists.tolist()):
+                end = starts[i + 1] if i + 1 < len(starts) else n
+                self._append(lst, first + order[starts[i]:end].astype(np.int32))
+            for lst in lists.tolist():
+                if self._sizes[lst] > self._limits[lst]:
+                    self._split(lst)
+
+    def _append(self, lst: int, rows: np.ndarray):
+        size = self._sizes[lst]
+        self._lists[lst] = _grown(self._lists[lst], size + len(rows))
+        self._lists[lst][size:size + len(rows)] = rows
+        self._sizes[lst] = size + len(rows)
+
+    def _split(self, lst: int):
+        """Split a list in two around two centroids found by spherical 2-means over its live members."""
+        rows = self._lists[lst][:self._sizes[lst]]
+        rows = rows[self._alive[rows]]
+        self._lists[lst], self._sizes[lst] = rows.copy(), len(rows)
+        if len(rows) <= self._limits[lst]:
+            return  # only dead rows had to go
+        vectors = self._gather(rows)
+        a = vectors[self._rng.integers(len(rows))]
+        b = vectors[np.argmin(vectors @ a)]  # the member least like a
+        side = None
+        for _ in range(SPLIT_ITERATIONS):
+            side = vectors @ b > vectors @ a
+            if side.all() or not side.any():
+                break
+            a, b = vectors[~side].sum(axis=0), vectors[side].sum(axis=0)
+            a /= max(float(np.linalg.norm(a)), 1e-12)
+            b /= max(float(np.linalg.norm(b)), 1e-12)
+        if side is None or side.all() or not side.any():
+            self._limits[lst] *= 2  # identical vectors; scanning them all is the best there is
+            return
+        new = len(self._lists)
+        self._centroids[lst] = a
+        self._centroids = np.vstack([self._centroids, b[None, :]])
+        self._lists[lst], self._sizes[lst] = rows[~side], int((~side).sum())
+        self._lists.append(rows[side])
+        self._sizes.append(int(side.sum()))
+        self._limits.append(self.max_list)
+        self._list_of[rows[side]] = new
+
+    def remove(self, keys: Sequence[Hashable]):
+        with self._lock:
+            self._remove(keys)
+
+    def _remove(self, keys: Sequence[Hashable]):
+        for key in keys:
+            row = self.rows.pop(key, None)
+            if row is not None:
+                self._alive[row] = False
+
+    def search(self, vector: np.ndarray, k: int, nprobe: Optional[int] = None) -> List[Tuple[Hashable, float]]:
+        """The k keys whose vectors have the largest inner product with vector, best first."""
+        nprobe = nprobe or self.nprobe
+        with self._lock:
+            if not self.rows:
+                return []
+            similarity = self._centroids @ vector
+            probe = np.argpartition(-similarity, nprobe - 1)[:nprobe] if len(similarity) > nprobe \
+                else range(len(similarity))
+            rows = np.concatenate([self._lists[lst][:self._sizes[lst]] for lst in probe])
+            rows = rows[self._alive[rows]]
+            scores = (self._codes_of(rows).astype(np.float32) @ vector) * self._scales[rows]
+            if len(rows) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                rows, scores = rows[top], scores[top]
+            order = np.argsort(-scores, kind="stable")
+            return [(self.keys[row], float(scores[i])) for i, row in zip(order.tolist(), rows[order].tolist())]
+
+    def save(self, path: str, encode: Callable[[Hashable], str] = str, meta: Optional[Dict[str, Any]] = None):
+        """Write the live vectors to directory `path`, then switch to memory-mapping them from there."""
+        with self._lock:
+            os.makedirs(path, exist_ok=True)
+            current = read_meta(path)
+            generation = current["generation"] + 1 if current else 1
+            live = np.flatnonzero(self._alive[:self.count])
+            names = {part: f"{part}-{generation}.npy" for part in ("codes", "scales", "lists", "centroids")}
+            codes = np.lib.format.open_memmap(os.path.join(path, names["codes"]), mode="w+", dtype=np.int8,
+                                              shape=(len(live), self.dim))
+            for start in range(0, len(live), 65536):
+                rows = live[start:start + 65536]
+                codes[start:start + len(rows)] = self._codes_of(rows)
+            codes.flush()
+            del codes
+            np.save(os.path.join(path, names["scales"]), self._scales[live])
+            np.save(os.path.join(path, names["lists"]), self._list_of[live])
+            np.save(os.path.join(path, names["centroids"]), self._centroids)
+            keys = [self.keys[row] for row in live.tolist()]
+            names["keys"] = f"keys-{generation}.txt"
+            with open(os.path.join(path, names["keys"]), "w", encoding="utf-8") as f:
+                f.writelines(f"{encode(key)}\n" for key in keys)
+            temp = os.path.join(path, "meta.json.tmp")
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump({"generation": generation, "dim": self.dim, "count": len(live), "files": names,
+                           **(meta or {})}, f)
+            os.replace(temp, os.path.join(path, "meta.json"))
+            for name in os.listdir(path):
+                if name.endswith((".npy", ".txt")) and name not in names.values():
+                    try:
+                        os.remove(os.path.join(path, name))
+                    except OSError:  # e.g. still mapped on Windows; removed by a later save
+                        pass
+            self._load(path, names, keys)
+
+    def load(self, path: str, decode: Callable[[str], Optional[Hashable]] = str) -> Optional[Dict[str, Any]]:
+        """
+        Replace the contents with the index saved in `path`, dropping keys
+        decode() maps to None. Returns the saved meta, or None if there is none.
+        """
+        meta = read_meta(path)
+        if meta is None or meta["dim"] != self.dim:
+            return None
+        with open(os.path.join(path, meta["files"]["keys"]), encoding="utf-8") as f:
+            keys = [decode(line.rstrip("\n")) for line in f]
+        with self._lock:
+            self._load(path, meta["files"], keys)
+        return meta
+
+    def _load(self, path: str, names: Dict[str, str], keys: List[Optional[Hashable]]):
+        self._base = np.load(os.path.join(path, names["codes"]), mmap_mode="r")
+        self._codes = np.empty((0, self.dim), dtype=np.int8)
+        self._scales = np.load(os.path.join(path, names["scales"]))
+        self._list_of = np.load(os.path.join(path, names["lists"]))
+        self._centroids = np.load(os.path.join(path, names["centroids"]))
+        self.count = len(keys)
+        self.keys = list(keys)
+        self._alive = np.array([key is not None for key in keys], dtype=bool)
+        self.rows = {key: row for row, key in enumerate(keys) if key is not None}
+        order = np.argsort(self._list_of, kind="stable").astype(np.int32)
+        bounds = np.searchsorted(self._list_of[order], np.arange(len(self._centroids) + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self._centroids))]
+        self._sizes = [len(rows) for rows in self._lists]
+        self._limits = [max(self.max_list, size) for size in self._sizes]
+
+
+def read_meta(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
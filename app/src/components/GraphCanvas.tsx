@@ -1,137 +1,188 @@
-import React, { useCallback, useMemo } from "react";
-import ReactFlow, {
-  Node,
-  Edge,
-  Controls,
-  Background,
-  useNodesState,
-  useEdgesState,
-  addEdge,
-  Connection,
-} from "reactflow";
+import React, { useCallback, useEffect, useMemo, useRef, useState } from "react";
+import ReactFlow, { Controls, Background } from "reactflow";
+import type { Node, ReactFlowInstance, Viewport as FlowViewport } from "reactflow";
 import "reactflow/dist/style.css";
-import { GraphData, GraphNode } from "../lib/api";
+import { api } from "../lib/api";
+import type { GraphNode, LayoutView, Viewport } from "../lib/api";
+import { covers, isCluster, layout, layoutNodeOf, visibleArea } from "../lib/layout";
+
+// Most nodes or clusters asked for per view; past it the server answers with a coarser level
+const VIEW_LIMIT = 1500;
 
 interface GraphCanvasProps {
-  graphData: GraphData | null;
-  selectedNode: GraphNode | null;
+  // Changes whenever the graph did, so the current view is fetched again
+  version: number;
   onNodeClick: (node: GraphNode) => void;
   citedNodes: string[];
   citedEdges: string[];
 }
 
 export const GraphCanvas: React.FC<GraphCanvasProps> = ({
-  graphData,
-  selectedNode,
+  version,
   onNodeClick,
   citedNodes,
   citedEdges,
 }) => {
-  const nodes = useMemo(() => {
-    console.log("DEBUG: GraphCanvas - graphData received:", graphData);
-    console.log(
-      "DEBUG: GraphCanvas - nodes count:",
-      graphData?.nodes?.length || 0
-    );
-    if (!graphData) return [];
+  const [view, setView] = useState<LayoutView | null>(null);
+  const [error, setError] = useState<string | null>(null);
+  const wrapper = useRef<HTMLDivElement>(null);
+  const flow = useRef<ReactFlowInstance | null>(null);
+  // Area and zoom of the last request, null until the whole graph was shown once
+  const requested = useRef<{ area: Viewport; zoom: number } | null>(null);
+  const latest = useRef(0);
+
+  // Fetches the nodes or clusters around a viewport, or the whole layout for null
+  const load = useCallback(
+    async (viewport: FlowViewport | null): Promise<LayoutView | null> => {
+      const element = wrapper.current;
+      const area =
+        viewport && element
+          ? visibleArea(viewport, element.clientWidth, element.clientHeight)
+          : null;
+      const zoom = viewport?.zoom ?? 1;
+      requested.current = area ? { area, zoom } : null;
+      const id = ++latest.current;
+      try {
+        const next = await api.getLayout(area, zoom, VIEW_LIMIT);
+        if (id !== latest.current) return null; // superseded by a later request
+        setView(next);
+        setError(null);
+        return next;
+      } catch (err) {
+        if (id === latest.current) {
+          requested.current = null;
+          setError(err instanceof Error ? err.message : "Failed to load graph");
+        }
+        return null;
+      }
+    },
+    []
+  );
 
-    return graphData.nodes.map((node) => ({
-      id: node.id,
-      position: { x: Math.random() * 800, y: Math.random() * 600 },
-      data: {
-        label: node.label,
-        isCited: citedNodes.includes(node.id),
-      },
-      style: {
-        background: citedNodes.includes(node.id) ? "#3b82f6" : "#374151",
-        color: "white",
-        border: citedNodes.includes(node.id)
-          ? "3px solid #fbbf24"
-          : "1px solid #6b7280",
-        borderRadius: "8px",
-        padding: "8px 12px",
-        fontSize: "12px",
-        fontWeight: citedNodes.includes(node.id) ? "bold" : "normal",
-      },
-    }));
-  }, [graphData, citedNodes]);
+  // Fetches again only once the screen leaves the area fetched last, or the zoom changed a level
+  const follow = useCallback(
+    (viewport: FlowViewport) => {
+      const element = wrapper.current;
+      const last = requested.current;
+      if (
+        element &&
+        last &&
+        covers(
+          last.area,
+          last.zoom,
+          visibleArea(viewport, element.clientWidth, element.clientHeight, 0),
+          viewport.zoom
+        )
+      ) {
+        return;
+      }
+      load(viewport);
+    },
+    [load]
+  );
 
-  const edges = useMemo(() => {
-    console.log(
-      "DEBUG: GraphCanvas - edges count:",
-      graphData?.edges?.length || 0
+  const showAll = useCallback(async () => {
+    const whole = await load(null);
+    const instance = flow.current;
+    if (!whole || !instance || !whole.nodes.length) return;
+    const { x0, y0, x1, y1 } = whole.bounds;
+    instance.fitBounds(
+      { x: x0, y: y0, width: x1 - x0, height: y1 - y0 },
+      { padding: 0.1 }
     );
-    if (!graphData) return [];
+    follow(instance.getViewport());
+  }, [load, follow]);
+
+  useEffect(() => {
+    const instance = flow.current;
+    if (!instance) return; // onInit shows the graph once React Flow is ready
+    if (requested.current) {
+      load(instance.getViewport());
+    } else {
+      showAll();
+    }
+  }, [version, load, showAll]);
 
-    return graphData.edges.map((edge) => ({
-      id: edge.id,
-      source: edge.source,
-      target: edge.target,
-      label: edge.relation,
-      style: {
-        stroke: citedEdges.includes(edge.id) ? "#ef4444" : "#6b7280",
-        strokeWidth: citedEdges.includes(edge.id) ? 3 : 1,
-      },
-      labelStyle: {
-        fill: citedEdges.includes(edge.id) ? "#ef4444" : "#9ca3af",
-        fontSize: "10px",
-        fontWeight: citedEdges.includes(edge.id) ? "bold" : "normal",
-      },
-    }));
-  }, [graphData, citedEdges]);
+  const onInit = useCallback(
+    (instance: ReactFlowInstance) => {
+      flow.current = instance;
+      showAll();
+    },
+    [showAll]
+  );
 
-  const [nodesState, setNodes, onNodesChange] = useNodesState(nodes);
-  const [edgesState, setEdges, onEdgesChange] = useEdgesState(edges);
+  const onMoveEnd = useCallback(
+    (_: unknown, viewport: FlowViewport) => follow(viewport),
+    [follow]
+  );
 
-  const onConnect = useCallback(
-    (params: Connection) => setEdges((eds) => addEdge(params, eds)),
-    [setEdges]
+  const { nodes, edges } = useMemo(
+    () =>
+      view
+        ? layout(view, citedNodes, citedEdges)
+        : { nodes: [], edges: [] },
+    [view, citedNodes, citedEdges]
   );
 
+  // Zero-size bounds and nothing shown: no graph at all, rather than a viewport off to the side
+  const empty =
+    view !== null &&
+    !view.nodes.length &&
+    view.bounds.x0 === view.bounds.x1 &&
+    view.bounds.y0 === view.bounds.y1;
+
   const onNodeClickHandler = useCallback(
-    (event: React.MouseEvent, node: Node) => {
-      const graphNode = graphData?.nodes.find((n) => n.id === node.id);
-      if (graphNode) {
-        onNodeClick(graphNode);
+    (_: React.MouseEvent, node: Node) => {
+      const target = layoutNodeOf(node);
+      const instance = flow.current;
+      if (!target || !instance) return;
+      if (isCluster(target)) {
+        // Zoom in on the cluster until its members show
+        instance.setCenter(target.x, target.y, { zoom: instance.getZoom() * 2 });
+        follow(instance.getViewport());
+        return;
       }
+      onNodeClick({ id: target.id, label: target.label, type: target.type });
     },
-    [graphData, onNodeClick]
+    [onNodeClick, follow]
   );
 
-  // Update nodes and edges when graphData changes
-  React.useEffect(() => {
-    console.log("DEBUG: GraphCanvas - setting nodes:", nodes.length);
-    console.log("DEBUG: GraphCanvas - setting edges:", edges.length);
-    setNodes(nodes);
-    setEdges(edges);
-  }, [nodes, edges, setNodes, setEdges]);
-
-  if (!graphData) {
-    return (
-      <div className="w-full h-full flex items-center justify-center bg-gray-900">
-        <div className="text-gray-400 text-center">
-          <p className="text-lg mb-2">No Graph Data</p>
-          <p className="text-sm">Upload URLs to build a knowledge graph</p>
-        </div>
-      </div>
-    );
-  }
-
   return (
-    <div className="w-full h-full bg-gray-900">
+    <div ref={wrapper} className="w-full h-full bg-gray-900 relative">
       <ReactFlow
-        nodes={nodesState}
-        edges={edgesState}
-        onNodesChange={onNodesChange}
-        onEdgesChange={onEdgesChange}
-        onConnect={onConnect}
+        nodes={nodes}
+        edges={edges}
+        onInit={onInit}
+        onMoveEnd={onMoveEnd}
         onNodeClick={onNodeClickHandler}
-        fitView
+        nodesDraggable={false}
+        nodesConnectable={false}
+        minZoom={0.01}
         attributionPosition="bottom-left"
       >
         <Controls />
         <Background color="#374151" gap={16} />
       </ReactFlow>
+      {view && view.level > 0 && (
+        <div className="absolute top-2 right-2 bg-gray-800 text-gray-300 text-xs px-2 py-1 rounded">
+          Clusters, level {view.level} of {view.levels - 1}: zoom in or click
+          one to see its nodes
+        </div>
+      )}
+      {(error || empty) && (
+        <div className="absolute inset-0 flex items-center justify-center pointer-events-none">
+          <div className="text-gray-400 text-center">
+            {error ? (
+              <p className="text-lg mb-2">{error}</p>
+            ) : (
+              <>
+                <p className="text-lg mb-2">No Graph Data</p>
+                <p className="text-sm">Upload URLs to build a knowledge graph</p>
+              </>
+            )}
+          </div>
+        </div>
+      )}
     </div>
   );
 };
@@ -1,15 +1,34 @@
-import React from "react";
-import { GraphNode, GraphEdge } from "../lib/api";
+import React, { useEffect, useState } from "react";
+import { api } from "../lib/api";
+import type { GraphNode, NeighborPage } from "../lib/api";
 
 interface NodeDetailsProps {
   node: GraphNode | null;
-  graphData: { nodes: GraphNode[]; edges: GraphEdge[] } | null;
 }
 
-export const NodeDetails: React.FC<NodeDetailsProps> = ({
-  node,
-  graphData,
-}) => {
+export const NodeDetails: React.FC<NodeDetailsProps> = ({ node }) => {
+  const [page, setPage] = useState<NeighborPage | null>(null);
+  const [error, setError] = useState<string | null>(null);
+
+  // The canvas only holds the current view, so the connections are asked for per node
+  useEffect(() => {
+    setPage(null);
+    setError(null);
+    if (!node) return;
+    let current = true;
+    api
+      .getNeighbors(node.id)
+      .then((next) => current && setPage(next))
+      .catch((err) => {
+        if (current) {
+          setError(err instanceof Error ? err.message : "Failed to load connections");
+        }
+      });
+    return () => {
+      current = false;
+    };
+  }, [node]);
+
   if (!node) {
     return (
       <div className="bg-gray-800 p-4 rounded-lg">
@@ -21,21 +40,12 @@ export const NodeDetails: React.FC<NodeDetailsProps> = ({
     );
   }
 
-  // Find connected edges
-  const connectedEdges =
-    graphData?.edges.filter(
-      (edge) => edge.source === node.id || edge.target === node.id
-    ) || [];
-
-  // Find connected nodes
-  const connectedNodeIds = new Set<string>();
-  connectedEdges.forEach((edge) => {
-    if (edge.source === node.id) connectedNodeIds.add(edge.target);
-    if (edge.target === node.id) connectedNodeIds.add(edge.source);
-  });
+  const neighbors = page?.neighbors ?? [];
 
-  const connectedNodes =
-    graphData?.nodes.filter((n) => connectedNodeIds.has(n.id)) || [];
+  // Distinct nodes on the other end of the connections
+  const connectedNodes = [
+    ...new Map(neighbors.map((n) => [n.node.id, n.node])).values(),
+  ];
 
   return (
     <div className="bg-gray-800 p-4 rounded-lg">
@@ -59,8 +69,13 @@ export const NodeDetails: React.FC<NodeDetailsProps> = ({
 
         <div>
           <h3 className="text-sm font-medium text-gray-300 mb-2">
-            Connected Nodes ({connectedNodes.length})
+            Connected Nodes ({connectedNodes.length}
+            {page?.next ? "+" : ""})
           </h3>
+          {error && <p className="text-red-400 text-xs mb-1">{error}</p>}
+          {!page && !error && (
+            <p className="text-gray-400 text-xs">Loading connections...</p>
+          )}
           <div className="space-y-1">
             {connectedNodes.map((connectedNode) => (
               <div
@@ -78,33 +93,30 @@ export const NodeDetails: React.FC<NodeDetailsProps> = ({
 
         <div>
           <h3 className="text-sm font-medium text-gray-300 mb-2">
-            Connections ({connectedEdges.length})
+            Connections ({neighbors.length}
+            {page?.next ? "+" : ""})
           </h3>
           <div className="space-y-1">
-            {connectedEdges.map((edge) => {
-              const isSource = edge.source === node.id;
-              const connectedNode = graphData?.nodes.find(
-                (n) => n.id === (isSource ? edge.target : edge.source)
-              );
-
-              return (
-                <div key={edge.id} className="bg-gray-700 p-2 rounded text-sm">
-                  <div className="flex items-center justify-between">
-                    <span className="text-white">
-                      {isSource ? "→" : "←"} {connectedNode?.label}
-                    </span>
-                    <span className="text-blue-400 text-xs">
-                      {edge.relation}
-                    </span>
-                  </div>
-                  {edge.sources.length > 0 && (
-                    <div className="text-gray-400 text-xs mt-1">
-                      Sources: {edge.sources.length}
-                    </div>
-                  )}
+            {neighbors.map(({ direction, edge, node: connectedNode }) => (
+              <div
+                key={`${direction}:${edge.id}`}
+                className="bg-gray-700 p-2 rounded text-sm"
+              >
+                <div className="flex items-center justify-between">
+                  <span className="text-white">
+                    {direction === "out" ? "→" : "←"} {connectedNode.label}
+                  </span>
+                  <span className="text-blue-400 text-xs">
+                    {edge.relation}
+                  </span>
                 </div>
-              );
-            })}
+                {edge.sources.length > 0 && (
+                  <div className="text-gray-400 text-xs mt-1">
+                    Sources: {edge.sources.length}
+                  </div>
+                )}
+              </div>
+            ))}
           </div>
         </div>
       </div>
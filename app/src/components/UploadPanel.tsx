@@ -1,6 +1,8 @@
 import React, { useState, useRef } from "react";
 import { api } from "../lib/api";
 
+const SUPPORTED_EXTENSIONS = [".txt", ".log", ".jsonl", ".ndjson", ".csv"];
+
 interface UploadPanelProps {
   onGraphBuilt: () => void;
 }
@@ -51,14 +53,15 @@ export const UploadPanel: React.FC<UploadPanelProps> = ({ onGraphBuilt }) => {
     if (!file) return;
 
     // Validate file type
-    if (!file.name.endsWith(".txt")) {
-      setError("Only TXT files are supported");
+    const name = file.name.toLowerCase().replace(/\.gz$/, "");
+    if (!SUPPORTED_EXTENSIONS.some((ext) => name.endsWith(ext))) {
+      setError("Only TXT, LOG, JSONL and CSV files (optionally gzipped) are supported");
       return;
     }
 
-    // Validate file size (5MB)
-    if (file.size > 5 * 1024 * 1024) {
-      setError("File too large. Maximum size is 5MB");
+    // Validate file size (1GB)
+    if (file.size > 1024 * 1024 * 1024) {
+      setError("File too large. Maximum size is 1GB");
       return;
     }
 
@@ -107,7 +110,7 @@ export const UploadPanel: React.FC<UploadPanelProps> = ({ onGraphBuilt }) => {
               : "text-gray-400 hover:text-gray-300"
           }`}
         >
-          📄 TXT File
+          📄 File
         </button>
       </div>
 
@@ -128,11 +131,11 @@ export const UploadPanel: React.FC<UploadPanelProps> = ({ onGraphBuilt }) => {
         ) : (
           <div>
             <label className="block text-sm font-medium text-gray-300 mb-2">
-              Upload TXT File (max 5MB)
+              Upload a TXT, LOG, JSONL or CSV file, optionally gzipped (max 1GB)
             </label>
             <div className="border-2 border-dashed border-gray-600 rounded-md p-6 text-center">
               <p className="text-gray-400 mb-4">
-                Click to select a TXT file or drag and drop
+                Click to select a file or drag and drop
               </p>
               <button
                 onClick={handleFileButtonClick}
@@ -144,7 +147,7 @@ export const UploadPanel: React.FC<UploadPanelProps> = ({ onGraphBuilt }) => {
               <input
                 ref={fileInputRef}
                 type="file"
-                accept=".txt"
+                accept={SUPPORTED_EXTENSIONS.flatMap((ext) => [ext, `${ext}.gz`]).join(",")}
                 onChange={handleFileUpload}
                 className="hidden"
               />
@@ -15,6 +15,60 @@ export interface GraphEdge {
 export interface GraphData {
   nodes: GraphNode[];
   edges: GraphEdge[];
+  version?: number;
+  since?: number | null;
+  full?: boolean;
+  removed_nodes?: string[];
+  removed_edges?: string[];
+}
+
+/** A rectangle in layout units, which are pixels at zoom 1. */
+export interface Viewport {
+  x0: number;
+  y0: number;
+  x1: number;
+  y1: number;
+}
+
+/** A node, or at coarser levels a cluster of nodes, placed by the server. */
+export interface LayoutNode extends GraphNode {
+  x: number;
+  y: number;
+  size?: number;
+  radius?: number;
+  outside?: boolean;
+}
+
+/** An edge between nodes, or between clusters with the number of edges it stands for. */
+export interface LayoutEdge {
+  id: string;
+  source: string;
+  target: string;
+  relation?: string;
+  sources?: string[];
+  weight?: number;
+}
+
+export interface LayoutView {
+  version: number;
+  level: number;
+  levels: number;
+  bounds: Viewport;
+  truncated: boolean;
+  nodes: LayoutNode[];
+  edges: LayoutEdge[];
+}
+
+export interface Neighbor {
+  direction: "out" | "in";
+  edge: GraphEdge;
+  node: GraphNode;
+}
+
+export interface NeighborPage {
+  node: GraphNode;
+  neighbors: Neighbor[];
+  next: string | null;
 }
 
 export interface QAResponse {
@@ -61,8 +115,9 @@ export const api = {
     return data;
   },
 
-  async getGraph(): Promise<GraphData> {
-    const response = await fetch(`${API_BASE}/graph`);
+  async getGraph(since?: number): Promise<GraphData> {
+    const query = since === undefined ? "" : `?since=${since}`;
+    const response = await fetch(`${API_BASE}/graph${query}`);
 
     if (!response.ok) {
       throw new Error(`Failed to get graph: ${response.statusText}`);
@@ -72,6 +127,42 @@ export const api = {
     return data;
   },
 
+  /** Nodes or clusters inside a viewport (default: the whole layout) at a zoom level. */
+  async getLayout(
+    viewport: Viewport | null,
+    zoom: number,
+    limit?: number
+  ): Promise<LayoutView> {
+    const params = new URLSearchParams({ zoom: String(zoom) });
+    if (viewport) {
+      for (const [key, value] of Object.entries(viewport)) {
+        params.set(key, value.toFixed(1));
+      }
+    }
+    if (limit !== undefined) {
+      params.set("limit", String(limit));
+    }
+    const response = await fetch(`${API_BASE}/graph/layout?${params}`);
+
+    if (!response.ok) {
+      throw new Error(`Failed to get layout: ${response.statusText}`);
+    }
+
+    return response.json();
+  },
+
+  async getNeighbors(nodeId: string, limit = 50): Promise<NeighborPage> {
+    const response = await fetch(
+      `${API_BASE}/query/nodes/${encodeURIComponent(nodeId)}/neighbors?limit=${limit}`
+    );
+
+    if (!response.ok) {
+      throw new Error(`Failed to get neighbors: ${response.statusText}`);
+    }
+
+    return response.json();
+  },
+
   async qa(question: string): Promise<QAResponse> {
     const response = await fetch(`${API_BASE}/qa`, {
       method: "POST",
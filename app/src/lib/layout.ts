@@ -1,35 +1,128 @@
-import { Node, Edge } from "reactflow";
+import type { Edge, Node, Viewport as FlowViewport } from "reactflow";
+import type { LayoutEdge, LayoutNode, LayoutView, Viewport } from "./api";
 
-export type LayoutNode = Node & {
-  position: { x: number; y: number };
-};
+// Share of the visible width and height also fetched on every side, so short pans need no request
+const VIEW_MARGIN = 0.5;
+// Refetch when the zoom changed by this factor since the last request, since it may pick another level
+const ZOOM_STEP = Math.SQRT2;
+// Smallest diameter a cluster is drawn with, in layout units
+const MIN_CLUSTER_SIZE = 40;
 
-export type LayoutEdge = Edge & {
-  sourcePosition?: "top" | "right" | "bottom" | "left";
-  targetPosition?: "top" | "right" | "bottom" | "left";
-};
+/** The part of the layout visible through React Flow's viewport, widened by margin on each side. */
+export function visibleArea(
+  viewport: FlowViewport,
+  width: number,
+  height: number,
+  margin = VIEW_MARGIN
+): Viewport {
+  const x0 = -viewport.x / viewport.zoom;
+  const y0 = -viewport.y / viewport.zoom;
+  const w = width / viewport.zoom;
+  const h = height / viewport.zoom;
+  return {
+    x0: x0 - w * margin,
+    y0: y0 - h * margin,
+    x1: x0 + w * (1 + margin),
+    y1: y0 + h * (1 + margin),
+  };
+}
 
-export function layout(
-  nodes: Node[],
-  edges: Edge[],
-  direction: "TB" | "LR" = "LR"
-): { nodes: LayoutNode[]; edges: LayoutEdge[] } {
-  // Simple grid layout for now
-  const cols = Math.ceil(Math.sqrt(nodes.length));
-  const layoutNodes: LayoutNode[] = nodes.map((node, index) => ({
-    ...node,
-    position: {
-      x: (index % cols) * 200 + 100,
-      y: Math.floor(index / cols) * 150 + 100,
+/** True if what was fetched for `loaded` at `loadedZoom` still serves `wanted` at `zoom`. */
+export function covers(
+  loaded: Viewport,
+  loadedZoom: number,
+  wanted: Viewport,
+  zoom: number
+): boolean {
+  const ratio = zoom / loadedZoom;
+  return (
+    ratio < ZOOM_STEP &&
+    ratio > 1 / ZOOM_STEP &&
+    loaded.x0 <= wanted.x0 &&
+    loaded.y0 <= wanted.y0 &&
+    loaded.x1 >= wanted.x1 &&
+    loaded.y1 >= wanted.y1
+  );
+}
+
+export function isCluster(node: LayoutNode): boolean {
+  return node.type === "cluster";
+}
+
+function flowNode(node: LayoutNode, cited: boolean): Node {
+  if (isCluster(node)) {
+    // Drawn as a circle around the cluster's centroid
+    const size = Math.max(2 * (node.radius ?? 0), MIN_CLUSTER_SIZE);
+    return {
+      id: node.id,
+      position: { x: node.x - size / 2, y: node.y - size / 2 },
+      data: { label: `${node.label} (${node.size ?? 0})`, layoutNode: node },
+      style: {
+        width: size,
+        height: size,
+        borderRadius: "50%",
+        background: "rgba(59, 130, 246, 0.15)",
+        border: "1px solid #3b82f6",
+        color: "white",
+        display: "flex",
+        alignItems: "center",
+        justifyContent: "center",
+        fontSize: "12px",
+        opacity: node.outside ? 0.4 : 1,
+      },
+    };
+  }
+  return {
+    id: node.id,
+    position: { x: node.x, y: node.y },
+    data: { label: node.label, isCited: cited, layoutNode: node },
+    style: {
+      background: cited ? "#3b82f6" : "#374151",
+      color: "white",
+      border: cited ? "3px solid #fbbf24" : "1px solid #6b7280",
+      borderRadius: "8px",
+      padding: "8px 12px",
+      fontSize: "12px",
+      fontWeight: cited ? "bold" : "normal",
+      opacity: node.outside ? 0.4 : 1,
     },
-  }));
+  };
+}
 
-  // Simple edge positioning
-  const layoutEdges: LayoutEdge[] = edges.map((edge) => ({
-    ...edge,
-    sourcePosition: "right" as const,
-    targetPosition: "left" as const,
-  }));
+function flowEdge(edge: LayoutEdge, cited: boolean): Edge {
+  return {
+    id: edge.id,
+    source: edge.source,
+    target: edge.target,
+    label: edge.relation ?? (edge.weight && edge.weight > 1 ? String(edge.weight) : undefined),
+    style: {
+      stroke: cited ? "#ef4444" : "#6b7280",
+      // Cluster edges grow with the number of edges they stand for
+      strokeWidth: cited ? 3 : Math.min(1 + Math.log2(edge.weight ?? 1), 6),
+    },
+    labelStyle: {
+      fill: cited ? "#ef4444" : "#9ca3af",
+      fontSize: "10px",
+      fontWeight: cited ? "bold" : "normal",
+    },
+  };
+}
+
+/** React Flow nodes and edges for a layout view, with cited nodes and edges highlighted. */
+export function layout(
+  view: LayoutView,
+  citedNodes: string[],
+  citedEdges: string[]
+): { nodes: Node[]; edges: Edge[] } {
+  const nodeIds = new Set(citedNodes);
+  const edgeIds = new Set(citedEdges);
+  return {
+    nodes: view.nodes.map((node) => flowNode(node, nodeIds.has(node.id))),
+    edges: view.edges.map((edge) => flowEdge(edge, edgeIds.has(edge.id))),
+  };
+}
 
-  return { nodes: layoutNodes, edges: layoutEdges };
+/** The server's node or cluster behind a React Flow node made by layout(). */
+export function layoutNodeOf(node: Node): LayoutNode | undefined {
+  return (node.data as { layoutNode?: LayoutNode } | undefined)?.layoutNode;
 }
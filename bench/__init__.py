@@ -0,0 +1 @@
+# Benchmarks for the Universal Knowledge Graph API
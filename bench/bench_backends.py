@@ -0,0 +1,97 @@
+"""
+Compare memory and upsert throughput of the graph storage backends.
+
+Each (backend, size) pair runs in a fresh subprocess so peak RSS is not
+shared between runs. Triples are synthetic: labels are drawn from a pool of
+size/2 entities, relations from a small vocabulary, and ~10% of upserts are
+repeat sightings of an existing edge from a new source. Usage:
+
+    python -m bench.bench_backends --sizes 1000000 10000000
+"""
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+
+RELATIONS = ["is_a", "uses", "depends_on", "enables", "part_of", "related_to", "subset_of", "implements"]
+
+
+def synthetic_triples(count: int, seed: int = 11):
+    """Yield (subject, relation, object, source_id) tuples."""
+    rng = random.Random(seed)
+    entities = max(2, count // 2)
+    recent = []
+    for i in range(count):
+        if recent and rng.random() < 0.1:
+            s, r, o = rng.choice(recent)
+        else:
+            s, r, o = f"Entity {rng.randrange(entities)}", rng.choice(RELATIONS), f"Entity {rng.randrange(entities)}"
+            if len(recent) < 1024:
+                recent.append((s, r, o))
+            else:
+                recent[rng.randrange(1024)] = (s, r, o)
+        yield s, r, o, f"doc{i // 50}#chunk_{i % 50}"
+
+
+def max_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+def run_one(backend: str, size: int, indexed: bool) -> dict:
+    from api.graph_store import GraphStore
+    from api.storage import create_engine
+
+    baseline_rss = max_rss_mb()
+    store = GraphStore(create_engine(backend), indexed=indexed)
+    started = time.perf_counter()
+    for s, r, o, src in synthetic_triples(size):
+        store.upsert_triple(s, r, o, src, confidence=0.5)
+    elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    store.get_subgraph_by_keywords(["entity 4242"]) if indexed else None
+    lookup_ms = (time.perf_counter() - started) * 1000
+    return {
+        "backend": backend,
+        "indexed": indexed,
+        "triples": size,
+        "nodes": store.node_count(),
+        "edges": store.edge_count(),
+        "upsert_seconds": round(elapsed, 2),
+        "upserts_per_second": int(size / elapsed),
+        "keyword_subgraph_ms": round(lookup_ms, 3) if indexed else None,
+        "peak_rss_mb": max_rss_mb(),
+        "graph_rss_mb": round(max_rss_mb() - baseline_rss, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--backends", nargs="+", default=["networkx", "compact"])
+    parser.add_argument("--no-index", action="store_true", help="measure the engines without the label index")
+    parser.add_argument("--child", nargs=3, metavar=("BACKEND", "SIZE", "INDEXED"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        backend, size, indexed = args.child
+        print(json.dumps(run_one(backend, int(size), indexed == "1")))
+        return
+
+    results = []
+    for size in args.sizes:
+        for backend in args.backends:
+            cmd = [sys.executable, "-m", "bench.bench_backends", "--child", backend, str(size),
+                   "0" if args.no_index else "1"]
+            out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+            print(json.dumps(results[-1]), file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Measure bulk triple import and export throughput and peak memory.
+
+Writes a synthetic triple file of each size and format (the triples of
+bench_backends, with one source per 50 triples), then imports it in a
+fresh subprocess per (backend, format, size) so peak RSS is not shared
+between runs. Each run also streams the graph back out. With
+--baseline the same triples are upserted one at a time for comparison.
+Entity resolution is off unless --resolve is given, as it would be for a
+curated knowledge base. Usage:
+
+    python -m bench.bench_bulk --sizes 1000000 10000000 --format nt csv jsonl.gz
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+from bench.bench_backends import max_rss_mb, synthetic_triples
+
+
+def document_triples(size: int):
+    """synthetic_triples attributed to documents rather than chunks, as a knowledge base dump would be."""
+    for s, r, o, src in synthetic_triples(size):
+        yield s, r, o, src.split("#", 1)[0]
+
+
+def write_triples(path: str, fmt: str, size: int):
+    opener = gzip.open if fmt.endswith(".gz") else open
+    base = fmt.split(".")[0]
+    with opener(path, "wt", encoding="utf-8", newline="") as f:
+        if base == "csv":
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(["subject", "relation", "object", "source"])
+            writer.writerows(document_triples(size))
+        elif base == "jsonl":
+            for s, r, o, src in document_triples(size):
+                f.write(json.dumps({"subject": s, "relation": r, "object": o, "source": src}) + "\n")
+        else:
+            for s, r, o, src in document_triples(size):
+                f.write(f"<http://example.org/{quote(s.replace(' ', '_'))}> <http://example.org/{r}> "
+                        f"<http://example.org/{quote(o.replace(' ', '_'))}> <urn:{src}> .\n")
+
+
+def run_one(backend: str, path: str, fmt: str, size: int, resolve: bool, baseline: bool) -> dict:
+    from api.bulk import import_file, iter_export
+    from api.graph_store import GraphStore
+    from api.storage import create_engine
+
+    baseline_rss = max_rss_mb()
+    store = GraphStore(create_engine(backend), resolve_entities=resolve)
+    row = {"backend": backend, "format": fmt, "triples": size, "resolve": resolve}
+    if baseline:
+        started = time.perf_counter()
+        for s, r, o, src in document_triples(size):
+            store.upsert_triple(s, r, o, src, confidence=1.0)
+        elapsed = time.perf_counter() - started
+        row.update({"mode": "upsert_triple", "seconds": round(elapsed, 2), "triples_per_second": int(size / elapsed)})
+    else:
+        with open(path, "rb") as f:
+            report = import_file(store, f, path)
+        row.update({"mode": "bulk", "seconds": report["seconds"], "triples_per_second": report["rows_per_second"],
+                    "batches": report["batches"], "bad_rows": report["bad_rows"]})
+    row.update({"nodes": store.node_count(), "edges": store.edge_count(),
+                "peak_rss_mb": max_rss_mb(), "graph_rss_mb": round(max_rss_mb() - baseline_rss, 1)})
+
+    started = time.perf_counter()
+    exported = sum(len(block) for block in iter_export(store, fmt.split(".")[0]))
+    elapsed = time.perf_counter() - started
+    row["export_seconds"] = round(elapsed, 2)
+    row["export_edges_per_second"] = int(store.edge_count() / elapsed) if elapsed else 0
+    row["export_mb"] = round(exported / 1e6, 1)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--backends", nargs="+", default=["compact", "networkx"])
+    parser.add_argument("--format", nargs="+", default=["nt", "csv", "jsonl"])
+    parser.add_argument("--resolve", action="store_true", help="run entity resolution on imported labels")
+    parser.add_argument("--baseline", action="store_true", help="also time one upsert_triple call per triple")
+    parser.add_argument("--child", nargs=6, metavar=("BACKEND", "PATH", "FORMAT", "SIZE", "RESOLVE", "BASELINE"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        backend, path, fmt, size, resolve, baseline = args.child
+        print(json.dumps(run_one(backend, path, fmt, int(size), resolve == "1", baseline == "1")))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            for fmt in args.format:
+                path = os.path.join(tmp, f"triples.{fmt}")
+                write_triples(path, fmt, size)
+                runs = [(backend, "0") for backend in args.backends]
+                if args.baseline and fmt == args.format[0]:
+                    runs += [(backend, "1") for backend in args.backends]
+                for backend, baseline in runs:
+                    cmd = [sys.executable, "-m", "bench.bench_bulk", "--child", backend, path, fmt, str(size),
+                           "1" if args.resolve else "0", baseline]
+                    out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+                    results.append(json.loads(out.strip().splitlines()[-1]))
+                    results[-1]["file_mb"] = round(os.path.getsize(path) / 1e6, 1)
+                    print(json.dumps(results[-1]), file=sys.stderr)
+                os.remove(path)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
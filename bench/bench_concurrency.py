@@ -0,0 +1,164 @@
+"""
+Stress GraphStore with concurrent writers and readers.
+
+Writer threads commit transactions of several triples that share one
+source id while reader threads take snapshots, ask QA retrieval
+questions and fetch deltas. Every read is checked: a snapshot's edges
+only reference nodes in that snapshot, versions never go backwards, and
+each transaction is visible in full or not at all. The run fails on any
+violation or exception, and reports read/write throughput and read
+latency for each reader count. Usage:
+
+    python -m bench.bench_concurrency --readers 1 2 4 8 --writers 2 --seconds 5
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from api.graph_store import GraphStore
+from api.retrieval import Retriever
+from api.storage import create_engine
+
+TXN_SIZE = 4
+WORDS = ["graph", "index", "stream", "query", "vector", "cache", "shard", "replica", "planner", "kernel"]
+
+
+def preload(store: GraphStore, triples: int, seed: int = 1):
+    rng = random.Random(seed)
+    with store.transaction() as tx:
+        for i in range(triples):
+            tx.upsert_triple(f"{rng.choice(WORDS).title()} {i % 5000}", rng.choice(["uses", "is_a", "depends_on"]),
+                             f"{rng.choice(WORDS).title()} {rng.randrange(5000)}", f"preload#chunk_{i}", 0.5)
+
+
+class Stress:
+    def __init__(self, store: GraphStore):
+        self.store = store
+        self.retriever = Retriever(store, cache_size=0)
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.errors = []
+        self.reads = Counter()
+        self.latencies = []
+        self.transactions = 0
+
+    def fail(self, message: str):
+        with self.lock:
+            self.errors.append(message)
+        self.stop.set()
+
+    def writer(self, w: int):
+        rng = random.Random(100 + w)
+        k = 0
+        while not self.stop.is_set():
+            source = f"txn-{w}-{k}"
+            try:
+                with self.store.transaction() as tx:
+                    for j in range(TXN_SIZE):
+                        tx.upsert_triple(f"Writer {w} {rng.choice(WORDS)} {k}", f"step_{j}",
+                                         f"{rng.choice(WORDS).title()} {rng.randrange(5000)}", source, 0.9)
+            except Exception as e:
+                self.fail(f"writer {w}: {e!r}")
+                return
+            k += 1
+            with self.lock:
+                self.transactions += 1
+
+    def check_snapshot(self, last_version: int) -> int:
+        snapshot = self.store.snapshot()
+        if snapshot.version < last_version:
+            self.fail(f"version went back from {last_version} to {snapshot.version}")
+        dto = snapshot.to_dto()
+        node_ids = {n["id"] for n in dto["nodes"]}
+        per_txn = Counter()
+        for edge in dto["edges"]:
+            if edge["source"] not in node_ids or edge["target"] not in node_ids:
+                self.fail(f"edge {edge['id']} references a node missing from snapshot {snapshot.version}")
+                break
+            for source in set(edge["sources"]):
+                if source.startswith("txn-"):
+                    per_txn[source] += 1
+        torn = [source for source, count in per_txn.items() if count != TXN_SIZE]
+        if torn:
+            self.fail(f"snapshot {snapshot.version} shows {len(torn)} partial transactions, e.g. {torn[0]}")
+        return snapshot.version
+
+    def reader(self, r: int):
+        rng = random.Random(200 + r)
+        version = 0
+        i = 0
+        latencies = []
+        while not self.stop.is_set():
+            started = time.perf_counter()
+            try:
+                kind = ("snapshot", "qa", "delta")[i % 3] if i % 10 else "check"
+                if kind == "check":
+                    version = self.check_snapshot(version)
+                elif kind == "snapshot":
+                    self.store.snapshot()
+                elif kind == "qa":
+                    self.retriever.retrieve(f"what does {rng.choice(WORDS)} {rng.randrange(5000)} use")
+                else:
+                    self.store.to_dto_since(max(0, self.store.version - 50))
+            except Exception as e:
+                self.fail(f"reader {r}: {e!r}")
+                return
+            latencies.append(time.perf_counter() - started)
+            i += 1
+            with self.lock:
+                self.reads[kind] += 1
+        with self.lock:
+            self.latencies += latencies
+
+
+def run(backend: str, preload_triples: int, readers: int, writers: int, seconds: float):
+    store = GraphStore(create_engine(backend))
+    preload(store, preload_triples)
+    stress = Stress(store)
+    threads = [threading.Thread(target=stress.writer, args=(w,)) for w in range(writers)]
+    threads += [threading.Thread(target=stress.reader, args=(r,)) for r in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stress.stop.set()
+    for t in threads:
+        t.join()
+    stress.check_snapshot(0)
+    latencies = sorted(stress.latencies) or [0.0]
+    return {
+        "backend": backend,
+        "readers": readers,
+        "writers": writers,
+        "reads_per_second": round(sum(stress.reads.values()) / seconds),
+        "reads": dict(stress.reads),
+        "write_transactions_per_second": round(stress.transactions / seconds),
+        "read_p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "read_p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3),
+        "nodes": store.node_count(),
+        "edges": store.edge_count(),
+        "errors": stress.errors[:5],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--readers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--preload", type=int, default=20000)
+    parser.add_argument("--backends", nargs="+", default=["networkx", "compact"])
+    args = parser.parse_args()
+
+    results = [run(backend, args.preload, readers, args.writers, args.seconds)
+               for backend in args.backends for readers in args.readers]
+    print(json.dumps(results, indent=2))
+    if any(r["errors"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
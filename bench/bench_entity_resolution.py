@@ -0,0 +1,116 @@
+"""
+Measure entity-resolution throughput and merge quality.
+
+Generates unique multi-word labels plus noisy variants of them (case,
+articles, plurals, punctuation and one-character typos), then times the
+resolver alone in labels/s and full upserts with resolution on and off.
+Usage:
+
+    python -m bench.bench_entity_resolution --labels 200000 --variants 0.2
+"""
+import argparse
+import json
+import random
+import time
+
+from api.entity_resolution import EntityResolver
+from api.graph_store import create_graph_store
+
+WORDS = [
+    "neural", "network", "graph", "database", "robot", "vision", "language", "model", "learning", "agent",
+    "transformer", "attention", "policy", "reward", "kernel", "vector", "search", "index", "query", "cluster",
+    "quantum", "protein", "climate", "market", "sensor", "signal", "compiler", "storage", "memory", "planner",
+]
+
+
+def make_labels(count: int, seed: int = 7):
+    """count unique base labels, e.g. 'Quantum Sensor Planner 41'."""
+    rng = random.Random(seed)
+    labels = set()
+    while len(labels) < count:
+        words = [rng.choice(WORDS).title() for _ in range(rng.randint(1, 3))]
+        if rng.random() < 0.5:
+            words.append(str(rng.randrange(count)))
+        else:
+            words.append(rng.choice(WORDS).title() + rng.choice(WORDS))
+        labels.add(" ".join(words))
+    return sorted(labels)
+
+
+def noisy_variant(label: str, rng: random.Random) -> str:
+    kind = rng.randrange(4)
+    if kind == 0:
+        return "the " + label.lower()
+    if kind == 1:
+        return label + "s"
+    if kind == 2:
+        return label.replace(" ", "-", 1)
+    words = label.split()
+    i = max(range(len(words)), key=lambda j: len(words[j]))
+    word = words[i]
+    if len(word) >= 6 and not any(c.isdigit() for c in word):
+        k = rng.randrange(1, len(word) - 1)
+        words[i] = word[:k] + word[k + 1:]
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--labels", type=int, default=200_000)
+    parser.add_argument("--variants", type=float, default=0.2, help="fraction of extra noisy variants")
+    parser.add_argument("--backend", default="compact")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    base = make_labels(args.labels)
+    variants = [(noisy_variant(label, rng), label) for label in rng.sample(base, int(len(base) * args.variants))]
+
+    resolver = EntityResolver()
+    handles = {}
+    started = time.perf_counter()
+    for i, label in enumerate(base):
+        key = resolver.key(label, "entity")
+        matches = resolver.resolve(key)
+        handle = matches[0] if matches else i
+        resolver.add(handle, key)
+        handles[label] = handle
+    new_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    resolved = 0
+    for variant, label in variants:
+        key = resolver.key(variant, "entity")
+        matches = resolver.resolve(key)
+        resolved += bool(matches) and matches[0] == resolver.clusters.find(handles[label])
+        if matches:
+            resolver.add(matches[0], key)
+    variant_elapsed = time.perf_counter() - started
+
+    results = {
+        "labels": len(base),
+        "distinct_entities_found": len({resolver.clusters.find(h) for h in handles.values()}),
+        "new_labels_per_s": round(len(base) / new_elapsed),
+        "variants": len(variants),
+        "variants_resolved_to_origin": resolved,
+        "variant_labels_per_s": round(len(variants) / variant_elapsed) if variants else None,
+        "resolver": resolver.stats(),
+    }
+
+    triples = [(label, "related_to", base[(i * 7919) % len(base)], f"doc#chunk_{i}") for i, label in enumerate(base)]
+    triples += [(variant, "related_to", label, "variants") for variant, label in variants]
+    for enabled in (False, True):
+        store = create_graph_store(args.backend)
+        if not enabled:
+            store.resolver = None
+        started = time.perf_counter()
+        for subject, relation, obj, source in triples:
+            store.upsert_triple(subject, relation, obj, source, confidence=0.5)
+        elapsed = time.perf_counter() - started
+        results[f"upserts_resolution_{'on' if enabled else 'off'}"] = {
+            "triples_per_s": round(len(triples) / elapsed), "nodes": store.node_count(), "edges": store.edge_count()
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Measure extraction cost for a cold and a warm extraction cache.
+
+Runs extract_triples over a generated corpus twice against a stub OpenAI
+client with a fixed latency, then fires concurrent requests for the same
+chunk to show single-flight coalescing. Usage:
+
+    python -m bench.bench_extraction_cache --chunks 200 --llm-latency 0.05
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from api import helpers
+from api.extraction_cache import ExtractionCache
+
+from .fixtures import SAMPLE_SENTENCES, fake_completion
+
+
+class StubOpenAI:
+    """Minimal stand-in for the OpenAI client that counts calls."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        content = fake_completion(kwargs["messages"][-1]["content"])
+        message = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+def run_pass(chunks, workers: int) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda c: helpers.extract_triples(c[1], f"doc#chunk_{c[0]}"), enumerate(chunks)))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    stub = StubOpenAI(args.llm_latency)
+    helpers.openai_client = stub
+    chunks = [f"{SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)]} Chunk {i}." for i in range(args.chunks)]
+    with tempfile.TemporaryDirectory() as tmp:
+        helpers.extraction_cache = ExtractionCache(os.path.join(tmp, "cache.sqlite3"))
+
+        cold = run_pass(chunks, args.workers)
+        cold_calls = stub.calls
+        warm = run_pass(chunks, args.workers)
+        warm_calls = stub.calls - cold_calls
+
+        before = stub.calls
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(lambda i: helpers.extract_triples("A brand new chunk.", f"dup#{i}"), range(args.workers)))
+        concurrent_calls = stub.calls - before
+
+        result = {
+            "chunks": args.chunks,
+            "cold_seconds": round(cold, 3),
+            "cold_llm_calls": cold_calls,
+            "warm_seconds": round(warm, 3),
+            "warm_llm_calls": warm_calls,
+            "warm_ms_per_chunk": round(warm / args.chunks * 1000, 3),
+            "concurrent_duplicate_requests": args.workers,
+            "concurrent_duplicate_llm_calls": concurrent_calls,
+            "cache": helpers.extraction_cache.stats(),
+        }
+        helpers.extraction_cache.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Compare full graph serialization with ?since=<version> deltas.
+
+Builds a graph of synthetic triples, applies a small batch of upserts, and
+reports payload size and serialization time for the full DTO, the delta
+and the NDJSON stream. Usage:
+
+    python -m bench.bench_graph_delta --triples 200000 --changes 50
+"""
+import argparse
+import json
+import time
+
+from api.graph_store import create_graph_store
+
+from .bench_backends import synthetic_triples
+
+
+def timed(fn):
+    started = time.perf_counter()
+    value = fn()
+    return value, round((time.perf_counter() - started) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--triples", type=int, default=200000)
+    parser.add_argument("--changes", type=int, default=50)
+    parser.add_argument("--backend", default="networkx", choices=["networkx", "compact"])
+    args = parser.parse_args()
+
+    store = create_graph_store(args.backend)
+    for s, r, o, src in synthetic_triples(args.triples):
+        store.upsert_triple(s, r, o, src, confidence=0.5)
+    since = store.version
+    for i in range(args.changes):
+        store.upsert_triple(f"New Entity {i}", "related_to", f"Entity {i}", "bench#chunk_0", confidence=0.5)
+
+    full, full_ms = timed(lambda: json.dumps(store.to_dto()))
+    delta, delta_ms = timed(lambda: json.dumps(store.to_dto_since(since)))
+    ndjson, ndjson_ms = timed(lambda: sum(len(json.dumps(item)) + 1 for _, item in store.iter_dto_items()))
+    print(json.dumps({
+        "backend": args.backend,
+        "nodes": store.node_count(),
+        "edges": store.edge_count(),
+        "changes": args.changes,
+        "full_bytes": len(full), "full_ms": full_ms,
+        "delta_bytes": len(delta), "delta_ms": delta_ms,
+        "ndjson_bytes": ndjson, "ndjson_ms": ndjson_ms,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Measure the cost of polling GET /api/graph when the graph has not changed.
+
+Builds a graph of synthetic triples and serves it from a small FastAPI app
+in-process, once the way /api/graph used to (the DTO validated against the
+response model and serialized on every request) and once through
+GraphResponseCache. Reports latency and bytes on the wire for an
+uncompressed poll, a gzip poll and a conditional poll answered with 304.
+Usage:
+
+    python -m bench.bench_graph_http --triples 200000 --polls 20
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from api.graph_store import create_graph_store
+from api.http_cache import GraphResponseCache
+
+from .bench_backends import synthetic_triples
+
+
+class GraphResponse(BaseModel):
+    """Same fields as api.main.IngestResponse."""
+    nodes: List[Dict[str, Any]]
+    edges: List[Dict[str, Any]]
+    version: int = 0
+    since: Optional[int] = None
+    full: bool = True
+    removed_nodes: List[str] = []
+    removed_edges: List[str] = []
+
+
+def make_app(store) -> FastAPI:
+    app = FastAPI()
+    cache = GraphResponseCache(store)
+
+    @app.get("/before", response_model=GraphResponse)
+    def before():
+        return store.to_dto()
+
+    @app.get("/after")
+    def after(request: Request):
+        return cache.respond("graph", store.to_dto, request.headers.get("if-none-match"),
+                             request.headers.get("accept-encoding"))
+
+    return app
+
+
+def poll(client: TestClient, path: str, polls: int, headers: Dict[str, str]) -> Dict[str, Any]:
+    times = []
+    for _ in range(polls):
+        started = time.perf_counter()
+        r = client.get(path, headers=headers)
+        times.append((time.perf_counter() - started) * 1000)
+    # TestClient decodes gzip, so the wire size is the compressed body's length header
+    size = int(r.headers.get("content-length", len(r.content)))
+    return {"status": r.status_code, "median_ms": round(statistics.median(times), 2),
+            "max_ms": round(max(times), 2), "wire_bytes": size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--triples", type=int, default=200000)
+    parser.add_argument("--polls", type=int, default=20)
+    parser.add_argument("--backend", default="compact", choices=["networkx", "compact"])
+    args = parser.parse_args()
+
+    store = create_graph_store(args.backend)
+    for s, r, o, src in synthetic_triples(args.triples):
+        store.upsert_triple(s, r, o, src, confidence=0.5)
+    store.to_dto()  # the snapshot is shared by both endpoints; time only the responses
+
+    client = TestClient(make_app(store))
+    started = time.perf_counter()
+    first = client.get("/after", headers={"Accept-Encoding": "gzip"})
+    first_ms = round((time.perf_counter() - started) * 1000, 2)
+    etag = first.headers["etag"]
+    result = {
+        "backend": args.backend,
+        "nodes": store.node_count(),
+        "edges": store.edge_count(),
+        "first_build_ms": first_ms,  # serialize and gzip once for this version
+        "before": poll(client, "/before", args.polls, {"Accept-Encoding": "identity"}),
+        "cached_identity": poll(client, "/after", args.polls, {"Accept-Encoding": "identity"}),
+        "cached_gzip": poll(client, "/after", args.polls, {"Accept-Encoding": "gzip"}),
+        "not_modified": poll(client, "/after", args.polls, {"Accept-Encoding": "gzip", "If-None-Match": etag}),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
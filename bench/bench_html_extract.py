@@ -0,0 +1,89 @@
+"""
+Compare the streaming main-content extractor with the BeautifulSoup path.
+
+Runs both over a corpus of HTML pages and reports pages/second, the
+fraction of the BeautifulSoup text the extractor keeps and the number of
+chunks (LLM extraction calls) each produces. On the generated corpus,
+which knows each page's article text, it also reports how much of the
+article is kept (recall) and how many boilerplate snippets leak through.
+Pass --corpus to run on a directory of saved .html pages instead. Usage:
+
+    python -m bench.bench_html_extract --pages 300
+    python -m bench.bench_html_extract --corpus ~/saved-pages
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+from bs4 import BeautifulSoup
+
+from api.html_extract import decode_html, extract_paragraphs
+from api.pipeline import chunk_text, html_to_chunks
+
+from .fixtures import boilerplate_page
+
+
+def soup_text(content: bytes) -> str:
+    """The former html_to_chunks text: full tree, drop script/style/noscript, get_text."""
+    soup = BeautifulSoup(content, "html.parser")
+    for element in soup(["script", "style", "noscript"]):
+        element.decompose()
+    return " ".join(soup.get_text(" ").split())
+
+
+def throughput(fn, pages) -> float:
+    started = time.perf_counter()
+    for content in pages:
+        fn(content)
+    return round(len(pages) / (time.perf_counter() - started), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--corpus", help="directory of saved .html pages (default: generated pages)")
+    args = parser.parse_args()
+
+    truth = None
+    if args.corpus:
+        paths = sorted(glob.glob(os.path.join(os.path.expanduser(args.corpus), "**", "*.htm*"), recursive=True))
+        pages = [open(path, "rb").read() for path in paths]
+    else:
+        generated = [boilerplate_page(i) for i in range(args.pages)]
+        pages = [page for page, _, _ in generated]
+        truth = [(paragraphs, boilerplate) for _, paragraphs, boilerplate in generated]
+
+    soup_chars = kept_chars = soup_chunks = new_chunks = 0
+    recall = leaked = 0.0
+    for i, content in enumerate(pages):
+        old = soup_text(content)
+        new = extract_paragraphs(decode_html(content))
+        soup_chars += len(old)
+        kept_chars += sum(len(p) for p in new)
+        soup_chunks += len(chunk_text(old, target=1800, overlap=200))
+        new_chunks += len(html_to_chunks(content))
+        if truth is not None:
+            text = "\n".join(new)
+            paragraphs, boilerplate = truth[i]
+            recall += sum(p in text for p in paragraphs) / len(paragraphs)
+            leaked += sum(b in text for b in boilerplate) / len(boilerplate)
+
+    result = {
+        "pages": len(pages),
+        "mb": round(sum(len(p) for p in pages) / 1e6, 2),
+        "soup_pages_per_s": throughput(soup_text, pages),
+        "extractor_pages_per_s": throughput(lambda c: extract_paragraphs(decode_html(c)), pages),
+        "kept_fraction": round(kept_chars / max(soup_chars, 1), 3),
+        "soup_chunks": soup_chunks,
+        "extractor_chunks": new_chunks,
+    }
+    if truth is not None:
+        result["article_recall"] = round(recall / len(pages), 4)
+        result["boilerplate_leaked"] = round(leaked / len(pages), 4)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
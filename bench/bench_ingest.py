@@ -0,0 +1,70 @@
+"""
+Compare sequential ingestion with the concurrent pipeline.
+
+Serves generated pages from a local HTTP server with a fixed response delay
+and replaces the LLM with a stub that sleeps for a fixed latency, so the
+numbers only reflect scheduling. Usage:
+
+    python -m bench.bench_ingest --urls 20 --fetch-delay 0.2 --llm-latency 0.1
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import requests
+
+from api.graph_store import GraphStore
+from api.pipeline import IngestPipeline, apply_triples, html_to_chunks
+
+from .fixtures import FakeHTTPServer, sample_page, stub_llm
+
+
+def run_sequential(urls, extract) -> float:
+    """The pre-pipeline behaviour: one blocking fetch and one extraction at a time."""
+    store = GraphStore()
+    started = time.perf_counter()
+    for url in urls:
+        r = requests.get(url, timeout=15)
+        for i, chunk in enumerate(html_to_chunks(r.content)):
+            source_id = f"{url}#chunk_{i}"
+            apply_triples(store, extract(chunk, source_id), source_id)
+    return time.perf_counter() - started
+
+
+async def run_pipeline(urls, extract, workers: int, per_host: int) -> float:
+    store = GraphStore()
+    pipeline = IngestPipeline(store, extract_fn=extract, extract_workers=workers, per_host_limit=per_host)
+    try:
+        report = await pipeline.ingest_urls(urls)
+    finally:
+        await pipeline.aclose()
+    return report.elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--urls", type=int, default=20)
+    parser.add_argument("--fetch-delay", type=float, default=0.2)
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--per-host", type=int, default=32)
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+
+    pages = {f"/page/{i}": sample_page(i) for i in range(args.urls)}
+    extract = stub_llm(args.llm_latency)
+    with FakeHTTPServer(pages, delay=args.fetch_delay) as server:
+        urls = [server.base_url + path for path in pages]
+        chunks = len(html_to_chunks(pages["/page/0"]))
+        result = {"urls": args.urls, "chunks_per_url": chunks, "fetch_delay": args.fetch_delay,
+                  "llm_latency": args.llm_latency}
+        result["pipeline_seconds"] = round(asyncio.run(run_pipeline(urls, extract, args.workers, args.per_host)), 3)
+        if not args.skip_sequential:
+            result["sequential_seconds"] = round(run_sequential(urls, extract), 3)
+            result["speedup"] = round(result["sequential_seconds"] / result["pipeline_seconds"], 1)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
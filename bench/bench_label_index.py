@@ -0,0 +1,73 @@
+"""
+Measure keyword lookup latency on a large graph.
+
+Builds a graph with synthetic entity labels, then times the indexed
+find_nodes / get_subgraph_by_keywords path against a linear label scan for
+a set of QA-style keyword lists. Usage:
+
+    python -m bench.bench_label_index --nodes 1000000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from api.graph_store import GraphStore, create_graph_store
+
+VOCABULARY = [
+    "neural", "network", "robot", "vision", "learning", "language", "model", "graph", "data", "agent",
+    "transformer", "attention", "policy", "reward", "kernel", "vector", "search", "index", "query", "cluster",
+]
+
+QUERIES = [["transformer", "attention"], ["reinforcement"], ["robot", "vision"], ["entity 4242"], ["xyzzy"]]
+
+
+def build_graph(nodes: int, backend: str, seed: int = 7) -> GraphStore:
+    rng = random.Random(seed)
+    store = create_graph_store(backend)
+    labels = [f"{rng.choice(VOCABULARY).title()} {rng.choice(VOCABULARY).title()} Entity {i}" for i in range(nodes)]
+    for i in range(0, nodes - 1, 2):
+        store.upsert_triple(labels[i], rng.choice(["uses", "is_a", "depends_on"]), labels[i + 1], f"doc#chunk_{i}")
+    return store
+
+
+def linear_scan(store: GraphStore, keywords):
+    engine = store.engine
+    return [engine.node_id(h) for h in engine.iter_nodes()
+            if any(k in engine.node_label(h).lower() for k in keywords)]
+
+
+def time_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--backend", default="networkx", choices=["networkx", "compact"])
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    store = build_graph(args.nodes, args.backend)
+    result = {"backend": args.backend, "nodes": store.node_count(), "edges": store.edge_count(),
+              "build_seconds": round(time.perf_counter() - started, 2), "queries": []}
+    for keywords in QUERIES:
+        result["queries"].append({
+            "keywords": keywords,
+            "matches": len(store.find_nodes(keywords)),
+            "indexed_ms": time_ms(lambda: store.find_nodes(keywords), args.repeat),
+            "subgraph_ms": time_ms(lambda: store.get_subgraph_by_keywords(keywords), args.repeat),
+            "linear_scan_ms": time_ms(lambda: linear_scan(store, keywords), 1),
+        })
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
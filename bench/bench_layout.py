@@ -0,0 +1,86 @@
+"""
+Measure server-side graph layout: a full layout, an incremental update
+after new triples arrive, and viewport queries at several zoom levels.
+
+Builds a synthetic graph with a Zipf degree distribution, lays it out,
+adds `--grow` more edges and lays it out again from the previous
+positions. Reports compute time, how far already placed nodes moved
+(median, in layout units) and the latency and size of view() responses.
+Usage:
+
+    python -m bench.bench_layout --nodes 10000 --edges 20000 --grow 0.05
+"""
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+
+from api.graph_store import create_graph_store
+from api.layout import EDGE_LENGTH, LayoutService
+
+from .fixtures import synthetic_graph
+
+
+def timed_layout(service: LayoutService):
+    started = time.perf_counter()
+    layout = service.layout(wait=True)
+    return layout, round((time.perf_counter() - started) * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("--edges", type=int, default=20000)
+    parser.add_argument("--grow", type=float, default=0.05, help="share of edges added before the incremental layout")
+    parser.add_argument("--views", type=int, default=20)
+    parser.add_argument("--backend", default="compact", choices=["networkx", "compact"])
+    args = parser.parse_args()
+
+    store = create_graph_store(args.backend)
+    edges = list(synthetic_graph(args.nodes, args.edges + int(args.edges * args.grow)))
+    for s, r, o, src in edges[:args.edges]:
+        store.upsert_triple(s, r, o, src, confidence=0.5)
+    service = LayoutService(store)
+    first, full_ms = timed_layout(service)
+
+    for s, r, o, src in edges[args.edges:]:
+        store.upsert_triple(s, r, o, src, confidence=0.5)
+    second, incremental_ms = timed_layout(service)
+    common = [node["id"] for node in first.nodes if node["id"] in second.index]
+    before = first.pos[[first.index[node] for node in common]]
+    after = second.pos[[second.index[node] for node in common]]
+    moved = np.hypot(*(after - before).T) if common else np.zeros(1)
+
+    bounds = second.bounds()
+    views = {}
+    for zoom in (1.0, 0.25, 0.05):
+        # A viewport of 1000 x 1000 screen pixels at the center of the layout
+        cx, cy, half = (bounds["x0"] + bounds["x1"]) / 2, (bounds["y0"] + bounds["y1"]) / 2, 500 / zoom
+        times = []
+        for _ in range(args.views):
+            started = time.perf_counter()
+            view = second.view(cx - half, cy - half, cx + half, cy + half, zoom=zoom)
+            times.append((time.perf_counter() - started) * 1000)
+        views[str(zoom)] = {"level": view["level"], "nodes": len(view["nodes"]), "edges": len(view["edges"]),
+                            "median_ms": round(statistics.median(times), 2),
+                            "bytes": len(json.dumps(view).encode())}
+
+    result = {
+        "backend": args.backend,
+        "nodes": len(second.nodes),
+        "edges": len(second.edges),
+        "levels": service.stats()["levels"],
+        "full_ms": full_ms,
+        "incremental_ms": incremental_ms,
+        "incremental_new_nodes": len(second.nodes) - len(common),
+        "median_move": round(float(np.median(moved)), 1),
+        "edge_length": EDGE_LENGTH,
+        "views": views,
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Measure batched, rate-limited extraction against a rate-limited fake OpenAI server.
+
+Ingests generated documents through the pipeline and extract_triples,
+talking to a local OpenAI-compatible server that enforces its own
+requests/tokens per minute limits and fails a share of requests with 500s.
+The unbatched run sends one chunk per request without retries or pacing,
+like extraction did before the scheduler; the batched run packs chunks up
+to the token budget and paces and retries requests. Usage:
+
+    python -m bench.bench_llm_scheduler --chunks 200 --server-rpm 120 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+
+from openai import OpenAI
+
+from api import helpers
+from api.graph_store import GraphStore
+from api.llm_scheduler import ExtractionScheduler
+from api.pipeline import IngestPipeline
+
+from .fixtures import FakeOpenAIServer, SAMPLE_SENTENCES
+
+
+def documents(chunks: int, per_document: int = 10):
+    texts = [" ".join(f"{SAMPLE_SENTENCES[(i + j) % len(SAMPLE_SENTENCES)]} Item {i}-{j}." for j in range(20))
+             for i in range(chunks)]
+    return [texts[i:i + per_document] for i in range(0, chunks, per_document)]
+
+
+async def ingest(docs):
+    pipeline = IngestPipeline(GraphStore(), extract_workers=64)
+    totals = {}
+    try:
+        for i, chunks in enumerate(docs):
+            report = (await pipeline.ingest_chunks(f"doc{i}", chunks)).to_dict()
+            for key in ("chunks", "triples", "llm_calls", "llm_retries", "prompt_tokens", "completion_tokens", "elapsed"):
+                totals[key] = round(totals.get(key, 0) + report[key], 2)
+    finally:
+        await pipeline.aclose()
+    return totals
+
+
+def run(server: FakeOpenAIServer, docs, scheduler: ExtractionScheduler):
+    helpers.extraction_scheduler = scheduler
+    requests, limited, errors = server.requests, server.rate_limited, server.errors
+    result = asyncio.run(ingest(docs))
+    scheduler.close()
+    stats = scheduler.stats()
+    result.update({
+        "server_requests": server.requests - requests,
+        "server_429s": server.rate_limited - limited,
+        "server_500s": server.errors - errors,
+        "chunks_per_request": stats["chunks_per_request"],
+        "chunks_dropped_to_stub": stats["failed_chunks"],
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake server seconds per request")
+    parser.add_argument("--server-rpm", type=float, default=120)
+    parser.add_argument("--server-tpm", type=float, default=200000)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--batch-tokens", type=int, default=6000)
+    args = parser.parse_args()
+
+    helpers.EXTRACTION_CACHE_PATH = ""  # every run must reach the server
+    docs = documents(args.chunks)
+    results = {"chunks": args.chunks, "server_rpm": args.server_rpm, "server_tpm": args.server_tpm,
+               "error_rate": args.error_rate}
+    with FakeOpenAIServer(latency=args.latency, requests_per_minute=args.server_rpm,
+                          tokens_per_minute=args.server_tpm, error_rate=args.error_rate) as server:
+        client = OpenAI(api_key="bench", base_url=server.base_url, max_retries=0)
+        helpers.openai_client = client
+        unbatched = ExtractionScheduler(client, helpers.EXTRACTION_MODEL, max_batch_chunks=1, concurrency=64,
+                                        requests_per_minute=None, tokens_per_minute=None, max_retries=0)
+        results["unbatched"] = run(server, docs, unbatched)
+        batched = ExtractionScheduler(client, helpers.EXTRACTION_MODEL, max_batch_tokens=args.batch_tokens,
+                                      requests_per_minute=args.server_rpm * 0.9,
+                                      tokens_per_minute=args.server_tpm * 0.9)
+        results["batched"] = run(server, docs, batched)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Measure read throughput and write visibility with several processes sharing one graph directory.
+
+Preloads a shared data directory, then starts N reader processes that
+each open their own replica and answer QA retrievals and graph snapshots
+while a writer process commits transactions. Reports total reads per
+second for each process count, how long a write takes to become visible
+in another process, and whether every replica ended on the same version
+and contents. Usage:
+
+    python -m bench.bench_multiprocess --processes 1 2 4 --seconds 5 --preload 20000
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+
+from .bench_concurrency import TXN_SIZE, WORDS, preload
+
+
+def open_store(data_dir: str, backend: str):
+    from api.graph_store import GraphStore
+    from api.persistence import GraphPersistence
+    from api.storage import create_engine
+
+    store = GraphStore(create_engine(backend))
+    persistence = GraphPersistence(data_dir, shared=True, snapshot_every=10 ** 12)
+    persistence.open(store)
+    persistence.start_follower(store)
+    return store
+
+
+def fingerprint(store) -> str:
+    dto = store.to_dto()
+    digest = hashlib.sha1()
+    for node in sorted(n["id"] for n in dto["nodes"]):
+        digest.update(node.encode())
+    for edge in sorted((e["id"], len(e["sources"])) for e in dto["edges"]):
+        digest.update(repr(edge).encode())
+    return digest.hexdigest()
+
+
+def reader(data_dir: str, backend: str, seed: int, start, stop, final_version, results):
+    from api.retrieval import Retriever
+
+    store = open_store(data_dir, backend)
+    retriever = Retriever(store, cache_size=0)
+    rng = random.Random(seed)
+    reads = 0
+    start.wait()
+    while not stop.is_set():
+        if reads % 10:
+            retriever.retrieve(f"what does {rng.choice(WORDS)} {rng.randrange(5000)} use")
+        else:
+            store.snapshot().to_dto()
+        reads += 1
+    results.put(("reader", reads))
+    # Wait for the writer's final version, then for this replica to apply it
+    deadline = time.monotonic() + 10
+    while (final_version.value < 0 or store.version < final_version.value) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    results.put(("replica", store.version, fingerprint(store)))
+    store.persistence.close()
+
+
+def writer(data_dir: str, backend: str, start, stop, final_version, results):
+    store = open_store(data_dir, backend)
+    rng = random.Random(7)
+    start.wait()
+    k = 0
+    while not stop.is_set():
+        with store.transaction() as tx:
+            for j in range(TXN_SIZE):
+                tx.upsert_triple(f"Writer {rng.choice(WORDS)} {k}", f"step_{j}",
+                                 f"{rng.choice(WORDS).title()} {rng.randrange(5000)}", f"txn-{k}", 0.9)
+        k += 1
+        time.sleep(0.005)
+    final_version.value = store.version
+    results.put(("writer", k))
+    results.put(("replica", store.version, fingerprint(store)))
+    store.persistence.close()
+
+
+def run_readers(data_dir: str, backend: str, processes: int, seconds: float) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    final_version = ctx.Value("q", -1)
+    start, stop, results = ctx.Event(), ctx.Event(), ctx.Queue()
+    workers = [ctx.Process(target=writer, args=(data_dir, backend, start, stop, final_version, results))]
+    workers += [ctx.Process(target=reader, args=(data_dir, backend, 100 + p, start, stop, final_version, results))
+                for p in range(processes)]
+    for w in workers:
+        w.start()
+    time.sleep(1.0 + 0.5 * processes)  # let every process restore its replica
+    start.set()
+    time.sleep(seconds)
+    stop.set()
+    reads = transactions = 0
+    replicas = []
+    for _ in range(2 * processes + 2):
+        message = results.get(timeout=60)
+        if message[0] == "reader":
+            reads += message[1]
+        elif message[0] == "writer":
+            transactions = message[1]
+        else:
+            replicas.append(message[1:])
+    for w in workers:
+        w.join()
+    return {
+        "processes": processes,
+        "reads_per_second": round(reads / seconds),
+        "write_transactions_per_second": round(transactions / seconds),
+        "replica_versions": sorted({v for v, _ in replicas}),
+        "replicas_identical": len(set(replicas)) == 1,
+    }
+
+
+def visibility(data_dir: str, backend: str, writes: int) -> dict:
+    """Latency from a commit in one process until another process's replica reaches its version."""
+    ctx = multiprocessing.get_context("spawn")
+    committed, latencies = ctx.Queue(), ctx.Queue()
+    follower = ctx.Process(target=_watch, args=(data_dir, backend, writes, committed, latencies))
+    follower.start()
+    store = open_store(data_dir, backend)
+    latencies.get(timeout=60)  # follower ready
+    for i in range(writes):
+        store.upsert_triple(f"Marker {i}", "written_at", f"Time {i}", "visibility", 1.0)
+        committed.put((store.version, time.time()))
+        time.sleep(0.02)
+    samples = sorted(latencies.get(timeout=60) for _ in range(writes))
+    follower.join()
+    store.persistence.close()
+    return {"writes": writes, "visible_p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+            "visible_p99_ms": round(samples[int(len(samples) * 0.99)] * 1000, 1)}
+
+
+def _watch(data_dir: str, backend: str, writes: int, committed, latencies):
+    store = open_store(data_dir, backend)
+    latencies.put(0.0)
+    for _ in range(writes):
+        version, at = committed.get()
+        while store.version < version:
+            time.sleep(0.0005)
+        latencies.put(time.time() - at)
+    store.persistence.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--preload", type=int, default=20000)
+    parser.add_argument("--writes", type=int, default=100, help="commits timed for cross-process visibility")
+    parser.add_argument("--backend", default="networkx", choices=["networkx", "compact"])
+    args = parser.parse_args()
+
+    results = {"backend": args.backend, "preload": args.preload}
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = open_store(data_dir, args.backend)
+        preload(store, args.preload)
+        store.persistence.checkpoint(store)
+        store.persistence.close()
+        results["runs"] = [run_readers(data_dir, args.backend, n, args.seconds) for n in args.processes]
+        results["visibility"] = visibility(data_dir, args.backend, args.writes)
+    print(json.dumps(results, indent=2))
+    if not all(run["replicas_identical"] for run in results["runs"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Measure LLM calls and time saved by near-duplicate chunk suppression.
+
+Builds the text of a multi-page site in which every page repeats the same
+header, sidebar and footer around its own article, plus a share of pages
+that are lightly edited mirrors of earlier ones. The site is ingested
+page by page through the pipeline with a stub LLM, once without and once
+with the chunk index. A second ingest of the same site shows what the
+persisted index saves across ingests. Usage:
+
+    python -m bench.bench_near_duplicates --pages 200 --llm-latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+
+from api.graph_store import GraphStore
+from api.near_duplicates import ChunkIndex
+from api.pipeline import IngestPipeline, chunk_text
+
+from .fixtures import TOPICS, _sentence, stub_llm
+
+
+def site_pages(pages: int, mirror_share: float, seed: int = 5):
+    rng = random.Random(seed)
+    header = " ".join(_sentence(rng, "the site") for _ in range(40))
+    sidebar = " ".join(_sentence(rng, rng.choice(TOPICS)) for _ in range(30))
+    footer = " ".join(_sentence(rng, "our company") for _ in range(25))
+    articles = []
+    for i in range(pages):
+        if articles and rng.random() < mirror_share:
+            words = rng.choice(articles).split()
+            words[rng.randrange(len(words))] = "updated"
+            articles.append(" ".join(words))
+        else:
+            topic = rng.choice(TOPICS)
+            articles.append(" ".join(_sentence(rng, topic) for _ in range(rng.randint(20, 60))))
+    return [f"{header} {article} {sidebar} {footer}" for article in articles]
+
+
+async def ingest_site(pages, extract, index, workers: int):
+    store = GraphStore()
+    pipeline = IngestPipeline(store, extract_fn=extract, extract_workers=workers, chunk_index=index)
+    calls = saved = 0
+    elapsed = 0.0
+    try:
+        for i, text in enumerate(pages):
+            report = await pipeline.ingest_chunks(f"page{i}", chunk_text(text, target=1800, overlap=200))
+            calls += report.chunks - report.skipped_chunks - report.llm_calls_saved
+            saved += report.llm_calls_saved
+            elapsed += report.elapsed
+    finally:
+        await pipeline.aclose()
+    return {"llm_calls": calls, "llm_calls_saved": saved, "seconds": round(elapsed, 2),
+            "nodes": store.node_count(), "edges": store.edge_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--mirror-share", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=0.95)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    pages = site_pages(args.pages, args.mirror_share)
+    extract = stub_llm(args.llm_latency)
+    result = {"pages": args.pages, "chunks": sum(len(chunk_text(p, 1800, 200)) for p in pages),
+              "threshold": args.threshold}
+    result["without_index"] = asyncio.run(ingest_site(pages, extract, None, args.workers))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chunks.sqlite3")
+        index = ChunkIndex(path, threshold=args.threshold)
+        result["with_index"] = asyncio.run(ingest_site(pages, extract, index, args.workers))
+        index.close()
+        index = ChunkIndex(path, threshold=args.threshold)
+        result["reingest_with_persisted_index"] = asyncio.run(ingest_site(pages, extract, index, args.workers))
+        index.close()
+    result["call_reduction"] = round(result["without_index"]["llm_calls"] / max(result["with_index"]["llm_calls"], 1), 2)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Measure restart time from a snapshot plus WAL tail versus a full WAL replay.
+
+Builds a graph of synthetic triples in a temporary data directory, writes a
+checkpoint, appends a WAL tail, then restores it in a fresh process. Usage:
+
+    python -m bench.bench_persistence --triples 2000000 --tail 50000 --backend compact
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from .bench_backends import synthetic_triples
+
+
+def build(data_dir: str, backend: str, triples: int, tail: int, fsync: str) -> dict:
+    from api.graph_store import create_graph_store
+
+    os.environ["GRAPH_WAL_FSYNC"] = fsync
+    os.environ["GRAPH_SNAPSHOT_EVERY"] = str(10 ** 12)
+    store = create_graph_store(backend, data_dir)
+    started = time.perf_counter()
+    for i, (s, r, o, src) in enumerate(synthetic_triples(triples + tail)):
+        if i == triples:
+            checkpoint_started = time.perf_counter()
+            store.persistence.checkpoint(store)
+            checkpoint_seconds = time.perf_counter() - checkpoint_started
+        store.upsert_triple(s, r, o, src, confidence=0.5)
+    build_seconds = time.perf_counter() - started
+    store.persistence.close()
+    return {"nodes": store.node_count(), "edges": store.edge_count(), "build_seconds": round(build_seconds, 2),
+            "checkpoint_seconds": round(checkpoint_seconds, 2),
+            "snapshot_mb": round(os.path.getsize(os.path.join(data_dir, "snapshot.bin")) / 2 ** 20, 1)}
+
+
+def restore(data_dir: str, backend: str) -> dict:
+    from api.graph_store import GraphStore
+    from api.persistence import GraphPersistence
+    from api.storage import create_engine
+
+    store = GraphStore(create_engine(backend))
+    stats = GraphPersistence(data_dir).open(store)
+    store.persistence.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--triples", type=int, default=500000)
+    parser.add_argument("--tail", type=int, default=20000)
+    parser.add_argument("--backend", default="compact", choices=["networkx", "compact"])
+    parser.add_argument("--fsync", default="interval", choices=["always", "interval", "never"])
+    parser.add_argument("--child", nargs=2, metavar=("DIR", "BACKEND"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(restore(*args.child)))
+        return
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        result = {"backend": args.backend, "fsync": args.fsync, "tail": args.tail}
+        result.update(build(data_dir, args.backend, args.triples, args.tail, args.fsync))
+        cmd = [sys.executable, "-m", "bench.bench_persistence", "--child", data_dir, args.backend]
+        started = time.perf_counter()
+        out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        result["restart_process_seconds"] = round(time.perf_counter() - started, 2)
+        result["restore"] = json.loads(out.strip().splitlines()[-1])
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Measure provenance dedup, per-source retraction and incremental re-crawl.
+
+Three runs over synthetic data:
+
+    reingest  the same triples upserted several times: distinct sources
+              per edge and graph JSON size stay flat while sightings grow
+    retract   time to retract one 50-chunk document from graphs of growing
+              size, against rebuilding the graph without it
+    recrawl   a site ingested through the pipeline, then one page edited
+              and re-ingested with replace=True: extraction calls made and
+              whether the graph matches a fresh build of the edited site
+
+Usage:
+
+    python -m bench.bench_provenance --triples 100000 300000 --pages 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+
+from api.graph_store import GraphStore
+from api.pipeline import IngestPipeline, chunk_text
+from api.storage import create_engine
+
+from .bench_backends import synthetic_triples
+from .fixtures import TOPICS, VERBS, _sentence
+
+SENTENCE = re.compile(r"([A-Z][a-z]+(?: [a-z]+)?) (" + "|".join(VERBS) + r") (" + "|".join(TOPICS) + r")")
+
+
+def build(backend: str, triples):
+    store = GraphStore(create_engine(backend))
+    with store.transaction() as tx:
+        for s, r, o, source_id in triples:
+            tx.upsert_triple(s, r, o, source_id, 0.5)
+    return store
+
+
+def reingest(backend: str, triples: int, passes: int) -> dict:
+    rows = list(synthetic_triples(triples))
+    store = build(backend, rows)
+    results = []
+    for i in range(passes):
+        if i:
+            with store.transaction() as tx:
+                for s, r, o, source_id in rows:
+                    tx.upsert_triple(s, r, o, source_id, 0.5)
+        engine = store.engine
+        sources = sightings = 0
+        for edge in engine.iter_edges():
+            sources += len(engine.edge_sources(edge))
+            sightings += sum(engine.edge_hits(edge))
+        results.append({"pass": i + 1, "edges": store.edge_count(), "sources_per_edge": round(sources / store.edge_count(), 3),
+                        "sightings_per_edge": round(sightings / store.edge_count(), 3),
+                        "graph_json_mb": round(len(json.dumps(store.to_dto())) / 2 ** 20, 2)})
+    return {"backend": backend, "triples": triples, "passes": results}
+
+
+def retract(backend: str, triples: int, repeat: int = 5) -> dict:
+    rows = list(synthetic_triples(triples))
+    store = build(backend, rows)
+    documents = sorted({source_id.split("#")[0] for _, _, _, source_id in rows})
+    rng = random.Random(3)
+    timings = []
+    for document in rng.sample(documents, min(repeat, len(documents))):
+        started = time.perf_counter()
+        counts = store.retract_source(f"{document}#", prefix=True)
+        timings.append(time.perf_counter() - started)
+    victim = f"{documents[0]}#"
+    started = time.perf_counter()
+    build(backend, (row for row in rows if not row[3].startswith(victim)))
+    rebuild = time.perf_counter() - started
+    return {"backend": backend, "triples": triples, "retract_document_ms": round(1000 * sum(timings) / len(timings), 2),
+            "last_retraction": counts, "rebuild_without_document_ms": round(1000 * rebuild, 1)}
+
+
+def site(pages: int, seed: int = 7):
+    rng = random.Random(seed)
+    return {f"https://site.example/page{i}": " ".join(_sentence(rng, rng.choice(TOPICS)) for _ in range(rng.randint(20, 80)))
+            for i in range(pages)}
+
+
+class CountingExtractor:
+    """Deterministic extractor: one triple per "<Filler> <verb> <topic>" sentence, counting calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, text: str, source_id: str, max_triples: int = 8):
+        with self._lock:
+            self.calls += 1
+        return [{"subject": s, "relation": r, "object": o, "confidence": 0.5} for s, r, o in SENTENCE.findall(text)]
+
+
+async def ingest(store: GraphStore, pages: dict, extract, replace: bool = False):
+    pipeline = IngestPipeline(store, extract_fn=extract)
+    try:
+        for url, text in pages.items():
+            await pipeline.ingest_chunks(url, chunk_text(text, target=600, overlap=0), replace=replace)
+    finally:
+        await pipeline.aclose()
+
+
+def graph_facts(store: GraphStore):
+    engine = store.engine
+    return sorted((engine.node_label(s), engine.edge_relation(e), engine.node_label(o), tuple(sorted(engine.edge_sources(e))))
+                  for e in engine.iter_edges() for s, o in [engine.edge_endpoints(e)])
+
+
+def recrawl(backend: str, pages: int) -> dict:
+    original = site(pages)
+    edited = dict(original)
+    url = next(iter(edited))
+    sentences = edited[url].split(". ")
+    rng = random.Random(9)
+    # Rewrite the middle third of the page and drop its ending
+    third = len(sentences) // 3
+    sentences[third:2 * third] = [_sentence(rng, rng.choice(TOPICS)).rstrip(".") for _ in range(third)]
+    edited[url] = ". ".join(sentences[:-3])
+
+    store = GraphStore(create_engine(backend))
+    extract = CountingExtractor()
+    asyncio.run(ingest(store, original, extract))
+    full_calls = extract.calls
+    extract.calls = 0
+    started = time.perf_counter()
+    asyncio.run(ingest(store, {url: edited[url]}, extract, replace=True))
+    recrawl_seconds = time.perf_counter() - started
+
+    fresh = GraphStore(create_engine(backend))
+    asyncio.run(ingest(fresh, edited, CountingExtractor()))
+    return {"backend": backend, "pages": pages, "full_ingest_extractions": full_calls,
+            "recrawl_extractions": extract.calls, "recrawl_ms": round(1000 * recrawl_seconds, 1),
+            "matches_fresh_build": graph_facts(store) == graph_facts(fresh),
+            "edges": store.edge_count(), "nodes": store.node_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--triples", type=int, nargs="+", default=[100000, 300000])
+    parser.add_argument("--passes", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", default=["networkx", "compact"])
+    args = parser.parse_args()
+
+    results = {
+        "reingest": [reingest(backend, args.triples[0], args.passes) for backend in args.backends],
+        "retract": [retract(backend, triples) for backend in args.backends for triples in args.triples],
+        "recrawl": [recrawl(backend, args.pages) for backend in args.backends],
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
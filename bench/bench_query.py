@@ -0,0 +1,77 @@
+"""
+Measure targeted graph queries against graphs of growing size.
+
+For each size, builds a synthetic graph with a Zipf degree distribution
+and times inspecting one node's connections the way the node panel did
+(the whole graph's DTO, filtered for the node's edges) and through
+GraphQuery: one page of neighbors of a hub and of an ordinary node,
+a later page of the hub, a page of edges by relation, an exact label
+lookup and a bounded path search. Query latency should stay flat while
+the graph grows. Usage:
+
+    python -m bench.bench_query --sizes 100000 1000000 --backend compact
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Callable, Dict
+
+from api.graph_store import create_graph_store
+from api.query import GraphQuery
+
+from .fixtures import synthetic_graph
+
+
+def median_ms(fn: Callable, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(times), 3)
+
+
+def run(edges: int, backend: str, repeat: int) -> Dict[str, float]:
+    store = create_graph_store(backend)
+    for s, r, o, src in synthetic_graph(max(2, edges // 5), edges):
+        store.upsert_triple(s, r, o, src, confidence=0.5)
+    engine = store.engine
+    query = GraphQuery(store)
+    nodes = list(engine.iter_nodes())
+    hub = engine.node_id(nodes[0])  # the Zipf fixture's first entity has the most edges
+    node = engine.node_id(nodes[len(nodes) // 2])
+    later = query.neighbors(hub, limit=1000)["next"]
+    relation = next(engine.relations())
+    rng = random.Random(3)
+    pairs = [(engine.node_id(rng.choice(nodes)), engine.node_id(rng.choice(nodes))) for _ in range(repeat)]
+
+    def full_graph():
+        dto = store.to_dto()
+        return [edge for edge in dto["edges"] if node in (edge["source"], edge["target"])]
+
+    store.to_dto()  # the snapshot is built once per version; time only reading it
+    return {
+        "edges": store.edge_count(),
+        "full_graph_neighbors_ms": median_ms(full_graph, repeat),
+        "neighbors_ms": median_ms(lambda: query.neighbors(node, limit=50), repeat),
+        "hub_neighbors_ms": median_ms(lambda: query.neighbors(hub, limit=50), repeat),
+        "hub_later_page_ms": median_ms(lambda: query.neighbors(hub, limit=50, cursor=later), repeat),
+        "edges_by_relation_ms": median_ms(lambda: query.edges(relation, limit=100), repeat),
+        "label_lookup_ms": median_ms(lambda: query.nodes(engine.node_label(nodes[-1])), repeat),
+        "paths_ms": median_ms(lambda: query.paths(*pairs.pop(), max_hops=4), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000], help="edges to generate")
+    parser.add_argument("--backend", default="compact", choices=["networkx", "compact"])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps([run(size, args.backend, args.repeat) for size in args.sizes], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Measure QA latency: keyword subgraph copy vs. bounded k-hop retrieval.
+
+Builds the synthetic graph from bench_label_index, then answers QA-style
+questions three ways: the old path that copies the keyword subgraph and
+scans it, the retriever with a cold cache, and the retriever serving the
+same questions (reworded) from its cache. Usage:
+
+    python -m bench.bench_retrieval --nodes 200000
+"""
+import argparse
+import json
+import time
+
+from api.helpers import answer_question
+from api.retrieval import Retriever, question_keywords
+
+from .bench_label_index import build_graph, time_ms
+
+QUESTIONS = [
+    "What is a transformer attention model?",
+    "How does the robot vision agent work?",
+    "Which reinforcement learning policy is used?",
+    "What is entity 4242?",
+    "xyzzy?",
+]
+
+
+def subgraph_answer(store, question: str):
+    """The former /api/qa path: copy the keyword subgraph, then scan it for every word."""
+    subgraph = store.get_subgraph_by_keywords(question_keywords(question))
+    words = question.lower().split()
+    return subgraph.find_nodes(words), subgraph.find_edges_by_relation(words)
+
+
+def reworded(question: str) -> str:
+    """Same keywords, different order and punctuation."""
+    return " ".join(reversed(question.rstrip("?").split())) + "!"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--backend", default="networkx", choices=["networkx", "compact"])
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    store = build_graph(args.nodes, args.backend)
+    result = {"backend": args.backend, "nodes": store.node_count(), "edges": store.edge_count(),
+              "build_seconds": round(time.perf_counter() - started, 2), "questions": []}
+    for question in QUESTIONS:
+        nodes, edges = subgraph_answer(store, question)
+        answer = answer_question(question, store, Retriever(store))
+        warm = Retriever(store)
+        answer_question(question, store, warm)
+        result["questions"].append({
+            "question": question,
+            "subgraph_cited": [len(nodes), len(edges)],
+            "retrieval_cited": [len(answer["cited_nodes"]), len(answer["cited_edges"])],
+            "subgraph_ms": time_ms(lambda: subgraph_answer(store, question), args.repeat),
+            # A fresh cache for every run, so each one walks the graph
+            "retrieval_cold_ms": time_ms(lambda: answer_question(question, store, Retriever(store)), args.repeat),
+            "retrieval_cached_ms": time_ms(lambda: answer_question(reworded(question), store, warm), args.repeat),
+        })
+        assert warm.stats()["misses"] == 1
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Measure throughput of the rule-based fallback extractor.
+
+Times the compiled rule engine in one process and across a process pool on
+realistic prose and on adversarial text (long punctuation-free runs of
+words that never complete a pattern), in MB/s. The old per-rule regexes are
+timed on a small prefix of each corpus for comparison, since they
+backtrack quadratically on the adversarial input. Usage:
+
+    python -m bench.bench_rules --mb 5 --processes 4
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from api.rules import RuleEngine
+
+from .fixtures import SAMPLE_SENTENCES
+
+LEGACY_PATTERNS = [
+    (re.compile(r'(\w+(?:\s+\w+)*)\s+is\s+a\s+(\w+(?:\s+\w+)*)', re.IGNORECASE), "is_a"),
+    (re.compile(r'(\w+(?:\s+\w+)*)\s+uses\s+(\w+(?:\s+\w+)*)', re.IGNORECASE), "uses"),
+    (re.compile(r'(\w+(?:\s+\w+)*)\s+depends\s+on\s+(\w+(?:\s+\w+)*)', re.IGNORECASE), "depends_on"),
+]
+
+
+def legacy_extract(text: str):
+    """The previous fallback: three regex searches per sentence, uncapped."""
+    triples = []
+    for sentence in re.split(r'[.!?]+', text):
+        sentence = sentence.strip()
+        if len(sentence) < 10:
+            continue
+        for pattern, relation in LEGACY_PATTERNS:
+            match = pattern.search(sentence)
+            if match and len(match.group(1).strip()) > 2 and len(match.group(2).strip()) > 2:
+                triples.append((match.group(1).strip(), relation, match.group(2).strip()))
+    return triples
+
+
+def realistic_corpus(size: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    filler = ["The system was evaluated on three benchmarks.", "Results are reported in Table 2, see below!",
+              "Why does this matter?", "Latency, however, remains a concern for production use."]
+    parts, total = [], 0
+    while total < size:
+        sentence = rng.choice(SAMPLE_SENTENCES + filler)
+        parts.append(sentence)
+        total += len(sentence) + 1
+    return " ".join(parts)[:size]
+
+
+def adversarial_corpus(size: int, sentence_words: int = 20000) -> str:
+    """Very long sentences of words with 'is' and 'depends' but no complete phrase."""
+    words = ["alpha", "is", "beta", "depends", "gamma", "use"]
+    sentence = " ".join(words[i % len(words)] for i in range(sentence_words)) + ". "
+    return (sentence * (size // len(sentence) + 1))[:size]
+
+
+def throughput(fn, text: str) -> dict:
+    started = time.perf_counter()
+    triples = fn(text)
+    elapsed = time.perf_counter() - started
+    return {"mb": round(len(text) / 1e6, 3), "seconds": round(elapsed, 4),
+            "mb_per_s": round(len(text) / 1e6 / elapsed, 2), "triples": len(triples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=5.0, help="corpus size in MB")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--legacy-kb", type=int, default=64, help="prefix size timed with the old regexes")
+    args = parser.parse_args()
+
+    engine = RuleEngine()
+    size = int(args.mb * 1e6)
+    results = {}
+    for name, text in (("realistic", realistic_corpus(size)), ("adversarial", adversarial_corpus(size))):
+        prefix = text[:args.legacy_kb * 1000]
+        results[name] = {
+            "legacy_regex": throughput(legacy_extract, prefix),
+            "rule_engine_prefix": throughput(lambda t: engine.extract(t, "bench", max_triples=None), prefix),
+            "rule_engine": throughput(lambda t: engine.extract(t, "bench", max_triples=None), text),
+            "rule_engine_pool": throughput(
+                lambda t: engine.extract_parallel(t, "bench", processes=args.processes, segment_chars=size // (4 * args.processes) or 1),
+                text),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
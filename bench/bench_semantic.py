@@ -0,0 +1,148 @@
+"""
+Measure the semantic index: build time, query latency, recall and QA hits.
+
+Builds a synthetic Zipf graph whose entities have worded labels ("Robot
+Policy 812"), plus the triple "Gripping Systems learn from Demonstrated
+Motions", then embeds every label and triple into a SemanticIndex.
+Reports embedding throughput, index size, save and load time, semantic
+search latency, recall@k against an exact scan at several nprobe values,
+and whether QA cites the planted triple, which shares no keyword with the
+question "Which grippers were trained by demonstrations?", with and
+without the index. Usage:
+
+    python -m bench.bench_semantic --triples 1000000 --backend compact
+"""
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+from typing import Any, Dict
+
+import numpy as np
+
+from api.graph_store import create_graph_store
+from api.retrieval import Retriever
+from api.semantic import SemanticIndex, verbalize
+
+from .bench_label_index import VOCABULARY
+from .fixtures import synthetic_graph
+
+QUESTION = "Which grippers were trained by demonstrations?"
+PLANTED = ("Gripping Systems", "learn_from", "Demonstrated Motions")
+
+
+def worded(label: str, rng_seed: int = 3) -> str:
+    """A worded label for a fixture entity ("Entity 812" -> "Robot Policy 812"), the same on every call."""
+    number = int(label.rsplit(" ", 1)[1])
+    rng = random.Random(rng_seed * 1000003 + number)
+    return f"{rng.choice(VOCABULARY).title()} {rng.choice(VOCABULARY).title()} {number}"
+
+
+def latency_ms(fn, queries) -> Dict[str, float]:
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"p50_ms": round(float(np.percentile(samples, 50)), 3),
+            "p99_ms": round(float(np.percentile(samples, 99)), 3)}
+
+
+def exact_top(index: SemanticIndex, vectors: np.ndarray, k: int) -> np.ndarray:
+    """Handles of the exact top k edges for each query vector, embedding every triple again in batches."""
+    store = index.store
+    engine = store.engine
+    with store.read():
+        edges = list(engine.iter_edges())
+        texts = []
+        for h in edges:
+            source, target = engine.edge_endpoints(h)
+            texts.append(verbalize(engine.node_label(source), engine.edge_relation(h), engine.node_label(target)))
+    best = np.full((len(vectors), k), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(vectors), k), dtype=np.int64)
+    for start in range(0, len(texts), 65536):
+        scores = vectors @ index.embedder.embed(texts[start:start + 65536]).T
+        scores = np.concatenate([best, scores], axis=1)
+        batch_rows = np.arange(start, start + scores.shape[1] - k)[None, :].repeat(len(vectors), 0)
+        rows = np.concatenate([best_rows, batch_rows], axis=1)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best, best_rows = np.take_along_axis(scores, top, 1), np.take_along_axis(rows, top, 1)
+    return np.array(edges, dtype=object)[best_rows]
+
+
+def run(triples: int, backend: str, queries: int, k: int) -> Dict[str, Any]:
+    store = create_graph_store(backend)
+    for s, r, o, src in synthetic_graph(max(2, triples // 5), triples):
+        store.upsert_triple(worded(s), r, worded(o), src, confidence=0.5)
+    version = store.version
+    store.upsert_triple(*PLANTED, "doc-grippers#chunk_0", confidence=0.5)
+    planted = store.engine.edge_id(store.changelog.since(version)[1][0])
+
+    index = SemanticIndex(store)
+    started = time.perf_counter()
+    index.sync()
+    build_seconds = time.perf_counter() - started
+    embedded = len(index.nodes) + len(index.edges)
+    result: Dict[str, Any] = {
+        "backend": backend, "nodes": store.node_count(), "edges": store.edge_count(),
+        "build_seconds": round(build_seconds, 2), "embedded_per_s": round(embedded / build_seconds),
+        "index_mb": round((index.nodes.stats()["bytes"] + index.edges.stats()["bytes"]) / 2 ** 20, 1),
+        "lists": index.edges.stats()["lists"],
+    }
+
+    directory = tempfile.mkdtemp()
+    try:
+        index.path = directory
+        started = time.perf_counter()
+        index.save()
+        result["save_seconds"] = round(time.perf_counter() - started, 2)
+        started = time.perf_counter()
+        SemanticIndex(store, path=directory)
+        result["load_seconds"] = round(time.perf_counter() - started, 2)
+    finally:
+        shutil.rmtree(directory)
+
+    # Questions made of the words of random triples, reordered
+    rng = random.Random(11)
+    engine = store.engine
+    edges = list(engine.iter_edges())
+    questions = []
+    for h in rng.sample(edges, queries):
+        source, target = engine.edge_endpoints(h)
+        words = f"{engine.node_label(source)} {engine.node_label(target)}".split()
+        questions.append(" ".join(rng.sample(words, 3)))
+    result["search"] = latency_ms(lambda q: index.search(q, k), questions)
+    vectors = index.embedder.embed(questions)
+    exact = exact_top(index, vectors, k)
+    result["recall"] = {}
+    for nprobe in (4, 8, 16, 32):
+        found = [{h for h, _ in index.edges.search(v, k, nprobe=nprobe)} for v in vectors]
+        result["recall"][f"nprobe_{nprobe}"] = round(
+            sum(len(f & set(e)) for f, e in zip(found, exact)) / (k * len(questions)), 3)
+
+    plain, semantic = Retriever(store), Retriever(store, semantic=index)
+    result["qa"] = {
+        "question": QUESTION,
+        "keyword_cites_planted": planted in plain.retrieve(QUESTION)["edges"],
+        "semantic_cites_planted": planted in semantic.retrieve(QUESTION)["edges"],
+        # A fresh cache for every question, so each one searches and walks the graph
+        "keyword": latency_ms(lambda q: Retriever(store).retrieve(q), questions),
+        "semantic": latency_ms(lambda q: Retriever(store, semantic=index).retrieve(q), questions),
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--triples", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--backend", default="compact", choices=["networkx", "compact"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps([run(size, args.backend, args.queries, args.k) for size in args.triples], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Measure memory and throughput of streaming upload ingestion.
+
+Generates a synthetic file of each size on disk and chunks it twice: the
+old way (read everything, decode, chunk_text) and through the streaming
+readers. It reports peak traced memory, MB/s and how soon the first chunk
+is ready. Usage:
+
+    python -m bench.bench_upload --mb 10 100 500 --format txt jsonl.gz
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from api.pipeline import chunk_text
+from api.readers import iter_chunks, iter_file, reader_for
+
+WORDS = ["graph", "node", "édge", "ingest", "stream", "chunk", "résumé", "naïve", "データ", "🙂"]
+
+
+def write_corpus(path: str, fmt: str, size: int, seed: int = 3):
+    rng = random.Random(seed)
+    opener = gzip.open if fmt.endswith(".gz") else open
+    base = fmt.split(".")[0]
+    written = 0
+    with opener(path, "wb") as f:
+        if base == "csv":
+            f.write(b"id,text\n")
+        i = 0
+        while written < size:
+            line = " ".join(rng.choice(WORDS) for _ in range(20)) + "."
+            if base == "jsonl":
+                data = json.dumps({"id": i, "text": line}) + "\n"
+            elif base == "csv":
+                data = f'{i},"{line}"\n'
+            else:
+                data = line + "\n"
+            encoded = data.encode("utf-8")
+            f.write(encoded)
+            written += len(encoded)
+            i += 1
+
+
+def run_legacy(path: str):
+    with open(path, "rb") as f:
+        text = f.read().decode("utf-8", errors="ignore")
+    return len(chunk_text(text, target=1800, overlap=200)), None
+
+
+def run_streaming(path: str, fmt: str):
+    started = time.perf_counter()
+    first = None
+    count = 0
+    with open(path, "rb") as f:
+        for _ in iter_chunks(iter_file(f), reader_for(f"upload.{fmt}")):
+            if first is None:
+                first = time.perf_counter() - started
+            count += 1
+    return count, first
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    chunks, first = fn(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"chunks": chunks, "seconds": round(elapsed, 2), "peak_mb": round(peak / 1e6, 2),
+            "first_chunk_ms": None if first is None else round(first * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--format", nargs="+", default=["txt", "jsonl", "csv", "txt.gz"])
+    parser.add_argument("--legacy-max-mb", type=int, default=100, help="skip the read-everything path above this size")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in args.format:
+            for mb in args.mb:
+                path = os.path.join(tmp, f"corpus.{fmt}")
+                write_corpus(path, fmt, mb * 1_000_000)
+                row = {"format": fmt, "mb": mb, "file_mb": round(os.path.getsize(path) / 1e6, 2)}
+                row["streaming"] = measure(run_streaming, path, fmt)
+                row["streaming"]["mb_per_s"] = round(mb / max(row["streaming"]["seconds"], 1e-9), 1)
+                if fmt == "txt" and mb <= args.legacy_max_mb:
+                    row["legacy"] = measure(run_legacy, path)
+                results.append(row)
+                os.remove(path)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
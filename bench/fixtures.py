@@ -0,0 +1,426 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Tuple
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+SAMPLE_SENTENCES = [
+    "Machine Learning is a subset of Artificial Intelligence.",
+    "Deep Learning uses Neural Networks.",
+    "Robotics depends on Computer Vision.",
+    "Natural Language Processing uses Large Language Models.",
+]
+
+
+def sample_page(index: int, paragraphs: int = 40) -> bytes:
+    """Build a small HTML page whose text chunks into a few extraction calls."""
+    body = "".join(
+        f"<p>{SAMPLE_SENTENCES[(index + i) % len(SAMPLE_SENTENCES)]} Page {index} paragraph {i}.</p>"
+        for i in range(paragraphs)
+    )
+    return f"<html><head><title>Page {index}</title></head><body>{body}</body></html>".encode("utf-8")
+
+
+TOPICS = ["graph databases", "vector search", "stream processing", "compilers", "robot navigation",
+          "protein folding", "battery chemistry", "distributed consensus", "image segmentation", "query planning"]
+FILLER = ("the system", "each component", "this approach", "the benchmark", "a typical deployment", "the team",
+          "the algorithm", "every request", "the index", "the model")
+VERBS = ("depends on", "uses", "improves", "reduces the cost of", "is a variant of", "replaces", "extends", "measures")
+
+
+def _sentence(rng, topic: str) -> str:
+    words = " ".join(rng.choice(("quickly", "carefully", "in practice", "at scale", "by design", "over time"))
+                     for _ in range(rng.randint(0, 2)))
+    return f"{rng.choice(FILLER).capitalize()} {rng.choice(VERBS)} {topic} {words}".rstrip() + "."
+
+
+def boilerplate_page(index: int, seed: int = 11):
+    """
+    A realistic page: cookie banner, navigation, breadcrumbs, an article,
+    a sidebar, a newsletter form, comments and a footer, in one of three
+    layouts. Returns (html bytes, article paragraphs, boilerplate snippets)
+    so extractors can be scored on what they keep.
+    """
+    import json
+    import random
+    rng = random.Random(seed * 100003 + index)
+    topic = rng.choice(TOPICS)
+    layout = index % 3
+    paragraphs = [" ".join(_sentence(rng, topic) for _ in range(rng.randint(3, 7)))
+                  for _ in range(rng.randint(6, 30))]
+    boilerplate = [
+        "We use cookies to personalise content and ads and to analyse our traffic. Accept all cookies?",
+        "Subscribe to our weekly newsletter for the latest stories delivered straight to your inbox.",
+        "Copyright Example Media Group. All rights reserved. Registered in England and Wales.",
+        f"Comment by reader{index}: great post, I have been looking for something like this for ages, thanks!",
+    ]
+    nav = "".join(f'<li class="menu-item"><a href="/section/{i}">Section {i}</a>' for i in range(25))
+    related = "".join(f'<li><a href="/story/{index}-{i}">Ten things you did not know about {rng.choice(TOPICS)}</a></li>'
+                      for i in range(8))
+    footer_links = "".join(f'<a href="/legal/{i}">Legal page {i}</a> ' for i in range(20))
+    state = json.dumps({"page": index, "items": [{"id": i, "title": rng.choice(TOPICS)} for i in range(200)]})
+    body = []
+    for i, paragraph in enumerate(paragraphs):
+        if i and i % 7 == 0:
+            body.append(f"<h2>More on {topic} ({i})</h2>")
+        if i == 3:
+            body.append(f'<figure><img src="/img/{index}.png"><figcaption>Figure 1: {topic} overview</figcaption></figure>')
+        words = paragraph.split(" ")
+        words[len(words) // 2] = f'<a href="/wiki/{i}">{words[len(words) // 2]}</a>'
+        body.append(f"<p>{' '.join(words)}</p>")
+    article = f"<h1>A field guide to {topic}</h1><p class=\"byline\">By Staff Writer</p>{''.join(body)}"
+    if layout == 0:
+        article = f"<main><article>{article}</article></main>"
+    elif layout == 1:
+        article = f'<div class="content"><div class="post-body">{article}</div></div>'
+    else:
+        article = f'<div id="docs"><div class="row"><div class="col">{article}</div></div></div>'
+    html = f"""<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{topic} | Example</title>
+<link rel="stylesheet" href="/site.css"><style>body {{ font-family: sans-serif; }} .nav li {{ display: inline; }}</style>
+<script>window.__STATE__ = {state};</script><script src="/analytics.js"></script></head>
+<body><div id="cookie-consent" class="banner"><p>{boilerplate[0]}</p><button>Accept</button></div>
+<header class="site-header"><a href="/" class="logo">Example</a><nav class="navbar"><ul>{nav}</ul></nav></header>
+<ol class="breadcrumbs"><li><a href="/">Home</a></li><li><a href="/t">{topic}</a></li></ol>
+{article}
+<div class="sidebar"><h3>Related stories</h3><ul>{related}</ul></div>
+<form class="newsletter"><p>{boilerplate[1]}</p><input type="email"><button>Sign up</button></form>
+<section class="comments"><h3>3 comments</h3><div class="comment"><p>{boilerplate[3]}</p></div></section>
+<footer><p>{boilerplate[2]}</p><div>{footer_links}</div></footer>
+<noscript><img src="/pixel.gif"></noscript></body></html>"""
+    return html.encode("utf-8"), paragraphs, boilerplate
+
+
+GRAPH_RELATIONS = ("is_a", "uses", "depends_on", "enables", "part_of", "related_to", "subset_of", "implements")
+
+
+def synthetic_graph(nodes: int, edges: int, degree: str = "zipf", exponent: float = 1.1, seed: int = 5):
+    """
+    Yield edges (subject, relation, object, source_id) over `nodes` entities.
+    With degree="zipf" the i-th entity is picked with weight 1 / (i + 1) ** exponent,
+    so a few hubs have most of the edges, as in extracted graphs; "uniform" picks
+    every entity alike. Sources group 20 edges per chunk and 50 chunks per document.
+    """
+    rng = random.Random(seed)
+    population = range(nodes)
+    if degree == "zipf":
+        cum_weights = list(accumulate(1.0 / (i + 1) ** exponent for i in population))
+    elif degree == "uniform":
+        cum_weights = None
+    else:
+        raise ValueError(f"unknown degree distribution {degree!r}")
+    done = 0
+    while done < edges:
+        batch = min(10000, edges - done)
+        ends = rng.choices(population, cum_weights=cum_weights, k=2 * batch)
+        for i in range(batch):
+            n = done + i
+            s, o = ends[2 * i], ends[2 * i + 1]
+            yield (f"Entity {s}", GRAPH_RELATIONS[rng.randrange(len(GRAPH_RELATIONS))], f"Entity {o}",
+                   f"doc{n // 1000}#chunk_{n // 20 % 50}")
+        done += batch
+
+
+def load_corpus() -> Tuple[Dict[str, bytes], Dict[str, str]]:
+    """The saved corpus in bench/corpus: ({name: html bytes}, {name: text})."""
+    pages, texts = {}, {}
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        path = os.path.join(CORPUS_DIR, name)
+        if name.endswith(".html"):
+            with open(path, "rb") as f:
+                pages[name] = f.read()
+        elif name.endswith(".txt"):
+            with open(path, encoding="utf-8") as f:
+                texts[name] = f.read()
+    return pages, texts
+
+
+class FakeHTTPServer:
+    """Local HTTP server that serves generated pages after a fixed delay."""
+
+    def __init__(self, pages: Dict[str, bytes], delay: float = 0.0):
+        self.pages = pages
+        self.delay = delay
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                time.sleep(server.delay)
+                body = server.pages.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeHTTPServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def site_pages(count: int, private: int = 5, orphans: int = 5) -> Dict[str, bytes]:
+    """
+    A small documentation site for crawler tests: /docs/0.html links to its
+    children in a binary tree, and every page links back home with a
+    tracking parameter and a fragment (spellings of pages already seen),
+    to an image and to a /private/ page. The last `orphans` pages are
+    linked from nowhere and only listed in the sitemap.
+    """
+    linked = count - orphans
+    pages = {}
+    for i in range(count):
+        links = [f'<a href="/docs/{j}.html">Chapter {j}</a>' for j in (2 * i + 1, 2 * i + 2) if i < linked and j < linked]
+        links += ['<a href="/docs/0.html?utm_source=nav#top">Home</a>', f'<a href="../img/{i}.png">Diagram</a>',
+                  f'<a href="/private/{i % private}.html">Admin</a>', '<a href="/docs/0.html" rel="nofollow">Top</a>']
+        body = "".join(f"<p>{SAMPLE_SENTENCES[(i + k) % len(SAMPLE_SENTENCES)]} Chapter {i} paragraph {k}.</p>"
+                       for k in range(12))
+        pages[f"/docs/{i}.html"] = (f"<html><head><title>Chapter {i}</title></head><body><main>{body}</main>"
+                                    f"<nav>{''.join(links)}</nav></body></html>").encode("utf-8")
+    for i in range(private):
+        pages[f"/private/{i}.html"] = sample_page(i, paragraphs=4)
+    return pages
+
+
+class StaticSiteServer(FakeHTTPServer):
+    """
+    FakeHTTPServer that behaves like a static file host: robots.txt, a
+    sitemap of every page, ETag/Last-Modified validators with 304 Not
+    Modified on conditional requests. Records each request path and the
+    most requests it had in flight at once.
+    """
+
+    def __init__(self, pages: Dict[str, bytes], delay: float = 0.0,
+                 robots: str = "User-agent: *\nDisallow: /private/\n", sitemap: bool = True):
+        self.pages = pages
+        self.delay = delay
+        self.robots = robots
+        self.sitemap = sitemap
+        self.requests: List[str] = []
+        self.not_modified = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests.append(self.path)
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.delay)
+                    self._serve()
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def _serve(self):
+                content_type = "text/html; charset=utf-8"
+                if self.path == "/robots.txt" and server.robots is not None:
+                    body = (server.robots + f"Sitemap: {server.base_url}/sitemap.xml\n"
+                            if server.sitemap else server.robots).encode("utf-8")
+                    content_type = "text/plain"
+                elif self.path == "/sitemap.xml" and server.sitemap:
+                    urls = "".join(f"<url><loc>{server.base_url}{path}</loc></url>" for path in server.pages)
+                    body = ('<?xml version="1.0" encoding="UTF-8"?><urlset '
+                            f'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>').encode("utf-8")
+                    content_type = "application/xml"
+                else:
+                    body = server.pages.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                etag = f'"{zlib.crc32(body):08x}"'
+                if self.headers.get("If-None-Match") == etag:
+                    with server._lock:
+                        server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", "Mon, 02 Jan 2006 15:04:05 GMT")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self) -> "StaticSiteServer":
+        self.thread.start()
+        return self
+
+
+def stub_llm(latency: float = 0.05):
+    """Return an extract_triples replacement that sleeps like an LLM round trip."""
+
+    def extract(text: str, source_id: str, max_triples: int = 8) -> List[Dict[str, Any]]:
+        time.sleep(latency)
+        words = text.split()
+        return [
+            {"subject": words[0] if words else "Text", "relation": "mentions", "object": f"Chunk {source_id}",
+             "confidence": 0.5, "source": source_id}
+        ]
+
+    return extract
+
+
+CHUNK_SECTION = re.compile(r'<chunk id="(c\d+)">\n(.*?)\n</chunk>', re.S)
+
+
+def fake_completion(prompt: str) -> str:
+    """
+    Answer an extraction prompt like the model would: one triple per chunk
+    of a batch prompt, or a plain {"triples": [...]} for a single text.
+    """
+    def triples(text: str) -> List[Dict[str, Any]]:
+        words = re.findall(r"[A-Z][a-z]+", text) or ["Text"]
+        return [{"subject": words[0], "relation": "mentions", "object": words[-1], "confidence": 0.9}]
+
+    sections = CHUNK_SECTION.findall(prompt)
+    if sections:
+        return json.dumps({"chunks": [{"id": chunk_id, "triples": triples(text)} for chunk_id, text in sections]})
+    return json.dumps({"triples": triples(prompt.rsplit("Text:", 1)[-1])})
+
+
+class FakeOpenAIServer:
+    """
+    Local OpenAI-compatible /v1/chat/completions endpoint for extraction tests.
+
+    Each request takes latency seconds plus per_1k_tokens per 1000 prompt
+    tokens. Requests over the server's own requests/tokens per minute limits
+    get a 429 with Retry-After, and error_rate of the rest get a 500.
+    """
+
+    def __init__(self, latency: float = 0.2, per_1k_tokens: float = 0.02, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, error_rate: float = 0.0, seed: int = 7):
+        self.latency = latency
+        self.per_1k_tokens = per_1k_tokens
+        self.error_rate = error_rate
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # Server-side limits: [rate per second, budget left, last refill], ten seconds of burst
+        self._limits = [[rate / 60.0, rate / 6.0, time.monotonic()]
+                        for rate in (requests_per_minute, tokens_per_minute)] \
+            if requests_per_minute and tokens_per_minute else None
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                prompt = body["messages"][-1]["content"]
+                tokens = len(prompt) // 4 + 1
+                status = server._admit(tokens + body.get("max_tokens", 0))
+                if status != 200:
+                    self._reply(status, {"error": {"message": "Rate limit reached" if status == 429 else "Server error",
+                                                   "type": "requests", "code": None}},
+                                {"Retry-After": "1"} if status == 429 else {})
+                    return
+                time.sleep(server.latency + server.per_1k_tokens * tokens / 1000)
+                content = fake_completion(prompt)
+                self._reply(200, {
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": tokens, "completion_tokens": len(content) // 4 + 1,
+                              "total_tokens": tokens + len(content) // 4 + 1},
+                })
+
+            def _reply(self, status: int, payload: Dict[str, Any], headers: Dict[str, str] = {}):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def _admit(self, tokens: int) -> int:
+        with self._lock:
+            self.requests += 1
+            if self._limits is not None:
+                now = time.monotonic()
+                for limit in self._limits:
+                    rate, _, updated = limit
+                    limit[1] = min(rate * 10, limit[1] + (now - updated) * rate)
+                    limit[2] = now
+                (_, requests_left, _), (_, tokens_left, _) = self._limits
+                if requests_left < 1 or tokens_left < tokens:
+                    self.rate_limited += 1
+                    return 429
+                self._limits[0][1] -= 1
+                self._limits[1][1] -= tokens
+            if self._rng.random() < self.error_rate:
+                self.errors += 1
+                return 500
+            self.prompt_tokens += tokens
+            return 200
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,374 @@
+"""
+Reproducible benchmark suite for the backend hot paths.
+
+Microbenchmarks time single functions (GraphStore.upsert_triple, to_dto,
+get_subgraph_by_keywords, chunk_text, html_to_chunks and the rule-based
+_extract_triples_stub), each in a fresh subprocess, on a synthetic graph
+(bench.fixtures.synthetic_graph) and the saved corpus in bench/corpus.
+Load tests start the API under uvicorn with an in-memory graph, the fake
+OpenAI server and the corpus served locally, then drive /api/ingest,
+/api/import, /api/graph and /api/qa from concurrent clients.
+
+Every benchmark reports ops/s, p50/p99 latency and peak RSS, and the run is
+written as JSON. `compare` flags metrics that got worse than a baseline run
+by more than the tolerance and exits with status 1 if any did. Usage:
+
+    python -m bench.suite run --profile small --out results.json
+    python -m bench.suite compare baseline.json results.json --tolerance 0.2
+    python -m bench.suite run --profile small --baseline baseline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .bench_backends import max_rss_mb
+from .fixtures import FakeHTTPServer, FakeOpenAIServer, load_corpus, synthetic_graph
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "small": {"nodes": 20000, "edges": 100000, "degree": "zipf", "repeat": 2000, "ingests": 24, "polls": 40,
+              "questions": 200, "concurrency": 8, "llm_latency": 0.05},
+    "large": {"nodes": 200000, "edges": 1000000, "degree": "zipf", "repeat": 10000, "ingests": 120, "polls": 100,
+              "questions": 1000, "concurrency": 32, "llm_latency": 0.2},
+}
+
+# Metrics where a higher value is better; every other reported number is a cost
+HIGHER_IS_BETTER = ("ops_per_s",)
+COMPARED = ("ops_per_s", "p50_ms", "p99_ms", "peak_rss_mb")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(latencies: List[float], elapsed: float, ops: Optional[int] = None) -> Dict[str, Any]:
+    """ops/s and latency percentiles (ms) from per-operation latencies in seconds."""
+    latencies = sorted(latencies)
+    ops = len(latencies) if ops is None else ops
+    return {
+        "ops": ops,
+        "seconds": round(elapsed, 4),
+        "ops_per_s": round(ops / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+    }
+
+
+def timed_calls(fn: Callable[[Any], Any], args: List[Any]) -> Dict[str, Any]:
+    """Call fn on each argument, timing every call."""
+    latencies = []
+    clock = time.perf_counter
+    started = clock()
+    for arg in args:
+        t = clock()
+        fn(arg)
+        latencies.append(clock() - t)
+    return summarize(latencies, clock() - started)
+
+
+# Microbenchmarks: each builds its inputs untimed and returns timed_calls' summary
+
+def build_store(profile: Dict[str, Any]):
+    from api.bulk import BulkImporter
+    from api.graph_store import GraphStore
+    store = GraphStore()
+    importer = BulkImporter(store, "bench")
+    importer.feed((s, r, o, [src], 0.5) for s, r, o, src in synthetic_graph(profile["nodes"], profile["edges"],
+                                                                               profile["degree"]))
+    importer.flush()
+    return store
+
+
+def micro_upsert_triple(profile):
+    from api.graph_store import GraphStore
+    store = GraphStore()
+    rows = list(synthetic_graph(profile["nodes"], profile["edges"] // 10, profile["degree"]))
+    return timed_calls(lambda row: store.upsert_triple(*row, confidence=0.5), rows)
+
+
+def micro_to_dto(profile):
+    # A poll after a write: the snapshot is patched with the change, then serialized
+    store = build_store(profile)
+    rng = random.Random(1)
+    n = profile["nodes"]
+
+    def poll(i):
+        store.upsert_triple(f"Entity {rng.randrange(n)}", "related_to", f"Entity {rng.randrange(n)}", f"poll#chunk_{i}")
+        json.dumps(store.to_dto())
+
+    return timed_calls(poll, list(range(max(5, profile["repeat"] // 200))))
+
+
+def micro_get_subgraph_by_keywords(profile):
+    store = build_store(profile)
+    rng = random.Random(2)
+    keywords = [[f"entity {rng.randrange(profile['nodes'])}"] for _ in range(profile["repeat"] // 10)]
+    return timed_calls(store.get_subgraph_by_keywords, keywords)
+
+
+def micro_chunk_text(profile):
+    from api.pipeline import chunk_text
+    texts = list(load_corpus()[1].values())
+    return timed_calls(chunk_text, [texts[i % len(texts)] * 8 for i in range(profile["repeat"])])
+
+
+def micro_html_to_chunks(profile):
+    from api.pipeline import html_to_chunks
+    pages = list(load_corpus()[0].values())
+    return timed_calls(html_to_chunks, [pages[i % len(pages)] for i in range(profile["repeat"] // 10)])
+
+
+def micro_extract_triples_stub(profile):
+    from api.helpers import _extract_triples_stub
+    from api.pipeline import chunk_text
+    chunks = [chunk for text in load_corpus()[1].values() for chunk in chunk_text(text)]
+    inputs = [chunks[i % len(chunks)] for i in range(profile["repeat"])]
+    return timed_calls(lambda chunk: _extract_triples_stub(chunk, "bench#chunk_0"), inputs)
+
+
+MICRO = {
+    "upsert_triple": micro_upsert_triple,
+    "to_dto": micro_to_dto,
+    "get_subgraph_by_keywords": micro_get_subgraph_by_keywords,
+    "chunk_text": micro_chunk_text,
+    "html_to_chunks": micro_html_to_chunks,
+    "extract_triples_stub": micro_extract_triples_stub,
+}
+
+
+def run_micro_child(name: str, profile_name: str) -> Dict[str, Any]:
+    # The code under test may print on its hot path; keep stdout for the result
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        row = MICRO[name](PROFILES[profile_name])
+    row["peak_rss_mb"] = max_rss_mb()
+    return row
+
+
+# Load tests against the real app
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_rss_mb(pid: int) -> float:
+    """Peak RSS of another process (Linux)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return 0.0
+
+
+@contextlib.contextmanager
+def api_server(openai_url: str, workdir: str):
+    """uvicorn serving api.main with an in-memory graph and no on-disk caches."""
+    port = free_port()
+    env = dict(os.environ, GRAPH_DATA_DIR="", EXTRACTION_CACHE_PATH="", NEAR_DUPLICATE_PATH="",
+               CRAWL_STATE_PATH="", OPENAI_API_KEY="bench", OPENAI_BASE_URL=openai_url)
+    cmd = [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"]
+    log_path = os.path.join(workdir, "server.log")
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=log)
+        try:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    with socket.create_connection(("127.0.0.1", port), timeout=1):
+                        break
+                except OSError:
+                    if proc.poll() is not None or time.monotonic() > deadline:
+                        with open(log_path) as f:
+                            raise RuntimeError("API server did not start:\n" + f.read()[-2000:])
+                    time.sleep(0.2)
+            yield f"http://127.0.0.1:{port}", proc
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+
+async def drive(client, requests: List[Tuple[str, str, Dict[str, Any]]], concurrency: int) -> Dict[str, Any]:
+    """Send (method, url, kwargs) requests from `concurrency` clients, counting 4xx/5xx answers as errors."""
+    latencies: List[float] = []
+    queue = list(reversed(requests))
+    failures = 0
+
+    async def worker():
+        nonlocal failures
+        while queue:
+            method, url, kwargs = queue.pop()
+            t = time.perf_counter()
+            r = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - t)
+            if r.status_code >= 400:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    row = summarize(latencies, time.perf_counter() - started)
+    row["errors"] = failures
+    return row
+
+
+async def load_tests(profile: Dict[str, Any], base: str, pid: int, page_urls: List[str]) -> Dict[str, Any]:
+    import httpx
+    results: Dict[str, Any] = {}
+    concurrency = profile["concurrency"]
+    rng = random.Random(3)
+    async with httpx.AsyncClient(base_url=base, timeout=600) as client:
+        # One corpus page per request; the same pages under new URLs so nothing is deduplicated away
+        ingests = [("POST", "/api/ingest?delta=true", {"json": {"urls": [f"{page_urls[i % len(page_urls)]}?copy={i}"]}})
+                   for i in range(profile["ingests"])]
+        results["POST /api/ingest"] = await drive(client, ingests, concurrency)
+
+        rows = "".join(json.dumps({"subject": s, "relation": r, "object": o, "source": src}) + "\n"
+                       for s, r, o, src in synthetic_graph(profile["nodes"], profile["edges"], profile["degree"]))
+        body = rows.encode("utf-8")
+        t = time.perf_counter()
+        r = await client.post("/api/import?filename=graph.jsonl", content=body)
+        r.raise_for_status()
+        elapsed = time.perf_counter() - t
+        results["POST /api/import"] = {**summarize([elapsed], elapsed, ops=profile["edges"]), "errors": 0}
+
+        # The first read after the import builds the snapshot; time it on its own
+        t = time.perf_counter()
+        etag = (await client.get("/api/graph", headers={"Accept-Encoding": "identity"})).headers.get("etag", "")
+        elapsed = time.perf_counter() - t
+        results["GET /api/graph (first)"] = {**summarize([elapsed], elapsed), "errors": 0}
+        polls = [("GET", "/api/graph", {"headers": {"Accept-Encoding": "identity"}})] * profile["polls"]
+        results["GET /api/graph"] = await drive(client, polls, concurrency)
+        polls = [("GET", "/api/graph", {"headers": {"Accept-Encoding": "identity", "If-None-Match": etag}})] * (profile["polls"] * 10)
+        results["GET /api/graph (If-None-Match)"] = await drive(client, polls, concurrency)
+
+        questions = [("POST", "/api/qa", {"json": {"question": f"What does Entity {rng.randrange(profile['nodes'])} use?"}})
+                     for _ in range(profile["questions"])]
+        results["POST /api/qa"] = await drive(client, questions, concurrency)
+    for row in results.values():
+        row["peak_rss_mb"] = server_rss_mb(pid)  # the server's peak so far
+    return results
+
+
+def run_load(profile_name: str) -> Dict[str, Any]:
+    profile = PROFILES[profile_name]
+    pages = {f"/corpus/{name}": body for name, body in load_corpus()[0].items()}
+    with tempfile.TemporaryDirectory() as workdir, \
+            FakeOpenAIServer(latency=profile["llm_latency"]) as llm, FakeHTTPServer(pages) as site, \
+            api_server(llm.base_url, workdir) as (base, proc):
+        return asyncio.run(load_tests(profile, base, proc.pid, [site.base_url + path for path in pages]))
+
+
+# Runs and comparisons
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(profile_name: str, only: List[str]) -> Dict[str, Any]:
+    result: Dict[str, Any] = {
+        "profile": profile_name,
+        "config": PROFILES[profile_name],
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "benchmarks": {},
+    }
+    if "micro" in only:
+        for name in MICRO:
+            cmd = [sys.executable, "-m", "bench.suite", "--child", name, profile_name]
+            out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+            result["benchmarks"][f"micro:{name}"] = row = json.loads(out.strip().splitlines()[-1])
+            print(json.dumps({"benchmark": f"micro:{name}", **row}), file=sys.stderr)
+    if "load" in only:
+        for name, row in run_load(profile_name).items():
+            result["benchmarks"][f"load:{name}"] = row
+            print(json.dumps({"benchmark": f"load:{name}", **row}), file=sys.stderr)
+    return result
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> Dict[str, Any]:
+    """Metrics of current that are worse than baseline by more than tolerance (a fraction)."""
+    regressions, improvements = [], []
+    for name, row in current["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if base is None:
+            continue
+        for metric in COMPARED:
+            old, new = base.get(metric), row.get(metric)
+            if not old or new is None:
+                continue
+            # Positive change means worse, whichever direction the metric runs
+            change = (old - new) / old if metric in HIGHER_IS_BETTER else (new - old) / old
+            entry = {"benchmark": name, "metric": metric, "baseline": old, "current": new, "change": round(change, 3)}
+            if change > tolerance:
+                regressions.append(entry)
+            elif change < -tolerance:
+                improvements.append(entry)
+    if baseline.get("profile") != current.get("profile"):
+        print(f"warning: comparing profile {current.get('profile')} against {baseline.get('profile')}", file=sys.stderr)
+    return {"tolerance": tolerance, "regressions": regressions, "improvements": improvements}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--child", nargs=2, metavar=("BENCHMARK", "PROFILE"), help=argparse.SUPPRESS)
+    commands = parser.add_subparsers(dest="command")
+    run = commands.add_parser("run", help="run the suite and print (or save) the results")
+    run.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    run.add_argument("--only", nargs="+", choices=["micro", "load"], default=["micro", "load"])
+    run.add_argument("--out", help="also write the results to this file")
+    run.add_argument("--baseline", help="compare against this results file")
+    run.add_argument("--tolerance", type=float, default=0.2)
+    cmp = commands.add_parser("compare", help="compare two results files")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_micro_child(*args.child)))
+        return
+    if args.command == "run":
+        result = run_suite(args.profile, args.only)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(result, f, indent=2)
+        if args.baseline:
+            with open(args.baseline) as f:
+                result["comparison"] = compare(json.load(f), result, args.tolerance)
+        print(json.dumps(result, indent=2))
+    elif args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            result = {"comparison": compare(baseline, json.load(f), args.tolerance)}
+        print(json.dumps(result, indent=2))
+    else:
+        parser.print_help()
+        return
+    if result.get("comparison", {}).get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
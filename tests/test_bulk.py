@@ -0,0 +1,70 @@
+import io
+import json
+
+import pytest
+
+from api.bulk import BulkImporter, import_file
+from api.graph_store import GraphStore, create_graph_store
+from api.storage import create_engine
+
+
+@pytest.mark.parametrize("filename, data, bad", [
+    ("kb.csv", "subject,relation,object,confidence\nA,r,B,0.9\nC,r,D,nan\nE,r,F,inf\nG,r,H,-Infinity\n", 3),
+    ("kb.csv", "subject,relation,object,confidence\nC,r,D,nan\nA,r,B,0.9\n", 1),
+    ("kb.jsonl", '{"subject": "A", "relation": "r", "object": "B", "confidence": 0.9}\n'
+                 '{"subject": "C", "relation": "r", "object": "D", "confidence": NaN}\n'
+                 '{"subject": "E", "relation": "r", "object": "F", "confidence": "inf"}\n', 2),
+])
+def test_import_skips_non_finite_confidence(filename, data, bad):
+    store = create_graph_store("compact")
+    report = import_file(store, io.BytesIO(data.encode()), filename)
+    assert report["bad_rows"] == bad
+    assert [edge["confidence"] for edge in store.to_dto()["edges"]] == [pytest.approx(0.9)]
+    json.dumps(store.to_dto(), allow_nan=False)
+
+
+def sequential(store, rows, default_source):
+    for subject, relation, obj, sources, confidence in rows:
+        if not subject:
+            continue
+        for source_id in sources or [default_source]:
+            store.upsert_triple(subject, relation, obj, source_id, confidence=1.0 if confidence is None else confidence)
+
+
+@pytest.mark.parametrize("backend", ["networkx", "compact"])
+@pytest.mark.parametrize("resolve", [False, True])
+def test_bulk_import_matches_row_by_row_upserts(backend, resolve):
+    rows = [
+        ("Python", "is_a", "Language", None, 0.5),
+        ("Rust", "is_a", "Language", ["doc1"], None),
+        ("Python", "is_a", "Language", ["doc1", "doc2"], 0.9),
+        ("Python", "runs_on", "CPython", ["doc2"], 0.4),
+        ("Python", "is_a", "Language", ["doc1"], 0.7),
+        ("Neural Networks", "used_in", "Deep Learning", ["doc3"], 0.6),
+        ("neural network", "used_in", "Deep Learning", ["doc3"], 0.8),
+        ("", "is_a", "Language", None, 0.5),
+    ]
+    later = [
+        ("Python", "is_a", "Language", ["doc4"], 1.0),
+        ("Go", "is_a", "Language", ["doc4"], 0.3),
+        ("Python", "runs_on", "PyPy", None, None),
+    ]
+    expected = GraphStore(create_engine(backend), resolve_entities=resolve)
+    sequential(expected, rows + later, "kb")
+    store = GraphStore(create_engine(backend), resolve_entities=resolve)
+    for batch in (rows, later):
+        importer = BulkImporter(store, "kb")
+        importer.feed(batch)
+        importer.flush()
+    assert importer.counts["edges_updated"] == 1
+    assert store.to_dto()["nodes"] == expected.to_dto()["nodes"]
+    edges = [{key: value for key, value in edge.items() if key != "confidence"} for edge in store.to_dto()["edges"]]
+    assert edges == [{key: value for key, value in edge.items() if key != "confidence"}
+                     for edge in expected.to_dto()["edges"]]
+    assert ([pytest.approx(edge["confidence"]) for edge in store.to_dto()["edges"]] ==
+            [edge["confidence"] for edge in expected.to_dto()["edges"]])
+    assert store.find_nodes(["pyth"]) == expected.find_nodes(["pyth"])
+    # Retracting drops the orphaned nodes from the search index too
+    store.retract_source("doc4")
+    expected.retract_source("doc4")
+    assert store.find_nodes(["go"]) == expected.find_nodes(["go"]) == []
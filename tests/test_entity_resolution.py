@@ -0,0 +1,46 @@
+import pytest
+
+from api.entity_resolution import EntityResolver
+
+
+def resolves_together(first, second):
+    resolver = EntityResolver()
+    resolver.add(1, resolver.key(first, "entity"))
+    return resolver.resolve(resolver.key(second, "entity")) == [1]
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Sender Thread", "Render Thread"),
+    ("Spring Boot", "String Boot"),
+    ("Planet Earth", "Plant Earth"),
+    ("Apache Spark", "Apache Spare"),
+    ("Hidden Layer", "Hidden Player"),
+    ("State Machine", "Slate Machine"),
+    ("Sensor Data", "Censor Data"),
+])
+def test_distinct_words_stay_apart(first, second):
+    assert not resolves_together(first, second)
+    assert not resolves_together(second, first)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Convolutional Network", "Convolutonal Network"),
+    ("Neural Network", "Neural Netwrok"),
+    ("Transformer Model", "Transfomer Model"),
+    ("Neural Networks", "the neural network"),
+    ("Tensor Flow", "TensorFlow"),
+])
+def test_variants_merge(first, second):
+    assert resolves_together(first, second)
+    assert resolves_together(second, first)
+
+
+def test_removed_entity_stops_matching():
+    resolver = EntityResolver()
+    resolver.add(1, resolver.key("Convolutional Network", "entity"))
+    resolver.add(2, resolver.key("Recurrent Network", "entity"))
+    resolver.add(1, resolver.key("Convolutional Networks", "entity"))
+    resolver.remove(1)
+    assert resolver.resolve(resolver.key("Convolutonal Network", "entity")) == []
+    assert resolver.resolve(resolver.key("Recurent Network", "entity")) == [2]
+    assert resolver.stats()["fuzzy_keys"] == 1
@@ -0,0 +1,153 @@
+import threading
+
+import pytest
+
+from api.graph_store import create_graph_store
+from api.retrieval import Retriever, SnapshotGraph
+
+BACKENDS = ["networkx", "compact"]
+
+
+def reopen(store, backend, data_dir):
+    store.persistence.close()
+    return create_graph_store(backend, data_dir=str(data_dir))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_reopen_after_rejected_op(backend, tmp_path):
+    store = create_graph_store(backend, data_dir=str(tmp_path))
+    store.upsert_triple("Python", "is_a", "Programming Language", "doc1", confidence=0.9)
+    for confidence in ("high", float("nan"), [0.9]):
+        with pytest.raises(ValueError):
+            store.upsert_triple("Python", "uses", "Bytecode", "doc1", confidence=confidence)
+    with pytest.raises(ValueError):
+        store.upsert_triple(None, "uses", "Bytecode", "doc1", confidence=0.5)
+    # Coerced rather than rejected
+    store.upsert_triple("Python", "uses", "Bytecode", "doc2", confidence=None)
+    store.upsert_triple("Python", "runs_on", "CPython", "doc2", confidence="1.5")
+    counts = (store.node_count(), store.edge_count(), store.version)
+
+    store = reopen(store, backend, tmp_path)
+    assert (store.node_count(), store.edge_count(), store.version) == counts
+    confidences = {edge["relation"]: edge["confidence"] for edge in store.to_dto()["edges"]}
+    assert confidences == {"is_a": pytest.approx(0.9), "uses": 0.0, "runs_on": 1.0}
+    store.persistence.close()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_replay_skips_bad_record(backend, tmp_path, caplog):
+    store = create_graph_store(backend, data_dir=str(tmp_path))
+    store.upsert_triple("Python", "is_a", "Programming Language", "doc1", confidence=0.9)
+    # A record logged before operations were checked
+    store.persistence.log([("upsert", "Python", "uses", None, "doc1", "high")])
+    store.upsert_triple("Python", "uses", "Bytecode", "doc1", confidence=0.5)
+
+    store = reopen(store, backend, tmp_path)
+    assert (store.node_count(), store.edge_count()) == (3, 2)
+    assert "Skipping a WAL record" in caplog.text
+    store.persistence.close()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_failing_transaction_applies_nothing(backend):
+    store = create_graph_store(backend)
+    store.upsert_triple("Python", "is_a", "Programming Language", "doc1", confidence=0.9)
+    before = (store.node_count(), store.edge_count(), store.version)
+    with pytest.raises(ValueError):
+        with store.transaction() as tx:
+            tx.upsert_triple("Rust", "is_a", "Programming Language", "doc2", confidence=0.8)
+            tx.upsert_triple("Rust", "uses", "LLVM", "doc2", confidence=0.8)
+            tx.upsert_triple("Rust", "uses", None, "doc2", confidence=0.8)
+    assert (store.node_count(), store.edge_count(), store.version) == before
+    with pytest.raises(ValueError):
+        store.commit([("upsert", "Rust", "is_a", "Programming Language", "doc2", 0.8),
+                      ("upsert", "Rust", "uses", "LLVM", "doc2", 0.8),
+                      ("upsert", "Rust", "uses", "Cargo", "doc2", "high")])
+    assert (store.node_count(), store.edge_count(), store.version) == before
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_bulk_upsert_checks_every_row(backend, tmp_path):
+    store = create_graph_store(backend, data_dir=str(tmp_path))
+    columns = (["A", "C", "E"], ["r", "r", "r"], ["B", "D", "F"])
+    links = ([0, 1, 2], ["doc"] * 3, [1] * 3)
+    for confidences in ([0.5, float("nan"), 0.5], [0.5, 0.5, float("nan")]):
+        with pytest.raises(ValueError):
+            store.bulk_upsert(*columns, confidences, *links)
+    with pytest.raises(ValueError):
+        store.bulk_upsert(["A", "C", "E"], ["r", "r", "r"], ["B", "  ", "F"], [0.5] * 3, *links)
+    assert (store.node_count(), store.edge_count(), store.version) == (0, 0, 0)
+
+    store = reopen(store, backend, tmp_path)
+    assert (store.node_count(), store.edge_count()) == (0, 0)
+    store.persistence.close()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_replay_bulk_upsert_with_per_row_sources(backend, tmp_path):
+    store = create_graph_store(backend, data_dir=str(tmp_path))
+    # The record format before provenance links were flat: per-row source and hit lists
+    store.persistence.log([("bulk_upsert", ["Python", "Python", "Rust"], ["is_a", "is_a", "uses"],
+                            ["Language", "Language", "LLVM"], [["doc1"], ["doc1", "doc2"], []],
+                            [[1], [2, 1], []], [0.5, 0.9, 0.7])])
+
+    store = reopen(store, backend, tmp_path)
+    edges = {edge["relation"]: edge for edge in store.to_dto()["edges"]}
+    assert (store.node_count(), store.edge_count()) == (4, 2)
+    assert edges["is_a"]["confidence"] == pytest.approx(0.9)
+    assert store.find_nodes(["rus"]) == [store.to_dto()["nodes"][2]["id"]]
+    store.persistence.close()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_reads_do_not_wait_for_a_writer(backend):
+    store = create_graph_store(backend)
+    store.upsert_triple("Python", "uses", "Bytecode", "doc1", confidence=0.9)
+    store.upsert_triple("Bytecode", "runs_on", "Virtual Machine", "doc1", confidence=0.8)
+    retriever = Retriever(store, cache_size=0)
+    question = "What does Python use?"
+    before, answer = store.snapshot(), retriever.retrieve(question)
+
+    applying, release = threading.Event(), threading.Event()
+    apply_op = store.apply_op
+
+    def slow_apply(op):
+        result = apply_op(op)
+        applying.set()
+        release.wait(10)
+        return result
+
+    store.apply_op = slow_apply
+    writer = threading.Thread(target=store.upsert_triple, args=("CPython", "implements", "Python", "doc2", 0.9))
+    writer.start()
+    try:
+        assert applying.wait(10)
+        # The write is applied but not committed: readers get the previous version
+        assert store.snapshot() is before
+        assert retriever.retrieve(question) == answer
+    finally:
+        release.set()
+        writer.join()
+    assert store.snapshot().version == store.version > before.version
+    assert "CPython" in retriever.retrieve(question)["labels"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_patched_snapshot_graph_matches_a_fresh_one(backend):
+    store = create_graph_store(backend)
+    store.upsert_triple("Python", "uses", "Bytecode", "doc1", confidence=0.9)
+    store.upsert_triple("Rust", "uses", "LLVM", "doc2", confidence=0.8)
+    previous = SnapshotGraph(store.snapshot())
+    store.upsert_triple("Python", "runs_on", "CPython", "doc3", confidence=0.7)
+    store.upsert_triple("Python", "uses", "Bytecode", "doc3", confidence=0.95)
+    store.upsert_triple("Neural Networks", "used_by", "Python", "doc3", confidence=0.6)
+    store.upsert_triple("the neural network", "uses", "Bytecode", "doc4", confidence=0.6)
+    store.retract_source("doc2")
+
+    snapshot = store.snapshot()
+    patched, fresh = SnapshotGraph(snapshot, previous), SnapshotGraph(snapshot)
+    for h in snapshot.nodes:
+        assert (patched.out_edges(h), patched.in_edges(h)) == (fresh.out_edges(h), fresh.in_edges(h))
+    for keyword in ("python", "network", "rust", "by"):
+        assert patched.search(keyword, 10) == fresh.search(keyword, 10)
+    assert patched.search("rust", 10) == []
@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+from api.graph_store import create_graph_store
+from api.jobs import JobBoard, JobManager, RemoteJob
+from api.pipeline import IngestReport
+
+
+class BlockingPipeline:
+    """Adds one triple per chunk, then waits until released."""
+
+    def __init__(self, store):
+        self.store = store
+        self.release = asyncio.Event()
+
+    async def ingest_chunks(self, name, chunks, on_chunk=None, replace=False):
+        report = IngestReport()
+        for i, chunk in enumerate(chunks):
+            self.store.upsert_triple(chunk, "in", name, f"{name}#chunk_{i}", confidence=0.9)
+            report.chunks_done += 1
+            on_chunk(report, f"{name}#chunk_{i}")
+        await self.release.wait()
+        return report
+
+
+def test_any_worker_answers_for_a_job(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+
+    async def scenario():
+        store = create_graph_store("compact")
+        pipeline = BlockingPipeline(store)
+        owner = JobManager(pipeline, store, board=JobBoard(path))
+        other = JobManager(pipeline, store, board=JobBoard(path))
+        owner.start()
+        job = owner.submit_chunks("doc", ["Python"])
+        remote = other.get(job.id)
+        assert isinstance(remote, RemoteJob) and remote.to_dict()["status"] == "queued"
+        assert other.get("unknown") is None
+
+        events = []
+        async def follow():
+            async for message in other.events(remote, keepalive=5.0):
+                events.append(message)
+        follower = asyncio.ensure_future(follow())
+        while other.get(job.id).to_dict()["chunks_done"] == 0:
+            await asyncio.sleep(0.01)
+        pipeline.release.set()
+        await asyncio.wait_for(follower, 10.0)
+        await owner.stop()
+        return events
+
+    events = asyncio.run(scenario())
+    kinds = [message.split("\n", 1)[0] for message in events]
+    assert kinds[0] == "event: progress" and kinds[-1] == "event: done"
+    assert "event: delta" in kinds
+    done = json.loads(events[-1].split("data: ", 1)[1])
+    assert (done["status"], done["chunks_done"]) == ("done", 1)
+
+
+def test_stopped_worker_fails_its_unfinished_jobs(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+
+    async def scenario():
+        store = create_graph_store("compact")
+        owner = JobManager(BlockingPipeline(store), store, board=JobBoard(path))
+        owner.start()
+        job = owner.submit_chunks("doc", ["Python"])
+        await asyncio.sleep(0.05)
+        await owner.stop()
+        return job.id
+
+    job_id = asyncio.run(scenario())
+    state = JobBoard(path).get(job_id)
+    assert (state["status"], state["error"]) == ("failed", "worker stopped")
@@ -0,0 +1,34 @@
+import pytest
+
+from api.graph_store import create_graph_store
+from api.llm_scheduler import clean_triples
+from api.pipeline import apply_triples
+
+
+def test_clean_triples_coerces_confidence_and_drops_incomplete():
+    raw = [
+        {"subject": "Python", "relation": "is_a", "object": "Language", "confidence": "0.9"},
+        {"subject": "Python", "relation": "uses", "object": "Bytecode", "confidence": None},
+        {"subject": "Python", "relation": "runs_on", "object": "CPython", "confidence": 7},
+        {"subject": "Python", "relation": "has", "object": "GIL", "confidence": "high"},
+        {"subject": " ", "relation": "uses", "object": "Bytecode"},
+        {"subject": "Python", "relation": "uses", "object": 3},
+        "Python uses Bytecode",
+    ]
+    triples = clean_triples(raw, max_triples=10)
+    assert [(t["relation"], t["confidence"]) for t in triples] == [
+        ("is_a", pytest.approx(0.9)), ("uses", 0.5), ("runs_on", 1.0), ("has", 0.5)]
+
+
+def test_apply_triples_skips_incomplete_and_coerces_confidence():
+    store = create_graph_store("networkx")
+    triples = [
+        {"subject": "Python", "relation": "is_a", "object": "Language", "confidence": "0.9"},
+        ("Python", "uses", "Bytecode", [0.4]),
+        {"subject": "Python", "relation": "", "object": "CPython"},
+        ("Python", None, "CPython"),
+        ("Python", "runs_on"),
+    ]
+    assert apply_triples(store, triples, "doc1") == 2
+    confidences = {edge["relation"]: edge["confidence"] for edge in store.to_dto()["edges"]}
+    assert confidences == {"is_a": pytest.approx(0.9), "uses": 0.5}